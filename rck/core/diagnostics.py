@@ -0,0 +1,345 @@
+import multiprocessing
+from collections import defaultdict
+from copy import deepcopy
+
+from rck.core.io import EXTERNAL_NA_ID
+from rck.core.structures import AdjacencyType, CNBoundaries, Haplotype
+from rck.utils.adj.adjacency_group_process import projected_groups
+
+WINDOW = "window"
+RELAXED_SCNB = "scnb"
+EXTRA_TELOMERES = "telomeres"
+DROPPED_GROUPS = "groups"
+NAS_FP = "nas_fp"
+
+RELAXATION_FAMILIES = [RELAXED_SCNB, EXTRA_TELOMERES, DROPPED_GROUPS, NAS_FP]
+
+_worker_checker = None
+
+
+def set_worker_checker(checker):
+    global _worker_checker
+    _worker_checker = checker
+
+
+def check_in_worker(spec):
+    return _worker_checker(spec)
+
+
+class FeasibilityChecker(object):
+    """
+    Decides feasibility of reduced/relaxed versions of the RCK ILP model. A reduction is described by a `spec` dict (only plain ids, so that it can be sent to worker processes):
+        * WINDOW -- ids of segments the model is restricted to (only adjacencies with both extremities on these segments are kept,
+            and extremities, whose reference adjacency leads outside of the window, become telomeres, so that a restricted model is a relaxation of the full one);
+        * RELAXED_SCNB -- ids of segments whose copy number boundaries are relaxed to [0, largest input upper boundary];
+        * EXTRA_TELOMERES -- ids of extremities that are additionally allowed to be telomeres;
+        * DROPPED_GROUPS -- ids of adjacency groups that are not taken into account;
+        * NAS_FP -- novel adjacencies false positive rate.
+    Only this class is solver-specific, localization routines (e.g., `localize_infeasibility`) only rely on its `check_many` method.
+    """
+
+    def __init__(self, segments, adjacencies, scnt, scnb, telomeres, adjacency_groups=None, segments_to_fragments=None, nas_fp=0.1,
+                 solve_as_haploid=False, extra=None, time_limit=600, threads=1, workers=1, max_checks=None):
+        self.segments = segments
+        self.adjacencies = adjacencies
+        self.scnt = scnt
+        self.scnb = scnb
+        self.telomeres = telomeres
+        self.adjacency_groups = adjacency_groups if adjacency_groups is not None else []
+        self.segments_to_fragments = segments_to_fragments
+        self.nas_fp = nas_fp
+        self.solve_as_haploid = solve_as_haploid
+        self.extra = extra
+        self.time_limit = time_limit
+        self.threads = threads
+        self.workers = workers
+        self.max_checks = max_checks
+        self.checks_cnt = 0
+        self.relaxed_upper = max([0] + [scnb[clone_id].get_cnb(sid=segment.stable_id_non_hap, hap=haplotype, boundary_type=CNBoundaries.UPPER)
+                                        for clone_id in scnb for segment in segments for haplotype in [Haplotype.A, Haplotype.B]])
+        self.positions_to_sids = {}
+        for segment in segments:
+            for position in [segment.start_position, segment.end_position]:
+                self.positions_to_sids[position.stable_id_non_hap] = segment.stable_id_non_hap
+
+    @property
+    def exhausted(self):
+        return self.max_checks is not None and self.checks_cnt >= self.max_checks
+
+    def get_model(self, spec):
+        from rck.core.ilp_gurobi import OptModelMultiClone
+        window = spec.get(WINDOW)
+        segments = self.segments if window is None else [segment for segment in self.segments if segment.stable_id_non_hap in window]
+        adjacencies = self.adjacencies if window is None else [adjacency for adjacency in self.adjacencies
+                                                               if self.positions_to_sids[adjacency.position1.stable_id_non_hap] in window
+                                                               and self.positions_to_sids[adjacency.position2.stable_id_non_hap] in window]
+        telomeres_ids = set(spec.get(EXTRA_TELOMERES, []))
+        if window is not None:
+            for adjacency in self.adjacencies:
+                if adjacency.adjacency_type != AdjacencyType.REFERENCE:
+                    continue
+                for position, other in [(adjacency.position1, adjacency.position2), (adjacency.position2, adjacency.position1)]:
+                    if self.positions_to_sids[position.stable_id_non_hap] in window and self.positions_to_sids[other.stable_id_non_hap] not in window:
+                        telomeres_ids.add(position.stable_id_non_hap)
+        telomeres = list(self.telomeres)
+        existing_telomeres_ids = {position.stable_id_non_hap for position in telomeres}
+        for segment in segments:
+            for position in [segment.start_position, segment.end_position]:
+                if position.stable_id_non_hap in telomeres_ids and position.stable_id_non_hap not in existing_telomeres_ids:
+                    telomeres.append(position)
+        relaxed_sids = set(spec.get(RELAXED_SCNB, []))
+        scnb = self.scnb
+        if len(relaxed_sids) > 0:
+            scnb = {}
+            for clone_id, clone_scnb in self.scnb.items():
+                scnb[clone_id] = deepcopy(clone_scnb)
+                for sid in relaxed_sids:
+                    for haplotype in [Haplotype.A, Haplotype.B]:
+                        scnb[clone_id].set_cnb_record(sid=sid, hap=haplotype, boundary_type=CNBoundaries.LOWER, value=0)
+                        scnb[clone_id].set_cnb_record(sid=sid, hap=haplotype, boundary_type=CNBoundaries.UPPER, value=self.relaxed_upper)
+        dropped_gids = set(spec.get(DROPPED_GROUPS, []))
+        groups = [group for group in self.adjacency_groups if group.gid not in dropped_gids]
+        if window is not None:
+            groups = projected_groups(groups=groups, adjacencies=adjacencies)
+        segments_to_fragments = None
+        if self.segments_to_fragments is not None:
+            segments_ids = {segment.stable_id_non_hap for segment in segments}
+            segments_to_fragments = {sid: fid for sid, fid in self.segments_to_fragments.items() if sid in segments_ids}
+        return OptModelMultiClone(hapl_segments=segments,
+                                  hapl_adjacencies=adjacencies,
+                                  scnt=self.scnt,
+                                  hapl_telomeres=telomeres,
+                                  scnb=scnb,
+                                  hapl_adjacencies_groups=groups,
+                                  hapl_segments_to_fragments=segments_to_fragments,
+                                  hapl_nov_adjacencies_fp=spec.get(NAS_FP, self.nas_fp),
+                                  solve_as_haploid=self.solve_as_haploid,
+                                  extra=self.extra)
+
+    def __call__(self, spec):
+        """
+        Returns True, if the reduced model is feasible, False, if it is proven infeasible, and None, if neither was established within the time limit.
+        """
+        import gurobi as g
+        ilp_model = self.get_model(spec=spec)
+        ilp_model.build_gurobi_model()
+        ilp_model.gm.setObjective(g.LinExpr(), g.GRB.MINIMIZE)
+        ilp_model.gm.setParam("OutputFlag", 0)
+        ilp_model.gm.setParam("SolutionLimit", 1)
+        ilp_model.gm.setParam("TimeLimit", self.time_limit)
+        ilp_model.gm.setParam("Threads", self.threads)
+        ilp_model.gm.optimize()
+        if ilp_model.gm.status in [g.GRB.Status.INFEASIBLE, g.GRB.Status.INF_OR_UNBD]:
+            return False
+        if ilp_model.gm.solcount > 0:
+            return True
+        return None
+
+    def check_many(self, specs):
+        """
+        Checks feasibility of several reduced models, in parallel (in `workers` separate processes), if more than one worker is allowed.
+        """
+        self.checks_cnt += len(specs)
+        if self.workers <= 1 or len(specs) <= 1:
+            return [self(spec) for spec in specs]
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(processes=min(self.workers, len(specs)), initializer=set_worker_checker, initargs=(self,)) as pool:
+            return pool.map(check_in_worker, specs)
+
+
+def get_monotone_boundary(lo, hi, predicate_many, width=1):
+    """
+    For a predicate that holds at `lo` and is monotone (once false, stays false) on [lo, hi], returns the largest value in [lo, hi] on which it holds.
+    Every round evaluates (via `predicate_many`, that takes a list of values) up to `width` evenly spaced points, so that the search takes about log_{width + 1}(hi - lo) rounds.
+    """
+    while lo < hi:
+        points = sorted({min(hi, lo + max(1, (hi - lo) * k // (width + 1))) for k in range(1, width + 1)})
+        results = predicate_many(points)
+        holding = [point for point, result in zip(points, results) if result]
+        failing = [point for point, result in zip(points, results) if not result]
+        if len(failing) > 0:
+            hi = min(failing) - 1
+        lo = max([lo] + [point for point in holding if point <= hi])
+    return lo
+
+
+def get_minimal_relaxation(items, is_sufficient):
+    """
+    QuickXplain-style divide and conquer search for an irreducible subset of `items`, relaxation of which is sufficient (i.e., `is_sufficient(subset)` holds) for feasibility.
+        `is_sufficient` must hold on all `items`, and be monotone with respect to the subset inclusion.
+    Takes O(k * log(n / k)) checks, where k is the size of the result.
+    """
+
+    def search(background, has_delta, candidates):
+        if has_delta and is_sufficient(background):
+            return []
+        if len(candidates) == 1:
+            return list(candidates)
+        middle = len(candidates) // 2
+        first, second = candidates[:middle], candidates[middle:]
+        second_result = search(background=background + first, has_delta=len(first) > 0, candidates=second)
+        first_result = search(background=background + second_result, has_delta=len(second_result) > 0, candidates=first)
+        return first_result + second_result
+
+    items = list(items)
+    if len(items) == 0 or is_sufficient([]):
+        return []
+    return search(background=[], has_delta=False, candidates=items)
+
+
+def get_segments_by_chromosomes(segments):
+    result = defaultdict(list)
+    for segment in segments:
+        result[segment.chromosome].append(segment)
+    for chromosome in result:
+        result[chromosome] = sorted(result[chromosome], key=lambda s: (s.start_coordinate, s.end_coordinate))
+    return result
+
+
+def get_full_relaxation_spec(checker, family):
+    if family == RELAXED_SCNB:
+        return {family: [segment.stable_id_non_hap for segment in checker.segments]}
+    if family == EXTRA_TELOMERES:
+        return {family: [position.stable_id_non_hap for segment in checker.segments for position in [segment.start_position, segment.end_position]]}
+    if family == DROPPED_GROUPS:
+        return {family: [group.gid for group in checker.adjacency_groups]}
+    return {family: 1.0}
+
+
+def get_window_report(checker, window, window_adjacencies):
+    """
+    For an infeasible `window` (None for the whole input) determines which relaxation families (copy number boundaries, telomeres, adjacency groups) restore feasibility,
+        and, for every such family, an irreducible set of segments/extremities/groups, relaxation of which is sufficient.
+    """
+    window_segments = [segment for segment in checker.segments if window is None or segment.stable_id_non_hap in window]
+    window_aids = {adjacency.extra.get(EXTERNAL_NA_ID, adjacency.stable_id_non_phased) for adjacency in window_adjacencies}
+    telomeres_ids = {position.stable_id_non_hap for position in checker.telomeres}
+    items = {
+        RELAXED_SCNB: [segment.stable_id_non_hap for segment in window_segments],
+        EXTRA_TELOMERES: [position.stable_id_non_hap for segment in window_segments for position in [segment.start_position, segment.end_position]
+                          if position.stable_id_non_hap not in telomeres_ids],
+        DROPPED_GROUPS: [group.gid for group in checker.adjacency_groups if window is None or not group.adjacencies_ids_set.isdisjoint(window_aids)],
+    }
+    base_spec = {} if window is None else {WINDOW: window, NAS_FP: 1.0}
+    families = [family for family in [RELAXED_SCNB, EXTRA_TELOMERES, DROPPED_GROUPS] if len(items[family]) > 0]
+    results = checker.check_many([dict(base_spec, **{family: items[family]}) for family in families])
+    result = {"families": {family: result for family, result in zip(families, results)}, "culprits": {}, "truncated": False}
+    for family, family_result in zip(families, results):
+        if not family_result:
+            continue
+
+        def is_sufficient(subset):
+            if checker.exhausted:
+                result["truncated"] = True
+                return False
+            return checker.check_many([dict(base_spec, **{family: subset})])[0] is True
+
+        result["culprits"][family] = get_minimal_relaxation(items=items[family], is_sufficient=is_sufficient)
+    return result
+
+
+def localize_infeasibility(checker, logger=None):
+    """
+    Localizes the infeasible core of the RCK model by solving reduced feasibility models (see `FeasibilityChecker`), instead of computing the IIS of the full model:
+        1. the full model, and the full model with relaxed copy number boundaries / extra telomeres / dropped adjacency groups / novel adjacencies false positive rate of 1, are checked;
+        2. every chromosome is checked on its own (false positive rate of 1, inter-chromosomal adjacencies are dropped);
+        3. for every infeasible chromosome, a minimal infeasible window of consecutive segments is determined by bisection of its left and right ends;
+        4. for every window (or for the whole input, if no chromosome is infeasible on its own), irreducible sets of segments/extremities/groups are determined (see `get_window_report`).
+    Independent checks at every stage are performed in parallel (see `FeasibilityChecker.check_many`).
+    Returns a dict with the localization report (see `get_infeasibility_report_lines` for its human-readable version).
+    """
+    report = {"feasible": None, "families": {}, "chromosomes": {}, "regions": []}
+    families = [family for family in RELAXATION_FAMILIES if family != DROPPED_GROUPS or len(checker.adjacency_groups) > 0]
+    results = checker.check_many([{}] + [get_full_relaxation_spec(checker=checker, family=family) for family in families])
+    report["feasible"] = results[0]
+    report["families"] = {family: result for family, result in zip(families, results[1:])}
+    if report["feasible"] is not False:
+        report["checks"] = checker.checks_cnt
+        return report
+    segments_by_chromosomes = get_segments_by_chromosomes(segments=checker.segments)
+    chromosomes = sorted(segments_by_chromosomes.keys())
+    if logger is not None:
+        logger.info("Checking feasibility of {cnt} chromosomes on their own".format(cnt=len(chromosomes)))
+    results = checker.check_many([{WINDOW: {segment.stable_id_non_hap for segment in segments_by_chromosomes[chromosome]}, NAS_FP: 1.0} for chromosome in chromosomes])
+    report["chromosomes"] = {chromosome: result for chromosome, result in zip(chromosomes, results)}
+    infeasible_chromosomes = [chromosome for chromosome, result in zip(chromosomes, results) if result is False]
+    windows = []
+    for chromosome in infeasible_chromosomes:
+        chr_segments = segments_by_chromosomes[chromosome]
+        segments_cnt = len(chr_segments)
+
+        def is_infeasible_many(bounds):
+            specs = [{WINDOW: {segment.stable_id_non_hap for segment in chr_segments[start:end]}, NAS_FP: 1.0} for start, end in bounds]
+            return [result is False for result in checker.check_many(specs)]
+
+        if logger is not None:
+            logger.info("Bisecting chromosome {chromosome} ({cnt} segments) for a minimal infeasible window".format(chromosome=chromosome, cnt=segments_cnt))
+        start = get_monotone_boundary(lo=0, hi=segments_cnt - 1, width=max(1, checker.workers),
+                                      predicate_many=lambda points: is_infeasible_many([(point, segments_cnt) for point in points]))
+        end = segments_cnt - get_monotone_boundary(lo=0, hi=segments_cnt - start - 1, width=max(1, checker.workers),
+                                                   predicate_many=lambda points: is_infeasible_many([(start, segments_cnt - point) for point in points]))
+        windows.append((chromosome, chr_segments[start:end]))
+    if len(windows) == 0:
+        windows.append((None, checker.segments))
+    for chromosome, window_segments in windows:
+        window = None if chromosome is None else {segment.stable_id_non_hap for segment in window_segments}
+        window_adjacencies = [adjacency for adjacency in checker.adjacencies
+                              if window is None or (checker.positions_to_sids[adjacency.position1.stable_id_non_hap] in window
+                                                    and checker.positions_to_sids[adjacency.position2.stable_id_non_hap] in window)]
+        region = {
+            "chromosome": chromosome,
+            "start": None if chromosome is None else window_segments[0].start_coordinate,
+            "end": None if chromosome is None else window_segments[-1].end_coordinate,
+            "segments": [segment.stable_id_non_hap for segment in window_segments],
+            "novel_adjacencies": [adjacency.stable_id_non_phased for adjacency in window_adjacencies if adjacency.adjacency_type == AdjacencyType.NOVEL],
+        }
+        if logger is not None:
+            logger.info("Determining culprits for the infeasible {region}".format(region="whole input" if chromosome is None else
+                                                                                   "window {chromosome}:{start}-{end}".format(**region)))
+        region.update(get_window_report(checker=checker, window=window, window_adjacencies=window_adjacencies))
+        report["regions"].append(region)
+    report["checks"] = checker.checks_cnt
+    return report
+
+
+def feasibility_str(value):
+    if value is None:
+        return "undetermined"
+    return "feasible" if value else "infeasible"
+
+
+def get_infeasibility_report_lines(report):
+    families_names = {
+        RELAXED_SCNB: "relaxed segment copy number boundaries",
+        EXTRA_TELOMERES: "all segment extremities allowed as telomeres",
+        DROPPED_GROUPS: "no adjacency groups",
+        NAS_FP: "novel adjacencies false positive rate of 1",
+    }
+    culprits_names = {
+        RELAXED_SCNB: "segments with too tight copy number boundaries",
+        EXTRA_TELOMERES: "extremities that would need to be telomeres",
+        DROPPED_GROUPS: "unsatisfiable adjacency groups",
+    }
+    result = ["Full model: {status}".format(status=feasibility_str(report["feasible"]))]
+    for family in RELAXATION_FAMILIES:
+        if family in report["families"]:
+            result.append("Full model with {name}: {status}".format(name=families_names[family], status=feasibility_str(report["families"][family])))
+    infeasible_chromosomes = [chromosome for chromosome, value in sorted(report["chromosomes"].items()) if value is False]
+    if len(report["chromosomes"]) > 0:
+        result.append("Chromosomes infeasible on their own: {chromosomes}".format(chromosomes=",".join(infeasible_chromosomes) if len(infeasible_chromosomes) > 0 else "none"))
+    for region in report["regions"]:
+        if region["chromosome"] is None:
+            result.append("No chromosome is infeasible on its own; the infeasibility involves inter-chromosomal adjacencies or the genome-wide novel adjacencies false positive rate")
+        else:
+            result.append("Minimal infeasible window {chromosome}:{start}-{end} ({cnt} segments)".format(cnt=len(region["segments"]), **region))
+            result.append("\tsegments: {sids}".format(sids=",".join(region["segments"])))
+            if len(region["novel_adjacencies"]) > 0:
+                result.append("\tnovel adjacencies: {aids}".format(aids=",".join(region["novel_adjacencies"])))
+        for family, value in sorted(region["families"].items()):
+            result.append("\twith {name}: {status}".format(name=families_names[family], status=feasibility_str(value)))
+        for family, culprits in sorted(region["culprits"].items()):
+            result.append("\t{name}: {ids}".format(name=culprits_names[family], ids=",".join(map(str, culprits))))
+        if region["truncated"]:
+            result.append("\tlimit on the number of checks was reached, culprits lists may be not minimal")
+    result.append("A total of {cnt} reduced models were checked".format(cnt=report.get("checks", 0)))
+    return result
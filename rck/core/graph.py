@@ -1,6 +1,8 @@
 from copy import deepcopy
 
 import networkx as nx
+import numpy as np
+from scipy.sparse import csr_matrix
 
 from rck.core.structures import propagate_haplotype_segment_to_positions, propagate_phasing_adjacency_to_positions
 from rck.core.structures import SegmentCopyNumberProfile, AdjacencyCopyNumberProfile, StructureProfile, Segment, Adjacency, AdjacencyType, HAPLOTYPE, Haplotype, Phasing, PHASING
@@ -28,6 +30,7 @@ class IntervalAdjacencyGraph(object):
         self.segments = segments
         self.adjacencies = adjacencies
         self.graph = nx.MultiGraph()
+        self.adjacency_edges_keys = set()
 
     @property
     def has_proper_topology(self):
@@ -54,6 +57,24 @@ class IntervalAdjacencyGraph(object):
         obj = self.get_segment_object_from_segment(segment=segment, copy=copy_segment)
         self.graph.add_edge(u, v, object=obj)
 
+    @classmethod
+    def get_adjacency_edge_stable_id(cls, adjacency):
+        return adjacency.stable_id_non_phased
+
+    def get_adjacency_edge_key(self, u, v, adjacency):
+        """
+        Hashable key under which an adjacency edge is recorded in the `adjacency_edges_keys` set.
+        Pair of vertices is sorted, so that the key does not depend on the order in which edge vertices are supplied.
+        """
+        if v < u:
+            u, v = v, u
+        return u, v, self.get_adjacency_edge_stable_id(adjacency=adjacency)
+
+    def rebuild_adjacency_edges_keys(self):
+        self.adjacency_edges_keys = set()
+        for u, v, data in self.adjacency_edges(data=True, sort=True):
+            self.adjacency_edges_keys.add(self.get_adjacency_edge_key(u=u, v=v, adjacency=data["object"]))
+
     def add_adjacency_edge(self, adjacency, sort=True, copy_adjacency=True):
         u, v = self.get_edge_vertices_pair_from_adjacency(adjacency=adjacency, sort=sort)
         if u not in self.graph:
@@ -61,13 +82,15 @@ class IntervalAdjacencyGraph(object):
         if v not in self.graph:
             raise ValueError()
         obj = self.get_adjacency_object_from_adjacency(adjacency=adjacency, copy=copy_adjacency)
-        for adj_edge_w_data in self.adjacency_edges(nbunch=u):
-            adj_u, adj_v, adj_data = adj_edge_w_data
-            if {adj_u, adj_v} == {u, v} and adj_data["object"].adjacency_type == obj.adjacency_type:
-                return
-        # if self.has_adjacency_edge(edge=(u, v), sort=True):   # can not have parallel adjacency edges. Only possible parallel edges are pairs of segment/adjacency ones
-        #     return
+        ###
+        # can not have parallel adjacency edges of the same type. Only possible parallel edges are pairs of segment/adjacency ones, or reference/novel ones
+        #   check is done via a hash lookup, rather than a scan over all edges incident to u, as hub vertices can have hundreds of novel adjacencies incident to them
+        ###
+        key = self.get_adjacency_edge_key(u=u, v=v, adjacency=obj)
+        if key in self.adjacency_edges_keys:
+            return
         self.graph.add_edge(u, v, object=obj)
+        self.adjacency_edges_keys.add(key)
 
     @staticmethod
     def get_edge_vertices_pair_from_adjacency(adjacency, sort=True):
@@ -200,6 +223,7 @@ class IntervalAdjacencyGraph(object):
         for adj_iag_cc in nx.connected_component_subgraphs(G=adjacency_edge_only_iag.graph, copy=copy):
             iag = self.__class__()
             iag.graph = adj_iag_cc
+            iag.rebuild_adjacency_edges_keys()
             yield iag
 
     def ref_adjacency_edges_connected_components_subgraphs(self, copy=True):
@@ -381,9 +405,10 @@ class IntervalAdjacencyGraph(object):
                     continue
                 if u_data["object"] == v_data["object"] and u_data["object"].adjacency_type == v_data["object"].adjacency_type and u_data["object"].adjacency_type == adj_type:
                     assert v_key == u_key
-                    edges_to_remove.append((u, v, v_key))
-        for u, v, key in edges_to_remove:
+                    edges_to_remove.append((u, v, v_key, u_data["object"]))
+        for u, v, key, obj in edges_to_remove:
             self.graph.remove_edge(u=u, v=v, key=key)
+            self.adjacency_edges_keys.discard(self.get_adjacency_edge_key(u=u, v=v, adjacency=obj))
 
     def remove_edges_with_zero_cn(self, check_cn_awareness=False, clear_nodes_after=True):
         self.remove_adjacency_edges_with_zero_cn(check_cn_awareness=check_cn_awareness, clear_nodes_after=clear_nodes_after)
@@ -539,6 +564,10 @@ class HaplotypeSpecificIntervalAdjacencyGraph(IntervalAdjacencyGraph):
     def get_adjacency_object_from_adjacency(cls, adjacency, copy=True):
         return deepcopy(adjacency) if copy else adjacency
 
+    @classmethod
+    def get_adjacency_edge_stable_id(cls, adjacency):
+        return adjacency.stable_id_phased
+
     def add_segment_edge(self, segment, sort=True, copy_segment=True):
         if not segment.is_haplotype_specific:
             raise ValueError()
@@ -790,6 +819,69 @@ def construct_hiag_inflate_from_haploid_data(hapl_segments, hapl_adjacencies):
     return hiag
 
 
+class CopyNumberIncidence(object):
+    """
+    Topology of the (haplotype-specific) interval adjacency graph, built once, as a sparse vertex x edge incidence matrix,
+        so that copy numbers of any number of clones (a clone x edge array, see `get_copy_numbers`) are checked at once.
+    Segment edges contribute +1 to each of its extremities and adjacency edges contribute -1 (self-loops -2),
+        so that the incidence matrix times the copy numbers are the vertices imbalances (as in `IntervalAdjacencyGraph.node_imbalance`).
+    Edges are ordered with all segment edges first.
+    """
+
+    def __init__(self, iag):
+        self.haplotype_specific = isinstance(iag, HaplotypeSpecificIntervalAdjacencyGraph)
+        self.nodes = list(iag.nodes(data=False))
+        nodes_indexes = {node: index for index, node in enumerate(self.nodes)}
+        self.segments = []
+        self.adjacencies = []
+        rows, columns, values = [], [], []
+        for u, v, data in iag.segment_edges(data=True, sort=True):
+            for node in {u, v}:
+                rows.append(nodes_indexes[node])
+                columns.append(len(self.segments))
+                values.append(1)
+            self.segments.append(data["object"])
+        for u, v, data in iag.adjacency_edges(data=True, sort=True):
+            for node in [u, v]:
+                rows.append(nodes_indexes[node])
+                columns.append(len(self.segments) + len(self.adjacencies))
+                values.append(-1)
+            self.adjacencies.append(data["object"])
+        # duplicate (row, column) entries (i.e., self-loop adjacencies) are summed up
+        self.incidence = csr_matrix((values, (rows, columns)), shape=(len(self.nodes), len(self.segments) + len(self.adjacencies)), dtype=np.int64)
+
+    def get_copy_numbers(self, scnt, acnt, clone_ids):
+        result = np.zeros((len(clone_ids), len(self.segments) + len(self.adjacencies)), dtype=np.int64)
+        for clone_index, clone_id in enumerate(clone_ids):
+            scnp, acnp = scnt[clone_id], acnt[clone_id]
+            for segment_index, segment in enumerate(self.segments):
+                if self.haplotype_specific:
+                    cn = scnp.get_cn(sid=segment.stable_id_non_hap, haplotype=segment.haplotype, default=0)
+                else:
+                    cn = scnp.get_combined_cn(sid=segment.stable_id_non_hap, default=0)
+                result[clone_index, segment_index] = cn
+            for adjacency_index, adjacency in enumerate(self.adjacencies, start=len(self.segments)):
+                if self.haplotype_specific:
+                    cn = acnp.get_cn(aid=adjacency.stable_id_non_phased, phasing=adjacency.stable_phasing, default=0)
+                else:
+                    cn = acnp.get_combined_cn(aid=adjacency.stable_id_non_phased, default=0)
+                result[clone_index, adjacency_index] = cn
+        return result
+
+    def get_imbalances(self, copy_numbers):
+        """
+        Clone x vertex array of vertices imbalances (positive imbalance indicates a telomere, negative one -- a violation of the copy number balance).
+        """
+        return np.asarray(self.incidence.dot(copy_numbers.T)).T
+
+    def get_lengths(self, copy_numbers):
+        """
+        Per clone total length of all segments copies.
+        """
+        lengths = np.array([segment.length for segment in self.segments], dtype=np.int64)
+        return copy_numbers[:, :len(self.segments)].dot(lengths)
+
+
 construct_hsiag = construct_hiag
 
 HSIAG = HaplotypeSpecificIntervalAdjacencyGraph
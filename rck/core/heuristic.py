@@ -0,0 +1,131 @@
+import networkx as nx
+
+from rck.core.graph import IntervalAdjacencyGraph
+from rck.core.structures import Haplotype, Phasing, Strand, AdjacencyType, CNBoundaries, SegmentCopyNumberProfile, AdjacencyCopyNumberProfile
+
+TELOMERE_NODE = "telomere"
+
+
+def get_other_haplotype(haplotype):
+    return Haplotype.B if haplotype == Haplotype.A else Haplotype.A
+
+
+def get_aabb_for_haplotype(haplotype):
+    return Phasing.AA if haplotype == Haplotype.A else Phasing.BB
+
+
+def get_opposite_locations_nas_ids(iag):
+    """
+    For every novel adjacency, ids of novel adjacencies that are incident to the other extremity of any reference adjacency its extremities are incident to.
+        Such novel adjacencies can not be present on different haplotypes (see reciprocal locations constraints in the ILP model).
+    """
+    result = {}
+    for u, v in iag.ref_adjacency_edges(data=False):
+        u_nas_ids = {data["object"].stable_id_non_phased for _, __, data in iag.nov_adjacency_edges(data=True, nbunch=u)}
+        v_nas_ids = {data["object"].stable_id_non_phased for _, __, data in iag.nov_adjacency_edges(data=True, nbunch=v)}
+        for aid in u_nas_ids:
+            result.setdefault(aid, set()).update(v_nas_ids)
+        for aid in v_nas_ids:
+            result.setdefault(aid, set()).update(u_nas_ids)
+    return result
+
+
+def get_flow_network(iag, scnp, scnbp, haplotype, telomeres_ids, allowed_nas_ids, length_attribute="length_10"):
+    """
+    Directed flow network for a single haplotype in a single clone:
+        * every segment is an arc from its start to its end extremity, with flow (i.e., copy number) within the copy number boundaries,
+            and a convex cost of the deviation from the input copy number (weighted by the segment length);
+        * every reference and allowed novel adjacency, that joins an end extremity with a start one, is an (uncapacitated, cost-free) arc from the end to the start;
+        * every telomere extremity is connected to (if it is a segment end) or from (if it is a segment start) an extra telomere node.
+    Segment copy numbers lower bounds are encoded via nodes demands.
+    Novel adjacencies joining extremities of the same strand (i.e., inversions) can not be encoded as arcs, and are not part of the network.
+    """
+    result = nx.MultiDiGraph()
+    result.add_node(TELOMERE_NODE, demand=0)
+    for u, v, data in iag.segment_edges(data=True):
+        segment = data["object"]
+        sid = segment.stable_id_non_hap
+        start, end = segment.start_position.stable_id_non_hap, segment.end_position.stable_id_non_hap
+        lower = scnbp.get_cnb(sid=sid, hap=haplotype, boundary_type=CNBoundaries.LOWER)
+        upper = scnbp.get_cnb(sid=sid, hap=haplotype, boundary_type=CNBoundaries.UPPER)
+        target = min(max(scnp.get_hap_aware_cn_by_seg_and_hap(segment=segment, haplotype=haplotype), lower), upper)
+        weight = getattr(segment, length_attribute)
+        for node in [start, end]:
+            if node not in result:
+                result.add_node(node, demand=0)
+        result.nodes[start]["demand"] += lower
+        result.nodes[end]["demand"] -= lower
+        result.add_edge(start, end, key=(sid, CNBoundaries.LOWER), capacity=target - lower, weight=-weight)
+        result.add_edge(start, end, key=(sid, CNBoundaries.UPPER), capacity=upper - target, weight=weight)
+        if start in telomeres_ids:
+            result.add_edge(TELOMERE_NODE, start, key=start, weight=0)
+        if end in telomeres_ids:
+            result.add_edge(end, TELOMERE_NODE, key=end, weight=0)
+    for u, v, data in iag.adjacency_edges(data=True):
+        adjacency = data["object"]
+        aid = adjacency.stable_id_non_phased
+        if adjacency.adjacency_type == AdjacencyType.NOVEL and aid not in allowed_nas_ids:
+            continue
+        if adjacency.position1.strand == adjacency.position2.strand:
+            continue
+        source, target = (adjacency.position1, adjacency.position2) if adjacency.position1.strand == Strand.FORWARD else (adjacency.position2, adjacency.position1)
+        result.add_edge(source.stable_id_non_hap, target.stable_id_non_hap, key=aid, weight=0)
+    return result
+
+
+def get_min_cost_flow_cn_profiles(segments, adjacencies, scnt, scnb, telomeres, length_attribute="length_10", solve_as_haploid=False):
+    """
+    Construction heuristic for the RCK problem: for every clone and haplotype a min-cost flow (see `get_flow_network`) is computed with the network simplex,
+        and the integral flow is taken as the haplotype-specific segment and (AA/BB phased) adjacency copy numbers.
+    Novel adjacencies are shared across clones, so a novel adjacency used on one haplotype is not allowed on the other haplotype (in all clones),
+        together with novel adjacencies on the opposite sides of the same reciprocal locations.
+    Allele flipping is not used (i.e., haplotype A follows allele A of the input), and adjacency groups and novel adjacencies false positive rates are not taken into account,
+        so the result is balanced and within the copy number boundaries, but is not necessarily feasible for the full ILP model (which still can use it as a partial MIP start).
+
+    Raises ValueError, if for some clone/haplotype no flow satisfying segments copy number lower boundaries exists in the network.
+    """
+    iag = IntervalAdjacencyGraph(segments=segments, adjacencies=adjacencies)
+    iag.build_graph()
+    telomeres_ids = {p.stable_id_non_hap for p in telomeres}
+    opposite_nas_ids = get_opposite_locations_nas_ids(iag=iag)
+    nas_ids = {adj.stable_id_non_phased for adj in adjacencies if adj.adjacency_type == AdjacencyType.NOVEL}
+    nas_haplotypes = {}
+    forbidden_nas_ids = {Haplotype.A: set(), Haplotype.B: set()}
+    haplotypes = [Haplotype.A] if solve_as_haploid else [Haplotype.A, Haplotype.B]
+    result_scnt = {}
+    result_acnt = {}
+    for clone_id in sorted(scnt.keys()):
+        scnp = SegmentCopyNumberProfile()
+        acnp = AdjacencyCopyNumberProfile()
+        result_scnt[clone_id] = scnp
+        result_acnt[clone_id] = acnp
+        for segment in segments:
+            for haplotype in [Haplotype.A, Haplotype.B]:
+                scnp.set_cn_record_for_segment(segment=segment, cn=0, haplotype=haplotype)
+        for haplotype in haplotypes:
+            allowed_nas_ids = {aid for aid in nas_ids if aid not in forbidden_nas_ids[haplotype] and nas_haplotypes.get(aid, haplotype) == haplotype}
+            network = get_flow_network(iag=iag, scnp=scnt[clone_id], scnbp=scnb[clone_id], haplotype=haplotype, telomeres_ids=telomeres_ids,
+                                       allowed_nas_ids=allowed_nas_ids, length_attribute=length_attribute)
+            try:
+                _, flow = nx.network_simplex(network)
+            except (nx.NetworkXUnfeasible, nx.NetworkXUnbounded) as e:
+                raise ValueError("No balanced copy number assignment within copy number boundaries was found for clone {clone_id} haplotype {haplotype}: {error}"
+                                 "".format(clone_id=clone_id, haplotype=haplotype, error=str(e)))
+            for segment in segments:
+                sid = segment.stable_id_non_hap
+                start, end = segment.start_position.stable_id_non_hap, segment.end_position.stable_id_non_hap
+                cn = scnb[clone_id].get_cnb(sid=sid, hap=haplotype, boundary_type=CNBoundaries.LOWER) + sum(flow[start][end].values())
+                scnp.set_cn_record_for_segment(segment=segment, cn=cn, haplotype=haplotype)
+            for adjacency in adjacencies:
+                aid = adjacency.stable_id_non_phased
+                source, target = adjacency.position1.stable_id_non_hap, adjacency.position2.stable_id_non_hap
+                if adjacency.position2.strand == Strand.FORWARD:
+                    source, target = target, source
+                cn = flow.get(source, {}).get(target, {}).get(aid, 0)
+                if cn == 0:
+                    continue
+                acnp.set_cn_record_for_adjacency(adjacency=adjacency, cn=cn, phasing=get_aabb_for_haplotype(haplotype=haplotype))
+                if adjacency.adjacency_type == AdjacencyType.NOVEL:
+                    nas_haplotypes[aid] = haplotype
+                    forbidden_nas_ids[get_other_haplotype(haplotype=haplotype)].update(opposite_nas_ids.get(aid, set()))
+    return result_scnt, result_acnt
@@ -1,8 +1,15 @@
+import json
+import math
+import os
+import time
+
 import gurobi as g
+import numpy as np
 
 from rck.core.graph import IntervalAdjacencyGraph
-from rck.core.io import FALSE_POSITIVE, EXTERNAL_NA_ID, AG_LABELING
-from rck.core.structures import Phasing, AdjacencyType, Haplotype, get_aabb_for_ra, get_abba_for_na_and_position
+from rck.core.io import FALSE_POSITIVE, EXTERNAL_NA_ID, AG_LABELING, write_scnt_to_file, write_acnt_to_file
+from rck.core.stages import get_content_key
+from rck.core.structures import Phasing, AdjacencyType, Haplotype, get_aabb_for_ra, get_abba_for_na_and_position, haplotype_pair_to_phasing
 from rck.core.structures import SegmentCopyNumberProfile, AdjacencyCopyNumberProfile, check_and_fill_segments_to_fragments, AdjacencyGroupType, CNBoundaries
 from rck.utils.scn.process import get_haploid_scnt
 
@@ -22,16 +29,47 @@ DEFAULT_GROUP_M_FP = "DEFAULT_GROUP_M_FP"
 DEFAULT_GROUP_N_FP = "DEFAULT_GROUP_N_FP"
 SEGMENT_LENGTH_ATTRIBUTE = "SEGMENT_LENGTH_ATTRIBUTE"
 
+LOCATION_CONSTRAINTS_PAIRWISE = "pairwise"
+LOCATION_CONSTRAINTS_AGGREGATED = "aggregated"
+LOCATION_CONSTRAINTS_LAZY = "lazy"
+LOCATION_CONSTRAINTS_MODES = [LOCATION_CONSTRAINTS_PAIRWISE, LOCATION_CONSTRAINTS_AGGREGATED, LOCATION_CONSTRAINTS_LAZY]
+LAZY_CONSTRAINTS_TOLERANCE = 1e-6
+
+MEMORY_BYTES_PER_VARIABLE = 500
+MEMORY_BYTES_PER_CONSTRAINT = 300
+MEMORY_BYTES_PER_NONZERO = 40
+
+
+def is_fixed_value(value):
+    """
+    Variables eliminated by the presolve (see OptModelMultiClone.presolve_eliminate_variables) are stored in the variables dict as plain numbers
+    """
+    return isinstance(value, (int, float))
+
+
+def get_variable_value(variable):
+    if is_fixed_value(variable):
+        return variable
+    return variable.X
+
+
+def add_to_lin_expr(lin_expr, value, mult=1.0):
+    if is_fixed_value(value):
+        lin_expr.addConstant(value * mult)
+    else:
+        lin_expr.add(value, mult)
+    return lin_expr
+
 
 def merge_variables_from_presolve(*variables_dicts, result=None):
     if result is None:
         result = {}
     for variables_dict in variables_dicts:
-        if FRAGMENT_ALLELE in variables_dicts:
+        if FRAGMENT_ALLELE in variables_dict:
             if FRAGMENT_ALLELE not in result:
                 result[FRAGMENT_ALLELE] = {}
             for key, value in variables_dict[FRAGMENT_ALLELE].items():
-                result[key] = value.X
+                result[FRAGMENT_ALLELE][key] = get_variable_value(value)
         if SEGMENT_COPY_NUMBER in variables_dict:
             if SEGMENT_COPY_NUMBER not in result:
                 result[SEGMENT_COPY_NUMBER] = {}
@@ -41,8 +79,8 @@ def merge_variables_from_presolve(*variables_dicts, result=None):
                     result_dict[clone_id] = {}
                 for sid, clone_specific_dict in value.items():
                     result_dict[clone_id][sid] = {
-                        Haplotype.A: clone_specific_dict[Haplotype.A].X,
-                        Haplotype.B: clone_specific_dict[Haplotype.B].X
+                        Haplotype.A: get_variable_value(clone_specific_dict[Haplotype.A]),
+                        Haplotype.B: get_variable_value(clone_specific_dict[Haplotype.B])
                     }
         if YR in variables_dict:
             if YR not in result:
@@ -53,10 +91,10 @@ def merge_variables_from_presolve(*variables_dicts, result=None):
                     result_dict[clone_id] = {}
                 for aid, clone_specific_dict in value.items():
                     result_dict[clone_id][aid] = {
-                        Phasing.AA: clone_specific_dict[Phasing.AA].X,
-                        Phasing.AB: clone_specific_dict[Phasing.AB].X,
-                        Phasing.BA: clone_specific_dict[Phasing.BA].X,
-                        Phasing.BB: clone_specific_dict[Phasing.BB].X
+                        Phasing.AA: get_variable_value(clone_specific_dict[Phasing.AA]),
+                        Phasing.AB: get_variable_value(clone_specific_dict[Phasing.AB]),
+                        Phasing.BA: get_variable_value(clone_specific_dict[Phasing.BA]),
+                        Phasing.BB: get_variable_value(clone_specific_dict[Phasing.BB])
                     }
         if YN in variables_dict:
             if YN not in result:
@@ -66,7 +104,7 @@ def merge_variables_from_presolve(*variables_dicts, result=None):
                 if clone_id not in result_dict:
                     result_dict[clone_id] = {}
                 for aid, cs_value in value.items():
-                    result_dict[clone_id][aid] = cs_value.X
+                    result_dict[clone_id][aid] = get_variable_value(cs_value)
         if P in variables_dict:
             if P not in result:
                 result[P] = {}
@@ -76,10 +114,10 @@ def merge_variables_from_presolve(*variables_dicts, result=None):
                     result_dict[clone_id] = {}
                 for aid, clone_specific_dict in value.items():
                     result_dict[clone_id][aid] = {
-                        Phasing.AA: clone_specific_dict[Phasing.AA].X,
-                        Phasing.AB: clone_specific_dict[Phasing.AB].X,
-                        Phasing.BA: clone_specific_dict[Phasing.BA].X,
-                        Phasing.BB: clone_specific_dict[Phasing.BB].X
+                        Phasing.AA: get_variable_value(clone_specific_dict[Phasing.AA]),
+                        Phasing.AB: get_variable_value(clone_specific_dict[Phasing.AB]),
+                        Phasing.BA: get_variable_value(clone_specific_dict[Phasing.BA]),
+                        Phasing.BB: get_variable_value(clone_specific_dict[Phasing.BB])
                     }
         if ADJ_GROUPS_M in variables_dict:
             if ADJ_GROUPS_M not in result:
@@ -89,15 +127,15 @@ def merge_variables_from_presolve(*variables_dicts, result=None):
                 if clone_id not in result_dict:
                     result_dict[clone_id] = {}
                 for gid, cs_value in value.items():
-                    result_dict[clone_id][gid] = cs_value.X
+                    result_dict[clone_id][gid] = get_variable_value(cs_value)
         if ADJ_GROUPS_L in variables_dict:
             if ADJ_GROUPS_L not in result:
                 result[ADJ_GROUPS_L] = {}
             result_dict = result[ADJ_GROUPS_L]
             for gid, value in variables_dict[ADJ_GROUPS_L].items():
                 result_dict[gid] = {
-                    Haplotype.A: value[Haplotype.A].X,
-                    Haplotype.B: value[Haplotype.B].X
+                    Haplotype.A: get_variable_value(value[Haplotype.A]),
+                    Haplotype.B: get_variable_value(value[Haplotype.B])
                 }
         if DELTA in variables_dict:
             if DELTA not in result:
@@ -108,8 +146,8 @@ def merge_variables_from_presolve(*variables_dicts, result=None):
                     result_dict[clone_id] = {}
                 for sid, cs_value in value.items():
                     result_dict[clone_id][sid] = {
-                        Haplotype.A: cs_value[Haplotype.A].X,
-                        Haplotype.B: cs_value[Haplotype.B].X
+                        Haplotype.A: get_variable_value(cs_value[Haplotype.A]),
+                        Haplotype.B: get_variable_value(cs_value[Haplotype.B])
                     }
         if PROD in variables_dict:
             if PROD not in result:
@@ -124,10 +162,10 @@ def merge_variables_from_presolve(*variables_dicts, result=None):
                         result_dict[clone_id] = {}
                     for aid, cs_value in value.items():
                         result_dict[clone_id][aid] = {
-                            Phasing.AA: cs_value[Phasing.AA].X,
-                            Phasing.AB: cs_value[Phasing.AB].X,
-                            Phasing.BA: cs_value[Phasing.BA].X,
-                            Phasing.BB: cs_value[Phasing.BB].X,
+                            Phasing.AA: get_variable_value(cs_value[Phasing.AA]),
+                            Phasing.AB: get_variable_value(cs_value[Phasing.AB]),
+                            Phasing.BA: get_variable_value(cs_value[Phasing.BA]),
+                            Phasing.BB: get_variable_value(cs_value[Phasing.BB]),
                         }
             result_dict = result[PROD]
             if PP in variables_dict[PROD]:
@@ -136,14 +174,136 @@ def merge_variables_from_presolve(*variables_dicts, result=None):
                 result_dict = result_dict[PP]
                 for aid, value in variables_dict[PROD][PP].items():
                     result_dict[aid] = {
-                        Phasing.AA: value[Phasing.AA].X,
-                        Phasing.AB: value[Phasing.AB].X,
-                        Phasing.BA: value[Phasing.BA].X,
-                        Phasing.BB: value[Phasing.BB].X
+                        Phasing.AA: get_variable_value(value[Phasing.AA]),
+                        Phasing.AB: get_variable_value(value[Phasing.AB]),
+                        Phasing.BA: get_variable_value(value[Phasing.BA]),
+                        Phasing.BB: get_variable_value(value[Phasing.BB])
                     }
     return result
 
 
+def get_nested_value(source, keys, default=None):
+    if source is None:
+        return default
+    result = source
+    for key in keys:
+        if not isinstance(result, dict) or key not in result:
+            return default
+        result = result[key]
+    return result
+
+
+def iter_variables_with_keys(variables, keys=()):
+    if isinstance(variables, dict):
+        for key, value in variables.items():
+            for entry in iter_variables_with_keys(variables=value, keys=keys + (key,)):
+                yield entry
+    elif variables is not None and not is_fixed_value(variables):
+        yield keys, variables
+
+
+def iter_nested_leaves_with_keys(source, keys=()):
+    if isinstance(source, dict):
+        for key, value in source.items():
+            for entry in iter_nested_leaves_with_keys(source=value, keys=keys + (key,)):
+                yield entry
+    else:
+        yield keys, source
+
+
+def set_nested_value(target, keys, value):
+    for key in keys[:-1]:
+        target = target.setdefault(key, {})
+    target[keys[-1]] = value
+
+
+def encode_variable_key(key):
+    if isinstance(key, Haplotype):
+        return ["hap", key.value]
+    if isinstance(key, Phasing):
+        return ["ph", str(key)]
+    return ["str", str(key)]
+
+
+def decode_variable_key(encoded_key):
+    key_type, value = encoded_key
+    if key_type == "hap":
+        return Haplotype.from_string(value)
+    if key_type == "ph":
+        return haplotype_pair_to_phasing(h1=Haplotype.from_string(value[0]), h2=Haplotype.from_string(value[1]))
+    return value
+
+
+MODEL_CACHE_VERSION = "3"
+MODEL_CACHE_MODEL_FILE = "model.mps"
+MODEL_CACHE_KEYS_FILE = "model.keys.json"
+
+
+def get_model_cache_key(input_files, options):
+    """
+    Content-based key for the built model: hash of the (preprocessed) input files content, together with the model-shaping options.
+        Solver parameters (e.g., MIP gap, time limit, threads) do not change the model, and must not be a part of the `options`.
+    """
+    return get_content_key(input_files=input_files, options=options, salt=MODEL_CACHE_VERSION)
+
+
+def model_cache_exists(cache_dir):
+    return os.path.exists(os.path.join(cache_dir, MODEL_CACHE_MODEL_FILE)) and os.path.exists(os.path.join(cache_dir, MODEL_CACHE_KEYS_FILE))
+
+
+def get_interchangeable_clones(clone_ids, segments, scnt, scnb):
+    """
+    Groups clones, that have the same input segment copy numbers and copy number boundaries for every segment.
+        Swapping such clones in any solution produces a solution with the same objective, so the solver can not tell them apart.
+    Returns a list of groups (only with at least two clones in them), with clones ids sorted in each group.
+    """
+    clones_by_signature = {}
+    for clone_id in sorted(clone_ids):
+        signature = []
+        for segment in segments:
+            sid = segment.stable_id_non_hap
+            for haplotype in [Haplotype.A, Haplotype.B]:
+                signature.append(scnt[clone_id].get_hap_aware_cn_by_seg_and_hap(segment=segment, haplotype=haplotype))
+                signature.append(scnb[clone_id].get_cnb(sid=sid, hap=haplotype, boundary_type=CNBoundaries.LOWER))
+                signature.append(scnb[clone_id].get_cnb(sid=sid, hap=haplotype, boundary_type=CNBoundaries.UPPER))
+        clones_by_signature.setdefault(tuple(signature), []).append(clone_id)
+    return sorted([group for group in clones_by_signature.values() if len(group) > 1])
+
+
+def get_starting_vars_from_cn_profiles(segments, adjacencies, scnt, acnt, segments_to_fragments=None):
+    """
+    Converts segment/adjacency copy number profiles (e.g., obtained by the `rck.core.heuristic.get_min_cost_flow_cn_profiles`, with no allele flipping) into `starting_vars` for the `OptModelMultiClone`.
+        Only primary variables are filled in; the rest is derived in `OptModelMultiClone.completed_starting_vars`.
+    """
+    segments_to_fragments = check_and_fill_segments_to_fragments(segments=segments, segments_to_fragments=segments_to_fragments)
+    phasings = [Phasing.AA, Phasing.AB, Phasing.BA, Phasing.BB]
+    result = {
+        FRAGMENT_ALLELE: {fid: 1 for fid in set(segments_to_fragments.values())},
+        SEGMENT_COPY_NUMBER: {},
+        YR: {},
+        YN: {},
+        P: {},
+        PROD: {PY: {}},
+    }
+    for clone_id in sorted(scnt.keys()):
+        result[SEGMENT_COPY_NUMBER][clone_id] = {
+            s.stable_id_non_hap: {h: scnt[clone_id].get_hap_aware_cn_by_seg_and_hap(segment=s, haplotype=h) for h in [Haplotype.A, Haplotype.B]} for s in segments
+        }
+        for key in [YR, YN, P]:
+            result[key][clone_id] = {}
+        result[PROD][PY][clone_id] = {}
+        for adjacency in adjacencies:
+            aid = adjacency.stable_id_non_phased
+            cns = {ph: acnt[clone_id].get_cn(aid=aid, phasing=ph) for ph in phasings}
+            result[P][clone_id][aid] = {ph: int(cn > 0) for ph, cn in cns.items()}
+            result[PROD][PY][clone_id][aid] = cns
+            if adjacency.adjacency_type == AdjacencyType.NOVEL:
+                result[YN][clone_id][aid] = max([1] + list(cns.values()))
+            else:
+                result[YR][clone_id][aid] = {ph: max(1, cn) for ph, cn in cns.items()}
+    return result
+
+
 class OptModelMultiClone(object):
     def __init__(self,
                  hapl_segments,
@@ -156,7 +316,12 @@ class OptModelMultiClone(object):
                  hapl_nov_adjacencies_fp=0.0,
                  starting_vars=None,
                  solve_as_haploid=False,
+                 eliminate_fixed_variables=True,
+                 break_clone_symmetry=False,
+                 location_constraints=LOCATION_CONSTRAINTS_PAIRWISE,
                  extra=None):
+        if location_constraints not in LOCATION_CONSTRAINTS_MODES:
+            raise ValueError("Unknown location constraints mode {mode}. Supported modes are: {modes}".format(mode=location_constraints, modes=",".join(LOCATION_CONSTRAINTS_MODES)))
         self.scnb = scnb
         self.hapl_segments = hapl_segments
         self.hapl_adjacencies = hapl_adjacencies
@@ -173,12 +338,31 @@ class OptModelMultiClone(object):
         self.clone_ids = sorted(self.scnt.keys())
         self.extra = extra if extra is not None else {}
         self.starting_vars = starting_vars
+        self.start_values = None
+        self.starting_vars_report = {}
+        self.eliminate_fixed_variables = eliminate_fixed_variables
+        self.eliminated_variables = {}
+        self.break_clone_symmetry = break_clone_symmetry
+        self.interchangeable_clones = get_interchangeable_clones(clone_ids=self.clone_ids, segments=self.hapl_segments, scnt=self.scnt, scnb=self.scnb) \
+            if self.break_clone_symmetry else []
         self.iag = IntervalAdjacencyGraph(segments=self.hapl_segments, adjacencies=self.hapl_adjacencies)
         self.iag.build_graph()
         self.variables = self.populate_variables_dict()
-        self.model = g.Model("RCK-mc-mln")  # multi-clone, molecule, labeling, and general groups; change when other features (e.g., multi-sample, labeling constraints, trees, etc)
-        self.gm = self.model
+        # Gurobi model (and with it a Gurobi environment/license) is only created in `build_gurobi_model` (or `load_gurobi_model_cache`),
+        # so that the model size estimation (see `estimate_model_size`) does not require a license
+        self.model = None
+        self.gm = None
         self.reciprocal_locations = []
+        self.location_constraints = location_constraints
+        self.lazy_locations = []
+        self.lazy_locations_variables = []
+        self.lazy_locations_indexes = []
+        self.lazy_locations_constraints_cnt = 0
+        self.nov_adjacencies_fp_constraint = None
+        self.screened_nas_ids = set()
+        self.screened_vars_bounds = []
+        self.molecule_groups_fp_constraints = []
+        self.general_groups_fp_constraints = []
 
     def populate_variables_dict(self):
         result = {}
@@ -269,12 +453,355 @@ class OptModelMultiClone(object):
         return result
 
     def build_gurobi_model(self):
+        self.model = g.Model("RCK-mc-mln")  # multi-clone, molecule, labeling, and general groups; change when other features (e.g., multi-sample, labeling constraints, trees, etc)
+        self.gm = self.model
+        self.presolve_eliminate_variables()
+        self.start_values = self.completed_starting_vars()
         self.define_variables()
         self.define_constraints()
         self.define_objective()
 
-    def solve_model(self):
-        self.gm.optimize()
+    def get_prohibited_phasings(self, adjacency):
+        """
+        Phased realizations of the adjacency that can not be present (AB/BA for reference adjacencies and novel self-loops; everything, but AA, in the haploid setting)
+        """
+        result = []
+        if adjacency.adjacency_type == AdjacencyType.REFERENCE or adjacency.is_self_loop_hapl:
+            result.extend([Phasing.AB, Phasing.BA])
+        if self.solve_as_haploid:
+            result.extend([Phasing.AB, Phasing.BA, Phasing.BB])
+        return sorted(set(result), key=lambda ph: str(ph))
+
+    def get_fixed_segment_copy_number(self, clone_id, sid):
+        """
+        Copy number of the segment on both haplotypes, if it is fully determined by the copy number boundaries (i.e., all of them coincide), and None otherwise.
+            The value then does not depend on the allele flipping.
+        """
+        lower_a = self.scnb[clone_id].get_cnb(sid=sid, hap=Haplotype.A, boundary_type=CNBoundaries.LOWER)
+        lower_b = self.scnb[clone_id].get_cnb(sid=sid, hap=Haplotype.B, boundary_type=CNBoundaries.LOWER)
+        upper_a = self.scnb[clone_id].get_cnb(sid=sid, hap=Haplotype.A, boundary_type=CNBoundaries.UPPER)
+        upper_b = self.scnb[clone_id].get_cnb(sid=sid, hap=Haplotype.B, boundary_type=CNBoundaries.UPPER)
+        if self.solve_as_haploid:
+            lower_b, upper_b = 0, 0
+        if min(lower_a, lower_b) != max(upper_a, upper_b):
+            return None
+        return lower_a
+
+    def presolve_eliminate_variables(self):
+        """
+        Substitutes constants for variables whose values are determined by the input alone, so that neither they, nor constraints that involve only them, reach the solver:
+            * presence indicators and copy numbers of prohibited phased adjacencies realizations (see `get_prohibited_phasings`) are fixed at 0
+                (with the internal copy number of respective reference adjacencies realizations fixed at its lower bound);
+            * segment copy numbers with coinciding lower and upper boundaries are fixed at the boundary value;
+            * deltas of such segments are fixed, when the input copy numbers are the same on both alleles (i.e., the delta does not depend on the allele flipping).
+        Constants are stored in `self.variables` in place of eliminated variables (counts are recorded in `self.eliminated_variables`),
+            so that the results extraction (e.g., `get_scnt_from_model`, `get_acnt_from_model`) reconstructs full copy number tensors.
+        """
+        self.eliminated_variables = {}
+        if not self.eliminate_fixed_variables:
+            return
+
+        def eliminate(keys, value):
+            set_nested_value(target=self.variables, keys=keys, value=value)
+            family = keys[1] if keys[0] == PROD else keys[0]
+            self.eliminated_variables[family] = self.eliminated_variables.get(family, 0) + 1
+
+        for adjacency in self.hapl_adjacencies:
+            aid = adjacency.stable_id_non_phased
+            for ph in self.get_prohibited_phasings(adjacency=adjacency):
+                for clone_id in self.clone_ids:
+                    eliminate(keys=[P, clone_id, aid, ph], value=0)
+                    eliminate(keys=[PROD, PY, clone_id, aid, ph], value=0)
+                    if adjacency.adjacency_type == AdjacencyType.REFERENCE:
+                        eliminate(keys=[YR, clone_id, aid, ph], value=1)
+                if adjacency.adjacency_type == AdjacencyType.NOVEL:
+                    eliminate(keys=[PROD, PP, aid, ph], value=0)
+
+        for clone_id in self.clone_ids:
+            for segment in self.hapl_segments:
+                sid = segment.stable_id_non_hap
+                cn = self.get_fixed_segment_copy_number(clone_id=clone_id, sid=sid)
+                if cn is None:
+                    continue
+                for haplotype in [Haplotype.A, Haplotype.B]:
+                    eliminate(keys=[SEGMENT_COPY_NUMBER, clone_id, sid, haplotype], value=cn)
+                s_cn_a = self.scnt[clone_id].get_hap_aware_cn_by_seg_and_hap(segment=segment, haplotype=Haplotype.A)
+                s_cn_b = self.scnt[clone_id].get_hap_aware_cn_by_seg_and_hap(segment=segment, haplotype=Haplotype.B)
+                if s_cn_a != s_cn_b:
+                    continue
+                for haplotype in [Haplotype.A, Haplotype.B]:
+                    eliminate(keys=[DELTA, clone_id, sid, haplotype], value=abs(cn - s_cn_a))
+
+    def estimate_model_size(self):
+        """
+        Computes numbers of variables (per family), linear and general constraints (per group of constraints), and an upper bound on the number of nonzeros
+            that `build_gurobi_model` would produce, by traversing the IAG and adjacency groups, without adding anything to the Gurobi model.
+        Memory estimate is a rough approximation, based on per-variable/constraint/nonzero footprint of the model (including Python-side variables objects).
+        """
+        self.presolve_eliminate_variables()
+        variables = {}
+        for var_keys, value in iter_nested_leaves_with_keys(self.variables):
+            if is_fixed_value(value):
+                continue
+            family = var_keys[1] if var_keys[0] == PROD else var_keys[0]
+            variables[family] = variables.get(family, 0) + 1
+        constraints = {}
+        general_constraints = {}
+        nonzeros = {}
+
+        def add(group, cnt, nnz, general=False):
+            target = general_constraints if general else constraints
+            target[group] = target.get(group, 0) + cnt
+            nonzeros[group] = nonzeros.get(group, 0) + nnz
+
+        phasings = [Phasing.AA, Phasing.AB, Phasing.BA, Phasing.BB]
+        nov_adjacencies = [adjacency for adjacency in self.hapl_adjacencies if adjacency.adjacency_type == AdjacencyType.NOVEL]
+        for clone_id in self.clone_ids:
+            for segment in self.hapl_segments:
+                sid = segment.stable_id_non_hap
+                if not is_fixed_value(self.variables[SEGMENT_COPY_NUMBER][clone_id][sid][Haplotype.A]):
+                    add("scnb", 4, 8)
+                if not is_fixed_value(self.variables[DELTA][clone_id][sid][Haplotype.A]):
+                    add("delta", 4, 12)
+                if self.solve_as_haploid:
+                    add("haploid", 1, 1)
+            for adjacency in self.hapl_adjacencies:
+                aid = adjacency.stable_id_non_phased
+                for ph in phasings:
+                    if not is_fixed_value(self.variables[P][clone_id][aid][ph]):
+                        add("big_m", 4, 8)
+                        if adjacency.adjacency_type == AdjacencyType.REFERENCE and (ph in [Phasing.AB, Phasing.BA] or (self.solve_as_haploid and ph == Phasing.BB)):
+                            add("labeling", 1, 1)
+            for node in self.iag.nodes(data=False):
+                nnz = 1 + len(list(self.iag.ref_adjacency_edges(data=False, nbunch=node))) + 2 * len(list(self.iag.nov_adjacency_edges(data=False, nbunch=node)))
+                add("nodes", 2, 2 * nnz)
+        add("nas_fp", 1, sum(not is_fixed_value(self.variables[PROD][PP][adjacency.stable_id_non_phased][ph]) for adjacency in nov_adjacencies for ph in phasings))
+        for adjacency in nov_adjacencies:
+            aid = adjacency.stable_id_non_phased
+            unfixed_phasings = [ph for ph in phasings if not is_fixed_value(self.variables[PROD][PP][aid][ph])]
+            add("labeling_or", len(unfixed_phasings), len(unfixed_phasings) * (len(self.clone_ids) + 1), general=True)
+            add("labeling", 1, len(unfixed_phasings))
+            prohibited = []
+            if adjacency.is_self_loop_hapl:
+                prohibited.extend([Phasing.AB, Phasing.BA])
+            if self.solve_as_haploid:
+                prohibited.extend([Phasing.AB, Phasing.BA, Phasing.BB])
+            prohibited_cnt = len([ph for ph in prohibited if ph in unfixed_phasings])
+            add("labeling", prohibited_cnt, prohibited_cnt)
+        for u, v in self.get_reciprocal_locations():
+            u_nas_cnt = len(list(self.iag.nov_adjacency_edges(data=False, nbunch=u)))
+            v_nas_cnt = len(list(self.iag.nov_adjacency_edges(data=False, nbunch=v)))
+            if self.location_constraints == LOCATION_CONSTRAINTS_LAZY:
+                continue
+            if self.location_constraints == LOCATION_CONSTRAINTS_AGGREGATED and u_nas_cnt > 1 and v_nas_cnt > 1:
+                variables["locations_sides"] = variables.get("locations_sides", 0) + 2
+                add("locations", 2 * (u_nas_cnt + v_nas_cnt), 2 * 3 * (u_nas_cnt + v_nas_cnt))
+            else:
+                add("locations", 2 * u_nas_cnt * v_nas_cnt, 2 * 4 * u_nas_cnt * v_nas_cnt)
+        adjacencies_by_external_ids = {adj.extra.get(EXTERNAL_NA_ID, adj.stable_id_non_phased): adj for adj in self.hapl_adjacencies}
+        for adj_group in self.hapl_adjacencies_groups:
+            group_size = len(adj_group.adjacencies_ids)
+            if adj_group.group_type == AdjacencyGroupType.MOLECULE:
+                add("groups", len(self.clone_ids), len(self.clone_ids) * (4 * group_size + 1))
+                add("groups", 1, len(self.clone_ids))
+            elif adj_group.group_type == AdjacencyGroupType.GENERAL:
+                add("groups", 1, 4 * group_size)
+            elif adj_group.group_type == AdjacencyGroupType.LABELING and not self.solve_as_haploid and len(adj_group.adjacencies_ids) == len(adj_group.extra.get(AG_LABELING, [])):
+                positions = [adjacencies_by_external_ids[aid].position1 if index == 0 else adjacencies_by_external_ids[aid].position2
+                             for aid, index in zip(adj_group.adjacencies_ids, adj_group.extra[AG_LABELING])]
+                positions_nas_cnt = sum(len(list(self.iag.nov_adjacency_edges(data=False, nbunch=position))) for position in positions)
+                add("groups", 1, 2)
+                add("groups_or", 2, 2 * (1 + 2 * positions_nas_cnt), general=True)
+        for group in self.interchangeable_clones:
+            add("symmetry", len(group) - 1, (len(group) - 1) * 4 * len(self.hapl_segments))
+        result = {
+            "variables": dict(variables, total=sum(variables.values())),
+            "constraints": dict(constraints, total=sum(constraints.values())),
+            "general_constraints": dict(general_constraints, total=sum(general_constraints.values())),
+            "nonzeros_upper_bound": dict(nonzeros, total=sum(nonzeros.values())),
+            "eliminated_variables": dict(self.eliminated_variables),
+        }
+        result["memory_mb"] = int(math.ceil((result["variables"]["total"] * MEMORY_BYTES_PER_VARIABLE
+                                             + (result["constraints"]["total"] + result["general_constraints"]["total"]) * MEMORY_BYTES_PER_CONSTRAINT
+                                             + result["nonzeros_upper_bound"]["total"] * MEMORY_BYTES_PER_NONZERO) / 2 ** 20))
+        return result
+
+    def screen_novel_adjacencies(self, threshold=0.1, verify=True, rc_tolerance=1e-6, nas_fp=None):
+        """
+        Heuristic, that solves the LP relaxation of the model, and fixes novel adjacencies with relaxed presence below the `threshold` as absent (in all clones) in the MIP model.
+            Relaxed presence of a novel adjacency is its largest (across clones) total relaxed copy number. Relaxed presence indicators are not used,
+            as in the big-M linearization they are only bounded from below by the copy number, and are not forced to 0 for absent adjacencies.
+            The relaxation (`Model.relax`) also drops general (OR/AND) constraints, so it is looser than the continuous version of the model.
+        With `verify`, a novel adjacency is kept, unless the reduced costs of all its copy number variables are positive (i.e., increasing any of them worsens the relaxed objective).
+        Novel adjacencies that are members of adjacency groups, and ones with all copy number variables eliminated by the presolve, are never screened out.
+        The number of screened out novel adjacencies is capped by the novel adjacencies false positive rate (lowest relaxed presence first),
+            which only keeps the overall novel adjacencies false positive constraint satisfiable. Screening can still make the model infeasible
+            (e.g., when copy number balance with tight boundaries, labeling groups, or location constraints require an adjacency, that the relaxation spread
+            across many adjacencies below the threshold), in which case screened out adjacencies are restored with `restore_screened_novel_adjacencies`.
+        Screened out novel adjacencies stay fixed as absent, so when the false positive rate is later lowered (see `update_false_positive_parameters`),
+            the cap has to be computed for the lowest such rate via `nas_fp` (defaults to the current novel adjacencies false positive rate).
+        Returns a dict with the screening report.
+        """
+        self.gm.update()
+        relaxed_model = self.gm.relax()
+        relaxed_model.optimize()
+        result = {"status": relaxed_model.status, "screened": 0, "below_threshold": 0, "kept_by_verification": 0, "kept_by_fp_cap": 0}
+        if relaxed_model.status != g.GRB.Status.OPTIMAL:
+            return result
+        result["lp_objective"] = relaxed_model.ObjVal
+        relaxed_vars = relaxed_model.getVars()
+        values = np.array(relaxed_model.getAttr("X", relaxed_vars), dtype=float)
+        reduced_costs = np.array(relaxed_model.getAttr("RC", relaxed_vars), dtype=float) if verify else None
+        grouped_nas_ids = {adjacency.stable_id_non_phased for adj_group in self.hapl_adjacencies_groups for adjacency in adj_group.adjacencies}
+        nov_adjacencies = [adjacency for adjacency in self.hapl_adjacencies if adjacency.adjacency_type == AdjacencyType.NOVEL]
+        phasings = [Phasing.AA, Phasing.AB, Phasing.BA, Phasing.BB]
+        candidates = []
+        for adjacency in nov_adjacencies:
+            aid = adjacency.stable_id_non_phased
+            if aid in grouped_nas_ids or aid in self.screened_nas_ids:
+                continue
+            clones_indexes = [[self.variables[PROD][PY][clone_id][aid][ph].index for ph in phasings if not is_fixed_value(self.variables[PROD][PY][clone_id][aid][ph])]
+                              for clone_id in self.clone_ids]
+            if all(len(indexes) == 0 for indexes in clones_indexes):
+                continue
+            presence = max(values[indexes].sum() for indexes in clones_indexes)
+            if presence >= threshold:
+                continue
+            result["below_threshold"] += 1
+            if verify and any(np.any(reduced_costs[indexes] <= rc_tolerance) for indexes in clones_indexes):
+                result["kept_by_verification"] += 1
+                continue
+            candidates.append((presence, aid))
+        nas_fp = self.hapl_nov_adjacencies_fp if nas_fp is None else min(nas_fp, self.hapl_nov_adjacencies_fp)
+        max_screened_cnt = max(0, int(math.floor(nas_fp * len(nov_adjacencies))) - len(self.screened_nas_ids))
+        candidates = sorted(candidates)
+        result["kept_by_fp_cap"] = max(0, len(candidates) - max_screened_cnt)
+        for _, aid in candidates[:max_screened_cnt]:
+            for clone_id in self.clone_ids:
+                for ph in phasings:
+                    for var in [self.variables[P][clone_id][aid][ph], self.variables[PROD][PY][clone_id][aid][ph]]:
+                        if is_fixed_value(var):
+                            continue
+                        self.screened_vars_bounds.append((var, var.ub, var.start))
+                        var.ub = 0
+                        var.start = 0
+            self.screened_nas_ids.add(aid)
+            result["screened"] += 1
+        return result
+
+    def restore_screened_novel_adjacencies(self):
+        """
+        Reverts the `screen_novel_adjacencies`, restoring upper bounds (and MIP starts) of copy number and presence variables of all screened out novel adjacencies.
+        Returns the number of restored novel adjacencies.
+        """
+        for var, ub, start in self.screened_vars_bounds:
+            var.ub = ub
+            var.start = start
+        result = len(self.screened_nas_ids)
+        self.screened_vars_bounds = []
+        self.screened_nas_ids = set()
+        return result
+
+    def update_false_positive_parameters(self, nas_fp=None, group_m_default_fp=None, group_n_default_fp=None):
+        """
+        Updates (in place, without rebuilding the model) false positive parameters for novel adjacencies and for adjacency groups, that rely on default false positive values.
+            Novel adjacencies and general groups false positive values only change the right-hand side of respective constraints,
+            while for molecule groups the false positive value is a part of the group indicator variable coefficient.
+        """
+        if nas_fp is not None:
+            self.hapl_nov_adjacencies_fp = nas_fp
+            if self.nov_adjacencies_fp_constraint is not None:
+                self.nov_adjacencies_fp_constraint.RHS = 1 - nas_fp
+        if group_m_default_fp is not None:
+            self.extra[DEFAULT_GROUP_M_FP] = group_m_default_fp
+            for constraint, group_var, group_size in self.molecule_groups_fp_constraints:
+                self.gm.chgCoeff(constraint, group_var, group_size * (1 - group_m_default_fp))
+        if group_n_default_fp is not None:
+            self.extra[DEFAULT_GROUP_N_FP] = group_n_default_fp
+            for constraint in self.general_groups_fp_constraints:
+                constraint.RHS = 1 - group_n_default_fp
+
+    def set_start_from_solution(self):
+        """
+        Uses the current solution as a MIP start for a subsequent re-optimization (e.g., after the `update_false_positive_parameters`)
+        """
+        if self.gm.solcount == 0:
+            return
+        variables = self.gm.getVars()
+        self.gm.setAttr("Start", variables, self.gm.getAttr("X", variables))
+
+    def write_gurobi_model_cache(self, cache_dir):
+        """
+        Stores the built model (as MPS) alongside the map from variables keys (as in `self.variables`) to their indexes in the stored model,
+            so that the model can be loaded with `load_gurobi_model_cache`, and results can be extracted from it as if it was built from scratch.
+        """
+        os.makedirs(cache_dir, exist_ok=True)
+        self.gm.update()
+        keys = []
+        for var_keys, var in iter_variables_with_keys(variables=self.variables):
+            keys.append([[encode_variable_key(key) for key in var_keys], var.index])
+        data = {
+            "version": MODEL_CACHE_VERSION,
+            "variables": keys,
+            "reciprocal_locations": [[str(u), str(v)] for u, v in self.reciprocal_locations],
+            "nov_adjacencies_fp_constraint": None if self.nov_adjacencies_fp_constraint is None else self.nov_adjacencies_fp_constraint.index,
+            "molecule_groups_fp_constraints": [[constraint.index, group_var.index, group_size] for constraint, group_var, group_size in self.molecule_groups_fp_constraints],
+            "general_groups_fp_constraints": [constraint.index for constraint in self.general_groups_fp_constraints],
+        }
+        keys_file = os.path.join(cache_dir, MODEL_CACHE_KEYS_FILE)
+        self.gm.write(os.path.join(cache_dir, MODEL_CACHE_MODEL_FILE))
+        with open(keys_file + ".tmp", "wt") as destination:
+            json.dump(data, destination)
+        os.replace(keys_file + ".tmp", keys_file)
+
+    def load_gurobi_model_cache(self, cache_dir):
+        with open(os.path.join(cache_dir, MODEL_CACHE_KEYS_FILE), "rt") as source:
+            data = json.load(source)
+        if data.get("version") != MODEL_CACHE_VERSION:
+            raise ValueError("Model cache in {cache_dir} has version {version}, while {expected} is expected".format(cache_dir=cache_dir, version=data.get("version"),
+                                                                                                                   expected=MODEL_CACHE_VERSION))
+        self.presolve_eliminate_variables()
+        self.model = g.read(os.path.join(cache_dir, MODEL_CACHE_MODEL_FILE))
+        self.gm = self.model
+        model_vars = self.gm.getVars()
+        for encoded_keys, index in data["variables"]:
+            set_nested_value(target=self.variables, keys=[decode_variable_key(key) for key in encoded_keys], value=model_vars[index])
+        self.reciprocal_locations = [tuple(entry) for entry in data.get("reciprocal_locations", [])]
+        model_constraints = self.gm.getConstrs()
+        if data.get("nov_adjacencies_fp_constraint") is not None:
+            self.nov_adjacencies_fp_constraint = model_constraints[data["nov_adjacencies_fp_constraint"]]
+        self.molecule_groups_fp_constraints = [(model_constraints[constraint_index], model_vars[var_index], group_size)
+                                               for constraint_index, var_index, group_size in data.get("molecule_groups_fp_constraints", [])]
+        self.general_groups_fp_constraints = [model_constraints[constraint_index] for constraint_index in data.get("general_groups_fp_constraints", [])]
+        if self.location_constraints == LOCATION_CONSTRAINTS_LAZY:
+            self.lazy_locations = [(u, v, self.get_location_sides_terms(u=u, v=v)) for u, v in self.get_reciprocal_locations()]
+            self.prepare_lazy_locations()
+        self.start_values = self.completed_starting_vars()
+        if self.start_values is not None:
+            for var_keys, var in iter_variables_with_keys(variables=self.variables):
+                family = var_keys[1] if var_keys[0] == PROD else var_keys[0]
+                ub = None if var.UB >= g.GRB.INFINITY else var.UB
+                self.set_variable_start(var=var, family=family, value=get_nested_value(self.start_values, var_keys), lb=var.LB, ub=ub)
+
+    def solve_model(self, callback=None):
+        """
+        Solves the model. With lazy locations constraints, violated ones are added in a callback (that precedes the supplied `callback`,
+            which is not invoked for candidate solutions rejected due to added lazy constraints).
+        """
+        if self.location_constraints == LOCATION_CONSTRAINTS_LAZY:
+            self.gm.setParam("LazyConstraints", 1)
+
+            def lazy_callback(model, where):
+                if self.add_violated_location_constraints(model=model, where=where) > 0:
+                    return
+                if callback is not None:
+                    callback(model, where)
+
+            self.gm.optimize(lazy_callback)
+        elif callback is None:
+            self.gm.optimize()
+        else:
+            self.gm.optimize(callback)
 
     def define_variables(self):
         ###
@@ -282,8 +809,7 @@ class OptModelMultiClone(object):
         ###
         for fid in list(self.variables[FRAGMENT_ALLELE].keys()):
             var = self.gm.addVar(vtype=g.GRB.BINARY, name="b_{{{fid}}}".format(fid=str(fid)))
-            if self.starting_vars is not None and FRAGMENT_ALLELE in self.starting_vars and fid in self.starting_vars[FRAGMENT_ALLELE]:
-                var.start = self.starting_vars[FRAGMENT_ALLELE][fid]
+            self.set_variable_start(var=var, family=FRAGMENT_ALLELE, value=get_nested_value(self.start_values, [FRAGMENT_ALLELE, fid]), lb=0, ub=1)
             self.variables[FRAGMENT_ALLELE][fid] = var
         ######
 
@@ -294,48 +820,38 @@ class OptModelMultiClone(object):
         for clone_id in self.clone_ids:
             for aid in list(self.variables[YR][clone_id].keys()):
                 for ph in [Phasing.AA, Phasing.AB, Phasing.BA, Phasing.BB]:
+                    if is_fixed_value(self.variables[YR][clone_id][aid][ph]):
+                        continue
                     var = self.gm.addVar(lb=1, vtype=g.GRB.INTEGER, name="N'_{{r,{cid},{aid},{phas}}}".format(cid=str(clone_id), aid=str(aid), phas=str(ph)))
-                    if self.starting_vars is not None and \
-                            YR in self.starting_vars and clone_id in self.starting_vars[YR] and aid in self.starting_vars[YR][clone_id] and \
-                            ph in self.starting_vars[YR][clone_id][aid]:
-                        var.start = self.starting_vars[YR][clone_id][aid][ph]
+                    self.set_variable_start(var=var, family=YR, value=get_nested_value(self.start_values, [YR, clone_id, aid, ph]), lb=1)
                     self.variables[YR][clone_id][aid][ph] = var
         ######
 
         ###
         # Integer segment copy numbers, bounded by lower and upper bounds, provided as part of the input
         ###
-        start_cnt = 0
         for clone_id in self.clone_ids:
             for sid in list(self.variables[SEGMENT_COPY_NUMBER][clone_id].keys()):
                 min_lower = min([self.scnb[clone_id].get_cnb(sid=sid, hap=h, boundary_type=CNBoundaries.LOWER) for h in [Haplotype.A, Haplotype.B]])
                 max_upper = max([self.scnb[clone_id].get_cnb(sid=sid, hap=h, boundary_type=CNBoundaries.UPPER) for h in [Haplotype.A, Haplotype.B]])
                 for h in [Haplotype.A, Haplotype.B]:
+                    if is_fixed_value(self.variables[SEGMENT_COPY_NUMBER][clone_id][sid][h]):
+                        continue
                     var = self.gm.addVar(lb=min_lower, ub=max_upper, vtype=g.GRB.INTEGER, name="c_{{{cid},{sid},{hap}}}".format(cid=str(clone_id), sid=str(sid), hap=str(h)))
-                    if self.starting_vars is not None and \
-                            SEGMENT_COPY_NUMBER in self.starting_vars and clone_id in self.starting_vars[SEGMENT_COPY_NUMBER] and sid in self.starting_vars[SEGMENT_COPY_NUMBER][
-                        clone_id] and \
-                            h in self.starting_vars[SEGMENT_COPY_NUMBER][clone_id][sid]:
-                        var.start = self.starting_vars[SEGMENT_COPY_NUMBER][clone_id][sid][h]
-                        start_cnt += 1
+                    self.set_variable_start(var=var, family=SEGMENT_COPY_NUMBER, value=get_nested_value(self.start_values, [SEGMENT_COPY_NUMBER, clone_id, sid, h]),
+                                            lb=min_lower, ub=max_upper)
                     self.variables[SEGMENT_COPY_NUMBER][clone_id][sid][h] = var
-        # print("segment start cnt = {cnt}".format(cnt=start_cnt))
         ######
 
         ###
         # Integer copy number of a novel adjacency (single phased realization). Every unphased novel adjacency can have at most one phased realization, thus 1 variable.
         #   lower bound is set at 1, as absence (i.e., copy number 0) is achieved via a binary indicator variable.
         ###
-        start_cnt = 0
         for clone_id in self.clone_ids:
             for aid in list(self.variables[YN][clone_id].keys()):
                 var = self.gm.addVar(lb=1, vtype=g.GRB.INTEGER, name="N'_{{n,{cid},{aid}}}".format(cid=str(clone_id), aid=str(aid)))
-                if self.starting_vars is not None and \
-                        YN in self.starting_vars and clone_id in self.starting_vars[YN] and aid in self.starting_vars[YN][clone_id]:
-                    var.start = self.starting_vars[YN][clone_id][aid]
-                    start_cnt += 1
+                self.set_variable_start(var=var, family=YN, value=get_nested_value(self.start_values, [YN, clone_id, aid]), lb=1)
                 self.variables[YN][clone_id][aid] = var
-        # print("yn start cnt = {cnt}".format(cnt=start_cnt))
         ######
 
         ###
@@ -344,53 +860,41 @@ class OptModelMultiClone(object):
         for clone_id in self.clone_ids:
             for aid in list(self.variables[P][clone_id].keys()):
                 for ph in [Phasing.AA, Phasing.AB, Phasing.BA, Phasing.BB]:
+                    if is_fixed_value(self.variables[P][clone_id][aid][ph]):
+                        continue
                     var = self.gm.addVar(vtype=g.GRB.BINARY, name="p_{{a,{cid},{aid},{phas}}}".format(cid=str(clone_id), aid=str(aid), phas=str(ph)))
-                    if self.starting_vars is not None and \
-                            P in self.starting_vars and clone_id in self.starting_vars[P] and aid in self.starting_vars[P][clone_id] and \
-                            ph in self.starting_vars[P][clone_id][aid]:
-                        var.start = self.starting_vars[P][clone_id][aid][ph]
+                    self.set_variable_start(var=var, family=P, value=get_nested_value(self.start_values, [P, clone_id, aid, ph]), lb=0, ub=1)
                     self.variables[P][clone_id][aid][ph] = var
         ######
 
         ###
         # Binary indicator presence variable that determines whether a group of adjacencies is present in a given clone, or not
         ###
-        start_cnt = 0
         for clone_id in self.clone_ids:
             for gid in list(self.variables[ADJ_GROUPS_M][clone_id].keys()):
                 var = self.gm.addVar(vtype=g.GRB.BINARY, name="p_{{u,{cid},{gid}}}".format(cid=str(clone_id), gid=str(gid)))
-                if self.starting_vars is not None and \
-                        ADJ_GROUPS_M in self.starting_vars and clone_id in self.starting_vars[ADJ_GROUPS_M] and gid in self.starting_vars[ADJ_GROUPS_M][clone_id]:
-                    var.start = self.starting_vars[ADJ_GROUPS_M][clone_id][gid]
-                    start_cnt += 1
+                self.set_variable_start(var=var, family=ADJ_GROUPS_M, value=get_nested_value(self.start_values, [ADJ_GROUPS_M, clone_id, gid]), lb=0, ub=1)
                 self.variables[ADJ_GROUPS_M][clone_id][gid] = var
-        # print("adj group m start cnt = {cnt}".format(cnt=start_cnt))
         ######
 
         ###
         # Binary indicator presence variable that determines whether any of the adjacencies in the given group are present on respective haplotype
         ###
-        start_cnt = 0
         for gid in list(self.variables[ADJ_GROUPS_L].keys()):
             for haplotype in [Haplotype.A, Haplotype.B]:
                 var = self.gm.addVar(vtype=g.GRB.BINARY, name="p_{{u,{gid},{hap}}}".format(gid=str(gid), hap=str(haplotype.value)))
-                if self.starting_vars is not None and \
-                        ADJ_GROUPS_L in self.starting_vars and gid in self.starting_vars[ADJ_GROUPS_L] and haplotype in self.starting_vars[ADJ_GROUPS_L][gid]:
-                    var.start = self.starting_vars[ADJ_GROUPS_L][gid][haplotype]
-                    start_cnt += 1
+                self.set_variable_start(var=var, family=ADJ_GROUPS_L, value=get_nested_value(self.start_values, [ADJ_GROUPS_L, gid, haplotype]), lb=0, ub=1)
                 self.variables[ADJ_GROUPS_L][gid][haplotype] = var
-        # print("adj group l start cnt = {cnt}".format(cnt=start_cnt))
         ###
         # Internal variable that encodes the difference between the inferred segment copy numbers and the original values
         ###
         for clone_id in self.clone_ids:
             for sid in list(self.variables[DELTA][clone_id].keys()):
                 for h in [Haplotype.A, Haplotype.B]:
+                    if is_fixed_value(self.variables[DELTA][clone_id][sid][h]):
+                        continue
                     var = self.gm.addVar(lb=0, vtype=g.GRB.INTEGER, name="delta_{{{cid},{sid},{hap}}}".format(cid=str(clone_id), sid=str(sid), hap=str(h)))
-                    if self.starting_vars is not None and \
-                            DELTA in self.starting_vars and clone_id in self.starting_vars[DELTA] and sid in self.starting_vars[DELTA][clone_id] and \
-                            h in self.starting_vars[DELTA][clone_id][sid]:
-                        var.start = self.starting_vars[DELTA][clone_id][sid][h]
+                    self.set_variable_start(var=var, family=DELTA, value=get_nested_value(self.start_values, [DELTA, clone_id, sid, h]), lb=0)
                     self.variables[DELTA][clone_id][sid][h] = var
         ######
 
@@ -398,33 +902,213 @@ class OptModelMultiClone(object):
         # Internal integer variable encoding internal copy number for all phased realizations of the adjacencies. Used in conjunction with respective binary variable
         #   and bigM notation technique to encode the true copy number (i.e., the result)
         ###
-        start_cnt = 0
         for clone_id in self.clone_ids:
             for aid in list(self.variables[PROD][PY][clone_id].keys()):
                 for ph in [Phasing.AA, Phasing.AB, Phasing.BA, Phasing.BB]:
+                    if is_fixed_value(self.variables[PROD][PY][clone_id][aid][ph]):
+                        continue
                     var = self.gm.addVar(lb=0, vtype=g.GRB.INTEGER, name="N_{{{cid},{aid},{phas}}}".format(cid=str(clone_id), aid=str(aid), phas=str(ph)))
-                    if self.starting_vars is not None and \
-                            PROD in self.starting_vars and PY in self.starting_vars[PROD] and clone_id in self.starting_vars[PROD][PY] and \
-                            aid in self.starting_vars[PROD][PY][clone_id] and ph in self.starting_vars[PROD][PY][clone_id][aid]:
-                        var.start = self.starting_vars[PROD][PY][clone_id][aid][ph]
-                        start_cnt += 1
+                    self.set_variable_start(var=var, family=PY, value=get_nested_value(self.start_values, [PROD, PY, clone_id, aid, ph]), lb=0)
                     self.variables[PROD][PY][clone_id][aid][ph] = var
-        # print("prod py start cnt = {cnt}".format(cnt=start_cnt))
         ######
 
         ###
         # Binary variables used for enforcing phasing constraints across clones
         ###
-        start_cnt = 0
         for aid in list(self.variables[PROD][PP].keys()):
             for ph in [Phasing.AA, Phasing.AB, Phasing.BA, Phasing.BB]:
+                if is_fixed_value(self.variables[PROD][PP][aid][ph]):
+                    continue
                 var = self.gm.addVar(vtype=g.GRB.BINARY, name="p_{{a,{aid},{phas}}}".format(aid=str(aid), phas=str(ph)))
-                if self.starting_vars is not None and \
-                        PROD in self.starting_vars and PP in self.starting_vars[PROD] and aid in self.starting_vars[PROD][PP] and ph in self.starting_vars[PROD][PP][aid]:
-                    var.start = self.starting_vars[PROD][PP][aid][ph]
-                    start_cnt += 1
+                self.set_variable_start(var=var, family=PP, value=get_nested_value(self.start_values, [PROD, PP, aid, ph]), lb=0, ub=1)
                 self.variables[PROD][PP][aid][ph] = var
-        # print("prod pp start cnt = {cnt}".format(cnt=start_cnt))
+
+    def set_variable_start(self, var, family, value, lb=0, ub=None):
+        """
+        Sets a MIP start value for a variable, if one is available, and records how the value was treated in the `starting_vars_report`:
+            values within variable bounds (up to rounding) are accepted as is, values outside of them are repaired (clamped to the closest bound),
+            and variables without a value are left to be filled in by the solver (partial start).
+        """
+        report = self.starting_vars_report.setdefault(family, {"total": 0, "accepted": 0, "repaired": 0, "missing": 0})
+        report["total"] += 1
+        if value is None:
+            report["missing"] += 1
+            return
+        repaired_value = int(round(value))
+        if lb is not None:
+            repaired_value = max(lb, repaired_value)
+        if ub is not None:
+            repaired_value = min(ub, repaired_value)
+        if abs(repaired_value - value) > 1e-6:
+            report["repaired"] += 1
+        else:
+            report["accepted"] += 1
+        var.start = repaired_value
+
+    def starting_vars_summary(self):
+        result = {"total": 0, "accepted": 0, "repaired": 0, "missing": 0}
+        for family_report in self.starting_vars_report.values():
+            for key in result:
+                result[key] += family_report[key]
+        return result
+
+    def completed_starting_vars(self):
+        """
+        Extends (possibly partial, e.g., assembled from per-chromosome presolve runs) starting values, so that every variable family is seeded consistently.
+            Primary values (allele flipping, segment copy numbers, adjacencies presence indicators and copy numbers) are taken from the starting values when present.
+            Adjacencies with no starting values (e.g., translocations, that are not part of any per-chromosome presolve) are seeded as absent.
+            Derived values (cross-clone phasing indicators, deltas, adjacency groups indicators) are always recomputed from the primary ones.
+            Adjacency groups indicators that can not be seeded in a feasible way are left without starting values, for the solver to fill in.
+        """
+        if self.starting_vars is None:
+            return None
+        source = self.starting_vars
+        result = {
+            FRAGMENT_ALLELE: {},
+            SEGMENT_COPY_NUMBER: {clone_id: {} for clone_id in self.clone_ids},
+            YR: {clone_id: {} for clone_id in self.clone_ids},
+            YN: {clone_id: {} for clone_id in self.clone_ids},
+            P: {clone_id: {} for clone_id in self.clone_ids},
+            ADJ_GROUPS_M: {clone_id: {} for clone_id in self.clone_ids},
+            ADJ_GROUPS_L: {},
+            DELTA: {clone_id: {} for clone_id in self.clone_ids},
+            PROD: {
+                PY: {clone_id: {} for clone_id in self.clone_ids},
+                PP: {}
+            }
+        }
+        phasings = [Phasing.AA, Phasing.AB, Phasing.BA, Phasing.BB]
+
+        for fid in self.fragments_ids:
+            value = get_nested_value(source, [FRAGMENT_ALLELE, fid])
+            if self.solve_as_haploid:
+                value = 1
+            if value is not None:
+                result[FRAGMENT_ALLELE][fid] = int(round(value))
+
+        for clone_id in self.clone_ids:
+            for segment in self.hapl_segments:
+                sid = segment.stable_id_non_hap
+                values = {h: get_nested_value(source, [SEGMENT_COPY_NUMBER, clone_id, sid, h]) for h in [Haplotype.A, Haplotype.B]}
+                for h in [Haplotype.A, Haplotype.B]:
+                    if is_fixed_value(self.variables[SEGMENT_COPY_NUMBER][clone_id][sid][h]):
+                        values[h] = self.variables[SEGMENT_COPY_NUMBER][clone_id][sid][h]
+                if any(value is None for value in values.values()):
+                    continue
+                result[SEGMENT_COPY_NUMBER][clone_id][sid] = {h: int(round(value)) for h, value in values.items()}
+
+        for clone_id in self.clone_ids:
+            for adjacency in self.hapl_adjacencies:
+                aid = adjacency.stable_id_non_phased
+                is_novel = adjacency.adjacency_type == AdjacencyType.NOVEL
+                p_values = {ph: get_nested_value(source, [P, clone_id, aid, ph]) for ph in phasings}
+                if any(value is None for value in p_values.values()):
+                    p_values = {ph: 0 for ph in phasings}
+                p_values = {ph: int(round(value)) for ph, value in p_values.items()}
+                for ph in self.get_prohibited_phasings(adjacency=adjacency):
+                    p_values[ph] = 0
+                result[P][clone_id][aid] = p_values
+                if is_novel:
+                    yn_value = get_nested_value(source, [YN, clone_id, aid])
+                    py_values = {ph: get_nested_value(source, [PROD, PY, clone_id, aid, ph]) for ph in phasings}
+                    if yn_value is None:
+                        yn_value = max([1] + [value for value in py_values.values() if value is not None])
+                    yn_value = max(1, int(round(yn_value)))
+                    result[YN][clone_id][aid] = yn_value
+                    result[PROD][PY][clone_id][aid] = {ph: p_values[ph] * yn_value for ph in phasings}
+                else:
+                    yr_values = {}
+                    for ph in phasings:
+                        yr_value = get_nested_value(source, [YR, clone_id, aid, ph])
+                        if yr_value is None:
+                            py_value = get_nested_value(source, [PROD, PY, clone_id, aid, ph])
+                            yr_value = 1 if py_value is None else py_value
+                        yr_values[ph] = max(1, int(round(yr_value)))
+                    result[YR][clone_id][aid] = yr_values
+                    result[PROD][PY][clone_id][aid] = {ph: p_values[ph] * yr_values[ph] for ph in phasings}
+
+        for adjacency in self.hapl_adjacencies:
+            aid = adjacency.stable_id_non_phased
+            result[PROD][PP][aid] = {ph: max(result[P][clone_id][aid][ph] for clone_id in self.clone_ids) for ph in phasings}
+
+        for clone_id in self.clone_ids:
+            for segment in self.hapl_segments:
+                sid = segment.stable_id_non_hap
+                fid = self.hapl_segments_to_fragments[sid]
+                if sid not in result[SEGMENT_COPY_NUMBER][clone_id] or fid not in result[FRAGMENT_ALLELE]:
+                    continue
+                f_value = result[FRAGMENT_ALLELE][fid]
+                s_cn_a = self.scnt[clone_id].get_hap_aware_cn_by_seg_and_hap(segment=segment, haplotype=Haplotype.A)
+                s_cn_b = self.scnt[clone_id].get_hap_aware_cn_by_seg_and_hap(segment=segment, haplotype=Haplotype.B)
+                c_a = result[SEGMENT_COPY_NUMBER][clone_id][sid][Haplotype.A]
+                c_b = result[SEGMENT_COPY_NUMBER][clone_id][sid][Haplotype.B]
+                result[DELTA][clone_id][sid] = {
+                    Haplotype.A: abs(c_a - f_value * s_cn_a - (1 - f_value) * s_cn_b),
+                    Haplotype.B: abs(c_b - (1 - f_value) * s_cn_a - f_value * s_cn_b),
+                }
+
+        for adj_group in filter(lambda ag: ag.group_type == AdjacencyGroupType.MOLECULE, self.hapl_adjacencies_groups):
+            fp = adj_group.extra.get(FALSE_POSITIVE, self.extra.get(DEFAULT_GROUP_M_FP, 0.1))
+            group_size = len(adj_group.adjacencies_ids)
+            values = {}
+            for clone_id in self.clone_ids:
+                present_cnt = sum(result[P][clone_id][adjacency.stable_id_non_phased][ph] for adjacency in adj_group.adjacencies for ph in phasings)
+                values[clone_id] = int(present_cnt >= group_size * (1 - fp))
+            if sum(values.values()) == 0:
+                continue
+            for clone_id, value in values.items():
+                result[ADJ_GROUPS_M][clone_id][adj_group.gid] = value
+
+        if not self.solve_as_haploid:
+            hapl_adjacencies_by_external_ids = {adj.extra.get(EXTERNAL_NA_ID, adj.stable_id_non_phased): adj for adj in self.hapl_adjacencies}
+            for adj_group in filter(lambda ag: ag.group_type == AdjacencyGroupType.LABELING, self.hapl_adjacencies_groups):
+                aids = adj_group.adjacencies_ids
+                indexes = adj_group.extra.get(AG_LABELING, [])
+                if len(aids) != len(indexes):
+                    continue
+                positions = []
+                for aid, index in zip(aids, indexes):
+                    adjacency = hapl_adjacencies_by_external_ids[aid]
+                    positions.append(adjacency.position1 if index == 0 else adjacency.position2)
+                values = {}
+                for haplotype in [Haplotype.A, Haplotype.B]:
+                    value = 0
+                    for position in positions:
+                        for u, v, data in self.iag.nov_adjacency_edges(nbunch=position, data=True):
+                            na = data["object"]
+                            aid = na.stable_id_non_phased
+                            value = max(value,
+                                        result[PROD][PP][aid][get_aabb_for_ra(haplotype=haplotype)],
+                                        result[PROD][PP][aid][get_abba_for_na_and_position(novel_adjacency=na, position=position, haplotype=haplotype)])
+                    values[haplotype] = value
+                if sum(values.values()) > 1:
+                    continue
+                result[ADJ_GROUPS_L][adj_group.gid] = values
+        return self.get_symmetry_ordered_starting_vars(starting_vars=result)
+
+    def get_symmetry_ordered_starting_vars(self, starting_vars):
+        """
+        Permutes clone-specific starting values within every group of interchangeable clones, so that they satisfy the symmetry breaking ordering
+            (i.e., are sorted by the total segment copy number in non-increasing order).
+        """
+        if len(self.interchangeable_clones) == 0:
+            return starting_vars
+        clone_specific_keys = [[SEGMENT_COPY_NUMBER], [YR], [YN], [P], [ADJ_GROUPS_M], [DELTA], [PROD, PY]]
+        for group in self.interchangeable_clones:
+            totals = {}
+            for clone_id in group:
+                clone_cns = starting_vars[SEGMENT_COPY_NUMBER][clone_id]
+                if len(clone_cns) != len(self.hapl_segments):
+                    break
+                totals[clone_id] = sum(cns[Haplotype.A] + cns[Haplotype.B] for cns in clone_cns.values())
+            if len(totals) != len(group):
+                continue
+            ordered_group = sorted(group, key=lambda clone_id: (-totals[clone_id], group.index(clone_id)))
+            for keys in clone_specific_keys:
+                family_values = get_nested_value(starting_vars, keys)
+                permuted_values = {clone_id: family_values[source_clone_id] for clone_id, source_clone_id in zip(group, ordered_group)}
+                family_values.update(permuted_values)
+        return starting_vars
 
     def define_constraints(self):
         self.define_segment_copy_number_boundary_constraints()
@@ -436,6 +1120,26 @@ class OptModelMultiClone(object):
         self.define_constraints_on_deltas()
         if self.solve_as_haploid:
             self.define_allele_flipping_haploid_constraints()
+        self.define_clone_symmetry_breaking_constraints()
+
+    def get_lin_expr_for_clone_total_copy_number(self, clone_id):
+        result = g.LinExpr()
+        for segment in self.hapl_segments:
+            for haplotype in [Haplotype.A, Haplotype.B]:
+                add_to_lin_expr(result, self.variables[SEGMENT_COPY_NUMBER][clone_id][segment.stable_id_non_hap][haplotype])
+        return result
+
+    def define_clone_symmetry_breaking_constraints(self):
+        """
+        Clones with identical input (see `get_interchangeable_clones`) are ordered by their total inferred segment copy number (non-increasing, in clone ids order),
+            so that the branch-and-bound does not explore subtrees that only differ by a permutation of such clones.
+        Since the interchangeable clones are indistinguishable in the input, inferred copy numbers of the i-th clone (in the imposed order) are reported for the i-th clone id in the group.
+        """
+        for group in self.interchangeable_clones:
+            for clone_id, next_clone_id in zip(group[:-1], group[1:]):
+                self.gm.addConstr(self.get_lin_expr_for_clone_total_copy_number(clone_id=clone_id), g.GRB.GREATER_EQUAL,
+                                  self.get_lin_expr_for_clone_total_copy_number(clone_id=next_clone_id),
+                                  name="clone-symmetry_{{{cid},{next_cid}}}".format(cid=str(clone_id), next_cid=str(next_clone_id)))
 
     def define_allele_flipping_haploid_constraints(self):
         """
@@ -471,6 +1175,11 @@ class OptModelMultiClone(object):
                 s_cn_a_var = self.variables[SEGMENT_COPY_NUMBER][clone_id][sid][Haplotype.A]
                 s_cn_b_var = self.variables[SEGMENT_COPY_NUMBER][clone_id][sid][Haplotype.B]
                 ####
+                # segment copy numbers eliminated in presolve are fixed at the (coinciding) boundaries value, and thus satisfy the constraints by construction
+                ####
+                if is_fixed_value(s_cn_a_var) and is_fixed_value(s_cn_b_var):
+                    continue
+                ####
                 # allele-tied copy number boundaries
                 ####
                 lower_a = self.scnb[clone_id].get_cnb(sid=sid, hap=Haplotype.A, boundary_type=CNBoundaries.LOWER)
@@ -505,6 +1214,8 @@ class OptModelMultiClone(object):
                 c_max = max(s1_cn_boundaries + s2_cn_boundaries)
                 for ph in [Phasing.AA, Phasing.AB, Phasing.BA, Phasing.BB]:
                     aid = adjacency.stable_id_non_phased
+                    if is_fixed_value(self.variables[P][clone_id][aid][ph]):
+                        continue
                     self.gm.addConstr(c_max * self.variables[P][clone_id][aid][ph], g.GRB.GREATER_EQUAL, self.variables[PROD][PY][clone_id][aid][ph])
                     self.gm.addConstr(self.variables[PROD][PY][clone_id][aid][ph], g.GRB.GREATER_EQUAL, 0.0)
                     if adjacency.adjacency_type == AdjacencyType.NOVEL:
@@ -531,6 +1242,8 @@ class OptModelMultiClone(object):
             for adjacency in filter(lambda a: a.adjacency_type == AdjacencyType.REFERENCE, self.hapl_adjacencies):
                 aid = adjacency.stable_id_non_phased
                 for ph in [Phasing.AB, Phasing.BA]:
+                    if is_fixed_value(self.variables[P][clone_id][aid][ph]):
+                        continue
                     self.gm.addConstr(self.variables[P][clone_id][aid][ph], g.GRB.EQUAL, 0, name="ph_{{r,{cid},{aid},{phas}}}".format(cid=str(clone_id),
                                                                                                                                       aid=str(aid),
                                                                                                                                       phas=str(ph)))
@@ -538,7 +1251,7 @@ class OptModelMultiClone(object):
                 # If we are solving the problem in the haploid setting, we can not have BB reference adjacency present (i.e., CN must be equal to 0, we are achieving it
                 #   via fixing binary indicator at 0)
                 ###
-                if self.solve_as_haploid:
+                if self.solve_as_haploid and not is_fixed_value(self.variables[P][clone_id][aid][Phasing.BB]):
                     self.gm.addConstr(self.variables[P][clone_id][aid][Phasing.BB], g.GRB.EQUAL, 0, name="ph_{{r,{cid},{aid},hapl-{phas}}}".format(cid=str(clone_id),
                                                                                                                                                    aid=str(aid),
                                                                                                                                                    phas=str(Phasing.BB)))
@@ -549,7 +1262,7 @@ class OptModelMultiClone(object):
         for adjacency in filter(lambda a: a.adjacency_type == AdjacencyType.NOVEL, self.hapl_adjacencies):
             aid = adjacency.stable_id_non_phased
             fp_lin_expr.add(g.quicksum([self.variables[PROD][PP][aid][ph] for ph in [Phasing.AA, Phasing.AB, Phasing.BA, Phasing.BB]]), mult=(1.0 / hapl_nov_adjs_cnt))
-        self.gm.addConstr(fp_lin_expr, g.GRB.GREATER_EQUAL, g.LinExpr(1 - self.hapl_nov_adjacencies_fp), name="nov-adj-fp")
+        self.nov_adjacencies_fp_constraint = self.gm.addConstr(fp_lin_expr, g.GRB.GREATER_EQUAL, g.LinExpr(1 - self.hapl_nov_adjacencies_fp), name="nov-adj-fp")
 
     def define_constraints_for_novel_labeling(self):
         for adjacency in filter(lambda a: a.adjacency_type == AdjacencyType.NOVEL, self.hapl_adjacencies):
@@ -559,6 +1272,8 @@ class OptModelMultiClone(object):
             #   Note: using Gurobi built-in OR constraint, rather than explicitly writing it down
             ###
             for ph in [Phasing.AA, Phasing.AB, Phasing.BA, Phasing.BB]:
+                if is_fixed_value(self.variables[PROD][PP][aid][ph]):
+                    continue
                 self.gm.addGenConstrOr(self.variables[PROD][PP][aid][ph],
                                        [self.variables[P][clone_id][aid][ph] for clone_id in self.clone_ids],
                                        name="pp_{{{aid},{phas}}}".format(aid=str(aid), phas=str(ph)))
@@ -574,43 +1289,83 @@ class OptModelMultiClone(object):
             ###
             if adjacency.is_self_loop_hapl:
                 for ph in [Phasing.AB, Phasing.BA]:
-                    self.gm.addConstr(self.variables[PROD][PP][aid][ph], g.GRB.EQUAL, 0)
+                    if not is_fixed_value(self.variables[PROD][PP][aid][ph]):
+                        self.gm.addConstr(self.variables[PROD][PP][aid][ph], g.GRB.EQUAL, 0)
             ###
             # If we are solving the problem in a haploid setting, then we must force every labeling choice, except for AA one, to not be present
             # (i.e., indicator forced to equal to 0)
             ###
             if self.solve_as_haploid:
                 for ph in [Phasing.AB, Phasing.BA, Phasing.BB]:
-                    self.gm.addConstr(self.variables[PROD][PP][aid][ph], g.GRB.EQUAL, 0)
+                    if not is_fixed_value(self.variables[PROD][PP][aid][ph]):
+                        self.gm.addConstr(self.variables[PROD][PP][aid][ph], g.GRB.EQUAL, 0)
 
-    def define_constraints_on_each_location(self):
-        self.reciprocal_locations = []
+    def get_reciprocal_locations(self):
+        """
+        Reference adjacencies (as pairs of their extremities), that have novel adjacencies incident to both of their extremities
+        """
+        result = []
         for u, v, data in self.iag.ref_adjacency_edges(data=True):
-            u_na_edges_w_data = list(self.iag.nov_adjacency_edges(data=True, nbunch=u))
-            v_na_edges_w_data = list(self.iag.nov_adjacency_edges(data=True, nbunch=v))
-            if len(u_na_edges_w_data) == 0 or len(v_na_edges_w_data) == 0:
+            if len(list(self.iag.nov_adjacency_edges(nbunch=u))) == 0 or len(list(self.iag.nov_adjacency_edges(nbunch=v))) == 0:
+                continue
+            result.append((u, v))
+        return result
+
+    def get_location_sides_terms(self, u, v):
+        """
+        For both orientations of the reciprocal location (u, v) (i.e., haplotype A at u and B at v, and vice versa), returns lists of (novel adjacency id, phasing indicators)
+            for novel adjacencies at u, and at v, that use respective haplotypes at the location.
+        Within an orientation, no pair of novel adjacencies from different sides can be present together.
+        """
+        u_nas = [data["object"] for _, __, data in self.iag.nov_adjacency_edges(data=True, nbunch=u)]
+        v_nas = [data["object"] for _, __, data in self.iag.nov_adjacency_edges(data=True, nbunch=v)]
+        result = []
+        for u_haplotype, v_haplotype in [(Haplotype.A, Haplotype.B), (Haplotype.B, Haplotype.A)]:
+            u_terms = [(na.stable_id_non_phased, [self.variables[PROD][PP][na.stable_id_non_phased][get_aabb_for_ra(haplotype=u_haplotype)],
+                                                  self.variables[PROD][PP][na.stable_id_non_phased][get_abba_for_na_and_position(novel_adjacency=na, position=u,
+                                                                                                                                 haplotype=u_haplotype)]])
+                       for na in u_nas]
+            v_terms = [(na.stable_id_non_phased, [self.variables[PROD][PP][na.stable_id_non_phased][get_abba_for_na_and_position(novel_adjacency=na, position=v,
+                                                                                                                                 haplotype=v_haplotype)],
+                                                  self.variables[PROD][PP][na.stable_id_non_phased][get_aabb_for_ra(haplotype=v_haplotype)]])
+                       for na in v_nas]
+            result.append((u_terms, v_terms))
+        return result
+
+    def define_constraints_on_each_location(self):
+        """
+        On every reciprocal location, novel adjacencies that use the same haplotype on the different sides of the location can not be present together.
+            Depending on the `location_constraints` mode, these exclusivity constraints are:
+            * pairwise: one constraint for every pair of novel adjacencies from the different sides (quadratic in the number of novel adjacencies at the location);
+            * aggregated: a binary indicator of the side, that may have novel adjacencies present, with one constraint for every novel adjacency (linear);
+            * lazy: not added to the model, but checked (and added only if violated) in a callback during the solving (see `add_violated_location_constraints`).
+        """
+        self.reciprocal_locations = self.get_reciprocal_locations()
+        self.lazy_locations = []
+        for u, v in self.reciprocal_locations:
+            sides_terms = self.get_location_sides_terms(u=u, v=v)
+            if self.location_constraints == LOCATION_CONSTRAINTS_LAZY:
+                self.lazy_locations.append((u, v, sides_terms))
                 continue
-            self.reciprocal_locations.append((u, v))
-            for u_na_edge_w_data in u_na_edges_w_data:
-                for v_na_edge_w_data in v_na_edges_w_data:
-                    u_na = u_na_edge_w_data[2]["object"]
-                    v_na = v_na_edge_w_data[2]["object"]
-                    u_na_id = u_na.stable_id_non_phased
-                    v_na_id = v_na.stable_id_non_phased
-                    expr1 = g.LinExpr()
-                    expr2 = g.LinExpr()
-                    expr1.add(self.variables[PROD][PP][u_na_id][get_aabb_for_ra(haplotype=Haplotype.A)], mult=1)
-                    expr1.add(self.variables[PROD][PP][u_na_id][get_abba_for_na_and_position(novel_adjacency=u_na, position=u, haplotype=Haplotype.A)], mult=1)
-                    expr1.add(self.variables[PROD][PP][v_na_id][get_abba_for_na_and_position(novel_adjacency=v_na, position=v, haplotype=Haplotype.B)], mult=1)
-                    expr1.add(self.variables[PROD][PP][v_na_id][get_aabb_for_ra(haplotype=Haplotype.B)], mult=1)
-                    self.gm.addConstr(expr1, g.GRB.LESS_EQUAL, 1, name="reciprocal_location_1_{{{u},{v},{u_aid},{v_aid}}}"
-                                                                       "".format(u=str(u), v=str(v), u_aid=str(u_na_id), v_aid=str(v_na_id)))
-                    expr2.add(self.variables[PROD][PP][u_na_id][get_aabb_for_ra(haplotype=Haplotype.B)], mult=1)
-                    expr2.add(self.variables[PROD][PP][u_na_id][get_abba_for_na_and_position(novel_adjacency=u_na, position=u, haplotype=Haplotype.B)], mult=1)
-                    expr2.add(self.variables[PROD][PP][v_na_id][get_abba_for_na_and_position(novel_adjacency=v_na, position=v, haplotype=Haplotype.A)], mult=1)
-                    expr2.add(self.variables[PROD][PP][v_na_id][get_aabb_for_ra(haplotype=Haplotype.A)], mult=1)
-                    self.gm.addConstr(expr2, g.GRB.LESS_EQUAL, 1, name="reciprocal_location_2_{{{u},{v},{u_aid},{v_aid}}}"
-                                                                       "".format(u=str(u), v=str(v), u_aid=str(u_na_id), v_aid=str(v_na_id)))
+            u_nas_cnt, v_nas_cnt = len(sides_terms[0][0]), len(sides_terms[0][1])
+            if self.location_constraints == LOCATION_CONSTRAINTS_AGGREGATED and u_nas_cnt > 1 and v_nas_cnt > 1:
+                for orientation, (u_terms, v_terms) in enumerate(sides_terms, start=1):
+                    side_var = self.gm.addVar(vtype=g.GRB.BINARY, name="w_{{{u},{v},{orientation}}}".format(u=str(u), v=str(v), orientation=orientation))
+                    for u_na_id, u_vars in u_terms:
+                        self.gm.addConstr(g.quicksum(u_vars), g.GRB.LESS_EQUAL, side_var, name="reciprocal_location_{orientation}_{{{u},{v},{aid}}}"
+                                                                                               "".format(orientation=orientation, u=str(u), v=str(v), aid=str(u_na_id)))
+                    for v_na_id, v_vars in v_terms:
+                        self.gm.addConstr(g.quicksum(v_vars), g.GRB.LESS_EQUAL, 1 - side_var, name="reciprocal_location_{orientation}_{{{u},{v},{aid}}}"
+                                                                                                   "".format(orientation=orientation, u=str(u), v=str(v), aid=str(v_na_id)))
+                continue
+            for u_index in range(u_nas_cnt):
+                for v_index in range(v_nas_cnt):
+                    for orientation, (u_terms, v_terms) in enumerate(sides_terms, start=1):
+                        u_na_id, u_vars = u_terms[u_index]
+                        v_na_id, v_vars = v_terms[v_index]
+                        self.gm.addConstr(g.quicksum(u_vars + v_vars), g.GRB.LESS_EQUAL, 1,
+                                          name="reciprocal_location_{orientation}_{{{u},{v},{u_aid},{v_aid}}}"
+                                               "".format(orientation=orientation, u=str(u), v=str(v), u_aid=str(u_na_id), v_aid=str(v_na_id)))
             # if len(u_na_edges_w_data) > 1 or len(v_na_edges_w_data) > 1:
             #     continue
             # u_na = u_na_edges_w_data[0][2]["object"]
@@ -628,6 +1383,65 @@ class OptModelMultiClone(object):
             # expr.add(g.LinExpr(self.variables[PROD][PP][u_na_id][get_abba_for_na_and_position(novel_adjacency=u_na, position=u, haplotype=Haplotype.B)]), mult=-1)
             # self.gm.addConstr(expr, g.GRB.GREATER_EQUAL, -1, name="recip_nov_l_{{{u},{v},{u_aid},{v_aid}}}".format(u=str(u), v=str(v), u_aid=str(u_na_id), v_aid=str(v_na_id)))
             # self.gm.addConstr(expr, g.GRB.LESS_EQUAL, 1, name="recip_nov_u_{{{u},{v},{u_aid},{v_aid}}}".format(u=str(u), v=str(v), u_aid=str(u_na_id), v_aid=str(v_na_id)))
+        self.prepare_lazy_locations()
+
+    def prepare_lazy_locations(self):
+        """
+        Flattens variables of the lazy locations constraints, so that their values can be obtained in a callback with a single query
+        """
+        self.lazy_locations_variables = []
+        self.lazy_locations_indexes = []
+        variables_positions = {}
+        for u, v, sides_terms in self.lazy_locations:
+            sides_indexes = []
+            for u_terms, v_terms in sides_terms:
+                side_indexes = []
+                for terms in [u_terms, v_terms]:
+                    terms_indexes = []
+                    for _, variables in terms:
+                        positions = []
+                        constant = 0
+                        for var in variables:
+                            if is_fixed_value(var):
+                                constant += var
+                                continue
+                            if var not in variables_positions:
+                                variables_positions[var] = len(self.lazy_locations_variables)
+                                self.lazy_locations_variables.append(var)
+                            positions.append(variables_positions[var])
+                        terms_indexes.append((np.array(positions, dtype=int), constant))
+                    side_indexes.append(terms_indexes)
+                sides_indexes.append(side_indexes)
+            self.lazy_locations_indexes.append(sides_indexes)
+
+    def add_violated_location_constraints(self, model, where):
+        """
+        Lazy locations constraints separation: for every lazy location (and orientation) the most violated pairwise exclusivity constraint
+            (w.r.t. the incumbent candidate, or the node relaxation solution) is added to the model.
+        Returns the number of added constraints.
+        """
+        if len(self.lazy_locations_variables) == 0:
+            return 0
+        if where == g.GRB.Callback.MIPSOL:
+            values = np.array(model.cbGetSolution(self.lazy_locations_variables), dtype=float)
+        elif where == g.GRB.Callback.MIPNODE and model.cbGet(g.GRB.Callback.MIPNODE_STATUS) == g.GRB.Status.OPTIMAL:
+            values = np.array(model.cbGetNodeRel(self.lazy_locations_variables), dtype=float)
+        else:
+            return 0
+        result = 0
+        for (u, v, sides_terms), sides_indexes in zip(self.lazy_locations, self.lazy_locations_indexes):
+            for (u_terms, v_terms), (u_indexes, v_indexes) in zip(sides_terms, sides_indexes):
+                u_values = [values[positions].sum() + constant for positions, constant in u_indexes]
+                v_values = [values[positions].sum() + constant for positions, constant in v_indexes]
+                u_index = int(np.argmax(u_values))
+                v_index = int(np.argmax(v_values))
+                if u_values[u_index] + v_values[v_index] <= 1 + LAZY_CONSTRAINTS_TOLERANCE:
+                    continue
+                model.cbLazy(g.quicksum(u_terms[u_index][1] + v_terms[v_index][1]), g.GRB.LESS_EQUAL, 1)
+                result += 1
+        self.lazy_locations_constraints_cnt += result
+        return result
+
 
     def define_constraints_for_adjacency_groups(self):
         self.define_constraints_for_adjacency_groups_molecule()
@@ -635,6 +1449,7 @@ class OptModelMultiClone(object):
         self.define_constraints_for_adjacency_groups_labeling()
 
     def define_constraints_for_adjacency_groups_molecule(self):
+        self.molecule_groups_fp_constraints = []
         for adj_group in filter(lambda ag: ag.group_type == AdjacencyGroupType.MOLECULE, self.hapl_adjacencies_groups):
             fp = adj_group.extra.get(FALSE_POSITIVE, self.extra.get(DEFAULT_GROUP_M_FP, 0.1))
             for clone_id in self.clone_ids:
@@ -644,13 +1459,15 @@ class OptModelMultiClone(object):
                 for adjacency in adj_group.adjacencies:
                     aid = adjacency.stable_id_non_phased
                     for ph in [Phasing.AA, Phasing.AB, Phasing.BA, Phasing.BB]:
-                        lin_expr.add(self.variables[P][clone_id][aid][ph])
+                        add_to_lin_expr(lin_expr, self.variables[P][clone_id][aid][ph])
                 ###
                 # in every clone, we force the total number of "realized" novel adjacencies in the group to be greater or equal to (1 - fp) * |u| * p_{i,u}
                 #   when p_{i,u} is 0, this inequality always holds, while when it is 1, the total number is forced to be greater or equal to the (1 - fp) * |u| of the group
                 ###
-                self.gm.addConstr(g.LinExpr(group_var * group_size * (1 - fp)), g.GRB.LESS_EQUAL, lin_expr, name="group-molecule_{{{cid},{gid}}}".format(cid=str(clone_id),
-                                                                                                                                                         gid=str(adj_group.gid)))
+                constraint = self.gm.addConstr(g.LinExpr(group_var * group_size * (1 - fp)), g.GRB.LESS_EQUAL, lin_expr,
+                                               name="group-molecule_{{{cid},{gid}}}".format(cid=str(clone_id), gid=str(adj_group.gid)))
+                if FALSE_POSITIVE not in adj_group.extra:
+                    self.molecule_groups_fp_constraints.append((constraint, group_var, group_size))
             ###
             # we force in at least 1 clone the p_{i, u} variable to be equal to 1, thus forcing at least one clone-specific inequality to force the group (fraction) realization
             ###
@@ -658,6 +1475,7 @@ class OptModelMultiClone(object):
                               g.GRB.GREATER_EQUAL, 1, name="group-molecule-across_{{{gid}}}".format(gid=str(adj_group.gid)))
 
     def define_constraints_for_adjacency_groups_general(self):
+        self.general_groups_fp_constraints = []
         for adj_group in filter(lambda ag: ag.group_type == AdjacencyGroupType.GENERAL, self.hapl_adjacencies_groups):
             fp = adj_group.extra.get(FALSE_POSITIVE, self.extra.get(DEFAULT_GROUP_N_FP, 0.1))
             group_size = len(adj_group.adjacencies_ids)
@@ -665,7 +1483,9 @@ class OptModelMultiClone(object):
             for adjacency in adj_group.adjacencies:
                 aid = adjacency.stable_id_non_phased
                 fp_lin_expr.add(g.quicksum([self.variables[PROD][PP][aid][ph] for ph in [Phasing.AA, Phasing.AB, Phasing.BA, Phasing.BB]]), mult=(1.0 / group_size))
-            self.gm.addConstr(fp_lin_expr, g.GRB.GREATER_EQUAL, g.LinExpr(1 - fp), name="general_group-fp_{{{gid}}}".format(gid=adj_group.gid))
+            constraint = self.gm.addConstr(fp_lin_expr, g.GRB.GREATER_EQUAL, g.LinExpr(1 - fp), name="general_group-fp_{{{gid}}}".format(gid=adj_group.gid))
+            if FALSE_POSITIVE not in adj_group.extra:
+                self.general_groups_fp_constraints.append(constraint)
 
     def define_constraints_for_adjacency_groups_labeling(self):
         if self.solve_as_haploid:
@@ -694,6 +1514,10 @@ class OptModelMultiClone(object):
                         positions_adjacency_variables.append(self.variables[PROD][PP][aid][get_aabb_for_ra(haplotype=haplotype)])
                         positions_adjacency_variables.append(self.variables[PROD][PP][aid][get_abba_for_na_and_position(novel_adjacency=na,
                                                                                                                         position=position, haplotype=haplotype)])
+                positions_adjacency_variables = [var for var in positions_adjacency_variables if not is_fixed_value(var)]
+                if len(positions_adjacency_variables) == 0:
+                    self.gm.addConstr(group_var, g.GRB.EQUAL, 0, name="labeling_group-{{{gid},{hap}}}".format(gid=adj_group.gid, hap=haplotype.value))
+                    continue
                 self.gm.addGenConstrOr(group_var, positions_adjacency_variables, name="labeling_group-{{{gid},{hap}}}".format(gid=adj_group.gid,
                                                                                                                               hap=haplotype.value))
             self.gm.addConstr(g.quicksum(group_vars), g.GRB.LESS_EQUAL, 1, name="labeling_group-{{{gid}}}".format(gid=adj_group.gid))
@@ -719,7 +1543,7 @@ class OptModelMultiClone(object):
         s = data["object"]
         sid = s.stable_id_non_hap
         s_var = self.variables[SEGMENT_COPY_NUMBER][clone_id][sid][haplotype]
-        result.add(s_var)
+        add_to_lin_expr(result, s_var)
         ###
         # Here IAG is haploid, not diploid.
         ###
@@ -731,18 +1555,18 @@ class OptModelMultiClone(object):
         ###
         assert len(ref_adjs) <= 1
         for adjacency in ref_adjs:
-            result.add(g.LinExpr(self.variables[PROD][PY][clone_id][adjacency.stable_id_non_phased][get_aabb_for_ra(haplotype=haplotype)]), mult=-1)
+            add_to_lin_expr(result, self.variables[PROD][PY][clone_id][adjacency.stable_id_non_phased][get_aabb_for_ra(haplotype=haplotype)], mult=-1)
         nov_adj_edges_w_data = self.iag.nov_adjacency_edges(data=True, nbunch=node)
         nov_adjs = [data["object"] for _, __, data in nov_adj_edges_w_data]
         for adjacency in nov_adjs:
             self_loop = adjacency.is_self_loop_hapl
             if self_loop:
-                result.add(g.LinExpr(self.variables[PROD][PY][clone_id][adjacency.stable_id_non_phased][get_aabb_for_ra(haplotype=haplotype)]), mult=-2)
+                add_to_lin_expr(result, self.variables[PROD][PY][clone_id][adjacency.stable_id_non_phased][get_aabb_for_ra(haplotype=haplotype)], mult=-2)
             else:
-                result.add(g.LinExpr(self.variables[PROD][PY][clone_id][adjacency.stable_id_non_phased][get_aabb_for_ra(haplotype=haplotype)]), mult=-1)
-                result.add(g.LinExpr(self.variables[PROD][PY][clone_id][adjacency.stable_id_non_phased][get_abba_for_na_and_position(novel_adjacency=adjacency,
+                add_to_lin_expr(result, self.variables[PROD][PY][clone_id][adjacency.stable_id_non_phased][get_aabb_for_ra(haplotype=haplotype)], mult=-1)
+                add_to_lin_expr(result, self.variables[PROD][PY][clone_id][adjacency.stable_id_non_phased][get_abba_for_na_and_position(novel_adjacency=adjacency,
                                                                                                                                      position=node,
-                                                                                                                                     haplotype=haplotype)]), mult=-1)
+                                                                                                                                     haplotype=haplotype)], mult=-1)
         return result
 
     def define_constraints_on_deltas(self):
@@ -761,6 +1585,8 @@ class OptModelMultiClone(object):
                 ####
                 delta_var_a = self.variables[DELTA][clone_id][sid][Haplotype.A]
                 delta_var_b = self.variables[DELTA][clone_id][sid][Haplotype.B]
+                if is_fixed_value(delta_var_a) and is_fixed_value(delta_var_b):
+                    continue
                 s_a_lin_expr = g.LinExpr(s_cn_a_var - f_var * s_cn_a - (1 - f_var) * s_cn_b)
                 self.gm.addConstr(delta_var_a, g.GRB.GREATER_EQUAL, s_a_lin_expr, name="delta-u_{{{cid},{sid},{hap}}}".format(cid=str(clone_id),
                                                                                                                               sid=str(sid),
@@ -784,37 +1610,287 @@ class OptModelMultiClone(object):
                 length = getattr(segment, self.extra.get(SEGMENT_LENGTH_ATTRIBUTE, "length_100"))
                 delta_var_a = self.variables[DELTA][clone_id][sid][Haplotype.A]
                 delta_var_b = self.variables[DELTA][clone_id][sid][Haplotype.B]
-                lin_exp.add(g.LinExpr(delta_var_a + delta_var_b), mult=length)
+                add_to_lin_expr(lin_exp, delta_var_a, mult=length)
+                add_to_lin_expr(lin_exp, delta_var_b, mult=length)
         self.gm.setObjective(lin_exp, g.GRB.MINIMIZE)
 
-    def get_scnt_from_model(self):
-        # self.gm.update()
+    def get_variables_values(self, variables, all_values=None):
+        """
+        Obtains values for all given variables with a single attribute query (rather than accessing .X one variable at a time), which matters for large models.
+            If `all_values` (values for all model variables, in the model order; e.g., obtained in a callback) are supplied, values are taken from there.
+            Variables eliminated in presolve (i.e., stored as constants) get their fixed values.
+        """
+        result = np.zeros(len(variables), dtype=float)
+        model_positions = []
+        model_variables = []
+        for position, var in enumerate(variables):
+            if is_fixed_value(var):
+                result[position] = var
+            else:
+                model_positions.append(position)
+                model_variables.append(var)
+        if len(model_variables) == 0:
+            return result
+        if all_values is not None:
+            result[model_positions] = all_values[np.array([var.index for var in model_variables])]
+        else:
+            result[model_positions] = np.array(self.gm.getAttr("X", model_variables), dtype=float)
+        return result
+
+    def get_scnt_from_model(self, all_values=None):
+        haplotypes = [Haplotype.A, Haplotype.B]
+        variables = [self.variables[SEGMENT_COPY_NUMBER][clone_id][s.stable_id_non_hap][h] for clone_id in self.clone_ids for s in self.hapl_segments for h in haplotypes]
+        values = np.rint(self.get_variables_values(variables=variables, all_values=all_values)).astype(int).reshape((len(self.clone_ids), len(self.hapl_segments), len(haplotypes)))
         result = {}
-        for clone_id in self.clone_ids:
+        for clone_index, clone_id in enumerate(self.clone_ids):
             scnp = SegmentCopyNumberProfile()
             result[clone_id] = scnp
-            for s in self.hapl_segments:
-                sid = s.stable_id_non_hap
-                cn_a = int(round(self.variables[SEGMENT_COPY_NUMBER][clone_id][sid][Haplotype.A].X))
-                cn_b = int(round(self.variables[SEGMENT_COPY_NUMBER][clone_id][sid][Haplotype.B].X))
-                scnp.set_cn_record_for_segment(segment=s, cn=cn_a, haplotype=Haplotype.A)
-                scnp.set_cn_record_for_segment(segment=s, cn=cn_b, haplotype=Haplotype.B)
+            for segment_index, s in enumerate(self.hapl_segments):
+                for haplotype_index, h in enumerate(haplotypes):
+                    scnp.set_cn_record_for_segment(segment=s, cn=int(values[clone_index, segment_index, haplotype_index]), haplotype=h)
         return result
 
-    def get_acnt_from_model(self):
-        # self.gm.update()
+    def get_acnt_from_model(self, all_values=None):
+        phasings = [Phasing.AA, Phasing.AB, Phasing.BA, Phasing.BB]
+        variables = [self.variables[PROD][PY][clone_id][adj.stable_id_non_phased][ph] for clone_id in self.clone_ids for adj in self.hapl_adjacencies for ph in phasings]
+        values = np.rint(self.get_variables_values(variables=variables, all_values=all_values)).astype(int).reshape((len(self.clone_ids), len(self.hapl_adjacencies), len(phasings)))
         result = {}
-        for clone_id in self.clone_ids:
+        for clone_index, clone_id in enumerate(self.clone_ids):
             acnp = AdjacencyCopyNumberProfile()
             result[clone_id] = acnp
-            for adj in self.hapl_adjacencies:
-                aid = adj.stable_id_non_phased
-                for ph in [Phasing.AA, Phasing.AB, Phasing.BA, Phasing.BB]:
-                    cn = int(round(self.variables[PROD][PY][clone_id][aid][ph].X))
-                    acnp.set_cn_record_for_adjacency(adjacency=adj, cn=cn, phasing=ph)
+            for adjacency_index, adj in enumerate(self.hapl_adjacencies):
+                for phasing_index, ph in enumerate(phasings):
+                    acnp.set_cn_record_for_adjacency(adjacency=adj, cn=int(values[clone_index, adjacency_index, phasing_index]), phasing=ph)
         return result
 
+    def write_solution(self, file_name):
+        """
+        Writes "<variable name> <value>" line for every variable in the model with a single buffered write
+        """
+        variables = self.gm.getVars()
+        names = self.gm.getAttr("VarName", variables)
+        values = self.gm.getAttr("X", variables)
+        with open(file_name, "wt") as destination:
+            destination.write("".join("{name} {value}\n".format(name=name, value=value) for name, value in zip(names, values)))
+
     def alleles_sync_result(self, segment):
         sid = segment.stable_id_non_hap
         fid = self.hapl_segments_to_fragments[sid]
         return int(round(self.variables[FRAGMENT_ALLELE][fid].X))
+
+
+CHECKPOINT_SCNT_FILE = "rck.scnt.tsv"
+CHECKPOINT_ACNT_FILE = "rck.acnt.tsv"
+CHECKPOINT_METRICS_FILE = "rck.checkpoint.json"
+CHECKPOINT_KEYS_FILE = "rck.checkpoint.keys.json"
+CHECKPOINT_VALUES_FILE = "rck.checkpoint.values.npy"
+CHECKPOINT_CONTENT_KEY_FILE = "rck.checkpoint.key"
+
+
+def replace_file_atomically(file_name, write_function):
+    tmp_file_name = file_name + ".tmp"
+    write_function(tmp_file_name)
+    os.replace(tmp_file_name, file_name)
+
+
+def write_json_to_file(file_name, data, indent=None):
+    with open(file_name, "wt") as destination:
+        json.dump(data, destination, indent=indent)
+
+
+def write_array_to_file(file_name, array):
+    with open(file_name, "wb") as destination:
+        np.save(destination, array)
+
+
+class IncumbentCheckpointCallback(object):
+    """
+    Gurobi callback, that snapshots improved incumbent solutions into the `checkpoint_dir`:
+        inferred segment and adjacency copy number tensors (rck.scnt.tsv, rck.acnt.tsv), incumbent metrics (objective, bound, gap, runtime),
+        and values of all model variables (used with `read_checkpoint_starting_vars` as a MIP start when resuming).
+    The (optional) `content_key` of the model input and options is written (see `read_checkpoint_content_key`) once the first checkpoint is complete,
+        and the key of a previous checkpoint in the `checkpoint_dir` is removed before it is overwritten, so that a checkpoint is never attributed to a wrong model.
+    Values are read with a single `cbGetSolution` call over all model variables for every improved incumbent,
+        while writing is rate-limited to at most once every `min_interval` seconds (a skipped incumbent is written on a subsequent callback, once the interval has passed).
+    """
+
+    def __init__(self, ilp_model, checkpoint_dir, min_interval=300, logger=None, content_key=None):
+        self.ilp_model = ilp_model
+        self.checkpoint_dir = checkpoint_dir
+        self.content_key = content_key
+        self.min_interval = min_interval
+        self.logger = logger
+        self.ilp_model.gm.update()
+        self.model_vars = self.ilp_model.gm.getVars()
+        self.best_objective = None
+        self.pending = None
+        self.last_write_time = None
+        self.keys_written = False
+        self.written_cnt = 0
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+
+    def __call__(self, model, where):
+        if where == g.GRB.Callback.MIPSOL:
+            objective = model.cbGet(g.GRB.Callback.MIPSOL_OBJ)
+            if self.best_objective is not None and objective >= self.best_objective:
+                return
+            self.best_objective = objective
+            bound = model.cbGet(g.GRB.Callback.MIPSOL_OBJBND)
+            self.pending = {
+                "values": np.array(model.cbGetSolution(self.model_vars), dtype=float),
+                "metrics": {
+                    "objective": objective,
+                    "bound": bound,
+                    "gap": abs(objective - bound) / abs(objective) if objective != 0 else 0.0,
+                    "runtime": model.cbGet(g.GRB.Callback.RUNTIME),
+                }
+            }
+        if self.pending is None:
+            return
+        now = time.time()
+        if self.last_write_time is not None and now - self.last_write_time < self.min_interval:
+            return
+        self.write_checkpoint(values=self.pending["values"], metrics=self.pending["metrics"])
+        self.pending = None
+        self.last_write_time = now
+
+    def flush(self):
+        if self.pending is not None:
+            self.write_checkpoint(values=self.pending["values"], metrics=self.pending["metrics"])
+            self.pending = None
+
+    def write_checkpoint(self, values, metrics):
+        content_key_file = os.path.join(self.checkpoint_dir, CHECKPOINT_CONTENT_KEY_FILE)
+        if not self.keys_written:
+            if os.path.exists(content_key_file):
+                os.remove(content_key_file)
+            keys = [None] * len(self.model_vars)
+            for var_keys, var in iter_variables_with_keys(variables=self.ilp_model.variables):
+                keys[var.index] = [encode_variable_key(key) for key in var_keys]
+            replace_file_atomically(os.path.join(self.checkpoint_dir, CHECKPOINT_KEYS_FILE), lambda file_name: write_json_to_file(file_name=file_name, data=keys))
+            self.keys_written = True
+        scnt = self.ilp_model.get_scnt_from_model(all_values=values)
+        acnt = self.ilp_model.get_acnt_from_model(all_values=values)
+        replace_file_atomically(os.path.join(self.checkpoint_dir, CHECKPOINT_SCNT_FILE),
+                                lambda file_name: write_scnt_to_file(file_name=file_name, segments=self.ilp_model.hapl_segments, scnt=scnt, inplace=False))
+        replace_file_atomically(os.path.join(self.checkpoint_dir, CHECKPOINT_ACNT_FILE),
+                                lambda file_name: write_acnt_to_file(file_name=file_name, acnt=acnt, adjacencies=self.ilp_model.hapl_adjacencies, inplace=False))
+        replace_file_atomically(os.path.join(self.checkpoint_dir, CHECKPOINT_VALUES_FILE), lambda file_name: write_array_to_file(file_name=file_name, array=values))
+        self.written_cnt += 1
+        metrics = dict(metrics, checkpoint=self.written_cnt, time=time.time())
+        replace_file_atomically(os.path.join(self.checkpoint_dir, CHECKPOINT_METRICS_FILE), lambda file_name: write_json_to_file(file_name=file_name, data=metrics, indent=2))
+        if self.written_cnt == 1 and self.content_key is not None:
+            replace_file_atomically(content_key_file, lambda file_name: write_json_to_file(file_name=file_name, data=self.content_key))
+        if self.logger is not None:
+            self.logger.info("Checkpointed incumbent solution with objective {obj:0.4f} (gap {gap:0.4f}) to {dir}".format(obj=metrics["objective"], gap=metrics["gap"],
+                                                                                                                        dir=self.checkpoint_dir))
+
+
+class SolverProgressCallback(object):
+    """
+    Gurobi callback, that records the solving trajectory: a point (runtime, explored nodes, incumbent objective, best bound, and gap) for every improved incumbent,
+        and (at most once every `min_interval` seconds) for changes of the best bound during the branch-and-bound.
+    Every call is passed on to the (optional) wrapped `callback` (e.g., `IncumbentCheckpointCallback`).
+    """
+
+    def __init__(self, callback=None, min_interval=1.0):
+        self.callback = callback
+        self.min_interval = min_interval
+        self.trajectory = []
+        self.nodes = 0
+        self.last_point_runtime = None
+
+    def add_point(self, runtime, objective, bound):
+        if objective >= g.GRB.INFINITY:
+            gap = None
+        else:
+            gap = abs(objective - bound) / abs(objective) if objective != 0 else 0.0
+        self.trajectory.append({"runtime": runtime, "nodes": self.nodes, "objective": objective if gap is not None else None, "bound": bound, "gap": gap})
+        self.last_point_runtime = runtime
+
+    def __call__(self, model, where):
+        if where == g.GRB.Callback.MIPSOL:
+            self.nodes = model.cbGet(g.GRB.Callback.MIPSOL_NODCNT)
+            objective, best_objective = model.cbGet(g.GRB.Callback.MIPSOL_OBJ), model.cbGet(g.GRB.Callback.MIPSOL_OBJBST)
+            if objective <= best_objective:
+                self.add_point(runtime=model.cbGet(g.GRB.Callback.RUNTIME), objective=objective, bound=model.cbGet(g.GRB.Callback.MIPSOL_OBJBND))
+        elif where == g.GRB.Callback.MIP:
+            self.nodes = model.cbGet(g.GRB.Callback.MIP_NODCNT)
+            runtime = model.cbGet(g.GRB.Callback.RUNTIME)
+            bound = model.cbGet(g.GRB.Callback.MIP_OBJBND)
+            if (self.last_point_runtime is None or runtime - self.last_point_runtime >= self.min_interval) and \
+                    (len(self.trajectory) == 0 or self.trajectory[-1]["bound"] != bound):
+                self.add_point(runtime=runtime, objective=model.cbGet(g.GRB.Callback.MIP_OBJBST), bound=bound)
+        if self.callback is not None:
+            self.callback(model, where)
+
+
+SOLVER_STATISTICS_ATTRIBUTES = ["Status", "SolCount", "Runtime", "NodeCount", "IterCount", "ObjVal", "ObjBound", "MIPGap", "NumVars", "NumIntVars", "NumConstrs",
+                                "NumGenConstrs", "NumNZs"]
+
+
+def get_solver_statistics(gm, progress_callback=None):
+    """
+    Statistics of the solved Gurobi model (attributes, that are not available, e.g., objective value when no solution was found, are set to None),
+        with the solving trajectory, if the `progress_callback` (`SolverProgressCallback`) was used.
+    """
+    result = {}
+    for attribute in SOLVER_STATISTICS_ATTRIBUTES:
+        try:
+            result[attribute] = gm.getAttr(attribute)
+        except (AttributeError, g.GurobiError):
+            result[attribute] = None
+    if progress_callback is not None:
+        result["trajectory"] = progress_callback.trajectory
+    return result
+
+
+def checkpoint_exists(checkpoint_dir):
+    return os.path.exists(os.path.join(checkpoint_dir, CHECKPOINT_KEYS_FILE)) and os.path.exists(os.path.join(checkpoint_dir, CHECKPOINT_VALUES_FILE))
+
+
+def read_checkpoint_content_key(checkpoint_dir):
+    """
+    Content key of the model input and options, that the checkpoint in the `checkpoint_dir` was written for (None, if it was not recorded)
+    """
+    try:
+        with open(os.path.join(checkpoint_dir, CHECKPOINT_CONTENT_KEY_FILE), "rt") as source:
+            return json.load(source)
+    except (IOError, ValueError):
+        return None
+
+
+def read_checkpoint_starting_vars(checkpoint_dir):
+    """
+    Reads variables values stored by the `IncumbentCheckpointCallback` into a nested dict, that can be used as `starting_vars` for the `OptModelMultiClone`
+    """
+    with open(os.path.join(checkpoint_dir, CHECKPOINT_KEYS_FILE), "rt") as source:
+        keys = json.load(source)
+    with open(os.path.join(checkpoint_dir, CHECKPOINT_VALUES_FILE), "rb") as source:
+        values = np.load(source)
+    if len(keys) != len(values):
+        raise ValueError("Checkpoint in {dir} is inconsistent: {keys_cnt} variables keys, but {values_cnt} values".format(dir=checkpoint_dir, keys_cnt=len(keys),
+                                                                                                                       values_cnt=len(values)))
+    result = {}
+    for encoded_keys, value in zip(keys, values):
+        if encoded_keys is None:
+            continue
+        set_nested_value(target=result, keys=[decode_variable_key(key) for key in encoded_keys], value=float(value))
+    return result
+
+
+def write_starting_vars_to_file(file_name, starting_vars):
+    """
+    Writes a nested dict of variables values (e.g., merged per-chromosome presolve results) as a JSON list of (encoded keys, value) pairs
+    """
+    entries = [[[encode_variable_key(key) for key in var_keys], value] for var_keys, value in iter_nested_leaves_with_keys(starting_vars) if value is not None]
+    replace_file_atomically(file_name, lambda tmp_file_name: write_json_to_file(file_name=tmp_file_name, data=entries))
+
+
+def read_starting_vars_from_file(file_name):
+    with open(file_name, "rt") as source:
+        entries = json.load(source)
+    result = {}
+    for encoded_keys, value in entries:
+        set_nested_value(target=result, keys=[decode_variable_key(key) for key in encoded_keys], value=value)
+    return result
@@ -0,0 +1,170 @@
+import contextlib
+import hashlib
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+STAGES_MANIFEST_FILE = "stages.json"
+
+
+def get_content_key(input_files, options, salt="", upstream_keys=None):
+    """
+    Content-based key: hash of the `salt`, keys of upstream stages, the input files content (missing files only contribute their names), and the (JSON-serialized) options.
+    """
+    result = hashlib.sha256()
+    result.update(salt.encode("utf-8"))
+    for key in (upstream_keys if upstream_keys is not None else []):
+        result.update(key.encode("utf-8"))
+    for file_path in input_files:
+        result.update(os.path.basename(file_path).encode("utf-8"))
+        if not os.path.exists(file_path):
+            continue
+        with open(file_path, "rb") as source:
+            for chunk in iter(lambda: source.read(1 << 20), b""):
+                result.update(chunk)
+    result.update(json.dumps(options, sort_keys=True, default=str).encode("utf-8"))
+    return result.hexdigest()
+
+
+def read_stages_manifest(workdir):
+    manifest_file = os.path.join(workdir, STAGES_MANIFEST_FILE)
+    if not os.path.exists(manifest_file):
+        return {}
+    try:
+        with open(manifest_file, "rt") as source:
+            return json.load(source)
+    except ValueError:
+        return {}
+
+
+def stage_is_fresh(workdir, stage, key):
+    """
+    A stage is fresh, if it was recorded (see `record_stage`) with the same key, and all its recorded outputs still exist.
+    """
+    record = read_stages_manifest(workdir=workdir).get(stage)
+    if record is None or record.get("key") != key:
+        return False
+    return all(os.path.exists(os.path.join(workdir, output)) for output in record.get("outputs", []))
+
+
+def record_stage(workdir, stage, key, outputs):
+    """
+    Records the completed `stage` (with its key and outputs, relative to the `workdir`) in the workdir stages manifest, which is replaced atomically.
+    """
+    manifest = read_stages_manifest(workdir=workdir)
+    manifest[stage] = {
+        "key": key,
+        "outputs": [os.path.relpath(output, workdir) for output in outputs],
+        "time": time.time(),
+    }
+    manifest_file = os.path.join(workdir, STAGES_MANIFEST_FILE)
+    tmp_manifest_file = manifest_file + ".tmp"
+    with open(tmp_manifest_file, "wt") as destination:
+        json.dump(manifest, destination, indent=2, sort_keys=True)
+    os.replace(tmp_manifest_file, manifest_file)
+
+
+PROFILE_FILE = "profile.json"
+
+
+def get_max_rss_mb(who=None):
+    """
+    Peak resident set size (in MB) of the current process (or, with `who="children"`, of its terminated and waited for children), None if not available on the platform.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if who == "children" else resource.RUSAGE_SELF)
+    # ru_maxrss is in kilobytes on Linux, and in bytes on macOS
+    return usage.ru_maxrss / (1024.0 * 1024.0 if sys.platform == "darwin" else 1024.0)
+
+
+class StageProfiler(object):
+    """
+    Records wall and CPU time, and memory usage of named stages (see `stage`), and writes them (along with arbitrary `extra` data, e.g., solver statistics)
+        into the `workdir/profile.json`, that is replaced atomically after every stage (so it is up to date even if the run is aborted).
+    Peak resident set size is the peak of the process so far (it can only be attributed to a stage, in which it increased).
+        With `trace_python_memory` the peak memory allocated by Python objects within every stage is traced with `tracemalloc` (it slows down the Python code).
+    """
+
+    def __init__(self, workdir, trace_python_memory=False, logger=None):
+        self.workdir = workdir
+        self.trace_python_memory = trace_python_memory
+        self.logger = logger
+        self.stages = []
+        self.extra = {}
+        self.start_time = time.time()
+        self.start_perf_counter = time.perf_counter()
+        self.start_process_time = time.process_time()
+        if self.trace_python_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextlib.contextmanager
+    def stage(self, name, **notes):
+        record = {"name": name, "status": "running"}
+        record.update(notes)
+        self.stages.append(record)
+        start_perf_counter, start_process_time = time.perf_counter(), time.process_time()
+        start_max_rss_mb = get_max_rss_mb()
+        if self.trace_python_memory and hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        try:
+            yield record
+            record["status"] = "finished"
+        except SystemExit as e:
+            record["status"] = "finished" if e.code in (None, 0) else "exited"
+            raise
+        except BaseException:
+            record["status"] = "failed"
+            raise
+        finally:
+            record["wall_time"] = time.perf_counter() - start_perf_counter
+            record["cpu_time"] = time.process_time() - start_process_time
+            record["max_rss_mb"] = get_max_rss_mb()
+            if record["max_rss_mb"] is not None and start_max_rss_mb is not None:
+                record["max_rss_increase_mb"] = record["max_rss_mb"] - start_max_rss_mb
+            if self.trace_python_memory:
+                record["python_peak_mb"] = tracemalloc.get_traced_memory()[1] / (1024.0 * 1024.0)
+            self.write()
+
+    def get_profile(self):
+        return {
+            "start_time": self.start_time,
+            "wall_time": time.perf_counter() - self.start_perf_counter,
+            "cpu_time": time.process_time() - self.start_process_time,
+            "max_rss_mb": get_max_rss_mb(),
+            "children_max_rss_mb": get_max_rss_mb(who="children"),
+            "stages": self.stages,
+            "extra": self.extra,
+        }
+
+    def write(self):
+        profile_file = os.path.join(self.workdir, PROFILE_FILE)
+        tmp_profile_file = profile_file + ".tmp"
+        with open(tmp_profile_file, "wt") as destination:
+            json.dump(self.get_profile(), destination, indent=2, default=str)
+        os.replace(tmp_profile_file, profile_file)
+
+    def get_summary_lines(self):
+        profile = self.get_profile()
+        rows = [("stage", "status", "wall (s)", "cpu (s)", "max rss (MB)")]
+        for record in profile["stages"]:
+            rows.append((record["name"], record["status"], "{:0.2f}".format(record["wall_time"]), "{:0.2f}".format(record["cpu_time"]),
+                         "n/a" if record["max_rss_mb"] is None else "{:0.1f}".format(record["max_rss_mb"])))
+        rows.append(("total", "", "{:0.2f}".format(profile["wall_time"]), "{:0.2f}".format(profile["cpu_time"]),
+                     "n/a" if profile["max_rss_mb"] is None else "{:0.1f}".format(profile["max_rss_mb"])))
+        widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+        return ["  ".join(value.ljust(width) if i < 2 else value.rjust(width) for i, (value, width) in enumerate(zip(row, widths))) for row in rows]
+
+    def finish(self):
+        """
+        Writes the final profile, and (if a `logger` was supplied) logs the stages summary table.
+        """
+        self.write()
+        if self.logger is not None:
+            self.logger.info("Stages profile (stored in {file}):".format(file=os.path.join(self.workdir, PROFILE_FILE)))
+            for line in self.get_summary_lines():
+                self.logger.info(line)
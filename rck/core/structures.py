@@ -833,6 +833,15 @@ class SegmentCopyNumberBoundaries(object):
     def __init__(self):
         self._records = defaultdict(lambda: defaultdict(dict))
 
+    def __getstate__(self):
+        return {sid: {hap: dict(boundaries) for hap, boundaries in sid_records.items()} for sid, sid_records in self._records.items()}
+
+    def __setstate__(self, state):
+        self._records = defaultdict(lambda: defaultdict(dict))
+        for sid, sid_records in state.items():
+            for hap, boundaries in sid_records.items():
+                self._records[sid][hap].update(boundaries)
+
     def set_cnb_record(self, sid, hap, boundary_type, value):
         self._records[sid][hap][boundary_type] = value
 
@@ -979,6 +988,11 @@ class AdjacencyGroupType(Enum):
 
 
 class AdjacencyGroup(object):
+    """
+    Member adjacencies ids are stored as an immutable (ordered, as labeling groups align them with their labeling) tuple,
+        from which the set view (`adjacencies_ids_set`) is lazily derived (and reset, whenever the ids are reassigned).
+    """
+
     def __init__(self, gid, aids, group_type, adjacencies=None, extra=None):
         self.gid = gid
         self.adjacencies_ids = aids
@@ -986,6 +1000,21 @@ class AdjacencyGroup(object):
         self.adjacencies = adjacencies if adjacencies is not None else []
         self.extra = extra if extra is not None else {}
 
+    @property
+    def adjacencies_ids(self):
+        return self._adjacencies_ids
+
+    @adjacencies_ids.setter
+    def adjacencies_ids(self, aids):
+        self._adjacencies_ids = tuple(aids)
+        self._adjacencies_ids_set = None
+
+    @property
+    def adjacencies_ids_set(self):
+        if self._adjacencies_ids_set is None:
+            self._adjacencies_ids_set = frozenset(self._adjacencies_ids)
+        return self._adjacencies_ids_set
+
     @property
     def stable_id(self):
         return "{gid}:{g_type}:<{aids}>".format(gid=self.gid, g_type=str(self.group_type.value), aids=",".join(self.adjacencies_ids))
@@ -994,11 +1023,13 @@ class AdjacencyGroup(object):
         from rck.core.io import EXTERNAL_NA_ID
         if source_by_ids is None:
             source_by_ids = {adj.extra.get(EXTERNAL_NA_ID, adj.idx): adj for adj in source}
+        adjacencies = []
         for aid in self.adjacencies_ids:
             if aid not in source_by_ids:
                 raise ValueError("Trying to populate adjacencies in adjacency group {gid}, but adjacency {aid} (reference in the group) is missing from available adjacencies"
                                  "".format(gid=self.gid, aid=aid))
-            self.adjacencies.append(source_by_ids[aid])
+            adjacencies.append(source_by_ids[aid])
+        self.adjacencies = adjacencies
 
 
 def reverse_segment(segment, copy=True):
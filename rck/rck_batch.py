@@ -0,0 +1,340 @@
+import argparse
+import csv
+import json
+import math
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+import rck
+from rck.core.io import get_logging_cli_parser, get_standard_logger_from_args, get_full_path
+from rck.core.stages import PROFILE_FILE
+
+BATCH_MANIFEST_FILE = "batch.json"
+
+PENDING = "pending"
+ESTIMATING = "estimating"
+ESTIMATED = "estimated"
+SOLVING = "solving"
+DONE = "done"
+FAILED = "failed"
+
+ESTIMATE_PHASE = "estimate"
+SOLVE_PHASE = "solve"
+
+SAMPLE_COLUMN = "sample"
+SCNT_COLUMN = "scnt"
+ADJACENCIES_COLUMN = "adjacencies"
+ARGS_COLUMN = "args"
+
+RESERVED_RCK_ARGS = ["--workdir", "--scnt", "--adjacencies", "--run-g-threads", "--resume", "--dry-run", "--no-run"]
+
+
+def read_samples_from_file(file_name, separator="\t"):
+    """
+    Reads the samples manifest: a table (with a header) with the `sample` (unique sample id), `scnt`, and `adjacencies` (paths to the RCK input) columns,
+        and an optional `args` column (additional, shell-quoted, RCK arguments for the sample, e.g., `--scnb sample.scnb.tsv --clone-ids c1,c2`).
+    """
+    result = []
+    sample_ids = set()
+    with open(file_name, "rt") as source:
+        reader = csv.DictReader(source, delimiter=separator)
+        for column in [SAMPLE_COLUMN, SCNT_COLUMN, ADJACENCIES_COLUMN]:
+            if reader.fieldnames is None or column not in reader.fieldnames:
+                raise ValueError("Samples manifest {file} does not have a required column {column}".format(file=file_name, column=column))
+        for row in reader:
+            sample_id = row[SAMPLE_COLUMN].strip()
+            if len(sample_id) == 0 or sample_id.startswith("#"):
+                continue
+            if sample_id in sample_ids:
+                raise ValueError("Sample {sample} is present in the samples manifest {file} more than once".format(sample=sample_id, file=file_name))
+            sample_ids.add(sample_id)
+            sample_args = shlex.split(row.get(ARGS_COLUMN) or "")
+            check_rck_args(args=sample_args)
+            result.append({
+                "sample": sample_id,
+                "scnt": get_full_path(row[SCNT_COLUMN].strip()),
+                "adjacencies": get_full_path(row[ADJACENCIES_COLUMN].strip()),
+                "args": sample_args,
+            })
+    return result
+
+
+def check_rck_args(args):
+    for arg in args:
+        if arg.split("=")[0] in RESERVED_RCK_ARGS:
+            raise ValueError("RCK argument {arg} is set by the batch runner, and can not be specified explicitly".format(arg=arg))
+
+
+def read_batch_manifest(workdir):
+    manifest_file = os.path.join(workdir, BATCH_MANIFEST_FILE)
+    if not os.path.exists(manifest_file):
+        return {}
+    with open(manifest_file, "rt") as source:
+        return json.load(source)
+
+
+def write_batch_manifest(workdir, manifest):
+    manifest_file = os.path.join(workdir, BATCH_MANIFEST_FILE)
+    tmp_manifest_file = manifest_file + ".tmp"
+    with open(tmp_manifest_file, "wt") as destination:
+        json.dump(manifest, destination, indent=2)
+    os.replace(tmp_manifest_file, manifest_file)
+
+
+def get_batch_manifest(samples, workdir, rck_args, previous_manifest, retry_failed=False):
+    """
+    Per-sample records of the batch manifest. Records from the `previous_manifest` are kept, unless the sample RCK arguments have changed.
+        In the latter case the sample workdir is cleared, so that the new run does not resume from (e.g., use as a MIP start the incumbent checkpointed by) the previous one.
+        Samples, that were being processed when the previous batch run was aborted, are returned to the respective queue,
+        and failed samples are retried (from the failed phase) with `retry_failed`.
+    """
+    result = {}
+    for sample in samples:
+        sample_rck_args = ["--scnt", sample["scnt"], "--adjacencies", sample["adjacencies"]] + rck_args + sample["args"]
+        record = previous_manifest.get(sample["sample"])
+        if record is None or record["rck_args"] != sample_rck_args:
+            if record is not None and os.path.exists(record["workdir"]):
+                shutil.rmtree(record["workdir"])
+            record = {
+                "sample": sample["sample"],
+                "workdir": os.path.join(workdir, "samples", sample["sample"]),
+                "rck_args": sample_rck_args,
+                "status": PENDING,
+                "memory_mb": None,
+                "threads": None,
+                "attempts": {ESTIMATE_PHASE: 0, SOLVE_PHASE: 0},
+                "failed_phase": None,
+                "return_code": None,
+                "logs": {phase: os.path.join(workdir, "logs", "{sample}.{phase}.log".format(sample=sample["sample"], phase=phase))
+                         for phase in [ESTIMATE_PHASE, SOLVE_PHASE]},
+                "outputs": None,
+                "start_time": None,
+                "end_time": None,
+            }
+        if record["status"] == ESTIMATING:
+            record["status"] = PENDING
+        elif record["status"] == SOLVING:
+            record["status"] = ESTIMATED
+        elif record["status"] == FAILED and retry_failed:
+            record["status"] = PENDING if record["failed_phase"] == ESTIMATE_PHASE else ESTIMATED
+        result[sample["sample"]] = record
+    return result
+
+
+def get_total_memory_mb():
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / (1024.0 * 1024.0)
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+class BatchScheduler(object):
+    """
+    Runs RCK for every sample of the batch `manifest` in two phases, with every phase being a separate `rck` process:
+        * estimate: reading and preprocessing of the input (recorded as a completed `rck` stage in the sample workdir), and the ILP model size estimation (`rck --dry-run`);
+        * solve: `rck --resume` (so the preprocessing is not repeated, and a previously checkpointed incumbent is used as a MIP start), with the assigned number of solver threads.
+    Processes are started as long as they fit into the available resources: `cores` (solver threads for the solve phase, 1 for the estimate phase),
+        `memory_mb` (estimated model size plus the memory used for preprocessing, for the solve phase; `estimate_memory_mb` for the estimate phase),
+        and `solver_seats` (concurrent solves, e.g., as limited by the solver license; estimates do not take a seat, as the dry run does not create a Gurobi model).
+    Solves are prioritized over estimates, and larger (by memory) solves are started first. A process, that does not fit into the resources at all, is started alone.
+    When there are no more samples to estimate, free cores are spread across the started solves (up to `max_solve_threads` each).
+    The manifest is written (atomically) to the batch `workdir` on every status change, so an aborted batch run can be resumed.
+    """
+
+    def __init__(self, manifest, workdir, cores, memory_mb, solver_seats, solve_threads, max_solve_threads, estimate_memory_mb, poll_interval=5, logger=None):
+        self.manifest = manifest
+        self.workdir = workdir
+        self.cores = cores
+        self.memory_mb = memory_mb
+        self.solver_seats = solver_seats
+        self.solve_threads = solve_threads
+        self.max_solve_threads = max(max_solve_threads, solve_threads)
+        self.estimate_memory_mb = estimate_memory_mb
+        self.poll_interval = poll_interval
+        self.logger = logger
+        self.running = {}
+
+    def log(self, message):
+        if self.logger is not None:
+            self.logger.info(message)
+
+    def write_manifest(self):
+        write_batch_manifest(workdir=self.workdir, manifest=self.manifest)
+
+    def get_used_resources(self):
+        cores, memory_mb, seats = 0, 0, 0
+        for job in self.running.values():
+            cores += job["cores"]
+            memory_mb += job["memory_mb"]
+            seats += job["seats"]
+        return cores, memory_mb, seats
+
+    def fits(self, cores, memory_mb, seats):
+        if len(self.running) == 0:
+            return True
+        used_cores, used_memory_mb, used_seats = self.get_used_resources()
+        if used_cores + cores > self.cores or used_seats + seats > self.solver_seats:
+            return False
+        return self.memory_mb is None or used_memory_mb + memory_mb <= self.memory_mb
+
+    def get_solve_threads(self, ready_cnt, pending_cnt):
+        used_cores, _, _ = self.get_used_resources()
+        free_cores = self.cores - used_cores
+        threads = self.solve_threads
+        if pending_cnt == 0:
+            threads = max(threads, min(self.max_solve_threads, free_cores // max(1, min(ready_cnt, self.solver_seats))))
+        return max(1, min(threads, self.cores))
+
+    def start(self, record, phase, cores, memory_mb, seats):
+        os.makedirs(record["workdir"], exist_ok=True)
+        os.makedirs(os.path.dirname(record["logs"][phase]), exist_ok=True)
+        command = [sys.executable, "-m", "rck.rck_run", "--workdir", record["workdir"]] + record["rck_args"]
+        if phase == ESTIMATE_PHASE:
+            command += ["--dry-run"]
+            stdout = open(os.path.join(record["workdir"], "estimate.json"), "wt")
+        else:
+            command += ["--resume", "--run-g-threads", str(cores)]
+            stdout = None
+        log = open(record["logs"][phase], "at")
+        process = subprocess.Popen(command, stdout=stdout if stdout is not None else log, stderr=log)
+        self.running[record["sample"]] = {"process": process, "phase": phase, "cores": cores, "memory_mb": memory_mb, "seats": seats, "files": [log, stdout]}
+        record["status"] = ESTIMATING if phase == ESTIMATE_PHASE else SOLVING
+        record["attempts"][phase] += 1
+        if phase == SOLVE_PHASE:
+            record["threads"] = cores
+        if record["start_time"] is None:
+            record["start_time"] = time.time()
+        self.write_manifest()
+        self.log("Started {phase} for sample {sample} ({cores} cores, {memory:0.0f} MB), log is stored in {log}".format(phase=phase, sample=record["sample"], cores=cores,
+                                                                                                                         memory=memory_mb, log=record["logs"][phase]))
+
+    def get_memory_estimate_mb(self, record):
+        with open(os.path.join(record["workdir"], "estimate.json"), "rt") as source:
+            model_size = json.load(source)
+        preprocessing_memory_mb = 0
+        profile_file = os.path.join(record["workdir"], PROFILE_FILE)
+        if os.path.exists(profile_file):
+            with open(profile_file, "rt") as source:
+                preprocessing_memory_mb = json.load(source).get("max_rss_mb") or 0
+        return int(math.ceil(model_size["memory_mb"] + preprocessing_memory_mb))
+
+    def finish(self, sample_id, return_code):
+        job = self.running.pop(sample_id)
+        for file in job["files"]:
+            if file is not None:
+                file.close()
+        record = self.manifest[sample_id]
+        record["return_code"] = return_code
+        phase = job["phase"]
+        if return_code == 0 and phase == ESTIMATE_PHASE:
+            try:
+                record["memory_mb"] = self.get_memory_estimate_mb(record=record)
+                record["status"] = ESTIMATED
+            except (OSError, ValueError, KeyError):
+                return_code = None
+        elif return_code == 0:
+            record["status"] = DONE
+            record["outputs"] = os.path.join(record["workdir"], "output")
+            record["end_time"] = time.time()
+        if return_code != 0:
+            record["status"] = FAILED
+            record["failed_phase"] = phase
+            record["end_time"] = time.time()
+            if self.logger is not None:
+                self.logger.error("Sample {sample} failed during {phase} (return code {code}), see {log}".format(sample=sample_id, phase=phase, code=record["return_code"],
+                                                                                                              log=record["logs"][phase]))
+        else:
+            self.log("Finished {phase} for sample {sample}".format(phase=phase, sample=sample_id))
+        self.write_manifest()
+
+    def schedule(self):
+        pending = [record for record in self.manifest.values() if record["status"] == PENDING and record["sample"] not in self.running]
+        ready = [record for record in self.manifest.values() if record["status"] == ESTIMATED and record["sample"] not in self.running]
+        for record in sorted(ready, key=lambda r: -r["memory_mb"]):
+            threads = self.get_solve_threads(ready_cnt=len(ready), pending_cnt=len(pending))
+            if self.fits(cores=threads, memory_mb=record["memory_mb"], seats=1):
+                self.start(record=record, phase=SOLVE_PHASE, cores=threads, memory_mb=record["memory_mb"], seats=1)
+                ready.remove(record)
+        for record in pending:
+            if not self.fits(cores=1, memory_mb=self.estimate_memory_mb, seats=0):
+                break
+            self.start(record=record, phase=ESTIMATE_PHASE, cores=1, memory_mb=self.estimate_memory_mb, seats=0)
+        return len(pending) + len(ready) > 0
+
+    def run(self):
+        self.write_manifest()
+        try:
+            while True:
+                for sample_id, job in list(self.running.items()):
+                    return_code = job["process"].poll()
+                    if return_code is not None:
+                        self.finish(sample_id=sample_id, return_code=return_code)
+                queued = self.schedule()
+                if not queued and len(self.running) == 0:
+                    break
+                time.sleep(self.poll_interval)
+        except KeyboardInterrupt:
+            self.log("Interrupted. Terminating {cnt} running RCK processes; the batch can be resumed by re-running the same command".format(cnt=len(self.running)))
+            for job in self.running.values():
+                job["process"].terminate()
+            for job in self.running.values():
+                job["process"].wait()
+            raise
+        return self.manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="RCK-batch", parents=[get_logging_cli_parser()],
+                                     description="Runs RCK on multiple samples, sharing cores, memory and solver seats. "
+                                                 "Unrecognized arguments are passed to every RCK run.")
+    parser.add_argument('--version', action='version', version=rck.version)
+    parser.add_argument("--samples", required=True)
+    parser.add_argument("--samples-separator", default="\t")
+    parser.add_argument("--workdir", default="RCK-batch")
+    parser.add_argument("--cores", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--memory", type=int, default=None, help="Memory (in MB) available for RCK runs. Default is the total physical memory.")
+    parser.add_argument("--solver-seats", type=int, default=1)
+    parser.add_argument("--solve-threads", type=int, default=4)
+    parser.add_argument("--max-solve-threads", type=int, default=16)
+    parser.add_argument("--estimate-memory", type=int, default=2000)
+    parser.add_argument("--poll-interval", type=float, default=5)
+    parser.add_argument("--retry-failed", action="store_true", dest="retry_failed")
+    args, rck_args = parser.parse_known_args()
+    try:
+        check_rck_args(args=rck_args)
+    except ValueError as e:
+        parser.error(str(e))
+    logger = get_standard_logger_from_args(args=args, program_name="RCK-batch")
+
+    workdir_path = get_full_path(path=args.workdir)
+    os.makedirs(workdir_path, exist_ok=True)
+    logger.info("Reading samples from {file}".format(file=args.samples))
+    samples = read_samples_from_file(file_name=get_full_path(args.samples), separator=args.samples_separator)
+    manifest = get_batch_manifest(samples=samples, workdir=workdir_path, rck_args=rck_args, previous_manifest=read_batch_manifest(workdir=workdir_path),
+                                  retry_failed=args.retry_failed)
+    done_cnt = sum(record["status"] == DONE for record in manifest.values())
+    if done_cnt > 0:
+        logger.info("{cnt} out of {total} samples were already processed in {dir}".format(cnt=done_cnt, total=len(manifest), dir=workdir_path))
+    memory_mb = args.memory if args.memory is not None else get_total_memory_mb()
+    logger.info("Running RCK on {cnt} samples with {cores} cores, {memory} MB of memory, and {seats} solver seats"
+                "".format(cnt=len(manifest), cores=args.cores, memory="unknown" if memory_mb is None else int(memory_mb), seats=args.solver_seats))
+    scheduler = BatchScheduler(manifest=manifest, workdir=workdir_path, cores=args.cores, memory_mb=memory_mb, solver_seats=args.solver_seats,
+                               solve_threads=args.solve_threads, max_solve_threads=args.max_solve_threads, estimate_memory_mb=args.estimate_memory,
+                               poll_interval=args.poll_interval, logger=logger)
+    manifest = scheduler.run()
+    failed = sorted(sample_id for sample_id, record in manifest.items() if record["status"] == FAILED)
+    logger.info("Finished. {done} samples were processed, {failed} failed. Batch manifest is stored in {file}"
+                "".format(done=sum(record["status"] == DONE for record in manifest.values()), failed=len(failed), file=os.path.join(workdir_path, BATCH_MANIFEST_FILE)))
+    if len(failed) > 0:
+        logger.error("Failed samples: {samples}".format(samples=",".join(failed)))
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
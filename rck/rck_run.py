@@ -1,5 +1,7 @@
 import argparse
 import datetime
+import itertools
+import json
 import logging
 import os
 import re
@@ -8,6 +10,8 @@ import sys
 from collections import defaultdict
 from copy import deepcopy
 
+import numpy as np
+
 sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
 
 import rck
@@ -22,148 +26,107 @@ from rck.core.io import read_adjacencies_from_file, write_acnt_to_file, get_logg
 from rck.core.process import positions_aligned, adj_groups_concur
 from rck.core.structures import get_segments_for_fragments_ids_dict, get_ref_telomeres_from_segments, get_ref_adjacencies_from_segments, SegmentCopyNumberBoundaries, refined_scnt, \
     refined_scnb, refined_scnt_with_adjacencies_and_telomeres, extract_spanned_extremities, SCNBoundariesStrategies, LengthSpreadRelationships, AdjacencyType, AdjacencyGroupType, \
-    Phasing, Haplotype, CNBoundaries, AdjacencyCopyNumberProfile, SegmentCopyNumberProfile, Segment
-from rck.core.graph import construct_hiag_inflate_from_haploid_data, IntervalAdjacencyGraph
-from rck.utils.karyotype.analysis import adjacency_groups_labeling_violations
-
-
-def main():
-    parser = argparse.ArgumentParser(parents=[get_logging_cli_parser()])
-    parser.add_argument('--version', action='version', version=rck.version)
-
-    parser.add_argument("--scnt", required=True)
-    parser.add_argument("--scnt-separator", default="\t")
-    parser.add_argument("--scnt-extra-separator", default=";")
-
-    parser.add_argument("--adjacencies", required=True)
-    parser.add_argument("--adjacencies-separator", default="\t")
-    parser.add_argument("--adjacencies-extra-separator", default=";")
-
-    parser.add_argument("--workdir", default=None)
-
-    parser.add_argument("--clone-ids", default=None)
-
-    parser.add_argument("--scnb", default=None)
-    parser.add_argument("--scnb-separator", default="\t")
-    parser.add_argument("--scnb-extra-separator", default=";")
-
-    parser.add_argument("--telomere-segments", default=None)
-    parser.add_argument("--telomere-segments-separator", default="\t")
-    parser.add_argument("--telomere-segments-extra-separator", default=";")
-
-    parser.add_argument("--telomere-positions", default=None)
-    parser.add_argument("--telomere-positions-separator", default="\t")
-    parser.add_argument("--telomere-positions-no-reciprocal", action="store_false", dest="telomere_reciprocal")
-
-    parser.add_argument("--adjacency-groups", default=None)
-    parser.add_argument("--adjacency-group-separator", default="\t")
-    parser.add_argument("--adjacency-group-extra-separator", default=";")
-
-    parser.add_argument("--fragments", default=None)
-    parser.add_argument("--fragments-separator", default="\t")
-    parser.add_argument("--fragments-extra-separator", default=";")
-
-    # parser.add_argument("--trees", default=None)
-    parser.add_argument("--no-allow-unit-segments", action="store_false", dest="allow_unit_segments")
-    ###
-    pre_group = parser.add_argument_group()
-    pre_group.add_argument("--no-pre", action="store_false", dest="do_preprocess")
-    ##
-    # Arguments for Segment Copy Number Tensor preprocessing
-    ##
-    pre_group.add_argument("--pre-no-scnt", action="store_false", dest="do_pre_scnt")
-    pre_group.add_argument("--pre-scnt-no-merge-fragments", action="store_false", dest="pre_scnt_merge_fragments")
-    pre_group.add_argument("--pre-scnt-max-merge-gap", type=int, default=1000000000)
-    pre_group.add_argument("--pre-scnt-no-fill-gaps", action="store_false", dest="pre_scnt_fill_gaps")
-    pre_group.add_argument("--pre-scnt-max-fill-gap", type=int, default=1000000000)
-    ##
-    # Arguments for Segment Copy Number Boundaries
-    ##
-    pre_group.add_argument("--pre-scnb", action="store_true", dest="do_pre_bnd")
-    pre_group.add_argument("--pre-scnb-strategy", choices=[strategy.value for strategy in SCNBoundariesStrategies], type=SCNBoundariesStrategies.from_string,
-                           default=SCNBoundariesStrategies.UNIFORM_MIN_MAX.value)
-    pre_group.add_argument("--pre-scnb-uniform-spread-size", type=int, default=1)
-    pre_group.add_argument("--pre-scnb-length-spread-relation", choices=[rel.value for rel in LengthSpreadRelationships], type=LengthSpreadRelationships.from_string,
-                           default=LengthSpreadRelationships.DUMMY.value)
-    pre_group.add_argument("--pre-scnb-uniform-min", type=int, default=0)
-    pre_group.add_argument("--pre-scnb-uniform-max", type=int, default=10)
-    pre_group.add_argument("--pre-scnb-min-allow-zero-for-positive", type=int, default=-1)
-    pre_group.add_argument("--pre-scnb-max-allow-zero-for-positive", type=int, default=1000000000)
-    pre_group.add_argument("--pre-scnb-min-allow-positive-for-zero", type=int, default=-1)
-    pre_group.add_argument("--pre-scnb-max-allow-positive-for-zero", type=int, default=1000000000)
-    pre_group.add_argument("--pre-scnb-is-male", action="store_false", dest="pre_scnb_is_female")
-    ##
-    # Arguments for adjacencies
-    ##
-    pre_group.add_argument("--pre-no-adj", action="store_false", dest="do_pre_adj")
-    pre_group.add_argument("--pre-adj-no-reciprocal", action="store_false", dest="pre_adj_reciprocal")
-    pre_group.add_argument("--pre-adj-reciprocal-include-ref", action="store_true", dest="pre_adj_reciprocal_include_ref")
-    pre_group.add_argument("--pre-adj-reciprocal-max-distance", type=int, default=50)
-    ###
-    pre_group.add_argument("--pre-no-adg", action="store_false", dest="do_pre_adg")
-    pre_group.add_argument("--pre-adg-sl-max-size", type=int, default=50000000)
-    pre_group.add_argument("--pre-adg-sl-allow-intermediate-same", action="store_true", dest="pre_adg_sl_allow_intermediate_same")
-    pre_group.add_argument("--pre-adg-sl-allow-intermediate-tra", action="store_true", dest="pre_adg_sl_allow_intermediate_tra")
-    pre_group.add_argument("--pre-adg-sl-no-inv-signatures", action="store_false", dest="pre_adg_sl_allow_inv_signature")
-    pre_group.add_argument("--pre-adg-sl-no-refine", action="store_false", dest="pre_adg_sl_refine")
-    pre_group.add_argument("--pre-adg-sl-fp", type=float, default=1)
-    pre_group.add_argument("--pre-adg-sl-gid-suffix", dest="pre_adg_sl_gid_suffix", default="rck-run-sL")
-    ###
-    run_group = parser.add_argument_group()
-    run_group.add_argument("--no-run", action="store_false", dest="do_run")
-    run_group.add_argument("--run-haploid", action="store_true", dest="run_haploid")
-    run_group.add_argument("--run-presolve-nas-threshold", type=int, default=5000)
-    run_group.add_argument("--run-g-mip-gap", type=float, default=0.015)
-    run_group.add_argument("--run-g-time-limit", type=int, default=28800)
-    run_group.add_argument("--run-g-threads", type=int, default=4)
-    run_group.add_argument("--run-g-mip-focus", type=int, choices=[0, 1, 2, 3], default=0)
-    run_group.add_argument("--run-nas-fp", type=float, default=0.1)
-    run_group.add_argument("--run-group-m-default-fp", type=float, default=0.1)
-    run_group.add_argument("--run-group-n-default-fp", type=float, default=0.1)
-    run_group.add_argument("--run-segment-length-attr", choices=["length", "length_10", "length_100", "length_1000"], default="length_10")
-    run_group.add_argument("--run-g-allow-interrupted", action="store_true")
-    ###
-    output_group = parser.add_argument_group()
-    output_group.add_argument("--o-prefix-name", type=str, dest="out_prefix_name", default="")
-    output_group.add_argument("--o-scnt-separator", default="\t")
-    output_group.add_argument("--o-scnt-extra-separator", default=";")
-    output_group.add_argument("--o-acnt-separator", default="\t")
-    output_group.add_argument("--o-acnt-extra-separator", default=";")
-    output_group.add_argument("--o-acnt-mix-novel-and-reference", action="store_true", )
-    ###
-    post_group = parser.add_argument_group()
-    post_group.add_argument("--post-check-all", action="store_true", dest="post_check_all")
-    post_group.add_argument("--post-check-scnb", action="store_true", dest="post_check_scnb")
-    post_group.add_argument("--post-check-labeling", action="store_true", dest="post_check_labeling")
-    post_group.add_argument("--post-check-balancing", action="store_true", dest="post_check_balancing")
-    post_group.add_argument("--post-check-adj-groups", action="store_true", dest="post_check_adj_groups")
-    post_group.add_argument("--post-check-adj-groups-m", action="store_true", dest="post_check_adj_groups_m")
-    post_group.add_argument("--post-check-adj-groups-n", action="store_true", dest="post_check_adj_groups_n")
-    post_group.add_argument("--post-check-adj-groups-l", action="store_true", dest="post_check_adj_groups_l")
-    post_group.add_argument("--post-check-nas-fp", action="store_true", dest="post_check_nas_fp")
-    ###
-    args = parser.parse_args()
-
-    from rck.core.ilp_gurobi import OptModelMultiClone, DEFAULT_GROUP_M_FP, SEGMENT_LENGTH_ATTRIBUTE, DEFAULT_GROUP_N_FP, merge_variables_from_presolve
+    Phasing, CNBoundaries, AdjacencyCopyNumberProfile, SegmentCopyNumberProfile, Segment
+from rck.core.graph import construct_hiag_inflate_from_haploid_data, IntervalAdjacencyGraph, CopyNumberIncidence
+from rck.core.heuristic import get_min_cost_flow_cn_profiles
+from rck.core.stages import get_content_key, stage_is_fresh, record_stage, StageProfiler
+from rck.utils.karyotype.analysis import adjacency_groups_labeling_violations, adjacency_groups_molecule_inferred_fps, adjacency_groups_general_inferred_fps, \
+    adjacencies_presence, get_acnt_array, get_scnp_array, get_scnbp_array, scnb_violations_mask, PHASINGS_INDEXES
+from rck.utils.scn.process import get_haploid_scnt
+
+PREPROCESSED_SCNT_FILE = "rck.scnt.tsv"
+PREPROCESSED_SCNB_FILE = "rck.scnb.tsv"
+PREPROCESSED_ADJACENCIES_FILE = "rck.adj.tsv"
+PREPROCESSED_FRAGMENTS_FILE = "rck.frag.tsv"
+PREPROCESSED_ADJACENCY_GROUPS_FILE = "rck.ag.tsv"
+PREPROCESSED_TELOMERES_FILE = "rck.pos.tsv"
+
+PREPROCESS_STAGE = "preprocess"
+PRESOLVE_STAGE = "presolve"
+PREPROCESS_STAGE_INPUT_ARGS = ["scnt", "scnb", "adjacencies", "telomere_segments", "telomere_positions", "adjacency_groups", "fragments"]
+PREPROCESS_STAGE_OPTIONS_PREFIXES = ("pre_", "do_pre", "scnt_", "scnb_", "adjacencies_", "telomere_", "adjacency_group_", "fragments_")
+PREPROCESS_STAGE_OPTIONS = ["clone_ids", "allow_unit_segments"]
+PRESOLVED_VARS_FILE = "presolved_vars.json"
+
+
+def get_output_file_path(output_dir, out_prefix_name, base_name):
+    file_name = out_prefix_name + base_name
+    if file_name.startswith("."):
+        file_name = file_name[1:]
+    file_name = re.sub("\.+", ".", file_name)
+    return os.path.join(output_dir, file_name)
+
+
+def parse_sweep_values(string):
+    return [float(value) for value in string.split(",") if len(value.strip()) > 0]
+
+
+def get_fp_sweep_points(nas_fp_values, group_m_default_fp_values, group_n_default_fp_values, nas_fp, group_m_default_fp, group_n_default_fp):
+    if nas_fp_values is None and group_m_default_fp_values is None and group_n_default_fp_values is None:
+        return []
+    nas_fp_values = [nas_fp] if nas_fp_values is None else nas_fp_values
+    group_m_default_fp_values = [group_m_default_fp] if group_m_default_fp_values is None else group_m_default_fp_values
+    group_n_default_fp_values = [group_n_default_fp] if group_n_default_fp_values is None else group_n_default_fp_values
+    return [{"nas_fp": nas_fp_value, "group_m_default_fp": group_m_fp_value, "group_n_default_fp": group_n_fp_value}
+            for nas_fp_value, group_m_fp_value, group_n_fp_value in itertools.product(nas_fp_values, group_m_default_fp_values, group_n_default_fp_values)]
+
+
+def run_fp_sweep(ilp_model, sweep_points, sweep_dir, segments, adjacencies, allow_interrupted=False, mix_reference_and_novel=False, logger=None):
+    """
+    Solves the already built model for every point in the false positive parameters sweep.
+        False positive parameters only change right-hand sides (and group indicators coefficients) of the respective constraints, so the model is updated in place,
+        and every re-optimization uses the solution for the previous point as a MIP start.
+    """
     import gurobi as g
-    logger = get_standard_logger_from_args(args=args, program_name="RCK")
-
-    workdir = args.workdir if args.workdir is not None else "RCK-{date}".format(date=str(datetime.date.today()))
-    workdir_path = get_full_path(path=workdir)
-    if args.run_haploid:
-        logger.warning("Solving the problem as if the reference was haploid. "
-                       "This, while producing some results, may limit and/or obscure underlying structural variations in the analyzed cancer genome")
-    logger.debug("Working directory is set as {workdir_path}".format(workdir_path=workdir_path))
-
-    logger.debug("Creating working directory if does not exist")
-    os.makedirs(workdir_path, exist_ok=True)
-    internal_debug_log_file = os.path.join(workdir_path, "debug.log")
-    formatter = logging.Formatter(args.log_format)
-    fh = logging.FileHandler(internal_debug_log_file)
-    fh.setLevel(logging.DEBUG)
-    fh.setFormatter(formatter)
-    logger.addHandler(fh)
-
+    allowed_statuses = [g.GRB.Status.OPTIMAL, g.GRB.Status.TIME_LIMIT]
+    if allow_interrupted:
+        allowed_statuses.append(g.GRB.Status.INTERRUPTED)
+    os.makedirs(sweep_dir, exist_ok=True)
+    summary = []
+    for point in sweep_points:
+        point_name = "nas_fp-{nas_fp}.group_m_fp-{group_m_default_fp}.group_n_fp-{group_n_default_fp}".format(**point)
+        point_dir = os.path.join(sweep_dir, point_name)
+        os.makedirs(point_dir, exist_ok=True)
+        logger.info("Solving the model for sweep point {point}".format(point=point_name))
+        ilp_model.update_false_positive_parameters(nas_fp=point["nas_fp"], group_m_default_fp=point["group_m_default_fp"], group_n_default_fp=point["group_n_default_fp"])
+        ilp_model.gm.setParam("LogFile", os.path.join(point_dir, "gurobi.log"))
+        ilp_model.solve_model()
+        if ilp_model.gm.status == g.GRB.Status.INFEASIBLE and len(ilp_model.screened_nas_ids) > 0:
+            restored_cnt = ilp_model.restore_screened_novel_adjacencies()
+            logger.warning("Model was infeasible for sweep point {point} with {cnt} novel adjacencies screened out. "
+                           "Restored screened out novel adjacencies and solving again".format(point=point_name, cnt=restored_cnt))
+            ilp_model.solve_model()
+        status = ilp_model.gm.status
+        entry = dict(point, status=status, objective=None, mip_gap=None)
+        summary.append(entry)
+        if status not in allowed_statuses or ilp_model.gm.solcount == 0:
+            logger.error("Gurobi finished with status {status} for sweep point {point}. No solution was obtained.".format(status=status, point=point_name))
+            continue
+        entry["objective"] = ilp_model.gm.ObjVal
+        entry["mip_gap"] = ilp_model.gm.MIPGap
+        scnt = ilp_model.get_scnt_from_model()
+        acnt = ilp_model.get_acnt_from_model()
+        write_scnt_to_file(file_name=os.path.join(point_dir, "rck.scnt.tsv"), segments=segments, scnt=scnt, inplace=False)
+        write_acnt_to_file(file_name=os.path.join(point_dir, "rck.acnt.tsv"), acnt=acnt, adjacencies=adjacencies, output_reference=True,
+                           mix_reference_and_novel=mix_reference_and_novel, inplace=False)
+        with open(os.path.join(point_dir, "objective.json"), "wt") as destination:
+            json.dump(entry, destination, indent=2)
+        ilp_model.set_start_from_solution()
+    summary_file = os.path.join(sweep_dir, "sweep.tsv")
+    logger.info("Writing false positive sweep summary to {file}".format(file=summary_file))
+    fields = ["nas_fp", "group_m_default_fp", "group_n_default_fp", "status", "objective", "mip_gap"]
+    with open(summary_file, "wt") as destination:
+        print("\t".join(fields), file=destination)
+        for entry in summary:
+            print("\t".join(str(entry[field]) for field in fields), file=destination)
+    return summary
+
+
+def preprocess_input(args, workdir_path, preprocessed_input_dir_path, logger):
+    """
+    Reads (and, unless disabled, preprocesses) the input, copying raw input files into the `workdir/raw_input` directory,
+        and writing preprocessed data into the `preprocessed_input_dir_path` (see `read_preprocessed_input`)
+    """
     raw_input_dir_path = get_full_path(path=os.path.join(workdir_path, "raw_input"))
     logger.debug("Raw input directory is {raw_dir_path}".format(raw_dir_path=raw_input_dir_path))
 
@@ -310,11 +273,6 @@ def main():
         fragments = None
         logger.debug("Fragments file path {fragments_file_path}".format(fragments_file_path=fragments_file_path))
 
-    overall_nas_fp = args.run_nas_fp
-    logger.info("Global False Positive value for novel adjacencies is set at {fp}".format(fp=overall_nas_fp))
-
-    preprocessed_input_dir_path = get_full_path(os.path.join(workdir_path, "input"))
-    os.makedirs(preprocessed_input_dir_path, exist_ok=True)
     if fragments is None:
         fragments = deepcopy(segments)
 
@@ -396,22 +354,22 @@ def main():
     #
     ########
 
-    preprocessed_scnt_file = os.path.join(preprocessed_input_dir_path, "rck.scnt.tsv")
+    preprocessed_scnt_file = os.path.join(preprocessed_input_dir_path, PREPROCESSED_SCNT_FILE)
     remove_cn_data_from_segments(segments=segments)
     remove_cnb_data_from_segments(segments=segments)
     logger.info("Writing (preprocessed) allele-specific segment copy number data to {file}".format(file=preprocessed_scnt_file))
     write_scnt_to_file(file_name=preprocessed_scnt_file, segments=segments, scnt=scnt, clone_ids=clone_ids, inplace=False)
 
-    preprocessed_scnb_file = os.path.join(preprocessed_input_dir_path, "rck.scnb.tsv")
+    preprocessed_scnb_file = os.path.join(preprocessed_input_dir_path, PREPROCESSED_SCNB_FILE)
     logger.info("Writing (preprocessed) segment copy number boundaries information to {file}".format(file=preprocessed_scnb_file))
     write_scnb_to_file(file_name=preprocessed_scnb_file, segments=segments, scnb=scnb, clone_ids=clone_ids, inplace=False)
 
-    preprocessed_input_adjacencies_file = os.path.join(preprocessed_input_dir_path, "rck.adj.tsv")
+    preprocessed_input_adjacencies_file = os.path.join(preprocessed_input_dir_path, PREPROCESSED_ADJACENCIES_FILE)
     logger.info("Writing (preprocessed) input adjacencies data to {file}".format(file=preprocessed_input_adjacencies_file))
     write_adjacencies_to_file(file_name=preprocessed_input_adjacencies_file, adjacencies=input_adjacencies)
     remove_cn_data_from_adjacencies(input_adjacencies)
 
-    preprocessed_fragments_file = os.path.join(preprocessed_input_dir_path, "rck.frag.tsv")
+    preprocessed_fragments_file = os.path.join(preprocessed_input_dir_path, PREPROCESSED_FRAGMENTS_FILE)
     remove_cn_data_from_segments(segments=fragments)
     logger.info("Writing (preprocessed) fragments data to {file}".format(file=preprocessed_fragments_file))
     write_segments_to_file(file_name=preprocessed_fragments_file, segments=fragments, extra=None)
@@ -421,7 +379,6 @@ def main():
     ref_adjacencies = get_ref_adjacencies_from_segments(segments=segments, assign_external_ids=True)
     logger.debug("A total of {cnt} reference unlabeled adjacencies are considered (labeled will be x2, except for X and Y chromosomes)".format(cnt=len(ref_adjacencies)))
     adjacencies = input_adjacencies + ref_adjacencies
-    output_dir = os.path.join(workdir_path, "output")
 
     iag = None
     molecule_groups = [ag for ag in adjacency_groups if ag.group_type == AdjacencyGroupType.MOLECULE]
@@ -445,12 +402,14 @@ def main():
     adjacencies_by_external_ids = {adj.extra.get(EXTERNAL_NA_ID, adj.stable_id_non_phased): adj for adj in input_adjacencies}
     for ag in adjacency_groups:
         ag.populate_adjacencies_via_ids(source=input_adjacencies, source_by_ids=adjacencies_by_external_ids)
-    preprocessed_adjacencies_group_file = os.path.join(preprocessed_input_dir_path, "rck.ag.tsv")
+    preprocessed_adjacencies_group_file = os.path.join(preprocessed_input_dir_path, PREPROCESSED_ADJACENCY_GROUPS_FILE)
     if len(adjacency_groups) > 0:
         logger.info("Writing (preprocessed) adjacency groups to {file}".format(file=preprocessed_adjacencies_group_file))
         write_adjacency_groups_to_file(file_name=preprocessed_adjacencies_group_file, adjacency_groups=adjacency_groups)
     else:
         logger.debug("No adjacencies groups information is present. Nothing to write.")
+        if os.path.exists(preprocessed_adjacencies_group_file):
+            os.remove(preprocessed_adjacencies_group_file)
 
     if args.telomere_reciprocal:
         logger.info("Reciprocal telomere positions are specified via --telomere-positions-reciprocal. Extracting.")
@@ -462,9 +421,259 @@ def main():
                 telomeres.append(v)
             if v in telomeres and u not in telomeres:
                 telomeres.append(u)
-    preprocessed_telomeres_file = os.path.join(preprocessed_input_dir_path, "rck.pos.tsv")
+    preprocessed_telomeres_file = os.path.join(preprocessed_input_dir_path, PREPROCESSED_TELOMERES_FILE)
     logger.info("Writing (preprocessed) telomeres (both input and reference) to {file}".format(file=preprocessed_telomeres_file))
     write_positions_to_file(file_name=preprocessed_telomeres_file, positions=telomeres)
+    return segments, scnt, scnb, clone_ids, input_adjacencies, adjacencies, segments_to_fragments, telomeres, adjacency_groups
+
+
+def read_preprocessed_input(preprocessed_input_dir_path, logger):
+    """
+    Reads data written by the `preprocess_input` from the `preprocessed_input_dir_path`
+    """
+    preprocessed_scnt_file = os.path.join(preprocessed_input_dir_path, PREPROCESSED_SCNT_FILE)
+    logger.info("Reading preprocessed allele-specific segment copy number data from {file}".format(file=preprocessed_scnt_file))
+    segments = read_segments_from_file(file_name=preprocessed_scnt_file)
+    scnt = extract_scnt_from_segments(segments=segments)
+    clone_ids = sorted(scnt.keys())
+    remove_cn_data_from_segments(segments=segments)
+    logger.info("Clones are set as {clone_ids}".format(clone_ids=",".join(clone_ids)))
+    preprocessed_scnb_file = os.path.join(preprocessed_input_dir_path, PREPROCESSED_SCNB_FILE)
+    logger.info("Reading preprocessed segment copy number boundaries from {file}".format(file=preprocessed_scnb_file))
+    _, scnb = read_scnb_from_file(file_name=preprocessed_scnb_file, clone_ids=clone_ids, allow_missing=True)
+    preprocessed_input_adjacencies_file = os.path.join(preprocessed_input_dir_path, PREPROCESSED_ADJACENCIES_FILE)
+    logger.info("Reading preprocessed input adjacencies from {file}".format(file=preprocessed_input_adjacencies_file))
+    input_adjacencies = read_adjacencies_from_file(file_name=preprocessed_input_adjacencies_file)
+    remove_cn_data_from_adjacencies(input_adjacencies)
+    fragments = read_segments_from_file(file_name=os.path.join(preprocessed_input_dir_path, PREPROCESSED_FRAGMENTS_FILE))
+    segments_to_fragments = get_segments_for_fragments_ids_dict(segments=segments, fragments=fragments, allow_non_covered=False)
+    ref_adjacencies = get_ref_adjacencies_from_segments(segments=segments, assign_external_ids=True)
+    adjacencies = input_adjacencies + ref_adjacencies
+    preprocessed_adjacencies_group_file = os.path.join(preprocessed_input_dir_path, PREPROCESSED_ADJACENCY_GROUPS_FILE)
+    adjacency_groups = []
+    if os.path.exists(preprocessed_adjacencies_group_file):
+        logger.info("Reading preprocessed adjacency groups from {file}".format(file=preprocessed_adjacencies_group_file))
+        adjacency_groups = read_adjacency_groups_from_file(file_name=preprocessed_adjacencies_group_file)
+        adjacencies_by_external_ids = {adj.extra.get(EXTERNAL_NA_ID, adj.stable_id_non_phased): adj for adj in input_adjacencies}
+        for ag in adjacency_groups:
+            ag.populate_adjacencies_via_ids(source=input_adjacencies, source_by_ids=adjacencies_by_external_ids)
+    preprocessed_telomeres_file = os.path.join(preprocessed_input_dir_path, PREPROCESSED_TELOMERES_FILE)
+    logger.info("Reading preprocessed telomeres from {file}".format(file=preprocessed_telomeres_file))
+    telomeres = read_positions_from_file(file_name=preprocessed_telomeres_file)
+    return segments, scnt, scnb, clone_ids, input_adjacencies, adjacencies, segments_to_fragments, telomeres, adjacency_groups
+
+
+def get_preprocess_stage_key(args):
+    """
+    Key of the preprocessing stage: content of raw input files, together with all input parsing and preprocessing options
+    """
+    input_files = [get_full_path(path=getattr(args, name)) for name in PREPROCESS_STAGE_INPUT_ARGS if getattr(args, name) not in (None, "")]
+    options = {name: value for name, value in vars(args).items()
+               if name not in PREPROCESS_STAGE_INPUT_ARGS and (name.startswith(PREPROCESS_STAGE_OPTIONS_PREFIXES) or name in PREPROCESS_STAGE_OPTIONS)}
+    return get_content_key(input_files=input_files, options=options, salt=PREPROCESS_STAGE)
+
+
+def main():
+    parser = argparse.ArgumentParser(parents=[get_logging_cli_parser()])
+    parser.add_argument('--version', action='version', version=rck.version)
+
+    parser.add_argument("--scnt", required=True)
+    parser.add_argument("--scnt-separator", default="\t")
+    parser.add_argument("--scnt-extra-separator", default=";")
+
+    parser.add_argument("--adjacencies", required=True)
+    parser.add_argument("--adjacencies-separator", default="\t")
+    parser.add_argument("--adjacencies-extra-separator", default=";")
+
+    parser.add_argument("--workdir", default=None)
+    parser.add_argument("--profile-python-memory", action="store_true", dest="profile_python_memory")
+
+    parser.add_argument("--clone-ids", default=None)
+
+    parser.add_argument("--scnb", default=None)
+    parser.add_argument("--scnb-separator", default="\t")
+    parser.add_argument("--scnb-extra-separator", default=";")
+
+    parser.add_argument("--telomere-segments", default=None)
+    parser.add_argument("--telomere-segments-separator", default="\t")
+    parser.add_argument("--telomere-segments-extra-separator", default=";")
+
+    parser.add_argument("--telomere-positions", default=None)
+    parser.add_argument("--telomere-positions-separator", default="\t")
+    parser.add_argument("--telomere-positions-no-reciprocal", action="store_false", dest="telomere_reciprocal")
+
+    parser.add_argument("--adjacency-groups", default=None)
+    parser.add_argument("--adjacency-group-separator", default="\t")
+    parser.add_argument("--adjacency-group-extra-separator", default=";")
+
+    parser.add_argument("--fragments", default=None)
+    parser.add_argument("--fragments-separator", default="\t")
+    parser.add_argument("--fragments-extra-separator", default=";")
+
+    # parser.add_argument("--trees", default=None)
+    parser.add_argument("--no-allow-unit-segments", action="store_false", dest="allow_unit_segments")
+    ###
+    pre_group = parser.add_argument_group()
+    pre_group.add_argument("--no-pre", action="store_false", dest="do_preprocess")
+    ##
+    # Arguments for Segment Copy Number Tensor preprocessing
+    ##
+    pre_group.add_argument("--pre-no-scnt", action="store_false", dest="do_pre_scnt")
+    pre_group.add_argument("--pre-scnt-no-merge-fragments", action="store_false", dest="pre_scnt_merge_fragments")
+    pre_group.add_argument("--pre-scnt-max-merge-gap", type=int, default=1000000000)
+    pre_group.add_argument("--pre-scnt-no-fill-gaps", action="store_false", dest="pre_scnt_fill_gaps")
+    pre_group.add_argument("--pre-scnt-max-fill-gap", type=int, default=1000000000)
+    ##
+    # Arguments for Segment Copy Number Boundaries
+    ##
+    pre_group.add_argument("--pre-scnb", action="store_true", dest="do_pre_bnd")
+    pre_group.add_argument("--pre-scnb-strategy", choices=[strategy.value for strategy in SCNBoundariesStrategies], type=SCNBoundariesStrategies.from_string,
+                           default=SCNBoundariesStrategies.UNIFORM_MIN_MAX.value)
+    pre_group.add_argument("--pre-scnb-uniform-spread-size", type=int, default=1)
+    pre_group.add_argument("--pre-scnb-length-spread-relation", choices=[rel.value for rel in LengthSpreadRelationships], type=LengthSpreadRelationships.from_string,
+                           default=LengthSpreadRelationships.DUMMY.value)
+    pre_group.add_argument("--pre-scnb-uniform-min", type=int, default=0)
+    pre_group.add_argument("--pre-scnb-uniform-max", type=int, default=10)
+    pre_group.add_argument("--pre-scnb-min-allow-zero-for-positive", type=int, default=-1)
+    pre_group.add_argument("--pre-scnb-max-allow-zero-for-positive", type=int, default=1000000000)
+    pre_group.add_argument("--pre-scnb-min-allow-positive-for-zero", type=int, default=-1)
+    pre_group.add_argument("--pre-scnb-max-allow-positive-for-zero", type=int, default=1000000000)
+    pre_group.add_argument("--pre-scnb-is-male", action="store_false", dest="pre_scnb_is_female")
+    ##
+    # Arguments for adjacencies
+    ##
+    pre_group.add_argument("--pre-no-adj", action="store_false", dest="do_pre_adj")
+    pre_group.add_argument("--pre-adj-no-reciprocal", action="store_false", dest="pre_adj_reciprocal")
+    pre_group.add_argument("--pre-adj-reciprocal-include-ref", action="store_true", dest="pre_adj_reciprocal_include_ref")
+    pre_group.add_argument("--pre-adj-reciprocal-max-distance", type=int, default=50)
+    ###
+    pre_group.add_argument("--pre-no-adg", action="store_false", dest="do_pre_adg")
+    pre_group.add_argument("--pre-adg-sl-max-size", type=int, default=50000000)
+    pre_group.add_argument("--pre-adg-sl-allow-intermediate-same", action="store_true", dest="pre_adg_sl_allow_intermediate_same")
+    pre_group.add_argument("--pre-adg-sl-allow-intermediate-tra", action="store_true", dest="pre_adg_sl_allow_intermediate_tra")
+    pre_group.add_argument("--pre-adg-sl-no-inv-signatures", action="store_false", dest="pre_adg_sl_allow_inv_signature")
+    pre_group.add_argument("--pre-adg-sl-no-refine", action="store_false", dest="pre_adg_sl_refine")
+    pre_group.add_argument("--pre-adg-sl-fp", type=float, default=1)
+    pre_group.add_argument("--pre-adg-sl-gid-suffix", dest="pre_adg_sl_gid_suffix", default="rck-run-sL")
+    ###
+    run_group = parser.add_argument_group()
+    run_group.add_argument("--no-run", action="store_false", dest="do_run")
+    run_group.add_argument("--run-haploid", action="store_true", dest="run_haploid")
+    run_group.add_argument("--dry-run", action="store_true", dest="dry_run")
+    run_group.add_argument("--run-presolve-nas-threshold", type=int, default=None)
+    run_group.add_argument("--run-presolve-vars-threshold", type=int, default=200000)
+    run_group.add_argument("--run-g-mip-gap", type=float, default=0.015)
+    run_group.add_argument("--run-g-time-limit", type=int, default=28800)
+    run_group.add_argument("--run-g-threads", type=int, default=4)
+    run_group.add_argument("--run-g-mip-focus", type=int, choices=[0, 1, 2, 3], default=0)
+    run_group.add_argument("--run-nas-fp", type=float, default=0.1)
+    run_group.add_argument("--run-group-m-default-fp", type=float, default=0.1)
+    run_group.add_argument("--run-group-n-default-fp", type=float, default=0.1)
+    run_group.add_argument("--run-segment-length-attr", choices=["length", "length_10", "length_100", "length_1000"], default="length_10")
+    run_group.add_argument("--run-g-allow-interrupted", action="store_true")
+    run_group.add_argument("--run-infeasibility-diagnostics", choices=["iis", "bisection", "both"], default="iis")
+    run_group.add_argument("--run-diagnostics-workers", type=int, default=1)
+    run_group.add_argument("--run-diagnostics-time-limit", type=int, default=600)
+    run_group.add_argument("--run-diagnostics-max-checks", type=int, default=500)
+    run_group.add_argument("--heuristic-only", action="store_true", dest="heuristic_only")
+    run_group.add_argument("--run-heuristic-start", action="store_true", dest="run_heuristic_start")
+    run_group.add_argument("--run-nas-screening", action="store_true", dest="run_nas_screening")
+    run_group.add_argument("--run-nas-screening-threshold", type=float, default=0.1)
+    run_group.add_argument("--run-nas-screening-no-verify", action="store_false", dest="run_nas_screening_verify")
+    run_group.add_argument("--run-no-var-elimination", action="store_false", dest="run_var_elimination")
+    run_group.add_argument("--run-clone-symmetry-breaking", action="store_true", dest="run_clone_symmetry_breaking")
+    run_group.add_argument("--run-location-constraints", choices=["pairwise", "aggregated", "lazy"], default="pairwise")
+    run_group.add_argument("--run-model-cache", action="store_true", dest="run_model_cache")
+    run_group.add_argument("--run-no-checkpoint", action="store_false", dest="run_checkpoint")
+    run_group.add_argument("--run-checkpoint-interval", type=int, default=300)
+    run_group.add_argument("--resume", action="store_true", dest="resume")
+    run_group.add_argument("--run-sweep-nas-fp", type=parse_sweep_values, default=None)
+    run_group.add_argument("--run-sweep-group-m-default-fp", type=parse_sweep_values, default=None)
+    run_group.add_argument("--run-sweep-group-n-default-fp", type=parse_sweep_values, default=None)
+    ###
+    output_group = parser.add_argument_group()
+    output_group.add_argument("--o-prefix-name", type=str, dest="out_prefix_name", default="")
+    output_group.add_argument("--o-scnt-separator", default="\t")
+    output_group.add_argument("--o-scnt-extra-separator", default=";")
+    output_group.add_argument("--o-acnt-separator", default="\t")
+    output_group.add_argument("--o-acnt-extra-separator", default=";")
+    output_group.add_argument("--o-acnt-mix-novel-and-reference", action="store_true", )
+    ###
+    post_group = parser.add_argument_group()
+    post_group.add_argument("--post-check-all", action="store_true", dest="post_check_all")
+    post_group.add_argument("--post-check-scnb", action="store_true", dest="post_check_scnb")
+    post_group.add_argument("--post-check-labeling", action="store_true", dest="post_check_labeling")
+    post_group.add_argument("--post-check-balancing", action="store_true", dest="post_check_balancing")
+    post_group.add_argument("--post-check-adj-groups", action="store_true", dest="post_check_adj_groups")
+    post_group.add_argument("--post-check-adj-groups-m", action="store_true", dest="post_check_adj_groups_m")
+    post_group.add_argument("--post-check-adj-groups-n", action="store_true", dest="post_check_adj_groups_n")
+    post_group.add_argument("--post-check-adj-groups-l", action="store_true", dest="post_check_adj_groups_l")
+    post_group.add_argument("--post-check-nas-fp", action="store_true", dest="post_check_nas_fp")
+    ###
+    args = parser.parse_args()
+
+    logger = get_standard_logger_from_args(args=args, program_name="RCK")
+
+    workdir = args.workdir if args.workdir is not None else "RCK-{date}".format(date=str(datetime.date.today()))
+    workdir_path = get_full_path(path=workdir)
+    if args.run_haploid:
+        logger.warning("Solving the problem as if the reference was haploid. "
+                       "This, while producing some results, may limit and/or obscure underlying structural variations in the analyzed cancer genome")
+    logger.debug("Working directory is set as {workdir_path}".format(workdir_path=workdir_path))
+
+    logger.debug("Creating working directory if does not exist")
+    os.makedirs(workdir_path, exist_ok=True)
+    internal_debug_log_file = os.path.join(workdir_path, "debug.log")
+    formatter = logging.Formatter(args.log_format)
+    fh = logging.FileHandler(internal_debug_log_file)
+    fh.setLevel(logging.DEBUG)
+    fh.setFormatter(formatter)
+    logger.addHandler(fh)
+
+    profiler = StageProfiler(workdir=workdir_path, trace_python_memory=args.profile_python_memory, logger=logger)
+    try:
+        run_rck(args=args, workdir_path=workdir_path, logger=logger, profiler=profiler)
+    finally:
+        profiler.finish()
+
+
+def run_rck(args, workdir_path, logger, profiler):
+    """
+    Runs the RCK pipeline stages (preprocessing, presolve, model building, solving, extraction, and post-inference checks) in the `workdir_path`,
+        timing each of them with the `profiler`.
+    """
+    from rck.core.ilp_gurobi import OptModelMultiClone, DEFAULT_GROUP_M_FP, SEGMENT_LENGTH_ATTRIBUTE, DEFAULT_GROUP_N_FP, merge_variables_from_presolve, \
+        get_model_cache_key, model_cache_exists, IncumbentCheckpointCallback, checkpoint_exists, read_checkpoint_starting_vars, read_checkpoint_content_key, get_starting_vars_from_cn_profiles, \
+        write_starting_vars_to_file, read_starting_vars_from_file, SolverProgressCallback, get_solver_statistics
+    from rck.core.diagnostics import FeasibilityChecker, localize_infeasibility, get_infeasibility_report_lines
+    import gurobi as g
+
+    preprocessed_input_dir_path = get_full_path(os.path.join(workdir_path, "input"))
+    os.makedirs(preprocessed_input_dir_path, exist_ok=True)
+    preprocessed_scnt_file = os.path.join(preprocessed_input_dir_path, PREPROCESSED_SCNT_FILE)
+    preprocessed_scnb_file = os.path.join(preprocessed_input_dir_path, PREPROCESSED_SCNB_FILE)
+    preprocessed_input_adjacencies_file = os.path.join(preprocessed_input_dir_path, PREPROCESSED_ADJACENCIES_FILE)
+    preprocessed_fragments_file = os.path.join(preprocessed_input_dir_path, PREPROCESSED_FRAGMENTS_FILE)
+    preprocessed_adjacencies_group_file = os.path.join(preprocessed_input_dir_path, PREPROCESSED_ADJACENCY_GROUPS_FILE)
+    preprocessed_telomeres_file = os.path.join(preprocessed_input_dir_path, PREPROCESSED_TELOMERES_FILE)
+    preprocess_key = get_preprocess_stage_key(args=args)
+    with profiler.stage(PREPROCESS_STAGE) as preprocess_stage:
+        if args.resume and stage_is_fresh(workdir=workdir_path, stage=PREPROCESS_STAGE, key=preprocess_key):
+            logger.info("Input and preprocessing options have not changed since the previous run. Skipping reading and preprocessing of the input.")
+            preprocess_stage["resumed"] = True
+            segments, scnt, scnb, clone_ids, input_adjacencies, adjacencies, segments_to_fragments, telomeres, adjacency_groups = \
+                read_preprocessed_input(preprocessed_input_dir_path=preprocessed_input_dir_path, logger=logger)
+        else:
+            segments, scnt, scnb, clone_ids, input_adjacencies, adjacencies, segments_to_fragments, telomeres, adjacency_groups = \
+                preprocess_input(args=args, workdir_path=workdir_path, preprocessed_input_dir_path=preprocessed_input_dir_path, logger=logger)
+            preprocess_outputs = [preprocessed_scnt_file, preprocessed_scnb_file, preprocessed_input_adjacencies_file, preprocessed_fragments_file, preprocessed_telomeres_file]
+            if len(adjacency_groups) > 0:
+                preprocess_outputs.append(preprocessed_adjacencies_group_file)
+            record_stage(workdir=workdir_path, stage=PREPROCESS_STAGE, key=preprocess_key, outputs=preprocess_outputs)
+
+    overall_nas_fp = args.run_nas_fp
+    logger.info("Global False Positive value for novel adjacencies is set at {fp}".format(fp=overall_nas_fp))
+    output_dir = os.path.join(workdir_path, "output")
 
     logger.debug("Output directory is {output}".format(output=output_dir))
     os.makedirs(output_dir, exist_ok=True)
@@ -478,133 +687,312 @@ def main():
         logger.info("A --no-run flag was set. Not performing the inference.")
         exit(0)
 
-    if len(input_adjacencies) > args.run_presolve_nas_threshold:
-        presolved_vars = {}
-        logger.info("Performing per chromosomal pre-sovling")
-        presolve_dir = os.path.join(workdir_path, "_presolve")
-        os.makedirs(presolve_dir, exist_ok=True)
-        logger.info("Results and logs will be stored in {file} directory".format(file=presolve_dir))
-        segments_by_chrs = defaultdict(list)
-        logger.debug("Computing translocations fraction out of the input adjacencies")
-        translocations = [adj for adj in adjacencies if adj.position1.chromosome != adj.position2.chromosome]
-        translocations_fraction = len(translocations) / len(input_adjacencies)
-        logger.debug("Translocation fraction is {:0.2f}".format(translocations_fraction))
-        presolve_overall_fp = max(0.0, overall_nas_fp - translocations_fraction)
-        for segment in segments:
-            segments_by_chrs[segment.chromosome].append(segment)
-        for chr_name in segments_by_chrs.keys():
-            logger.info("Presolving for chr {chr_name}".format(chr_name=chr_name))
-            segments_by_chrs[chr_name] = sorted(segments_by_chrs[chr_name], key=lambda s: (s.start_coordinate, s.end_coordinate))
-            chr_segments = segments_by_chrs[chr_name]
-            logger.debug("A total of {cnt} segments are on chromosome {chr_name}".format(cnt=len(chr_segments), chr_name=chr_name))
-            chr_adjacencies = list(filter_adjacencies_by_chromosomal_regions(adjacencies=adjacencies,
-                                                                             include=[Segment.from_chromosome_coordinates(chromosome=chr_name, start=-1, end=1000000000)]))
-            logger.debug("A total of {cnt} adjacencies (both reference and novel) are on chromosome {chr_name}".format(cnt=len(chr_adjacencies), chr_name=chr_name))
-            chr_groups = projected_groups(groups=adjacency_groups, adjacencies=chr_adjacencies)
-            logger.debug("A total of {cnt} adjacency groups are on chromosome {chr_name}".format(cnt=len(chr_groups), chr_name=chr_name))
-            gurobi_log_path = os.path.join(presolve_dir, "{chr_name}.gurobi.log".format(chr_name=chr_name))
-            logger.info("Gurobi log will be stored in {log_path}".format(log_path=gurobi_log_path))
-            extra = {DEFAULT_GROUP_M_FP: args.run_group_m_default_fp,
-                     DEFAULT_GROUP_N_FP: args.run_group_n_default_fp,
-                     SEGMENT_LENGTH_ATTRIBUTE: args.run_segment_length_attr}
-            logger.debug("Gurobi ILP extra is {extra}".format(extra=str(extra)))
-            logger.info("Setting up Gurobi ILP model (includes construction of the IAG)")
-            segments_ids = {s.stable_id_non_hap for s in chr_segments}
-            chr_segments_to_fragments = {sid: fid for sid, fid in segments_to_fragments.items() if sid in segments_ids}
-            ilp_model = OptModelMultiClone(hapl_segments=chr_segments,
-                                           hapl_adjacencies=chr_adjacencies,
-                                           scnt=scnt,
-                                           hapl_telomeres=telomeres,
-                                           hapl_segments_to_fragments=chr_segments_to_fragments,
-                                           hapl_adjacencies_groups=chr_groups,
-                                           scnb=scnb,
-                                           solve_as_haploid=args.run_haploid,
-                                           hapl_nov_adjacencies_fp=presolve_overall_fp,
-                                           extra=extra)
-            logger.debug("Building variables and constraints")
-            ilp_model.build_gurobi_model()
-            logger.debug("Setting gurobi parameters")
-            ilp_model.gm.setParam("MIPGap", args.run_g_mip_gap)
-            ilp_model.gm.setParam("MIPGapAbs", args.run_g_mip_gap)
-            ilp_model.gm.setParam("MIPFocus", args.run_g_mip_focus)
-            ilp_model.gm.setParam("LogFile", gurobi_log_path)
-            ilp_model.gm.setParam("TimeLimit", args.run_g_time_limit)
-            ilp_model.gm.setParam("Threads", args.run_g_threads)
-            if args.run_haploid:
-                logger.warning("Problem is being solved as if the underlying reference is haploid.")
-            logger.info("Starting Gurobi to solve the optimization problem")
-            ilp_model.solve_model()
-            logger.info("Gurobi model solving has ended")
-            status = ilp_model.gm.status
-            solution_cnt = ilp_model.gm.solcount
-            if status == g.GRB.Status.INFEASIBLE:
-                logger.error("Constructed model was infeasible to solve. This usually happens because of the tight segment copy number boundaries.")
-                logger.error("\t Try more flexible segment copy number boundaries or try increasing allowed Novel adjacencies False Positive value.")
-                logger.info("Gurobi computes the IIS")
-                ilp_model.gm.computeIIS()
-                ilp_path = os.path.join(presolve_dir, "{chr_name}.model.ilp".format(chr_name=chr_name))
-                logger.info("Writing down Gurobi IIS to {file}".format(file=ilp_path))
-                ilp_model.gm.write(ilp_path)
-                logger.error("Inference was unsuccessful.")
-                continue
-            allowed_statuses = [g.GRB.Status.OPTIMAL, g.GRB.Status.TIME_LIMIT]
-            if args.run_g_allow_interrupted:
-                allowed_statuses.append(g.GRB.Status.INTERRUPTED)
-            if status not in allowed_statuses:
-                logger.error("Gurobi finished with status {status}".format(status=status))
-                logger.error("Inference was unsuccessful")
-                continue
-            if solution_cnt == 0:
-                logger.error("Inference was unsuccessful")
-                continue
-            logger.info("Extracting inferred diploid segemnt and adjacency copy number data")
-            chr_scnt = ilp_model.get_scnt_from_model()
-            chr_acnt = ilp_model.get_acnt_from_model()
-            presolved_vars = merge_variables_from_presolve(ilp_model.variables, result=presolved_vars)
-            logger.info("Writing extracted data to presolve dir")
-            chr_scnt_file = os.path.join(presolve_dir, "{chr_name}.rck.scnt.tsv".format(chr_name=chr_name))
-            logger.info("Writing presolved segment copy number data for chr {chr_name} to {file}".format(chr_name=chr_name, file=chr_scnt_file))
-            write_scnt_to_file(file_name=chr_scnt_file, segments=chr_segments, scnt=chr_scnt)
-            chr_acnt_file = os.path.join(presolve_dir, "{chr_name}.rck.acnt.tsv".format(chr_name=chr_name))
-            logger.info("Writing presolved adjacency copy number data for chr {chr_name} to {file}".format(chr_name=chr_name, file=chr_acnt_file))
-            write_acnt_to_file(file_name=chr_acnt_file, adjacencies=chr_adjacencies, acnt=chr_acnt)
-    else:
-        presolved_vars = None
-
-    gurobi_log_path = os.path.join(output_dir, "gurobi.log")
-    logger.info("Gurobi log will be stored in {log_path}".format(log_path=gurobi_log_path))
     extra = {DEFAULT_GROUP_M_FP: args.run_group_m_default_fp,
              DEFAULT_GROUP_N_FP: args.run_group_n_default_fp,
              SEGMENT_LENGTH_ATTRIBUTE: args.run_segment_length_attr}
     logger.debug("Gurobi ILP extra is {extra}".format(extra=str(extra)))
     logger.info("Setting up Gurobi ILP model (includes construction of the IAG)")
-    # if presolved_vars is not None:
-    #     logger.info("Merging results from presolved chromosome subproblems to create a starting vector for the overall problem")
-    #     presolved_vars = merge_variables_from_presolve(*presolved_vars)
-    ilp_model = OptModelMultiClone(hapl_segments=segments,
-                                   hapl_adjacencies=adjacencies,
-                                   scnt=scnt,
-                                   hapl_telomeres=telomeres,
-                                   hapl_segments_to_fragments=segments_to_fragments,
-                                   hapl_adjacencies_groups=adjacency_groups,
-                                   scnb=scnb,
-                                   hapl_nov_adjacencies_fp=overall_nas_fp,
-                                   starting_vars=presolved_vars,
-                                   solve_as_haploid=args.run_haploid,
-                                   extra=extra)
-    logger.debug("Building variables and constraints")
-    ilp_model.build_gurobi_model()
-    logger.debug("Setting gurobi parameters")
-    ilp_model.gm.setParam("MIPGap", args.run_g_mip_gap)
-    ilp_model.gm.setParam("MIPGapAbs", args.run_g_mip_gap)
-    ilp_model.gm.setParam("MIPFocus", args.run_g_mip_focus)
-    ilp_model.gm.setParam("LogFile", gurobi_log_path)
-    ilp_model.gm.setParam("TimeLimit", args.run_g_time_limit)
-    ilp_model.gm.setParam("Threads", args.run_g_threads)
+    with profiler.stage("iag_construction"):
+        ilp_model = OptModelMultiClone(hapl_segments=segments,
+                                       hapl_adjacencies=adjacencies,
+                                       scnt=scnt,
+                                       hapl_telomeres=telomeres,
+                                       hapl_segments_to_fragments=segments_to_fragments,
+                                       hapl_adjacencies_groups=adjacency_groups,
+                                       scnb=scnb,
+                                       hapl_nov_adjacencies_fp=overall_nas_fp,
+                                       solve_as_haploid=args.run_haploid,
+                                       eliminate_fixed_variables=args.run_var_elimination,
+                                       break_clone_symmetry=args.run_clone_symmetry_breaking,
+                                       location_constraints=args.run_location_constraints,
+                                       extra=extra)
+        model_size = ilp_model.estimate_model_size()
+        logger.info("Estimated ILP model size: {variables} variables, {constraints} linear and {general} general constraints, at most {nonzeros} nonzeros (~{memory} MB)"
+                    "".format(variables=model_size["variables"]["total"], constraints=model_size["constraints"]["total"],
+                              general=model_size["general_constraints"]["total"], nonzeros=model_size["nonzeros_upper_bound"]["total"], memory=model_size["memory_mb"]))
+    profiler.extra["model_size"] = model_size
+    if args.run_presolve_nas_threshold is not None:
+        run_presolve = len(input_adjacencies) > args.run_presolve_nas_threshold
+    else:
+        run_presolve = model_size["variables"]["total"] > args.run_presolve_vars_threshold
+    logger.debug("Per chromosome presolve is {status}".format(status="required" if run_presolve else "not required"))
+    if args.dry_run:
+        model_size["presolve"] = run_presolve
+        model_size["novel_adjacencies"] = len(input_adjacencies)
+        json.dump(model_size, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+        logger.info("A --dry-run flag was set. Not performing the inference.")
+        exit(0)
+
+    heuristic_scnt, heuristic_acnt = None, None
+    if args.heuristic_only or args.run_heuristic_start:
+        with profiler.stage("heuristic"):
+            logger.info("Computing segment and adjacency copy numbers with the min-cost flow construction heuristic")
+            heuristic_input_scnt = get_haploid_scnt(segments=segments, scnt=scnt) if args.run_haploid else scnt
+            try:
+                heuristic_scnt, heuristic_acnt = get_min_cost_flow_cn_profiles(segments=segments, adjacencies=adjacencies, scnt=heuristic_input_scnt, scnb=scnb,
+                                                                               telomeres=telomeres, length_attribute=args.run_segment_length_attr,
+                                                                               solve_as_haploid=args.run_haploid)
+            except ValueError as e:
+                if args.heuristic_only:
+                    logger.error("Min-cost flow heuristic was unsuccessful: {error}".format(error=str(e)))
+                    exit(1)
+                logger.warning("Min-cost flow heuristic was unsuccessful, no MIP start will be derived from it: {error}".format(error=str(e)))
+    if args.heuristic_only:
+        scnt_file_path = get_output_file_path(output_dir=output_dir, out_prefix_name=args.out_prefix_name, base_name="rck.scnt.tsv")
+        logger.info("Writing heuristic diploid segment copy number data to {file}".format(file=scnt_file_path))
+        remove_cn_data_from_segments(segments=segments)
+        write_scnt_to_file(file_name=scnt_file_path, segments=segments, scnt=heuristic_scnt)
+        acnt_file_path = get_output_file_path(output_dir=output_dir, out_prefix_name=args.out_prefix_name, base_name="rck.acnt.tsv")
+        logger.info("Writing heuristic diploid adjacency copy number data to {file}".format(file=acnt_file_path))
+        remove_cn_data_from_adjacencies(adjacencies=adjacencies)
+        write_acnt_to_file(file_name=acnt_file_path, acnt=heuristic_acnt, adjacencies=adjacencies, output_reference=True,
+                           mix_reference_and_novel=args.o_acnt_mix_novel_and_reference)
+        logger.warning("Copy numbers were obtained with the --heuristic-only mode (min-cost flow construction heuristic), and are a quick preview, rather than the RCK inference result.")
+        exit(0)
+
+    presolve_dir = os.path.join(workdir_path, "_presolve")
+    presolved_vars_file = os.path.join(presolve_dir, PRESOLVED_VARS_FILE)
+    presolve_key = get_content_key(input_files=[], upstream_keys=[preprocess_key], salt=PRESOLVE_STAGE,
+                                   options={"haploid": args.run_haploid,
+                                            "nas_fp": overall_nas_fp,
+                                            "var_elimination": args.run_var_elimination,
+                                            "clone_symmetry_breaking": args.run_clone_symmetry_breaking,
+                                            "location_constraints": args.run_location_constraints,
+                                            "extra": extra,
+                                            "mip_gap": args.run_g_mip_gap,
+                                            "mip_focus": args.run_g_mip_focus,
+                                            "time_limit": args.run_g_time_limit,
+                                            "threads": args.run_g_threads})
+    checkpoint_dir = os.path.join(workdir_path, "checkpoint")
+    # unlike the presolve, incumbent checkpoints do not depend on the solver parameters (e.g., threads are changed by rck-batch between attempts)
+    checkpoint_key = get_content_key(input_files=[], upstream_keys=[preprocess_key], salt="checkpoint",
+                                     options={"haploid": args.run_haploid,
+                                              "nas_fp": overall_nas_fp,
+                                              "var_elimination": args.run_var_elimination,
+                                              "clone_symmetry_breaking": args.run_clone_symmetry_breaking,
+                                              "location_constraints": args.run_location_constraints,
+                                              "extra": extra})
+    resume_from_checkpoint = False
+    if args.resume and not checkpoint_exists(checkpoint_dir=checkpoint_dir):
+        logger.info("No incumbent checkpoint was found in {dir}. Nothing to resume from.".format(dir=checkpoint_dir))
+    elif args.resume and read_checkpoint_content_key(checkpoint_dir=checkpoint_dir) != checkpoint_key:
+        logger.info("Incumbent checkpoint in {dir} is stale (it was written for a different input or model options). Not resuming from it.".format(dir=checkpoint_dir))
+    elif args.resume:
+        resume_from_checkpoint = True
+    if resume_from_checkpoint:
+        logger.info("Resuming from the last incumbent checkpoint in {dir}; it will be used as a MIP start (presolve is skipped)".format(dir=checkpoint_dir))
+        presolved_vars = read_checkpoint_starting_vars(checkpoint_dir=checkpoint_dir)
+    elif run_presolve and args.resume and stage_is_fresh(workdir=workdir_path, stage=PRESOLVE_STAGE, key=presolve_key):
+        logger.info("Input and presolve options have not changed since the previous run. Reading presolved variables from {file}".format(file=presolved_vars_file))
+        presolved_vars = read_starting_vars_from_file(file_name=presolved_vars_file)
+    elif run_presolve:
+        with profiler.stage(PRESOLVE_STAGE) as presolve_stage:
+            presolved_vars = {}
+            logger.info("Performing per chromosomal pre-sovling")
+            os.makedirs(presolve_dir, exist_ok=True)
+            logger.info("Results and logs will be stored in {file} directory".format(file=presolve_dir))
+            segments_by_chrs = defaultdict(list)
+            logger.debug("Computing translocations fraction out of the input adjacencies")
+            translocations = [adj for adj in adjacencies if adj.position1.chromosome != adj.position2.chromosome]
+            translocations_fraction = len(translocations) / len(input_adjacencies)
+            logger.debug("Translocation fraction is {:0.2f}".format(translocations_fraction))
+            presolve_overall_fp = max(0.0, overall_nas_fp - translocations_fraction)
+            for segment in segments:
+                segments_by_chrs[segment.chromosome].append(segment)
+            for chr_name in segments_by_chrs.keys():
+                logger.info("Presolving for chr {chr_name}".format(chr_name=chr_name))
+                segments_by_chrs[chr_name] = sorted(segments_by_chrs[chr_name], key=lambda s: (s.start_coordinate, s.end_coordinate))
+                chr_segments = segments_by_chrs[chr_name]
+                logger.debug("A total of {cnt} segments are on chromosome {chr_name}".format(cnt=len(chr_segments), chr_name=chr_name))
+                chr_adjacencies = list(filter_adjacencies_by_chromosomal_regions(adjacencies=adjacencies,
+                                                                                 include=[Segment.from_chromosome_coordinates(chromosome=chr_name, start=-1, end=1000000000)]))
+                logger.debug("A total of {cnt} adjacencies (both reference and novel) are on chromosome {chr_name}".format(cnt=len(chr_adjacencies), chr_name=chr_name))
+                chr_groups = projected_groups(groups=adjacency_groups, adjacencies=chr_adjacencies)
+                logger.debug("A total of {cnt} adjacency groups are on chromosome {chr_name}".format(cnt=len(chr_groups), chr_name=chr_name))
+                gurobi_log_path = os.path.join(presolve_dir, "{chr_name}.gurobi.log".format(chr_name=chr_name))
+                logger.info("Gurobi log will be stored in {log_path}".format(log_path=gurobi_log_path))
+                chr_extra = {DEFAULT_GROUP_M_FP: args.run_group_m_default_fp,
+                             DEFAULT_GROUP_N_FP: args.run_group_n_default_fp,
+                             SEGMENT_LENGTH_ATTRIBUTE: args.run_segment_length_attr}
+                logger.debug("Gurobi ILP extra is {extra}".format(extra=str(chr_extra)))
+                logger.info("Setting up Gurobi ILP model (includes construction of the IAG)")
+                segments_ids = {s.stable_id_non_hap for s in chr_segments}
+                chr_segments_to_fragments = {sid: fid for sid, fid in segments_to_fragments.items() if sid in segments_ids}
+                chr_ilp_model = OptModelMultiClone(hapl_segments=chr_segments,
+                                                   hapl_adjacencies=chr_adjacencies,
+                                                   scnt=scnt,
+                                                   hapl_telomeres=telomeres,
+                                                   hapl_segments_to_fragments=chr_segments_to_fragments,
+                                                   hapl_adjacencies_groups=chr_groups,
+                                                   scnb=scnb,
+                                                   solve_as_haploid=args.run_haploid,
+                                                   hapl_nov_adjacencies_fp=presolve_overall_fp,
+                                                   eliminate_fixed_variables=args.run_var_elimination,
+                                                   break_clone_symmetry=args.run_clone_symmetry_breaking,
+                                                   location_constraints=args.run_location_constraints,
+                                                   extra=chr_extra)
+                logger.debug("Building variables and constraints")
+                chr_ilp_model.build_gurobi_model()
+                logger.debug("Setting gurobi parameters")
+                chr_ilp_model.gm.setParam("MIPGap", args.run_g_mip_gap)
+                chr_ilp_model.gm.setParam("MIPGapAbs", args.run_g_mip_gap)
+                chr_ilp_model.gm.setParam("MIPFocus", args.run_g_mip_focus)
+                chr_ilp_model.gm.setParam("LogFile", gurobi_log_path)
+                chr_ilp_model.gm.setParam("TimeLimit", args.run_g_time_limit)
+                chr_ilp_model.gm.setParam("Threads", args.run_g_threads)
+                if args.run_haploid:
+                    logger.warning("Problem is being solved as if the underlying reference is haploid.")
+                logger.info("Starting Gurobi to solve the optimization problem")
+                chr_ilp_model.solve_model()
+                logger.info("Gurobi model solving has ended")
+                presolve_stage.setdefault("chromosomes", {})[chr_name] = get_solver_statistics(gm=chr_ilp_model.gm)
+                status = chr_ilp_model.gm.status
+                solution_cnt = chr_ilp_model.gm.solcount
+                if status == g.GRB.Status.INFEASIBLE:
+                    logger.error("Constructed model was infeasible to solve. This usually happens because of the tight segment copy number boundaries.")
+                    logger.error("\t Try more flexible segment copy number boundaries or try increasing allowed Novel adjacencies False Positive value.")
+                    logger.info("Gurobi computes the IIS")
+                    chr_ilp_model.gm.computeIIS()
+                    ilp_path = os.path.join(presolve_dir, "{chr_name}.model.ilp".format(chr_name=chr_name))
+                    logger.info("Writing down Gurobi IIS to {file}".format(file=ilp_path))
+                    chr_ilp_model.gm.write(ilp_path)
+                    logger.error("Inference was unsuccessful.")
+                    continue
+                allowed_statuses = [g.GRB.Status.OPTIMAL, g.GRB.Status.TIME_LIMIT]
+                if args.run_g_allow_interrupted:
+                    allowed_statuses.append(g.GRB.Status.INTERRUPTED)
+                if status not in allowed_statuses:
+                    logger.error("Gurobi finished with status {status}".format(status=status))
+                    logger.error("Inference was unsuccessful")
+                    continue
+                if solution_cnt == 0:
+                    logger.error("Inference was unsuccessful")
+                    continue
+                logger.info("Extracting inferred diploid segemnt and adjacency copy number data")
+                chr_scnt = chr_ilp_model.get_scnt_from_model()
+                chr_acnt = chr_ilp_model.get_acnt_from_model()
+                presolved_vars = merge_variables_from_presolve(chr_ilp_model.variables, result=presolved_vars)
+                logger.info("Writing extracted data to presolve dir")
+                chr_scnt_file = os.path.join(presolve_dir, "{chr_name}.rck.scnt.tsv".format(chr_name=chr_name))
+                logger.info("Writing presolved segment copy number data for chr {chr_name} to {file}".format(chr_name=chr_name, file=chr_scnt_file))
+                write_scnt_to_file(file_name=chr_scnt_file, segments=chr_segments, scnt=chr_scnt)
+                chr_acnt_file = os.path.join(presolve_dir, "{chr_name}.rck.acnt.tsv".format(chr_name=chr_name))
+                logger.info("Writing presolved adjacency copy number data for chr {chr_name} to {file}".format(chr_name=chr_name, file=chr_acnt_file))
+                write_acnt_to_file(file_name=chr_acnt_file, adjacencies=chr_adjacencies, acnt=chr_acnt)
+            logger.debug("Writing merged presolved variables to {file}".format(file=presolved_vars_file))
+            write_starting_vars_to_file(file_name=presolved_vars_file, starting_vars=presolved_vars)
+            record_stage(workdir=workdir_path, stage=PRESOLVE_STAGE, key=presolve_key, outputs=[presolved_vars_file])
+    else:
+        presolved_vars = None
+    if presolved_vars is None and heuristic_scnt is not None:
+        logger.info("Using min-cost flow heuristic copy numbers as a MIP start")
+        presolved_vars = get_starting_vars_from_cn_profiles(segments=segments, adjacencies=adjacencies, scnt=heuristic_scnt, acnt=heuristic_acnt,
+                                                            segments_to_fragments=segments_to_fragments)
+
+    gurobi_log_path = os.path.join(output_dir, "gurobi.log")
+    logger.info("Gurobi log will be stored in {log_path}".format(log_path=gurobi_log_path))
+    with profiler.stage("model_build") as model_build_stage:
+        ilp_model.starting_vars = presolved_vars
+        for clones_group in ilp_model.interchangeable_clones:
+            logger.info("Clones {clone_ids} have identical input and are ordered by their total copy number to break the symmetry".format(clone_ids=",".join(clones_group)))
+        model_cache_dir = None
+        if args.run_model_cache:
+            model_input_files = [preprocessed_scnt_file, preprocessed_scnb_file, preprocessed_input_adjacencies_file, preprocessed_telomeres_file, preprocessed_fragments_file]
+            if len(adjacency_groups) > 0:
+                model_input_files.append(preprocessed_adjacencies_group_file)
+            model_cache_key = get_model_cache_key(input_files=model_input_files,
+                                                  options={"clone_ids": clone_ids,
+                                                           "haploid": args.run_haploid,
+                                                           "nas_fp": overall_nas_fp,
+                                                           "var_elimination": args.run_var_elimination,
+                                                           "clone_symmetry_breaking": args.run_clone_symmetry_breaking,
+                                                           "location_constraints": args.run_location_constraints,
+                                                           "extra": extra})
+            model_cache_dir = os.path.join(workdir_path, "_model_cache", model_cache_key)
+            logger.debug("Model cache directory is {cache_dir}".format(cache_dir=model_cache_dir))
+        if model_cache_dir is not None and model_cache_exists(cache_dir=model_cache_dir):
+            logger.info("Loading previously built Gurobi ILP model from {cache_dir}".format(cache_dir=model_cache_dir))
+            ilp_model.load_gurobi_model_cache(cache_dir=model_cache_dir)
+            model_build_stage["cached"] = True
+        else:
+            logger.debug("Building variables and constraints")
+            ilp_model.build_gurobi_model()
+            if model_cache_dir is not None:
+                logger.info("Storing built Gurobi ILP model in {cache_dir}".format(cache_dir=model_cache_dir))
+                ilp_model.write_gurobi_model_cache(cache_dir=model_cache_dir)
+        if len(ilp_model.eliminated_variables) > 0:
+            logger.info("Presolve eliminated {cnt} variables with values fixed by the input".format(cnt=sum(ilp_model.eliminated_variables.values())))
+            for family, cnt in sorted(ilp_model.eliminated_variables.items()):
+                logger.debug("Presolve eliminated {cnt} {family} variables".format(cnt=cnt, family=family))
+        if presolved_vars is not None:
+            starts_summary = ilp_model.starting_vars_summary()
+            logger.info("MIP start: {accepted} accepted, {repaired} repaired, {missing} missing out of {total} variables"
+                        "".format(accepted=starts_summary["accepted"], repaired=starts_summary["repaired"], missing=starts_summary["missing"], total=starts_summary["total"]))
+            for family, family_report in sorted(ilp_model.starting_vars_report.items()):
+                logger.debug("MIP start for {family} variables: {accepted} accepted, {repaired} repaired, {missing} missing out of {total}"
+                             "".format(family=family, **family_report))
+        logger.debug("Setting gurobi parameters")
+        ilp_model.gm.setParam("MIPGap", args.run_g_mip_gap)
+        ilp_model.gm.setParam("MIPGapAbs", args.run_g_mip_gap)
+        ilp_model.gm.setParam("MIPFocus", args.run_g_mip_focus)
+        ilp_model.gm.setParam("LogFile", gurobi_log_path)
+        ilp_model.gm.setParam("TimeLimit", args.run_g_time_limit)
+        ilp_model.gm.setParam("Threads", args.run_g_threads)
+    sweep_points = get_fp_sweep_points(nas_fp_values=args.run_sweep_nas_fp, group_m_default_fp_values=args.run_sweep_group_m_default_fp,
+                                       group_n_default_fp_values=args.run_sweep_group_n_default_fp, nas_fp=overall_nas_fp,
+                                       group_m_default_fp=args.run_group_m_default_fp, group_n_default_fp=args.run_group_n_default_fp)
+    if args.run_nas_screening:
+        with profiler.stage("nas_screening"):
+            logger.info("Screening novel adjacencies with the LP relaxation of the model (threshold {threshold})".format(threshold=args.run_nas_screening_threshold))
+            # screened out novel adjacencies stay absent for all sweep points, so their number is capped by the lowest false positive rate among them
+            screening_nas_fp = min([overall_nas_fp] + [point["nas_fp"] for point in sweep_points])
+            if screening_nas_fp < overall_nas_fp:
+                logger.info("Number of screened out novel adjacencies is capped by the lowest swept novel adjacencies false positive rate {fp}".format(fp=screening_nas_fp))
+            screening_report = ilp_model.screen_novel_adjacencies(threshold=args.run_nas_screening_threshold, verify=args.run_nas_screening_verify,
+                                                                  nas_fp=screening_nas_fp)
+            if screening_report["status"] != g.GRB.Status.OPTIMAL:
+                logger.warning("LP relaxation finished with status {status}, no novel adjacencies were screened out".format(status=screening_report["status"]))
+            else:
+                logger.info("Screened out {screened} novel adjacencies ({below} were below the threshold, {verified} of them were kept by the reduced cost verification, "
+                            "{capped} were kept due to the novel adjacencies false positive rate)".format(screened=screening_report["screened"],
+                                                                                                           below=screening_report["below_threshold"],
+                                                                                                           verified=screening_report["kept_by_verification"],
+                                                                                                           capped=screening_report["kept_by_fp_cap"]))
+            screening_file = os.path.join(output_dir, "nas_screening.json")
+            logger.debug("Writing novel adjacencies screening report to {file}".format(file=screening_file))
+            with open(screening_file, "wt") as destination:
+                json.dump(dict(screening_report, screened_ids=sorted(ilp_model.screened_nas_ids)), destination, indent=2)
+    if len(sweep_points) > 0:
+        sweep_dir = os.path.join(output_dir, "sweep")
+        logger.info("Solving the model for {cnt} points of false positive parameters sweep. Results will be stored in {dir}".format(cnt=len(sweep_points), dir=sweep_dir))
+        with profiler.stage("sweep", points=len(sweep_points)):
+            run_fp_sweep(ilp_model=ilp_model, sweep_points=sweep_points, sweep_dir=sweep_dir, segments=segments, adjacencies=adjacencies,
+                         allow_interrupted=args.run_g_allow_interrupted, mix_reference_and_novel=args.o_acnt_mix_novel_and_reference, logger=logger)
+        logger.info("Finished false positive parameters sweep. Post-inference checks are not performed in the sweep mode.")
+        exit(0)
     logger.info("Starting Gurobi to solve the optimization problem")
     if args.run_haploid:
         logger.warning("Problem is being solved as if the underlying reference is haploid.")
-    ilp_model.solve_model()
+    with profiler.stage("solve"):
+        checkpoint_callback = None
+        if args.run_checkpoint:
+            logger.info("Improved incumbent solutions will be checkpointed (at most once every {interval} seconds) to {dir}".format(interval=args.run_checkpoint_interval,
+                                                                                                                                   dir=checkpoint_dir))
+            checkpoint_callback = IncumbentCheckpointCallback(ilp_model=ilp_model, checkpoint_dir=checkpoint_dir, min_interval=args.run_checkpoint_interval, logger=logger,
+                                                              content_key=checkpoint_key)
+        progress_callback = SolverProgressCallback(callback=checkpoint_callback)
+        ilp_model.solve_model(callback=progress_callback)
+        if ilp_model.gm.status == g.GRB.Status.INFEASIBLE and len(ilp_model.screened_nas_ids) > 0:
+            restored_cnt = ilp_model.restore_screened_novel_adjacencies()
+            logger.warning("Model was infeasible with {cnt} novel adjacencies screened out (screening is a heuristic). "
+                           "Restored screened out novel adjacencies and solving again".format(cnt=restored_cnt))
+            ilp_model.solve_model(callback=progress_callback)
+        if args.run_location_constraints == "lazy":
+            logger.info("A total of {cnt} violated location constraints were lazily added during solving".format(cnt=ilp_model.lazy_locations_constraints_cnt))
+        if checkpoint_callback is not None:
+            checkpoint_callback.flush()
+    profiler.extra["solver"] = dict(get_solver_statistics(gm=ilp_model.gm, progress_callback=progress_callback), build_time=model_build_stage["wall_time"])
 
     logger.info("Gurobi model solving has ended")
     status = ilp_model.gm.status
@@ -612,11 +1000,30 @@ def main():
     if status == g.GRB.Status.INFEASIBLE:
         logger.error("Constructed model was infeasible to solve. This usually happens because of the tight segment copy number boundaries.")
         logger.error("\t Try more flexible segment copy number boundaries or try increasing allowed Novel adjacencies False Positive value.")
-        logger.info("Gurobi computes the IIS")
-        ilp_model.gm.computeIIS()
-        ilp_path = os.path.join(output_dir, "model.ilp")
-        logger.info("Writing down Gurobi IIS to {file}".format(file=ilp_path))
-        ilp_model.gm.write(ilp_path)
+        with profiler.stage("diagnostics"):
+            if args.run_infeasibility_diagnostics in ["bisection", "both"]:
+                logger.info("Localizing the infeasibility by solving reduced feasibility models ({workers} in parallel)".format(workers=args.run_diagnostics_workers))
+                feasibility_checker = FeasibilityChecker(segments=segments, adjacencies=adjacencies, scnt=scnt, scnb=scnb, telomeres=telomeres,
+                                                         adjacency_groups=adjacency_groups, segments_to_fragments=segments_to_fragments, nas_fp=overall_nas_fp,
+                                                         solve_as_haploid=args.run_haploid, extra=extra, time_limit=args.run_diagnostics_time_limit,
+                                                         threads=max(1, args.run_g_threads // max(1, args.run_diagnostics_workers)),
+                                                         workers=args.run_diagnostics_workers, max_checks=args.run_diagnostics_max_checks)
+                infeasibility_report = localize_infeasibility(checker=feasibility_checker, logger=logger)
+                infeasibility_report_lines = get_infeasibility_report_lines(report=infeasibility_report)
+                for line in infeasibility_report_lines:
+                    logger.error(line)
+                infeasibility_report_path = os.path.join(output_dir, "infeasibility.txt")
+                logger.info("Writing down infeasibility localization report to {file} (and its JSON version alongside)".format(file=infeasibility_report_path))
+                with open(infeasibility_report_path, "wt") as destination:
+                    print("\n".join(infeasibility_report_lines), file=destination)
+                with open(os.path.join(output_dir, "infeasibility.json"), "wt") as destination:
+                    json.dump(infeasibility_report, destination, indent=2)
+            if args.run_infeasibility_diagnostics in ["iis", "both"]:
+                logger.info("Gurobi computes the IIS")
+                ilp_model.gm.computeIIS()
+                ilp_path = os.path.join(output_dir, "model.ilp")
+                logger.info("Writing down Gurobi IIS to {file}".format(file=ilp_path))
+                ilp_model.gm.write(ilp_path)
         logger.error("Inference was unsuccessful.")
         exit(1)
     allowed_statuses = [g.GRB.Status.OPTIMAL, g.GRB.Status.TIME_LIMIT]
@@ -630,34 +1037,25 @@ def main():
         logger.error("Inference was unsuccessful")
         exit(1)
 
-    ilp_model.gm.write(os.path.join(output_dir, "gurobi.lp"))
-    with open(os.path.join(output_dir, "gurobi.sol"), "wt") as destination:
-        for var in ilp_model.gm.getVars():
-            print(var.VarName, var.X, file=destination)
-
-    logger.info("Gurobi finished execution with status {status}".format(status=status))
-    if args.run_haploid:
-        logger.warning("Problem has been solved as if the underlying reference is haploid. Inferred copy number data is not truly diploid.")
-    logger.info("Extracting inferred diploid segment copy number data")
-    scnt = ilp_model.get_scnt_from_model()
-    logger.info("Extracting inferred diploid adjacency copy number data")
-    acnt = ilp_model.get_acnt_from_model()
-    scnt_base_name = args.out_prefix_name + "rck.scnt.tsv"
-    if scnt_base_name.startswith("."):
-        scnt_base_name = scnt_base_name[1:]
-    scnt_base_name = re.sub("\.+", ".", scnt_base_name)
-    scnt_file_path = os.path.join(output_dir, scnt_base_name)
-    logger.info("Writing inferred diploid segment copy number data to {file}".format(file=scnt_file_path))
-    remove_cn_data_from_segments(segments=segments)
-    write_scnt_to_file(file_name=scnt_file_path, segments=segments, scnt=scnt)
-    acnt_base_name = args.out_prefix_name + "rck.acnt.tsv"
-    if acnt_base_name.startswith("."):
-        acnt_base_name = acnt_base_name[1:]
-    acnt_base_name = re.sub("\.+", ".", acnt_base_name)
-    acnt_file_path = os.path.join(output_dir, acnt_base_name)
-    logger.info("Writing inferred diploid adjacency copy number data to {file}".format(file=acnt_file_path))
-    remove_cn_data_from_adjacencies(adjacencies=adjacencies)
-    write_acnt_to_file(file_name=acnt_file_path, acnt=acnt, adjacencies=adjacencies, output_reference=True, mix_reference_and_novel=args.o_acnt_mix_novel_and_reference)
+    with profiler.stage("extraction"):
+        ilp_model.gm.write(os.path.join(output_dir, "gurobi.lp"))
+        ilp_model.write_solution(file_name=os.path.join(output_dir, "gurobi.sol"))
+
+        logger.info("Gurobi finished execution with status {status}".format(status=status))
+        if args.run_haploid:
+            logger.warning("Problem has been solved as if the underlying reference is haploid. Inferred copy number data is not truly diploid.")
+        logger.info("Extracting inferred diploid segment copy number data")
+        scnt = ilp_model.get_scnt_from_model()
+        logger.info("Extracting inferred diploid adjacency copy number data")
+        acnt = ilp_model.get_acnt_from_model()
+        scnt_file_path = get_output_file_path(output_dir=output_dir, out_prefix_name=args.out_prefix_name, base_name="rck.scnt.tsv")
+        logger.info("Writing inferred diploid segment copy number data to {file}".format(file=scnt_file_path))
+        remove_cn_data_from_segments(segments=segments)
+        write_scnt_to_file(file_name=scnt_file_path, segments=segments, scnt=scnt)
+        acnt_file_path = get_output_file_path(output_dir=output_dir, out_prefix_name=args.out_prefix_name, base_name="rck.acnt.tsv")
+        logger.info("Writing inferred diploid adjacency copy number data to {file}".format(file=acnt_file_path))
+        remove_cn_data_from_adjacencies(adjacencies=adjacencies)
+        write_acnt_to_file(file_name=acnt_file_path, acnt=acnt, adjacencies=adjacencies, output_reference=True, mix_reference_and_novel=args.o_acnt_mix_novel_and_reference)
 
     #########
     #
@@ -665,200 +1063,169 @@ def main():
     #
     #########
 
-    if args.post_check_all or args.post_check_scnb:
-        logger.info("Performing post-inference check that inferred segment copy number values are within input and/or preprocessed bounds")
-        for clone_id in clone_ids:
-            logger.info("Working with clone {clone_id}".format(clone_id=clone_id))
-            scnp = scnt[clone_id]
-            scnbp = scnb[clone_id]
-            problems = False
-            for segment in segments:
-                sid = segment.stable_id_non_hap
-                sync_indicator = ilp_model.alleles_sync_result(segment=segment)
-                cna, cnb = scnp.get_cn(sid=sid, haplotype=Haplotype.A), scnp.get_cn(sid=sid, haplotype=Haplotype.B)
-                lower_a = scnbp.get_cnb(sid=sid, hap=Haplotype.A, boundary_type=CNBoundaries.LOWER)
-                lower_b = scnbp.get_cnb(sid=sid, hap=Haplotype.B, boundary_type=CNBoundaries.LOWER)
-                upper_a = scnbp.get_cnb(sid=sid, hap=Haplotype.A, boundary_type=CNBoundaries.UPPER)
-                upper_b = scnbp.get_cnb(sid=sid, hap=Haplotype.B, boundary_type=CNBoundaries.UPPER)
+    with profiler.stage("post_checks"):
+        if args.post_check_all or args.post_check_scnb:
+            logger.info("Performing post-inference check that inferred segment copy number values are within input and/or preprocessed bounds")
+            sids = [segment.stable_id_non_hap for segment in segments]
+            syncs = np.array([ilp_model.alleles_sync_result(segment=segment) for segment in segments])
+            for clone_id in clone_ids:
+                logger.info("Working with clone {clone_id}".format(clone_id=clone_id))
+                cns = get_scnp_array(scnp=scnt[clone_id], sids=sids)
+                lower = get_scnbp_array(scnbp=scnb[clone_id], sids=sids, boundary_type=CNBoundaries.LOWER)
+                upper = get_scnbp_array(scnbp=scnb[clone_id], sids=sids, boundary_type=CNBoundaries.UPPER)
                 if args.run_haploid:
-                    lower_b, upper_b = 0, 0
-                if sync_indicator == 1:
-                    if (not lower_a <= cna <= upper_a) or (not lower_b <= cnb <= upper_b):
-                        problems = True
-                else:
-                    if (not lower_b <= cna <= upper_b) or (not lower_a <= cnb <= upper_a):
-                        problems = True
-                if problems:
+                    lower[:, 1], upper[:, 1] = 0, 0
+                violations = scnb_violations_mask(cns=cns, lower=lower, upper=upper, syncs=syncs)
+                for index in np.flatnonzero(violations):
                     logger.error("Something went WRONG! For segment {sid} with allele-sync flag {flag} inferred copy numbers are A={cna}, B={cnb},"
                                  "the input copy number boundaries were A={lower_a}-{upper_a}, B={lower_b}-{upper_b}."
-                                 "".format(sid=sid, flag=sync_indicator, cna=cna, cnb=cnb, lower_a=lower_a, upper_a=upper_a, lower_b=lower_b, upper_b=upper_b))
-            if not problems:
-                logger.info("Everything is OK!")
-
-    if args.post_check_all or args.post_check_labeling:
-        logger.info("Performing post-inference check on labels on adjacencies with positive copy numbers")
-        logger.info("Checking that every unlabeled novel adjacency has at most one labeled 'realization' across all clones")
-        novel_adjacencies = [a for a in adjacencies if a.adjacency_type == AdjacencyType.NOVEL]
-        violations = False
-        for adj in novel_adjacencies:
-            labeling_realizations = set()
-            for clone_id in clone_ids:
-                acnp = acnt[clone_id]
-                for ph in [Phasing.AA, Phasing.AB, Phasing.BA, Phasing.BB]:
-                    if acnp.get_cn(aid=adj.stable_id_non_phased, phasing=ph) > 0:
-                        labeling_realizations.add(ph)
-            if len(labeling_realizations) > 1:
-                violations = True
-                logger.error("Something went WRONG! For unlabeled novel adjacency (id = {aid}) {stable_id} more than 1 labeled 'realization' is present across all clones"
-                             "".format(aid=adj.extra.get(EXTERNAL_NA_ID, adj.idx), stable_id=adj.stable_id_non_phased))
-        if not violations:
-            logger.info("Everything is OK! No violations of multiple 'realizations' were identified.")
-
-        logger.info("Checking that every reference location, that has reciprocal novel adjacencies, concurs with the Infinite Sites constraints")
-        combined_scnp = SegmentCopyNumberProfile.combined(*[scnt[clone_id] for clone_id in clone_ids])
-        combined_acnp = AdjacencyCopyNumberProfile.combined(*[acnt[clone_id] for clone_id in clone_ids])
-        hiag = construct_hiag_inflate_from_haploid_data(hapl_segments=segments, hapl_adjacencies=adjacencies)
-        hiag.assign_copy_numbers_from_scn_profile(scn_profile=combined_scnp)
-        hiag.assign_copy_numbers_from_acn_profile(acn_profile=combined_acnp)
-        hiag.remove_edges_with_zero_cn()
-
-        logger.info("Checking for extremity-exclusivity constraint violations")
-        extremity_exclusivity_violations = hiag.violations_of_extremity_exclusivity()
-        if len(extremity_exclusivity_violations) > 0:
-            logger.error("Something went WRONG! The following segments extremities violate extremity-exclusivity constraint of the Infinite Sites model.")
-            logger.error(",".join(map(str, extremity_exclusivity_violations)))
-        else:
-            logger.info("Everything is OK! No extremity-exclusivity violations were found!")
-        logger.info("Checking for homologous-extremity-exclusivity violations")
-        homologous_extremity_exclusivity_violations = hiag.violations_of_homologous_extremity_exclusivity()
-        if len(homologous_extremity_exclusivity_violations) > 0:
-            logger.error("Something went WRONG! The following pairs of segments extremities violate homologous-extremity-exclusivity constraint of the Infinite Sites model.")
-            string_data = []
-            for p1, p2 in homologous_extremity_exclusivity_violations:
-                string_data.append("{{{p1},{p2}}}".format(p1=str(p1), p2=str(p2[0])))
-            logger.error(" , ".join(string_data))
-        else:
-            logger.info("Everything is OK! No homologous-extremity-exclusivity violations were found!"
-                        "".format(cnt=len(ilp_model.reciprocal_locations)))
-        logger.info("Checking for reciprocal-homologous-extremity-exclusivity violations")
-        homologous_reciprocal_extremity_exclusivity_violations = hiag.violations_of_homologous_reciprocal_extremity_exclusivity()
-        if len(homologous_reciprocal_extremity_exclusivity_violations) > 0:
-            logger.error("Something went WRONG! "
-                         "The following pairs of segments extremities violate homologous-reciprocal-extremity-exclusivity constraint of the Infinite Sites model.")
-            string_data = []
-            for p1, p2 in homologous_reciprocal_extremity_exclusivity_violations:
-                string_data.append("{{{p1},{p2}}}".format(p1=str(p1), p2=str(p2)))
-            logger.error(" , ".join(string_data))
-        else:
-            logger.info("Everything is OK! Ho homologous-reciprocal-extremity-exclusivity were found across {cnt} reciprocal locations!"
-                        "".format(cnt=len(ilp_model.reciprocal_locations)))
-
-    if args.post_check_all or args.post_check_balancing:
-        logger.info("Performing post-inference check on balances/excesses on segments' extremities")
-        for clone_id in clone_ids:
-            logger.info("Processing clone {clone_id}".format(clone_id=clone_id))
+                                 "".format(sid=sids[index], flag=syncs[index], cna=cns[index, 0], cnb=cns[index, 1],
+                                           lower_a=lower[index, 0], upper_a=upper[index, 0], lower_b=lower[index, 1], upper_b=upper[index, 1]))
+                if not violations.any():
+                    logger.info("Everything is OK!")
+
+        if args.post_check_all or args.post_check_labeling:
+            logger.info("Performing post-inference check on labels on adjacencies with positive copy numbers")
+            logger.info("Checking that every unlabeled novel adjacency has at most one labeled 'realization' across all clones")
+            novel_adjacencies = [a for a in adjacencies if a.adjacency_type == AdjacencyType.NOVEL]
+            violations = False
+            labeled_phasings_indexes = [PHASINGS_INDEXES[ph] for ph in [Phasing.AA, Phasing.AB, Phasing.BA, Phasing.BB]]
+            novel_acnt = get_acnt_array(acnt=acnt, aids=[adj.stable_id_non_phased for adj in novel_adjacencies], clone_ids=clone_ids)
+            labeling_realizations_cnts = (novel_acnt[:, :, labeled_phasings_indexes] > 0).any(axis=0).sum(axis=1)
+            for adj, labeling_realizations_cnt in zip(novel_adjacencies, labeling_realizations_cnts):
+                if labeling_realizations_cnt > 1:
+                    violations = True
+                    logger.error("Something went WRONG! For unlabeled novel adjacency (id = {aid}) {stable_id} more than 1 labeled 'realization' is present across all clones"
+                                 "".format(aid=adj.extra.get(EXTERNAL_NA_ID, adj.idx), stable_id=adj.stable_id_non_phased))
+            if not violations:
+                logger.info("Everything is OK! No violations of multiple 'realizations' were identified.")
+
+            logger.info("Checking that every reference location, that has reciprocal novel adjacencies, concurs with the Infinite Sites constraints")
+            combined_scnp = SegmentCopyNumberProfile.combined(*[scnt[clone_id] for clone_id in clone_ids])
+            combined_acnp = AdjacencyCopyNumberProfile.combined(*[acnt[clone_id] for clone_id in clone_ids])
             hiag = construct_hiag_inflate_from_haploid_data(hapl_segments=segments, hapl_adjacencies=adjacencies)
-            scnp = scnt[clone_id]
-            acnp = acnt[clone_id]
-            hiag.assign_copy_numbers_from_scn_profile(scn_profile=scnp)
-            hiag.assign_copy_numbers_from_acn_profile(acn_profile=acnp)
+            hiag.assign_copy_numbers_from_scn_profile(scn_profile=combined_scnp)
+            hiag.assign_copy_numbers_from_acn_profile(acn_profile=combined_acnp)
             hiag.remove_edges_with_zero_cn()
-            logger.info("Checking that every vertex has a copy number excess >= 0.")
-            for node in hiag.nodes(data=False):
-                if hiag.node_imbalance(node=node) < 0:
-                    logger.error("Something went WRONG! On segment extremity {node} there is a negative copy number excess...")
-                    exit(1)
-            logger.info("Getting inferred telomeres.")
-            diploid_telomeres = hiag.get_telomeres()
-            inferred_hapl_telomeres_ids = {p.stable_id_non_hap for p in diploid_telomeres}
+
+            logger.info("Checking for extremity-exclusivity constraint violations")
+            extremity_exclusivity_violations = hiag.violations_of_extremity_exclusivity()
+            if len(extremity_exclusivity_violations) > 0:
+                logger.error("Something went WRONG! The following segments extremities violate extremity-exclusivity constraint of the Infinite Sites model.")
+                logger.error(",".join(map(str, extremity_exclusivity_violations)))
+            else:
+                logger.info("Everything is OK! No extremity-exclusivity violations were found!")
+            logger.info("Checking for homologous-extremity-exclusivity violations")
+            homologous_extremity_exclusivity_violations = hiag.violations_of_homologous_extremity_exclusivity()
+            if len(homologous_extremity_exclusivity_violations) > 0:
+                logger.error("Something went WRONG! The following pairs of segments extremities violate homologous-extremity-exclusivity constraint of the Infinite Sites model.")
+                string_data = []
+                for p1, p2 in homologous_extremity_exclusivity_violations:
+                    string_data.append("{{{p1},{p2}}}".format(p1=str(p1), p2=str(p2[0])))
+                logger.error(" , ".join(string_data))
+            else:
+                logger.info("Everything is OK! No homologous-extremity-exclusivity violations were found!"
+                            "".format(cnt=len(ilp_model.reciprocal_locations)))
+            logger.info("Checking for reciprocal-homologous-extremity-exclusivity violations")
+            homologous_reciprocal_extremity_exclusivity_violations = hiag.violations_of_homologous_reciprocal_extremity_exclusivity()
+            if len(homologous_reciprocal_extremity_exclusivity_violations) > 0:
+                logger.error("Something went WRONG! "
+                             "The following pairs of segments extremities violate homologous-reciprocal-extremity-exclusivity constraint of the Infinite Sites model.")
+                string_data = []
+                for p1, p2 in homologous_reciprocal_extremity_exclusivity_violations:
+                    string_data.append("{{{p1},{p2}}}".format(p1=str(p1), p2=str(p2)))
+                logger.error(" , ".join(string_data))
+            else:
+                logger.info("Everything is OK! Ho homologous-reciprocal-extremity-exclusivity were found across {cnt} reciprocal locations!"
+                            "".format(cnt=len(ilp_model.reciprocal_locations)))
+
+        if args.post_check_all or args.post_check_balancing:
+            logger.info("Performing post-inference check on balances/excesses on segments' extremities")
+            hiag = construct_hiag_inflate_from_haploid_data(hapl_segments=segments, hapl_adjacencies=adjacencies)
+            incidence = CopyNumberIncidence(iag=hiag)
+            imbalances = incidence.get_imbalances(copy_numbers=incidence.get_copy_numbers(scnt=scnt, acnt=acnt, clone_ids=clone_ids))
             input_hapl_telomers_ids = {p.stable_id_non_hap for p in telomeres}
-            if inferred_hapl_telomeres_ids > input_hapl_telomers_ids:
-                logger.error("Something went WRONG! Following segments extremities, while not specified specified as possible telomere sites were inferred as such.")
-                logger.error(",".join(map(str, sorted(inferred_hapl_telomeres_ids - input_hapl_telomers_ids))))
+            for clone_index, clone_id in enumerate(clone_ids):
+                logger.info("Processing clone {clone_id}".format(clone_id=clone_id))
+                logger.info("Checking that every vertex has a copy number excess >= 0.")
+                if (imbalances[clone_index] < 0).any():
+                    logger.error("Something went WRONG! On segment extremity {node} there is a negative copy number excess..."
+                                 "".format(node=str(incidence.nodes[np.flatnonzero(imbalances[clone_index] < 0)[0]])))
+                    exit(1)
+                logger.info("Getting inferred telomeres.")
+                inferred_hapl_telomeres_ids = {incidence.nodes[node_index].stable_id_non_hap for node_index in np.flatnonzero(imbalances[clone_index] > 0)}
+                if len(inferred_hapl_telomeres_ids - input_hapl_telomers_ids) > 0:
+                    logger.error("Something went WRONG! Following segments extremities, while not specified specified as possible telomere sites were inferred as such.")
+                    logger.error(",".join(map(str, sorted(inferred_hapl_telomeres_ids - input_hapl_telomers_ids))))
+                else:
+                    logger.info("Everything is OK! in clone {clone_id} all extremities have non-negative copy number excess, and inferred telomere sites concur with the input"
+                                "".format(clone_id=clone_id))
+
+        if args.post_check_all or args.post_check_adj_groups or args.post_check_adj_groups_m:
+            logger.info("Performing post-inference check on adjacencies groups (molecule type)")
+            molecule_groups = [ag for ag in adjacency_groups if ag.group_type == AdjacencyGroupType.MOLECULE]
+            molecule_groups_fine_cnt = 0
+            logger.info("There were {cnt} molecule adjacency groups in the input.".format(cnt=len(molecule_groups)))
+            molecule_groups_inferred_fps = adjacency_groups_molecule_inferred_fps(groups=molecule_groups, acnt=acnt, clone_ids=clone_ids)
+            for group, inferred_fps in zip(molecule_groups, molecule_groups_inferred_fps):
+                group_fp = group.extra.get(FALSE_POSITIVE, extra[DEFAULT_GROUP_M_FP])
+                good_clones_indexes = np.flatnonzero(inferred_fps <= group_fp)
+                group_is_good = len(good_clones_indexes) > 0
+                good_inferred_fp = inferred_fps[good_clones_indexes[-1]] if group_is_good else -1
+                if not group_is_good:
+                    logger.error("Something went WRONG! In Adjacency Group {gid} not a single clone has <= than the input FP of {input_fp}."
+                                 "".format(gid=group.gid, input_fp=group_fp))
+                else:
+                    logger.debug("Group {gid} is fine (there is a clone with group FP of {fp:0.4f} which is >= than the input FP of {ifp:0.4f})."
+                                 "".format(gid=group.gid, fp=good_inferred_fp, ifp=group.extra.get(FALSE_POSITIVE, extra[DEFAULT_GROUP_M_FP])))
+                    molecule_groups_fine_cnt += 1
+            if molecule_groups_fine_cnt == len(molecule_groups):
+                logger.info("Everything is OK for all {good}/{all} molecule adjacency groups.".format(good=molecule_groups_fine_cnt, all=len(molecule_groups)))
             else:
-                logger.info("Everything is OK! in clone {clone_id} all extremities have non-negative copy number excess, and inferred telomere sites concur with the input"
-                            "".format(clone_id=clone_id))
-
-    if args.post_check_all or args.post_check_adj_groups or args.post_check_adj_groups_m:
-        logger.info("Performing post-inference check on adjacencies groups (molecule type)")
-        molecule_groups = [ag for ag in adjacency_groups if ag.group_type == AdjacencyGroupType.MOLECULE]
-        molecule_groups_fine_cnt = 0
-        logger.info("There were {cnt} molecule adjacency groups in the input.".format(cnt=len(molecule_groups)))
-        for group in molecule_groups:
-            group_fp = group.extra.get(FALSE_POSITIVE, extra[DEFAULT_GROUP_M_FP])
-            group_is_good = False
-            good_inferred_fp = -1
-            for clone_id in clone_ids:
-                acnp = acnt[clone_id]
-                clone_present = acnp.haploid_adjacencies_present(adjacencies=group.adjacencies)
-                inferred_fp = 1 - (len(clone_present) * 1.0 / len(group.adjacencies))
-                if inferred_fp <= group_fp:
-                    good_inferred_fp = inferred_fp
-                group_is_good |= inferred_fp <= group_fp
-            if not group_is_good:
-                logger.error("Something went WRONG! In Adjacency Group {gid} not a single clone has <= than the input FP of {input_fp}."
-                             "".format(gid=group.gid, input_fp=group_fp))
+                logger.error("Something went WRONG! In some molecule adjacency groups (see above) not a single clone has <= than the input FP.")
+
+        if args.post_check_all or args.post_check_adj_groups or args.post_check_adj_groups_n:
+            logger.info("Performing post-inference check on adjacency groups (general type)")
+            general_groups = [ag for ag in adjacency_groups if ag.group_type == AdjacencyGroupType.GENERAL]
+            general_groups_fine_cnt = 0
+            logger.info("There were {cnt} general adjacency groups in the input.".format(cnt=len(general_groups)))
+            general_groups_inferred_fps = adjacency_groups_general_inferred_fps(groups=general_groups, acnt=acnt, clone_ids=clone_ids)
+            for group, inferred_fp in zip(general_groups, general_groups_inferred_fps):
+                group_fp = group.extra.get(FALSE_POSITIVE, extra[DEFAULT_GROUP_N_FP])
+                if inferred_fp > group_fp:
+                    logger.error("Something went wrong! In Adjacency Group {gid} inferred FP is {inferred:0.4f}, while input maximum FP was {group_fp:0.4f}."
+                                 "".format(gid=group.gid, inferred=inferred_fp, group_fp=group_fp))
+                else:
+                    logger.debug("Group {gid} is fine (inferred FP is {inferred:0.4f}, with the input maximum FP being {group_fp:0.4f}"
+                                 "".format(gid=group.gid, inferred=inferred_fp, group_fp=group_fp))
+                    general_groups_fine_cnt += 1
+            if general_groups_fine_cnt == len(general_groups):
+                logger.info("Everything is OK for all {good}/{all} general adjacency groups.".format(good=general_groups_fine_cnt, all=len(general_groups)))
             else:
-                logger.debug("Group {gid} is fine (there is a clone with group FP of {fp:0.4f} which is >= than the input FP of {ifp:0.4f})."
-                             "".format(gid=group.gid, fp=good_inferred_fp, ifp=group.extra.get(FALSE_POSITIVE, extra[DEFAULT_GROUP_M_FP])))
-                molecule_groups_fine_cnt += 1
-        if molecule_groups_fine_cnt == len(molecule_groups):
-            logger.info("Everything is OK for all {good}/{all} molecule adjacency groups.".format(good=molecule_groups_fine_cnt, all=len(molecule_groups)))
-        else:
-            logger.error("Something went WRONG! In some molecule adjacency groups (see above) not a single clone has <= than the input FP.")
-
-    if args.post_check_all or args.post_check_adj_groups or args.post_check_adj_groups_n:
-        logger.info("Performing post-inference check on adjacency groups (general type)")
-        general_groups = [ag for ag in adjacency_groups if ag.group_type == AdjacencyGroupType.GENERAL]
-        general_groups_fine_cnt = 0
-        logger.info("There were {cnt} general adjacency groups in the input.".format(cnt=len(general_groups)))
-        for group in general_groups:
-            group_fp = group.extra.get(FALSE_POSITIVE, extra[DEFAULT_GROUP_N_FP])
-            total_present = set()
-            for clone_id in clone_ids:
-                acnp = acnt[clone_id]
-                clone_specific = acnp.haploid_adjacencies_present(adjacencies=group.adjacencies)
-                for adjacency in clone_specific:
-                    total_present.add(adjacency.stable_id_non_phased)
-            inferred_fp = 1 - (len(total_present) * 1.0 / len(group.adjacencies_ids))
-            if inferred_fp > group_fp:
-                logger.error("Something went wrong! In Adjacency Group {gid} inferred FP is {inferred:0.4f}, while input maximum FP was {group_fp:0.4f}."
-                             "".format(gid=group.gid, inferred=inferred_fp, group_fp=group_fp))
+                logger.error("Something went WRONG! In some general adjacency groups (see above) inferred FP was greater then the maximum input FP.")
+
+        if args.post_check_all or args.post_check_adj_groups or args.post_check_adj_groups_l:
+            logger.info("Performing post-inference check on adjacency groups (labeling type)")
+            labeling_groups = [ag for ag in adjacency_groups if ag.group_type == AdjacencyGroupType.LABELING]
+            logger.info("There were {cnt} labeling adjacency groups in the input.".format(cnt=len(labeling_groups)))
+            labeling_groups_violations = adjacency_groups_labeling_violations(groups=labeling_groups, acnt=acnt)
+            if len(labeling_groups_violations) == 0:
+                logger.info("Everything is OK for all {good}/{all} labeling adjacency groups.".format(good=len(labeling_groups) - len(labeling_groups_violations), all=len(labeling_groups)))
             else:
-                logger.debug("Group {gid} is fine (inferred FP is {inferred:0.4f}, with the input maximum FP being {group_fp:0.4f}"
-                             "".format(gid=group.gid, inferred=inferred_fp, group_fp=group_fp))
-                general_groups_fine_cnt += 1
-        if general_groups_fine_cnt == len(general_groups):
-            logger.info("Everything is OK for all {good}/{all} general adjacency groups.".format(good=general_groups_fine_cnt, all=len(general_groups)))
-        else:
-            logger.error("Something went WRONG! In some general adjacency groups (see above) inferred FP was greater then the maximum input FP.")
-
-    if args.post_check_all or args.post_check_adj_groups or args.post_check_adj_groups_l:
-        logger.info("Performing post-inference check on adjacency groups (labeling type)")
-        labeling_groups = [ag for ag in adjacency_groups if ag.group_type == AdjacencyGroupType.LABELING]
-        logger.info("There were {cnt} labeling adjacency groups in the input.".format(cnt=len(labeling_groups)))
-        labeling_groups_violations = adjacency_groups_labeling_violations(groups=labeling_groups, acnt=acnt)
-        if len(labeling_groups_violations) == 0:
-            logger.info("Everything is OK for all {good}/{all} labeling adjacency groups.".format(good=len(labeling_groups) - len(labeling_groups_violations), all=len(labeling_groups)))
-        else:
-            logger.error(", ".join(str(ag.gid) for ag in labeling_groups_violations))
-            logger.error("Something went WRONG! In some labeling adjacency groups (see above) inferred FP was greater then the maximum input FP.")
-
-    if args.post_check_all or args.post_check_nas_fp:
-        logger.info("Performing post-inference check on overall novel adjacencies false positive parameter")
-        novel_adjacencies = [a for a in adjacencies if a.adjacency_type == AdjacencyType.NOVEL]
-        present = set()
-        for clone_id in clone_ids:
-            acnp = acnt[clone_id]
-            clone_present = acnp.haploid_adjacencies_present(adjacencies=novel_adjacencies)
-            clone_present_ids = {adj.extra.get(EXTERNAL_NA_ID, adj.idx) for adj in clone_present}
-            present |= clone_present_ids
-        inferred_fp = 1 - (len(present) * 1.0 / len(novel_adjacencies))
-        if inferred_fp <= overall_nas_fp:
-            logger.info("Everything is OK! Inferred FP = {inf_fp:0.4f}, while the input FP was {input_fp:0.4f}.".format(inf_fp=inferred_fp, input_fp=overall_nas_fp))
-        else:
-            logger.error("Something went WRONG! Inferred FP = {inf_fp:0.4f}, while the input FP was {input_fp:0.4f}.".format(inf_fp=inferred_fp, input_fp=overall_nas_fp))
-        logger.info("Finished everything. Hope you've enjoyed using RCK!")
+                logger.error(", ".join(str(ag.gid) for ag in labeling_groups_violations))
+                logger.error("Something went WRONG! In some labeling adjacency groups (see above) inferred FP was greater then the maximum input FP.")
+
+        if args.post_check_all or args.post_check_nas_fp:
+            logger.info("Performing post-inference check on overall novel adjacencies false positive parameter")
+            novel_adjacencies = [a for a in adjacencies if a.adjacency_type == AdjacencyType.NOVEL]
+            novel_adjacencies_presence = adjacencies_presence(acnt=acnt, adjacencies=novel_adjacencies, clone_ids=clone_ids).any(axis=0)
+            present = {adj.extra.get(EXTERNAL_NA_ID, adj.idx) for adj, adj_present in zip(novel_adjacencies, novel_adjacencies_presence) if adj_present}
+            inferred_fp = 1 - (len(present) * 1.0 / len(novel_adjacencies))
+            if inferred_fp <= overall_nas_fp:
+                logger.info("Everything is OK! Inferred FP = {inf_fp:0.4f}, while the input FP was {input_fp:0.4f}.".format(inf_fp=inferred_fp, input_fp=overall_nas_fp))
+            else:
+                logger.error("Something went WRONG! Inferred FP = {inf_fp:0.4f}, while the input FP was {input_fp:0.4f}.".format(inf_fp=inferred_fp, input_fp=overall_nas_fp))
+            logger.info("Finished everything. Hope you've enjoyed using RCK!")
 
 
 if __name__ == "__main__":
@@ -1,35 +1,60 @@
+import multiprocessing
 import sys
-from collections import defaultdict
+from array import array
+from collections import defaultdict, namedtuple
 
+import numpy as np
 import pysam
+from scipy.sparse import csc_matrix
 
 from rck.core.io import EXTERNAL_NA_ID, AG_LABELING
 from rck.core.structures import AdjacencyGroup, AdjacencyGroupType, Strand
 
 
 def infer_sniffles_molecule_groups(adjacencies, extra_rnames_field="rnames", gid_suffix=""):
-    reads_to_adjacencies_ids = defaultdict(set)
+    """
+    Molecule groups of adjacencies, that are supported by the same read (listed in the `extra_rnames_field`), one per read supporting at least two adjacencies.
+    Read names and adjacencies ids are interned into int32 ids, and groups are obtained from the columns of the sparse (adjacencies x reads) incidence matrix.
+    """
+    read_names_ids = {}
+    aids_ids = {}
+    incidence_aids = array("i")
+    incidence_reads = array("i")
     for adj in adjacencies:
         read_names = adj.extra.get(extra_rnames_field, "").split(",")
         if len(read_names) == 1 and len(read_names[0]) == 0:
             continue
-        for read_name in read_names:
-            reads_to_adjacencies_ids[read_name].add(adj.extra.get(EXTERNAL_NA_ID, adj.stable_id_non_phased))
+        aid = adj.extra.get(EXTERNAL_NA_ID, adj.stable_id_non_phased)
+        aid_id = aids_ids.setdefault(aid, len(aids_ids))
+        incidence_aids.extend([aid_id] * len(read_names))
+        incidence_reads.extend([read_names_ids.setdefault(read_name, len(read_names_ids)) for read_name in read_names])
+    if len(read_names_ids) == 0:
+        return []
+    incidence = csc_matrix((np.ones(len(incidence_aids), dtype=np.int32), (np.frombuffer(incidence_aids, dtype=np.intc), np.frombuffer(incidence_reads, dtype=np.intc))),
+                           shape=(len(aids_ids), len(read_names_ids)))
+    incidence.sum_duplicates()
+    read_names = list(read_names_ids.keys())
+    aids = list(aids_ids.keys())
+    indptr, indices = incidence.indptr.tolist(), incidence.indices
     result = []
-    for cnt, (read_name, aids) in enumerate(reads_to_adjacencies_ids.items()):
-        if len(aids) < 2:
-            continue
-        extra = {"source": read_name}
-        gid = str(cnt)
+    for read_id in np.flatnonzero(np.diff(incidence.indptr) >= 2).tolist():
+        extra = {"source": read_names[read_id]}
+        gid = str(read_id)
         if len(gid_suffix) > 0:
             gid += "_" + gid_suffix
-        ag = AdjacencyGroup(gid=gid, aids=list(aids), group_type=AdjacencyGroupType.MOLECULE, extra=extra)
+        group_aids = [aids[aid_id] for aid_id in indices[indptr[read_id]:indptr[read_id + 1]].tolist()]
+        ag = AdjacencyGroup(gid=gid, aids=group_aids, group_type=AdjacencyGroupType.MOLECULE, extra=extra)
         result.append(ag)
     return result
 
 
 def infer_short_nas_labeling_groups(adjacencies, gid_suffix="", max_size=1000, allow_intermediate_same=False, allow_intermediate_tra=False,
                                     allow_inv_signatures=True):
+    """
+    Labeling groups for intra-chromosomal novel adjacencies (of size at most `max_size`), whose breakends are consecutive among all breakends on the chromosome,
+        or (with `allow_intermediate_same` / `allow_intermediate_tra`) span breakends of intra- / inter-chromosomal novel adjacencies.
+    Presence of such spanned breakends is determined in constant time (per adjacency) from prefix sums over the sorted breakends.
+    """
     positions_to_adjacencies = defaultdict(list)
     positions_by_chrs = defaultdict(list)
     result = []
@@ -39,10 +64,21 @@ def infer_short_nas_labeling_groups(adjacencies, gid_suffix="", max_size=1000, a
         positions_to_adjacencies[p2].append(adj)
         positions_by_chrs[p1.chromosome].append(p1)
         positions_by_chrs[p2.chromosome].append(p2)
+    check_intermediate = allow_intermediate_same or allow_intermediate_tra
     positions_by_chr_to_index = {}
+    same_prefix_sums_by_chrs = {}
+    tra_prefix_sums_by_chrs = {}
+    if check_intermediate:
+        same_cnts = {p: sum(a.position1.chromosome == a.position2.chromosome for a in adjs) for p, adjs in positions_to_adjacencies.items()}
     for chr_name in list(positions_by_chrs.keys()):
         positions_by_chrs[chr_name] = sorted(positions_by_chrs[chr_name], key=lambda p: (p.coordinate, p.strand))
         positions_by_chr_to_index[chr_name] = {p: cnt for cnt, p in enumerate(positions_by_chrs[chr_name])}
+        if check_intermediate:
+            positions = positions_by_chrs[chr_name]
+            chr_same_cnts = np.fromiter((same_cnts[p] for p in positions), dtype=np.int64, count=len(positions))
+            chr_tra_cnts = np.fromiter((len(positions_to_adjacencies[p]) for p in positions), dtype=np.int64, count=len(positions)) - chr_same_cnts
+            same_prefix_sums_by_chrs[chr_name] = np.concatenate(([0], np.cumsum(chr_same_cnts)))
+            tra_prefix_sums_by_chrs[chr_name] = np.concatenate(([0], np.cumsum(chr_tra_cnts)))
     processed_adj_ids = set()
     cnt = 0
     for adj in adjacencies:
@@ -58,7 +94,6 @@ def infer_short_nas_labeling_groups(adjacencies, gid_suffix="", max_size=1000, a
         adj_size = adj.distance_non_hap
         if adj_size > max_size:
             continue
-        positions = positions_by_chrs[p1_chr]
         p1_index, p2_index = positions_by_chr_to_index[p1_chr][p1], positions_by_chr_to_index[p1_chr][p2]
         aid = adj.extra.get(EXTERNAL_NA_ID, adj.stable_id_non_phased)
         aids = [aid, aid]
@@ -67,28 +102,25 @@ def infer_short_nas_labeling_groups(adjacencies, gid_suffix="", max_size=1000, a
             gid += "_" + gid_suffix
         extra = {AG_LABELING: [0, 1]}
         ag = AdjacencyGroup(gid=gid, aids=aids, group_type=AdjacencyGroupType.LABELING, extra=extra)
+        processed_aid = adj.stable_id_non_phased
         if abs(p1_index - p2_index) == 1:
             result.append(ag)
             cnt += 1
         else:
-            if not (allow_intermediate_same or allow_intermediate_tra):
+            if not check_intermediate:
                 continue
-            intermediate_indexes = list(range(p1_index + 1, p2_index))
-            has_same = False
-            has_tra = False
-            allow = False
-            for index in intermediate_indexes:
-                position = positions[index]
-                adjs = positions_to_adjacencies[position]
-                for adj in adjs:
-                    has_same |= adj.position1.chromosome == adj.position2.chromosome
-                    has_tra |= adj.position1.chromosome != adj.position2.chromosome
-            allow |= has_same and allow_intermediate_same
-            allow |= has_tra and allow_intermediate_tra
-            if allow:
+            # breakends with indexes in the (p1_index, p2_index) range; for the reversed order of breakends the range is empty
+            same_prefix_sums, tra_prefix_sums = same_prefix_sums_by_chrs[p1_chr], tra_prefix_sums_by_chrs[p1_chr]
+            has_same = p2_index > p1_index + 1 and same_prefix_sums[p2_index] - same_prefix_sums[p1_index + 1] > 0
+            has_tra = p2_index > p1_index + 1 and tra_prefix_sums[p2_index] - tra_prefix_sums[p1_index + 1] > 0
+            if p2_index > p1_index + 1:
+                # deliberately reproduces the original behaviour, in which the loop over spanned breakends shadowed `adj`:
+                #   the last adjacency at the last spanned breakend (and not the current adjacency) is marked as processed
+                processed_aid = positions_to_adjacencies[positions_by_chrs[p1_chr][p2_index - 1]][-1].stable_id_non_phased
+            if (has_same and allow_intermediate_same) or (has_tra and allow_intermediate_tra):
                 result.append(ag)
                 cnt += 1
-        processed_adj_ids.add(adj.stable_id_non_phased)
+        processed_adj_ids.add(processed_aid)
     return result
 
 
@@ -101,9 +133,40 @@ def get_mode_str(format="bam", input=False):
     return result
 
 
+def get_breakend_index(positions):
+    """
+    Per chromosome index of (unique) breakend positions: positions sorted by coordinate (and strand), and a numpy array of their coordinates (for `get_breakends_in_range`)
+    """
+    positions_by_chrs = defaultdict(set)
+    for p in positions:
+        positions_by_chrs[p.chromosome].add(p)
+    result = {}
+    for chr_name, chr_positions in positions_by_chrs.items():
+        chr_positions = sorted(chr_positions, key=lambda p: (p.coordinate, p.strand))
+        result[chr_name] = (chr_positions, np.fromiter((p.coordinate for p in chr_positions), dtype=np.int64, count=len(chr_positions)))
+    return result
+
+
+def get_breakends_in_range(breakend_index, chromosome, start, end):
+    """
+    Positions from the `breakend_index` on the `chromosome` with coordinates in the [`start`, `end`] range (located with a binary search)
+    """
+    if chromosome not in breakend_index:
+        return []
+    positions, coordinates = breakend_index[chromosome]
+    return positions[np.searchsorted(coordinates, start, side="left"):np.searchsorted(coordinates, end, side="right")]
+
+
+def is_aligned(alignment):
+    """
+    Unmapped alignments (including the ones placed next to their mapped mates) have no reference span, and thus can not be near any breakend
+    """
+    return not getattr(alignment, "is_unmapped", False) and alignment.reference_end is not None
+
+
 def get_labeling_groups(read_alignments, read_adjacencies, strategy="skip", delta=500, neighbour_selection="first"):
     result = []
-    read_alignments = sorted(read_alignments, key=lambda e: (e.query_alignment_start, e.query_alignment_end))
+    read_alignments = sorted(filter(is_aligned, read_alignments), key=lambda e: (e.query_alignment_start, e.query_alignment_end))
     processed_positions = set()
     positions_by_chrs = defaultdict(list)
     positions_to_alignments = defaultdict(list)
@@ -114,14 +177,14 @@ def get_labeling_groups(read_alignments, read_adjacencies, strategy="skip", delt
         p2 = adj.position2
         positions_by_chrs[p1.chromosome].append(p1)
         positions_by_chrs[p2.chromosome].append(p2)
-        for alignment in read_alignments:
-            for p in [p1, p2]:
-                if p.chromosome == alignment.reference_name and \
-                        (alignment.reference_start - delta <= p.coordinate <= alignment.reference_end + delta):
-                    positions_to_alignments[p].append(alignment)
-                    alignments_to_positions[alignment].append(p)
         positions_to_adjacencies[p1].append(adj)
         positions_to_adjacencies[p2].append(adj)
+    breakend_index = get_breakend_index(positions=positions_to_adjacencies.keys())
+    for alignment in read_alignments:
+        for p in get_breakends_in_range(breakend_index=breakend_index, chromosome=alignment.reference_name,
+                                        start=alignment.reference_start - delta, end=alignment.reference_end + delta):
+            positions_to_alignments[p].append(alignment)
+            alignments_to_positions[alignment].append(p)
     for alignment in alignments_to_positions.keys():
         alignments_to_positions[alignment] = sorted(alignments_to_positions[alignment], key=lambda p: (p.coordinate, p.strand))
     for chr_name in list(positions_by_chrs.keys()):
@@ -165,10 +228,128 @@ def get_labeling_groups(read_alignments, read_adjacencies, strategy="skip", delt
     return result
 
 
+ReadAlignment = namedtuple("ReadAlignment", ["query_name", "reference_name", "reference_start", "reference_end", "query_alignment_start", "query_alignment_end",
+                                             "is_reverse"])
+
+
+def get_read_alignment(entry):
+    """
+    Lightweight (picklable, hashable by value) version of the pysam alignment entry with all the attributes that are used for labeling groups inference
+    """
+    return ReadAlignment(query_name=entry.query_name, reference_name=entry.reference_name, reference_start=entry.reference_start, reference_end=entry.reference_end,
+                         query_alignment_start=entry.query_alignment_start, query_alignment_end=entry.query_alignment_end, is_reverse=entry.is_reverse)
+
+
+def get_alignment_sort_order(alignment_file_name, alignment_format="bam"):
+    with pysam.AlignmentFile(alignment_file_name, get_mode_str(format=alignment_format, input=True)) as i_stream:
+        return i_stream.header.to_dict().get("HD", {}).get("SO", "unknown")
+
+
+def iter_name_sorted_read_alignments(alignment_file_name, read_names, alignment_format="bam"):
+    """
+    Walks over the read (i.e., query) name sorted alignment file, and yields (read name, alignments) pairs for every read with the name in `read_names`
+    """
+    mode = get_mode_str(format=alignment_format, input=True)
+    current_read_name = None
+    current_entries = []
+    with pysam.AlignmentFile(alignment_file_name, mode) as i_stream:
+        if "SO:queryname" not in i_stream.text:
+            raise ValueError("Input alignment file needs to be sorted by read (i.e., query) name (or by coordinate and indexed). It is not.")
+        for entry in i_stream:
+            if entry.qname != current_read_name:
+                if len(current_entries) > 0 and current_read_name in read_names:
+                    yield current_read_name, current_entries
+                current_read_name = entry.qname
+                current_entries = [entry]
+            else:
+                current_entries.append(entry)
+        if len(current_entries) > 0 and current_read_name in read_names:
+            yield current_read_name, current_entries
+
+
+def get_breakend_regions(adjacencies_by_aids, adjacencies_ids_to_reads, delta=500):
+    """
+    Merged (per chromosome) regions of +-`delta` around adjacencies breakends, each with the names of reads, that support adjacencies with breakends in it.
+        Any alignment, that is within `delta` of a breakend (i.e., can be used in `get_labeling_groups`), overlaps the respective region.
+    """
+    breakends_by_chrs = defaultdict(list)
+    for aid, adj in adjacencies_by_aids.items():
+        for p in [adj.position1, adj.position2]:
+            breakends_by_chrs[p.chromosome].append((max(0, p.coordinate - delta - 1), p.coordinate + delta + 1, aid))
+    result = []
+    for chr_name in sorted(breakends_by_chrs.keys()):
+        current = None
+        for start, end, aid in sorted(breakends_by_chrs[chr_name]):
+            if current is not None and start <= current[2]:
+                current[2] = max(current[2], end)
+                current[3].update(adjacencies_ids_to_reads[aid])
+                continue
+            current = [chr_name, start, end, set(adjacencies_ids_to_reads[aid])]
+            result.append(current)
+    return result
+
+
+def fetch_read_alignments(alignment_file_name, regions, alignment_format="bam"):
+    """
+    Fetches (via the alignment file index) alignments in the `regions` ([chromosome, start, end, read names] entries), retaining only the ones of the specified reads
+    """
+    result = []
+    with pysam.AlignmentFile(alignment_file_name, get_mode_str(format=alignment_format, input=True)) as i_stream:
+        references = set(i_stream.references)
+        for chr_name, start, end, read_names in regions:
+            if chr_name not in references:
+                continue
+            for entry in i_stream.fetch(chr_name, start, end):
+                if entry.query_name in read_names and is_aligned(alignment=entry):
+                    result.append(get_read_alignment(entry=entry))
+    return result
+
+
+def fetch_read_alignments_star(arguments):
+    return fetch_read_alignments(*arguments)
+
+
+def iter_region_read_alignments(alignment_file_name, adjacencies_by_aids, adjacencies_ids_to_reads, alignment_format="bam", delta=500, workers=1, shards_per_worker=4):
+    """
+    Fetches alignments around adjacencies breakends from the coordinate sorted and indexed alignment file
+        (regions are split into shards, that are processed by a pool of `workers` processes), joins them by read name,
+        and yields (read name, alignments) pairs (in the read name order)
+    """
+    with pysam.AlignmentFile(alignment_file_name, get_mode_str(format=alignment_format, input=True)) as i_stream:
+        if not i_stream.has_index():
+            raise ValueError("Input coordinate sorted alignment file needs to be indexed (e.g., with samtools index). It is not.")
+    regions = get_breakend_regions(adjacencies_by_aids=adjacencies_by_aids, adjacencies_ids_to_reads=adjacencies_ids_to_reads, delta=delta)
+    shards_cnt = max(1, min(len(regions), workers * shards_per_worker))
+    shards = [regions[cnt::shards_cnt] for cnt in range(shards_cnt)]
+    tasks = [(alignment_file_name, shard, alignment_format) for shard in shards]
+    reads_to_alignments = defaultdict(set)
+    if workers > 1:
+        with multiprocessing.Pool(processes=workers) as pool:
+            shards_alignments = pool.imap_unordered(fetch_read_alignments_star, tasks)
+            for alignments in shards_alignments:
+                for alignment in alignments:
+                    reads_to_alignments[alignment.query_name].add(alignment)
+    else:
+        for task in tasks:
+            for alignment in fetch_read_alignments_star(task):
+                reads_to_alignments[alignment.query_name].add(alignment)
+    for read_name in sorted(reads_to_alignments.keys()):
+        yield read_name, sorted(reads_to_alignments[read_name])
+
+
 def infer_alignment_labeling_groups(adjacencies, alignment_file_name, alignment_format="bam",
-                                    extra_rnames_field="rnames", gid_suffix="", inconsistent_traversal_strategy="skip"):
+                                    extra_rnames_field="rnames", gid_suffix="", inconsistent_traversal_strategy="skip", sort_order="auto", delta=500, workers=1):
+    """
+    Infers labeling groups from alignments of reads, that support the adjacencies (listed in the `extra_rnames_field`).
+    Alignment file can be either
+        * sorted by read (i.e., query) name ("queryname" `sort_order`), in which case it is read sequentially, or
+        * sorted by coordinate and indexed ("coordinate" `sort_order`), in which case only alignments within `delta` of adjacencies breakends are fetched,
+            with regions processed by `workers` processes, and alignments are joined by read name.
+    With the "auto" `sort_order` it is determined from the alignment file header.
+    """
     result = []
     reads_to_adjacencies_ids = defaultdict(set)
+    adjacencies_ids_to_reads = defaultdict(set)
     adjacencies_by_aids = {}
     for adj in adjacencies:
         aid = adj.stable_id_non_phased
@@ -177,47 +358,36 @@ def infer_alignment_labeling_groups(adjacencies, alignment_file_name, alignment_
             continue
         for read_name in read_names:
             reads_to_adjacencies_ids[read_name].add(aid)
+            adjacencies_ids_to_reads[aid].add(read_name)
         adjacencies_by_aids[aid] = adj
-    mode = get_mode_str(format=alignment_format, input=True)
-    current_read_name = None
-    current_entries = []
+    if sort_order == "auto":
+        sort_order = get_alignment_sort_order(alignment_file_name=alignment_file_name, alignment_format=alignment_format)
+    if sort_order == "coordinate":
+        reads_alignments = iter_region_read_alignments(alignment_file_name=alignment_file_name, adjacencies_by_aids=adjacencies_by_aids,
+                                                       adjacencies_ids_to_reads=adjacencies_ids_to_reads, alignment_format=alignment_format, delta=delta,
+                                                       workers=workers)
+    else:
+        reads_alignments = iter_name_sorted_read_alignments(alignment_file_name=alignment_file_name, read_names=reads_to_adjacencies_ids, alignment_format=alignment_format)
     cnt = 0
-    alignment_1k_counter = 0
-    with pysam.AlignmentFile(alignment_file_name, mode) as i_stream:
-        if "SO:queryname" not in i_stream.text:
-            raise ValueError("Input alignment file needs to be sorted by read (i.e., query) name. It is not.")
-        for alignment_cnt, entry in enumerate(i_stream):
-            if alignment_cnt / 1000 >= alignment_1k_counter:
-                alignment_1k_counter += 1
-            if entry.qname != current_read_name:
-                if len(current_entries) > 0 and current_read_name in reads_to_adjacencies_ids:
-                    adjacencies = [adjacencies_by_aids[aid] for aid in reads_to_adjacencies_ids[current_read_name]]
-                    groups = get_labeling_groups(read_alignments=current_entries, read_adjacencies=adjacencies, strategy=inconsistent_traversal_strategy)
-                    for group in groups:
-                        gid = str(cnt)
-                        if len(gid_suffix) > 0:
-                            gid += "_" + gid_suffix
-                        group.gid = gid
-                        cnt += 1
-                    result.extend(groups)
-                current_read_name = entry.qname
-                current_entries = [entry]
-            else:
-                current_entries.append(entry)
-        if len(current_entries) > 0 and current_read_name in reads_to_adjacencies_ids:
-            adjacencies = [adjacencies_by_aids[aid] for aid in reads_to_adjacencies_ids[current_read_name]]
-            groups = get_labeling_groups(read_alignments=current_entries, read_adjacencies=adjacencies, strategy=inconsistent_traversal_strategy)
-            for group in groups:
-                gid = str(cnt)
-                if len(gid_suffix) > 0:
-                    gid += "_" + gid_suffix
-                group.gid = gid
-                cnt += 1
-            result.extend(groups)
+    for read_name, read_alignments in reads_alignments:
+        adjacencies = [adjacencies_by_aids[aid] for aid in reads_to_adjacencies_ids[read_name]]
+        groups = get_labeling_groups(read_alignments=read_alignments, read_adjacencies=adjacencies, strategy=inconsistent_traversal_strategy, delta=delta)
+        for group in groups:
+            gid = str(cnt)
+            if len(gid_suffix) > 0:
+                gid += "_" + gid_suffix
+            group.gid = gid
+            cnt += 1
+        result.extend(groups)
     return result
 
 
-def filter_alignment(adjacencies, alignment_file_name, output_alignment_file_name, alignment_format="bam", extra_rnames_field="rnames", output_alignment_format="bam"):
+def filter_alignment(adjacencies, alignment_file_name, output_alignment_file_name, alignment_format="bam", extra_rnames_field="rnames", output_alignment_format="bam",
+                     threads=1):
+    """
+    Writes alignments of reads, that support adjacencies (listed in the `extra_rnames_field`), into the output alignment file (in the input order).
+        With `threads` > 1, BGZF (de)compression of both alignment files is performed by the htslib thread pools.
+    """
     all_read_names = set()
     for adj in adjacencies:
         read_names = adj.extra.get(extra_rnames_field, "").split(",")
@@ -227,8 +397,9 @@ def filter_alignment(adjacencies, alignment_file_name, output_alignment_file_nam
             all_read_names.add(read_name)
     i_mode = get_mode_str(format=alignment_format, input=True)
     o_mode = get_mode_str(format=output_alignment_format, input=False)
-    with pysam.AlignmentFile(alignment_file_name, i_mode) as i_stream:
-        with pysam.AlignmentFile(output_alignment_file_name, o_mode, template=i_stream) as o_stream:
+    with pysam.AlignmentFile(alignment_file_name, i_mode, threads=threads) as i_stream:
+        with pysam.AlignmentFile(output_alignment_file_name, o_mode, template=i_stream, threads=threads) as o_stream:
+            write = o_stream.write
             for entry in i_stream:
-                if entry.qname in all_read_names:
-                    o_stream.write(entry)
+                if entry.query_name in all_read_names:
+                    write(entry)
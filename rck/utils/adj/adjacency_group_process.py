@@ -1,5 +1,4 @@
 from collections import defaultdict
-from copy import deepcopy
 
 import networkx as nx
 
@@ -164,27 +163,38 @@ def refined_labeling_groups(adj_groups, iag=None, adjacencies=None, gid_suffix="
 
 
 def projected_groups(groups, adjacencies, adjacencies_by_external_ids=None, gid_suffix=""):
+    """
+    Groups restricted to the given adjacencies (by their external ids).
+    Groups, all members of which are present among the adjacencies, are shared (rather than copied) with the input; restricted groups are new objects
+        (with a shallow copy of the source group extra).
+    """
     if adjacencies_by_external_ids is None:
         adjacencies_by_external_ids = {adj.extra.get(EXTERNAL_NA_ID, adj.stable_id_non_phased): adj for adj in adjacencies}
+    available_ids = adjacencies_by_external_ids.keys()
     result = []
     for group in groups:
+        if len(group.adjacencies_ids) == 0:
+            continue
+        if group.adjacencies_ids_set <= available_ids:
+            if group.group_type == AdjacencyGroupType.LABELING and len(group.adjacencies_ids) < 2:
+                continue
+            result.append(group)
+            continue
         projected = [aid in adjacencies_by_external_ids for aid in group.adjacencies_ids]
         aids = [aid for aid, allowed in zip(group.adjacencies_ids, projected) if allowed]
         if len(aids) == 0:
             continue
+        if group.group_type == AdjacencyGroupType.LABELING and len(aids) < 2:
+            continue
         if group.adjacencies is not None:
             adjacencies = [adj for adj, allowed in zip(group.adjacencies, projected) if allowed]
         else:
             adjacencies = None
-        ag = deepcopy(group)
-        ag.adjacencies_ids = aids
-        ag.adjacencies = adjacencies
+        extra = dict(group.extra)
         if group.group_type == AdjacencyGroupType.LABELING:
-            if len(aids) < 2:
-                continue
-            labeling = [index for index, allowed in zip(group.extra[AG_LABELING], projected) if allowed]
-            ag.extra[AG_LABELING] = labeling
-        if not all(projected) and len(gid_suffix) > 0 and group.group_type != AdjacencyGroupType.GENERAL:
-            ag.gid += "_" + gid_suffix
-        result.append(ag)
+            extra[AG_LABELING] = [index for index, allowed in zip(group.extra[AG_LABELING], projected) if allowed]
+        gid = group.gid
+        if len(gid_suffix) > 0 and group.group_type != AdjacencyGroupType.GENERAL:
+            gid += "_" + gid_suffix
+        result.append(AdjacencyGroup(gid=gid, aids=aids, group_type=group.group_type, adjacencies=adjacencies, extra=extra))
     return result
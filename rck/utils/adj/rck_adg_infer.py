@@ -58,6 +58,9 @@ def main():
     sniffles_labeling_group_parser.add_argument("--i-extra-separator", default=";")
     sniffles_labeling_group_parser.add_argument("--alignment", required=True)
     sniffles_labeling_group_parser.add_argument("--alignment-format", choices=["sam", "bam", "cram"], default="bam")
+    sniffles_labeling_group_parser.add_argument("--alignment-sort-order", choices=["auto", "queryname", "coordinate"], default="auto")
+    sniffles_labeling_group_parser.add_argument("--delta", type=int, default=500)
+    sniffles_labeling_group_parser.add_argument("--workers", type=int, default=1)
     sniffles_labeling_group_parser.add_argument("--extra-rnames-field", default="rnames")
     sniffles_labeling_group_parser.add_argument("--no-refine", action="store_false", dest="refine")
     sniffles_labeling_group_parser.add_argument("--fp", type=float, default=1)
@@ -76,6 +79,7 @@ def main():
     filter_alignment_parser.add_argument("--alignment-format", choices=["sam", "bam", "cram"], default="bam")
     filter_alignment_parser.add_argument("-o", "--output", required=True)
     filter_alignment_parser.add_argument("--output-format", choices=["sam", "bam", "cram"], default="bam")
+    filter_alignment_parser.add_argument("--threads", type=int, default=1)
     ###
     args = parser.parse_args()
     logger = get_standard_logger_from_args(args=args, program_name="RCK-UTILS-ADJ-GROUPS-infer")
@@ -113,7 +117,8 @@ def main():
         adjacencies = read_adjacencies_from_source(source=args.rck_adj, extra_separator=args.i_extra_separator, separator=args.i_separator)
         logger.info("Inferring labeling adjacency groups from read adjacencies and their reads-of-origin alignments")
         adj_groups = infer_alignment_labeling_groups(adjacencies=adjacencies, alignment_file_name=args.alignment, alignment_format=args.alignment_format,
-                                                     extra_rnames_field=args.extra_rnames_field, gid_suffix=args.gid_suffix)
+                                                     extra_rnames_field=args.extra_rnames_field, gid_suffix=args.gid_suffix, sort_order=args.alignment_sort_order,
+                                                     delta=args.delta, workers=args.workers)
         logger.info("Inferred {cnt} labeling adjacency groups. There can be many duplicates, refinement shall take care of it.".format(cnt=len(adj_groups)))
         if args.refine:
             logger.info("Refining inferred labeling adjacency groups")
@@ -129,7 +134,7 @@ def main():
         adjacencies = read_adjacencies_from_source(source=args.rck_adj, extra_separator=args.i_extra_separator, separator=args.i_separator)
         logger.info("Filtering input alignment form file {file} and writing result in {o_file}".format(file=args.alignment, o_file=args.output))
         filter_alignment(adjacencies=adjacencies, alignment_file_name=args.alignment, alignment_format=args.alignment_format, extra_rnames_field=args.extra_rnames_field,
-                         output_alignment_file_name=args.output, output_alignment_format=args.output_format)
+                         output_alignment_file_name=args.output, output_alignment_format=args.output_format, threads=args.threads)
         exit(0)
 
 
@@ -1,8 +1,129 @@
 from collections import defaultdict
 
+import numpy as np
+from scipy.sparse import csr_matrix
+
 from rck.core.io import FALSE_POSITIVE, AG_LABELING
 from rck.core.structures import Haplotype, CNBoundaries, AdjacencyGroupType, Phasing
 
+HAPLOTYPES = [Haplotype.A, Haplotype.B]
+PHASINGS = list(Phasing)
+PHASINGS_INDEXES = {phasing: index for index, phasing in enumerate(PHASINGS)}
+
+
+def get_scnp_array(scnp, sids):
+    """
+    Segments x haplotypes (A, B) array of copy numbers (missing records are 0).
+    """
+    result = np.zeros((len(sids), len(HAPLOTYPES)), dtype=np.int64)
+    for sid_index, sid in enumerate(sids):
+        for hap_index, haplotype in enumerate(HAPLOTYPES):
+            result[sid_index, hap_index] = scnp.get_cn(sid=sid, haplotype=haplotype, default=0)
+    return result
+
+
+def get_scnbp_array(scnbp, sids, boundary_type):
+    """
+    Segments x haplotypes (A, B) array of copy number boundaries of a given type (missing records are 0).
+    """
+    result = np.zeros((len(sids), len(HAPLOTYPES)), dtype=np.int64)
+    for sid_index, sid in enumerate(sids):
+        for hap_index, haplotype in enumerate(HAPLOTYPES):
+            result[sid_index, hap_index] = scnbp.get_cnb(sid=sid, hap=haplotype, boundary_type=boundary_type)
+    return result
+
+
+def get_acnt_array(acnt, aids, clone_ids):
+    """
+    Clones x adjacencies x phasings (all of `Phasing`, in the `PHASINGS` order) array of copy numbers (missing records are 0).
+    """
+    result = np.zeros((len(clone_ids), len(aids), len(PHASINGS)), dtype=np.int64)
+    for clone_index, clone_id in enumerate(clone_ids):
+        records = acnt[clone_id].records
+        for aid_index, aid in enumerate(aids):
+            for phasing, cn in records.get(aid, {}).items():
+                result[clone_index, aid_index, PHASINGS_INDEXES[phasing]] = cn
+    return result
+
+
+def get_groups_members_indexes(groups, aids_indexes=None):
+    """
+    Flattened membership of groups' adjacencies (in the order of `group.adjacencies`):
+        a pair of arrays of groups indexes and adjacencies indexes (w.r.t. the `aids_indexes`, extended with any new stable non-phased aid), and the `aids_indexes` itself.
+    """
+    if aids_indexes is None:
+        aids_indexes = {}
+    groups_indexes, members_indexes = [], []
+    for group_index, group in enumerate(groups):
+        for adjacency in group.adjacencies:
+            groups_indexes.append(group_index)
+            members_indexes.append(aids_indexes.setdefault(adjacency.stable_id_non_phased, len(aids_indexes)))
+    return np.array(groups_indexes, dtype=np.int64), np.array(members_indexes, dtype=np.int64), aids_indexes
+
+
+def get_groups_membership_matrix(groups_indexes, members_indexes, groups_cnt, aids_cnt, unique=False):
+    """
+    Sparse groups x adjacencies matrix with a number of times (or, with `unique`, an indicator of whether) an adjacency is a member of a group.
+    """
+    result = csr_matrix((np.ones(len(groups_indexes), dtype=np.int64), (groups_indexes, members_indexes)), shape=(groups_cnt, aids_cnt))
+    if unique:
+        result.data = np.minimum(result.data, 1)
+    return result
+
+
+def adjacencies_presence(acnt, adjacencies, clone_ids=None):
+    """
+    Clones x adjacencies boolean array indicating if an adjacency (in any phasing) has a positive copy number in a clone (see `AdjacencyCopyNumberProfile.haploid_adjacencies_present`).
+    """
+    if clone_ids is None:
+        clone_ids = sorted(acnt.keys())
+    aids = [adjacency.stable_id_non_phased for adjacency in adjacencies]
+    return get_acnt_array(acnt=acnt, aids=aids, clone_ids=clone_ids).sum(axis=2) > 0
+
+
+def adjacency_groups_molecule_inferred_fps(groups, acnt, clone_ids=None):
+    """
+    Groups x clones array of inferred false positive rate of every (molecule) group in every clone (i.e., a fraction of group's adjacencies that are absent in the clone).
+    A group without adjacencies has no absent adjacencies (i.e., inferred false positive rate of 0).
+    """
+    if clone_ids is None:
+        clone_ids = sorted(acnt.keys())
+    groups_indexes, members_indexes, aids_indexes = get_groups_members_indexes(groups=groups)
+    membership = get_groups_membership_matrix(groups_indexes=groups_indexes, members_indexes=members_indexes, groups_cnt=len(groups), aids_cnt=len(aids_indexes))
+    presence = get_acnt_array(acnt=acnt, aids=list(aids_indexes), clone_ids=clone_ids).sum(axis=2) > 0
+    present_cnts = np.asarray(membership.dot(presence.T.astype(np.int64)))
+    sizes = np.array([len(group.adjacencies) for group in groups], dtype=np.int64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(sizes[:, np.newaxis] > 0, 1 - (present_cnts * 1.0 / sizes[:, np.newaxis]), 0.0)
+
+
+def adjacency_groups_general_inferred_fps(groups, acnt, clone_ids=None):
+    """
+    Inferred false positive rate of every (general) group across all clones (i.e., a fraction of group's adjacencies that are absent in all clones).
+    A group without adjacencies has no absent adjacencies (i.e., inferred false positive rate of 0).
+    """
+    if clone_ids is None:
+        clone_ids = sorted(acnt.keys())
+    groups_indexes, members_indexes, aids_indexes = get_groups_members_indexes(groups=groups)
+    membership = get_groups_membership_matrix(groups_indexes=groups_indexes, members_indexes=members_indexes, groups_cnt=len(groups), aids_cnt=len(aids_indexes), unique=True)
+    presence = (get_acnt_array(acnt=acnt, aids=list(aids_indexes), clone_ids=clone_ids).sum(axis=2) > 0).any(axis=0)
+    present_cnts = membership.dot(presence.astype(np.int64))
+    sizes = np.array([len(group.adjacencies_ids) for group in groups], dtype=np.int64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(sizes > 0, 1 - (present_cnts * 1.0 / sizes), 0.0)
+
+
+def scnb_violations_mask(cns, lower, upper, syncs):
+    """
+    Boolean mask of segments (rows of segments x haplotypes arrays of copy numbers and their lower/upper boundaries),
+        whose copy numbers are outside of the boundaries. Boundaries of segments, that are not in allele sync (i.e., sync indicator is not 1), are considered swapped.
+    """
+    not_synced = syncs != 1
+    lower, upper = lower.copy(), upper.copy()
+    lower[not_synced] = lower[not_synced][:, ::-1]
+    upper[not_synced] = upper[not_synced][:, ::-1]
+    return ((cns < lower) | (cns > upper)).any(axis=1)
+
 
 def scnb_violations(scnt, scnb, segments_syncs, segments=None, clone_ids=None, short_circuit=False):
     if clone_ids is None:
@@ -11,21 +132,16 @@ def scnb_violations(scnt, scnb, segments_syncs, segments=None, clone_ids=None, s
     for clone_id in clone_ids:
         scnp = scnt[clone_id]
         scnbp = scnb[clone_id]
-        sids = [s.stable_id_non_hap for s in segments] if segments is not None else scnp.records.keys()
-        for sid in sids:
-            sync_indicator = segments_syncs[sid]
-            cna, cnb = scnp.get_cn(sid=sid, haplotype=Haplotype.A), scnp.get_cn(sid=sid, haplotype=Haplotype.B)
-            lower_a = scnbp.get_cnb(sid=sid, hap=Haplotype.A, boundary_type=CNBoundaries.LOWER)
-            lower_b = scnbp.get_cnb(sid=sid, hap=Haplotype.B, boundary_type=CNBoundaries.LOWER)
-            upper_a = scnbp.get_cnb(sid=sid, hap=Haplotype.A, boundary_type=CNBoundaries.UPPER)
-            upper_b = scnbp.get_cnb(sid=sid, hap=Haplotype.B, boundary_type=CNBoundaries.UPPER)
-            if sync_indicator == 1:
-                if (not lower_a <= cna <= upper_a) or (not lower_b <= cnb <= upper_b):
-                    result[clone_id].append(sid)
-            else:
-                if (not lower_b <= cna <= upper_b) or (not lower_a <= cnb <= upper_a):
-                    result[clone_id].append(sid)
-        if short_circuit and len(result[clone_id]) > 0:
+        sids = [s.stable_id_non_hap for s in segments] if segments is not None else list(scnp.records.keys())
+        cns = get_scnp_array(scnp=scnp, sids=sids)
+        lower = get_scnbp_array(scnbp=scnbp, sids=sids, boundary_type=CNBoundaries.LOWER)
+        upper = get_scnbp_array(scnbp=scnbp, sids=sids, boundary_type=CNBoundaries.UPPER)
+        syncs = np.array([segments_syncs[sid] for sid in sids])
+        violations = scnb_violations_mask(cns=cns, lower=lower, upper=upper, syncs=syncs)
+        if not violations.any():
+            continue
+        result[clone_id].extend(sids[index] for index in np.flatnonzero(violations))
+        if short_circuit:
             return result
     return result
 
@@ -34,84 +150,61 @@ def unique_realization_violations(adjacencies, acnt):
     pass
 
 
-def adjacency_groups_molecule_violations(groups, acnt, clone_ids=None, skip_missing_fp=True, short_circuit=False):
+def get_groups_fps_violations(groups, inferred_fps_violations, skip_missing_fp=True, short_circuit=False):
     result = []
-    if clone_ids is None:
-        clone_ids = sorted(acnt.keys())
-    for group in filter(lambda ag: ag.group_type == AdjacencyGroupType.MOLECULE, groups):
-        group_fp = group.extra.get(FALSE_POSITIVE, None)
-        if group_fp is None:
-            if not skip_missing_fp:
-                result.append(group)
-                if short_circuit:
-                    return result
+    for group, inferred_fp_violation in zip(groups, inferred_fps_violations):
+        if group.extra.get(FALSE_POSITIVE, None) is None:
+            if skip_missing_fp:
+                continue
+        elif not inferred_fp_violation:
             continue
-        group_is_good = False
-        for clone_id in clone_ids:
-            acnp = acnt[clone_id]
-            clone_present = acnp.haploid_adjacencies_present(adjacencies=group.adjacencies)
-            inferred_fp = 1 - (len(clone_present) * 1.0 / len(group.adjacencies))
-            group_is_good |= inferred_fp <= group_fp
-        if not group_is_good:
-            result.append(group)
-        if short_circuit and len(result) > 0:
-            return result
+        result.append(group)
+        if short_circuit:
+            break
     return result
 
 
+def adjacency_groups_molecule_violations(groups, acnt, clone_ids=None, skip_missing_fp=True, short_circuit=False):
+    groups = [group for group in groups if group.group_type == AdjacencyGroupType.MOLECULE]
+    fps = np.array([group.extra.get(FALSE_POSITIVE, np.nan) for group in groups], dtype=float)
+    inferred_fps = adjacency_groups_molecule_inferred_fps(groups=groups, acnt=acnt, clone_ids=clone_ids)
+    # a molecule group is good if there is at least one clone, in which its inferred false positive rate does not exceed the group one
+    inferred_fps_violations = ~(inferred_fps <= fps[:, np.newaxis]).any(axis=1)
+    return get_groups_fps_violations(groups=groups, inferred_fps_violations=inferred_fps_violations, skip_missing_fp=skip_missing_fp, short_circuit=short_circuit)
+
+
 def adjacency_groups_general_violations(groups, acnt, clone_ids=None, skip_missing_fp=True, short_circuit=False):
-    result = []
-    if clone_ids is None:
-        clone_ids = sorted(acnt.keys())
-    for group in filter(lambda ag: ag.group_type == AdjacencyGroupType.GENERAL, groups):
-        group_fp = group.extra.get(FALSE_POSITIVE, None)
-        if group_fp is None:
-            if not skip_missing_fp:
-                result.append(group)
-                if short_circuit:
-                    return result
-            continue
-        total_present = set()
-        for clone_id in clone_ids:
-            acnp = acnt[clone_id]
-            clone_specific = acnp.haploid_adjacencies_present(adjacencies=group.adjacencies)
-            for adjacency in clone_specific:
-                total_present.add(adjacency.stable_id_non_phased)
-        inferred_fp = 1 - (len(total_present) * 1.0 / len(group.adjacencies_ids))
-        if inferred_fp > group_fp:
-            result.append(group)
-        if short_circuit and len(result) > 0:
-            return result
-    return result
+    groups = [group for group in groups if group.group_type == AdjacencyGroupType.GENERAL]
+    fps = np.array([group.extra.get(FALSE_POSITIVE, np.nan) for group in groups], dtype=float)
+    inferred_fps = adjacency_groups_general_inferred_fps(groups=groups, acnt=acnt, clone_ids=clone_ids)
+    inferred_fps_violations = inferred_fps > fps
+    return get_groups_fps_violations(groups=groups, inferred_fps_violations=inferred_fps_violations, skip_missing_fp=skip_missing_fp, short_circuit=short_circuit)
 
 
 def adjacency_groups_labeling_violations(groups, acnt, clone_ids=None, short_circuit=False):
     if clone_ids is None:
         clone_ids = sorted(acnt.keys())
-    result = []
-    for group in filter(lambda ag: ag.group_type == AdjacencyGroupType.LABELING, groups):
-        adjacencies = group.adjacencies
-        indexes = group.extra[AG_LABELING]
-        haplotype_specific_presence = defaultdict(list)
-        for hap in [Haplotype.A, Haplotype.B]:
-            for adjacency, index in zip(adjacencies, indexes):
-                phasings = [Phasing.AA] if hap == Haplotype.A else [Phasing.BB]
-                local_phasings = [Phasing.AB, Phasing.BA] if hap == Haplotype.A else [Phasing.BA, Phasing.AB]
-                phasings.append(local_phasings[index])
-                aid = adjacency.stable_id_non_phased
-                cn = 0
-                for clone_id in clone_ids:
-                    acnp = acnt[clone_id]
-                    for ph in phasings:
-                        cn += acnp.get_cn(aid=aid, phasing=ph)
-                haplotype_specific_presence[hap].append(cn != 0)
-        haplotype_specific_presence = dict(haplotype_specific_presence)
-        for hap in [Haplotype.A, Haplotype.B]:
-            haplotype_specific_presence[hap] = any(haplotype_specific_presence[hap])
-        if sum(haplotype_specific_presence.values()) > 1:
-            result.append(group)
-            if short_circuit:
-                return result
+    groups = [group for group in groups if group.group_type == AdjacencyGroupType.LABELING]
+    aids_indexes = {}
+    groups_indexes, members_indexes, labeling = [], [], []
+    for group_index, group in enumerate(groups):
+        for adjacency, index in zip(group.adjacencies, group.extra[AG_LABELING]):
+            groups_indexes.append(group_index)
+            members_indexes.append(aids_indexes.setdefault(adjacency.stable_id_non_phased, len(aids_indexes)))
+            labeling.append(index)
+    groups_indexes = np.array(groups_indexes, dtype=np.int64)
+    members_indexes = np.array(members_indexes, dtype=np.int64)
+    labeling = np.array(labeling, dtype=np.int64)
+    cns = get_acnt_array(acnt=acnt, aids=list(aids_indexes), clone_ids=clone_ids).sum(axis=0)[members_indexes]
+    # haplotype A is supported by the AA phasing and, depending on the labeling index, by the AB (0) or BA (1) one; haplotype B -- by BB and the other one
+    ab, ba = cns[:, PHASINGS_INDEXES[Phasing.AB]], cns[:, PHASINGS_INDEXES[Phasing.BA]]
+    a_cns = cns[:, PHASINGS_INDEXES[Phasing.AA]] + np.where(labeling == 0, ab, ba)
+    b_cns = cns[:, PHASINGS_INDEXES[Phasing.BB]] + np.where(labeling == 0, ba, ab)
+    a_present = np.bincount(groups_indexes, weights=a_cns != 0, minlength=len(groups)) > 0
+    b_present = np.bincount(groups_indexes, weights=b_cns != 0, minlength=len(groups)) > 0
+    result = [groups[group_index] for group_index in np.flatnonzero(a_present & b_present)]
+    if short_circuit:
+        return result[:1]
     return result
 
 
@@ -1,10 +1,12 @@
 import argparse
 from collections import defaultdict
 
-from rck.core.graph import construct_hiag_inflate_from_haploid_data
+import numpy as np
+
+from rck.core.graph import construct_hiag_inflate_from_haploid_data, CopyNumberIncidence
 from rck.core.io import read_scnt_from_source, read_acnt_from_source, read_scnb_from_source, read_adjacency_groups_from_source, read_positions_from_source, get_logging_cli_parser, \
     get_standard_logger_from_args, EXTERNAL_NA_ID
-from rck.core.structures import get_ref_telomeres_from_segments, AdjacencyType, AdjacencyGroupType, Segment
+from rck.core.structures import get_ref_telomeres_from_segments, AdjacencyType, AdjacencyGroupType
 from rck.utils.karyotype.analysis import adjacency_groups_molecule_violations, adjacency_groups_labeling_violations, adjacency_groups_general_violations
 
 
@@ -108,34 +110,31 @@ def main():
         logger.info("No information about adjacency groups were provided. Nothing to check.")
 
     clone_ids = sorted(set(scnt.keys()) & set(acnt.keys()))
-    for clone_id in clone_ids:
+    logger.info("Building haplotype-specific interval adjacency graph (shared by all clones)")
+    hiag = construct_hiag_inflate_from_haploid_data(hapl_segments=segments, hapl_adjacencies=adjacencies)
+    incidence = CopyNumberIncidence(iag=hiag)
+    copy_numbers = incidence.get_copy_numbers(scnt=scnt, acnt=acnt, clone_ids=clone_ids)
+    imbalances = incidence.get_imbalances(copy_numbers=copy_numbers)
+    lengths = incidence.get_lengths(copy_numbers=copy_numbers)
+    input_hapl_telomers_ids = {p.stable_id_non_hap for p in telomeres}
+    for clone_index, clone_id in enumerate(clone_ids):
         logger.info("Checking balancing and telomeres for clone {clone_id}".format(clone_id=clone_id))
-        hiag = construct_hiag_inflate_from_haploid_data(hapl_segments=segments, hapl_adjacencies=adjacencies)
-        scnp = scnt[clone_id]
-        acnp = acnt[clone_id]
-        hiag.assign_copy_numbers_from_scn_profile(scn_profile=scnp)
-        hiag.assign_copy_numbers_from_acn_profile(acn_profile=acnp)
-        hiag.remove_edges_with_zero_cn()
+        clone_imbalances = imbalances[clone_index]
         logger.info("Checking that every vertex has a copy number excess >= 0.")
-        for node in hiag.nodes(data=False):
-            if hiag.node_imbalance(node=node) < 0:
-                logger.warning("Something went WRONG! On segment extremity {node} there is a negative copy number excess...".format(node=str(node)))
+        negative_nodes_indexes = np.flatnonzero(clone_imbalances < 0)
+        for node_index in negative_nodes_indexes:
+            logger.warning("Something went WRONG! On segment extremity {node} there is a negative copy number excess...".format(node=str(incidence.nodes[node_index])))
         logger.info("Getting inferred telomeres.")
-        diploid_telomeres = hiag.get_telomeres()
-        inferred_hapl_telomeres_ids = {p.stable_id_non_hap for p in diploid_telomeres}
-        input_hapl_telomers_ids = {p.stable_id_non_hap for p in telomeres}
-        if inferred_hapl_telomeres_ids > input_hapl_telomers_ids:
+        inferred_hapl_telomeres_ids = {incidence.nodes[node_index].stable_id_non_hap for node_index in np.flatnonzero(clone_imbalances > 0)}
+        extra_telomeres_ids = inferred_hapl_telomeres_ids - input_hapl_telomers_ids
+        if len(extra_telomeres_ids) > 0:
             logger.error("Something went WRONG! Following segments extremities, while not specified specified as possible telomere sites were inferred as such.")
-            logger.error(",".join(map(str, sorted(inferred_hapl_telomeres_ids - input_hapl_telomers_ids))))
-        else:
+            logger.error(",".join(map(str, sorted(extra_telomeres_ids))))
+        elif len(negative_nodes_indexes) == 0:
             logger.info("Everything is OK! in clone {clone_id} all extremities have non-negative copy number excess, and inferred telomere sites concur with the input"
                         "".format(clone_id=clone_id))
-        length = 0
-        for u, v, data in hiag.segment_edges():
-            s: Segment = data["object"]
-            length += s.length * data["copy_number"]
-        logger.info(f"Total length for clone {clone_id} = {length}")
-        chromosome_cnt = sum(hiag.node_imbalance(node) for node in hiag.nodes(data=False)) / 2
+        logger.info(f"Total length for clone {clone_id} = {int(lengths[clone_index])}")
+        chromosome_cnt = clone_imbalances.sum() / 2
         logger.info(f"Total number of chromosomes in clone {clone_id} = {chromosome_cnt}")
 
 
@@ -1,8 +1,13 @@
+import itertools
+import multiprocessing
 from collections import defaultdict
 from copy import deepcopy
 
+import numpy as np
+
 from rck.core.io import COPY_NUMBER, stringify_adjacency_cn_entry
-from rck.core.structures import Strand, Position, sorted_segments_donot_overlap, Haplotype, SegmentCopyNumberProfile, Segment, refined_scnt_with_adjacencies_and_telomeres
+from rck.core.structures import Strand, Position, sorted_segments_donot_overlap, Haplotype, SegmentCopyNumberProfile, Segment, refined_scnt_with_adjacencies_and_telomeres, \
+    cn_distance_inter_scnt
 from rck.utils.adj.process import REMOVE
 
 
@@ -292,3 +297,67 @@ def get_circa_segments_cna_fractions(segments, scnt, clone_id, window_size=10000
                 cna_fraction += length_fraction
         result[window] = cna_fraction
     return result
+
+
+def scnt_pair_distance(scnt1, scnt2, segments, best_clone_mapping=False):
+    """
+    Distance (see `cn_distance_inter_scnt`) between two SCNTs defined on the same `segments`, whose clone ids need not match.
+    Clones of `scnt1` are mapped to clones of `scnt2` in the sorted order of clone ids, or (with `best_clone_mapping`) by a permutation that minimizes the total distance.
+    Returns a triple of the total distance, per-clone distances (keyed by `scnt1` clone ids), and the clone mapping (`scnt1` clone ids -> `scnt2` clone ids).
+    """
+    clone_ids1 = sorted(scnt1.keys())
+    clone_ids2 = sorted(scnt2.keys())
+    if len(clone_ids1) != len(clone_ids2):
+        raise ValueError("Can not compute distance between SCNTs with different number of clones ({cnt1} and {cnt2})".format(cnt1=len(clone_ids1), cnt2=len(clone_ids2)))
+    result = None
+    for target_clone_ids in (itertools.permutations(clone_ids2) if best_clone_mapping else [clone_ids2]):
+        relabeled_scnt2 = {clone_id1: scnt2[clone_id2] for clone_id1, clone_id2 in zip(clone_ids1, target_clone_ids)}
+        distances = cn_distance_inter_scnt(tensor1=scnt1, tensor2=relabeled_scnt2, segments=segments, check_clone_ids_match=True)
+        total_distance = sum(distances.values())
+        if result is None or total_distance < result[0]:
+            result = total_distance, distances, dict(zip(clone_ids1, target_clone_ids))
+    return result
+
+
+distance_matrix_worker_data = {}
+
+
+def init_distance_matrix_worker(segments_by_sample_names, scnts_by_sample_names):
+    distance_matrix_worker_data["segments"] = segments_by_sample_names
+    distance_matrix_worker_data["scnts"] = scnts_by_sample_names
+
+
+def scnt_pair_distance_task(arguments):
+    sample_name1, sample_name2, best_clone_mapping = arguments
+    segments = distance_matrix_worker_data["segments"][sample_name1]
+    scnt1, scnt2 = distance_matrix_worker_data["scnts"][sample_name1], distance_matrix_worker_data["scnts"][sample_name2]
+    try:
+        return sample_name1, sample_name2, scnt_pair_distance(scnt1=scnt1, scnt2=scnt2, segments=segments, best_clone_mapping=best_clone_mapping)
+    except ValueError:
+        return sample_name1, sample_name2, None
+
+
+def scnt_distance_matrix(segments_by_sample_names, scnts_by_sample_names, best_clone_mapping=False, workers=1):
+    """
+    Pairwise distances (see `scnt_pair_distance`) between SCNTs, that are aligned to a common segmentation (see `aligned_scnts`).
+    Every unordered pair of samples is processed once (on the segments of the sample, that comes first in the sorted order), with pairs distributed over a pool of `workers` processes.
+    Returns sorted sample names, a symmetric samples x samples distance matrix (NaN for pairs of samples with different number of clones),
+        and a dict of (total distance, per-clone distances, clone mapping) triples (None for incomparable pairs) for every (sample name 1, sample name 2) pair with sample name 1 < sample name 2.
+    """
+    sample_names = sorted(scnts_by_sample_names.keys())
+    tasks = [(sample_name1, sample_name2, best_clone_mapping) for sample_name1, sample_name2 in itertools.combinations(sample_names, 2)]
+    if workers > 1 and len(tasks) > 1:
+        with multiprocessing.Pool(processes=workers, initializer=init_distance_matrix_worker, initargs=(segments_by_sample_names, scnts_by_sample_names)) as pool:
+            pairs_results = list(pool.imap_unordered(scnt_pair_distance_task, tasks, chunksize=max(1, len(tasks) // (workers * 4))))
+    else:
+        init_distance_matrix_worker(segments_by_sample_names=segments_by_sample_names, scnts_by_sample_names=scnts_by_sample_names)
+        pairs_results = [scnt_pair_distance_task(task) for task in tasks]
+    indexes = {sample_name: index for index, sample_name in enumerate(sample_names)}
+    matrix = np.zeros((len(sample_names), len(sample_names)), dtype=float)
+    pairs = {}
+    for sample_name1, sample_name2, pair_result in pairs_results:
+        distance = np.nan if pair_result is None else pair_result[0]
+        matrix[indexes[sample_name1], indexes[sample_name2]] = distance
+        matrix[indexes[sample_name2], indexes[sample_name1]] = distance
+        pairs[(sample_name1, sample_name2)] = pair_result
+    return sample_names, matrix, pairs
@@ -3,6 +3,8 @@ import itertools
 import sys
 import os
 
+import numpy as np
+
 current_file_level = 3
 current_dir = os.path.dirname(os.path.realpath(__file__))
 for _ in range(current_file_level):
@@ -13,10 +15,19 @@ from rck.core.io import get_logging_cli_parser, get_standard_logger_from_args, g
     write_scnt_to_destination, read_scnt_from_source, stream_segments_from_source, write_segments_to_destination
 from rck.core.structures import aligned_scnts, refined_scnt, cn_distance_inter_scnt
 from rck.utils.adj.process import KEEP, REMOVE, iter_over_string_entries_from_source, get_extra_field_regexes
-from rck.utils.scn.process import iter_haploid_segments, filter_segments_by_chromosomal_regions, filter_segments_by_extra, filter_segments_by_size
+from rck.utils.scn.process import iter_haploid_segments, filter_segments_by_chromosomal_regions, filter_segments_by_extra, filter_segments_by_size, scnt_distance_matrix
 from rck.utils.adj.convert import get_chrs_regions_string_list_from_file, parse_segment_chr_region, get_chrs_regions_string_lists_from_source
 
 
+def get_scnt_sample_name(path):
+    name = os.path.splitext(os.path.basename(path))[0]
+    if name.endswith(".scnt"):
+        name = name[:-5]
+    if name.endswith("."):
+        name = name[:-1]
+    return name
+
+
 def main():
     parser = argparse.ArgumentParser(prog="RCK-UTILS-SCNT-process")
     cli_logging_parser = get_logging_cli_parser()
@@ -51,6 +62,17 @@ def main():
     distance_parser.add_argument("--clone-ids", default=None)
     distance_parser.add_argument("--output", "-o", type=argparse.FileType("wt"), default=sys.stdout)
     ###
+    distance_matrix_parser = subparsers.add_parser("distance-matrix", parents=[cli_logging_parser])
+    distance_matrix_parser.add_argument("scnt", nargs="+")
+    distance_matrix_parser.add_argument("--separator", default="\t")
+    distance_matrix_parser.add_argument("--extra-separator", default=";")
+    distance_matrix_parser.add_argument("--clone-ids", default=None)
+    distance_matrix_parser.add_argument("--best-clone-mapping", action="store_true")
+    distance_matrix_parser.add_argument("--workers", type=int, default=1)
+    distance_matrix_parser.add_argument("--output", "-o", type=argparse.FileType("wt"), default=sys.stdout)
+    distance_matrix_parser.add_argument("--output-npy", default=None)
+    distance_matrix_parser.add_argument("--output-mappings", type=argparse.FileType("wt"), default=None)
+    ###
     filter_parser = subparsers.add_parser("filter", parents=[cli_logging_parser])
     filter_parser.add_argument("scnt", type=argparse.FileType("rt"), default=sys.stdin)
     filter_parser.add_argument("--separator", default="\t")
@@ -96,12 +118,7 @@ def main():
         scnt_files = {}
         for path in args.scnt:
             full_path = get_full_path(path=path)
-            name = os.path.splitext(os.path.basename(full_path))[0]
-            if name.endswith(".scnt"):
-                name = name[:-5]
-            if name.endswith("."):
-                name = name[:-1]
-            scnt_files[name] = full_path
+            scnt_files[get_scnt_sample_name(path=full_path)] = full_path
         logger.debug("Input Segment Copy Number Tensors (SCNT) identified as {input_scnts}".format(input_scnts=" , ".join(scnt_files.values())))
         scnts_by_name = {}
         segments_by_name = {}
@@ -195,6 +212,50 @@ def main():
         scnt1, scnt2 = scnts_by_sample_names["1"], scnts_by_sample_names["2"]
         distance = cn_distance_inter_scnt(tensor1=scnt1, tensor2=scnt2, segments=segments, check_clone_ids_match=True)
         print("distance = ", distance)
+    elif args.command == "distance-matrix":
+        clone_ids = args.clone_ids
+        if args.clone_ids is not None:
+            clone_ids = args.clone_ids.split(",")
+        scnt_files = {}
+        for path in args.scnt:
+            full_path = get_full_path(path=path)
+            name = get_scnt_sample_name(path=full_path)
+            if name in scnt_files:
+                parser.error("Sample name {name} is shared by SCNTs in {file1} and {file2}".format(name=name, file1=scnt_files[name], file2=full_path))
+            scnt_files[name] = full_path
+        if len(scnt_files) < 2:
+            parser.error("At least two SCNTs are required to compute a distance matrix")
+        segments_by_sample_names = {}
+        scnts_by_sample_names = {}
+        logger.info("Reading {cnt} input SCNTs".format(cnt=len(scnt_files)))
+        for name, path in scnt_files.items():
+            logger.debug("Reading SCNT from {file}".format(file=path))
+            segments_by_sample_names[name], scnts_by_sample_names[name] = read_scnt_from_file(file_name=path, clone_ids=clone_ids, separator=args.separator,
+                                                                                              extra_separator=args.extra_separator, remove_cn_data_from_segs=True)
+        logger.info("Aligning input SCNTs.")
+        segments_by_sample_names, scnts_by_sample_names = aligned_scnts(segments_by_sample_names=segments_by_sample_names, scnts_by_sample_names=scnts_by_sample_names)
+        logger.info("Computing pairwise distances between {cnt} SCNTs with {workers} worker(s)".format(cnt=len(scnt_files), workers=args.workers))
+        sample_names, matrix, pairs = scnt_distance_matrix(segments_by_sample_names=segments_by_sample_names, scnts_by_sample_names=scnts_by_sample_names,
+                                                           best_clone_mapping=args.best_clone_mapping, workers=args.workers)
+        for (sample_name1, sample_name2), pair_result in sorted(pairs.items()):
+            if pair_result is None:
+                logger.warning("SCNTs {sample1} and {sample2} have different number of clones. Their distance is reported as NaN".format(sample1=sample_name1, sample2=sample_name2))
+        logger.info("Writing distance matrix to {file}".format(file=args.output.name))
+        print("sample", *sample_names, sep=args.separator, file=args.output)
+        for sample_name, row in zip(sample_names, matrix):
+            print(sample_name, *["NaN" if np.isnan(value) else str(int(value)) if value.is_integer() else str(value) for value in row], sep=args.separator, file=args.output)
+        if args.output_npy is not None:
+            logger.info("Writing distance matrix (with samples in the {names} order) to {file}".format(names=",".join(sample_names), file=args.output_npy))
+            np.save(args.output_npy, matrix)
+        if args.output_mappings is not None:
+            logger.info("Writing per pair clone mappings and distances to {file}".format(file=args.output_mappings.name))
+            print("sample1", "sample2", "clone1", "clone2", "distance", sep=args.separator, file=args.output_mappings)
+            for (sample_name1, sample_name2), pair_result in sorted(pairs.items()):
+                if pair_result is None:
+                    continue
+                _, distances, clone_mapping = pair_result
+                for clone_id1 in sorted(clone_mapping.keys()):
+                    print(sample_name1, sample_name2, clone_id1, clone_mapping[clone_id1], distances[clone_id1], sep=args.separator, file=args.output_mappings)
 
     logger.info("Success!")
 
@@ -21,6 +21,7 @@ setup(
     entry_points={
         "console_scripts": [
             "rck = rck.rck_run:main",
+            "rck-batch = rck.rck_batch:main",
             "rck-scnt-x2rck = rck.utils.scn.rck_scnt_x2rck:main",
             "rck-scnt-process = rck.utils.scn.rck_scnt_process:main",
             "rck-scnt-rck2x = rck.utils.scn.rck_scnt_rck2x:main",
@@ -0,0 +1,257 @@
+import itertools
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from collections import defaultdict
+
+import pysam
+
+from rck.core.io import EXTERNAL_NA_ID
+from rck.core.structures import Position, Strand, Adjacency
+from rck.utils.adj.adjacency_group_inference import infer_sniffles_molecule_groups, infer_short_nas_labeling_groups, get_breakend_index, \
+    get_breakends_in_range, get_labeling_groups, ReadAlignment, fetch_read_alignments
+
+F, R = Strand.FORWARD, Strand.REVERSE
+
+
+def get_adjacency(aid, chr1, coord1, strand1, chr2, coord2, strand2, rnames=None):
+    extra = {EXTERNAL_NA_ID: aid}
+    if rnames is not None:
+        extra["rnames"] = rnames
+    return Adjacency(position1=Position(chromosome=chr1, coordinate=coord1, strand=strand1), position2=Position(chromosome=chr2, coordinate=coord2, strand=strand2),
+                     extra=extra)
+
+
+def get_groups_summary(groups):
+    return [(group.gid, list(group.adjacencies_ids), group.extra) for group in groups]
+
+
+def reference_short_nas_labeling_groups(adjacencies, max_size=1000, allow_intermediate_same=False, allow_intermediate_tra=False, allow_inv_signatures=True):
+    """
+    Straightforward (quadratic) version of `infer_short_nas_labeling_groups`, that scans all the spanned breakends for every adjacency.
+    """
+    positions_to_adjacencies = defaultdict(list)
+    positions_by_chrs = defaultdict(list)
+    for adj in adjacencies:
+        for p in [adj.position1, adj.position2]:
+            positions_to_adjacencies[p].append(adj)
+            positions_by_chrs[p.chromosome].append(p)
+    positions_by_chr_to_index = {}
+    for chr_name in list(positions_by_chrs.keys()):
+        positions_by_chrs[chr_name] = sorted(positions_by_chrs[chr_name], key=lambda p: (p.coordinate, p.strand))
+        positions_by_chr_to_index[chr_name] = {p: cnt for cnt, p in enumerate(positions_by_chrs[chr_name])}
+    result = []
+    processed_adj_ids = set()
+    for adj in adjacencies:
+        if adj.stable_id_non_phased in processed_adj_ids:
+            continue
+        p1, p2 = adj.position1, adj.position2
+        if p1.chromosome != p2.chromosome or (not allow_inv_signatures and p1.strand == p2.strand) or adj.distance_non_hap > max_size:
+            continue
+        p1_index, p2_index = positions_by_chr_to_index[p1.chromosome][p1], positions_by_chr_to_index[p1.chromosome][p2]
+        aid = adj.extra.get(EXTERNAL_NA_ID, adj.stable_id_non_phased)
+        processed_adj = adj
+        if abs(p1_index - p2_index) == 1:
+            result.append(aid)
+        else:
+            if not (allow_intermediate_same or allow_intermediate_tra):
+                continue
+            has_same, has_tra = False, False
+            for index in range(p1_index + 1, p2_index):
+                for processed_adj in positions_to_adjacencies[positions_by_chrs[p1.chromosome][index]]:
+                    has_same |= processed_adj.position1.chromosome == processed_adj.position2.chromosome
+                    has_tra |= processed_adj.position1.chromosome != processed_adj.position2.chromosome
+            if (has_same and allow_intermediate_same) or (has_tra and allow_intermediate_tra):
+                result.append(aid)
+        processed_adj_ids.add(processed_adj.stable_id_non_phased)
+    return result
+
+
+def get_aligned_segment(query_name, flag, reference_id=-1, reference_start=-1, cigar_length=None):
+    result = pysam.AlignedSegment()
+    result.query_name = query_name
+    result.query_sequence = "A" * 100
+    result.flag = flag
+    result.reference_id = reference_id
+    result.reference_start = reference_start
+    if cigar_length is not None:
+        result.cigartuples = [(0, cigar_length)]
+    return result
+
+
+class SnifflesMoleculeGroupsTestCase(unittest.TestCase):
+    def test_groups(self):
+        adjacencies = [
+            get_adjacency("a1", "1", 100, F, "1", 1100, R, rnames="r1,r2,r3"),
+            get_adjacency("a2", "1", 200, F, "1", 1200, R, rnames="r2,r4"),
+            get_adjacency("a3", "1", 300, F, "1", 1300, R),
+            get_adjacency("a4", "1", 400, F, "1", 1400, R, rnames=""),
+            get_adjacency("a5", "1", 500, F, "1", 1500, R, rnames="r4,r4,r1"),
+            get_adjacency("a6", "1", 600, F, "1", 1600, R, rnames="r5,r5"),
+            get_adjacency("a1", "1", 700, F, "1", 1700, R, rnames="r3"),
+        ]
+        # groups ids follow the order of the first appearance of reads (r3 and r5 support a single adjacency each, and do not make groups)
+        self.assertEqual(get_groups_summary(infer_sniffles_molecule_groups(adjacencies=adjacencies)),
+                         [("0", ["a1", "a5"], {"source": "r1"}), ("1", ["a1", "a2"], {"source": "r2"}), ("3", ["a2", "a5"], {"source": "r4"})])
+        self.assertEqual([group.gid for group in infer_sniffles_molecule_groups(adjacencies=adjacencies, gid_suffix="s")], ["0_s", "1_s", "3_s"])
+
+    def test_no_groups(self):
+        self.assertEqual(infer_sniffles_molecule_groups(adjacencies=[]), [])
+        self.assertEqual(infer_sniffles_molecule_groups(adjacencies=[get_adjacency("a1", "1", 100, F, "1", 1100, R)]), [])
+        self.assertEqual(infer_sniffles_molecule_groups(adjacencies=[get_adjacency("a1", "1", 100, F, "1", 1100, R, rnames="r1"),
+                                                                     get_adjacency("a2", "1", 200, F, "1", 1200, R, rnames="r2")]), [])
+
+    def test_random(self):
+        rnd = random.Random(1)
+        for _ in range(50):
+            reads = ["r{}".format(index) for index in range(rnd.randint(1, 30))]
+            adjacencies = []
+            for index in range(rnd.randint(0, 40)):
+                rnames = ",".join(rnd.choice(reads) for _ in range(rnd.randint(0, 4)))
+                adjacencies.append(get_adjacency("a{}".format(rnd.randint(0, 30)), "1", index * 10, F, "1", index * 10 + 5, R, rnames=rnames))
+            reads_to_aids = defaultdict(set)
+            for adj in adjacencies:
+                for read_name in adj.extra["rnames"].split(","):
+                    if len(read_name) > 0:
+                        reads_to_aids[read_name].add(adj.extra[EXTERNAL_NA_ID])
+            expected = [(str(cnt), aids, read_name) for cnt, (read_name, aids) in enumerate(reads_to_aids.items()) if len(aids) >= 2]
+            groups = infer_sniffles_molecule_groups(adjacencies=adjacencies)
+            self.assertEqual([(group.gid, set(group.adjacencies_ids), group.extra["source"]) for group in groups], expected)
+            self.assertTrue(all(len(group.adjacencies_ids) == len(group.adjacencies_ids_set) for group in groups))
+
+
+class ShortNasLabelingGroupsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.adjacencies = [
+            # spans a2 (inter-chromosomal) and a3 (intra-chromosomal) breakends
+            get_adjacency("a1", "1", 100, F, "1", 400, R),
+            get_adjacency("a2", "1", 200, R, "2", 50, F),
+            get_adjacency("a3", "1", 300, F, "1", 350, R),
+            # inversion signature
+            get_adjacency("a5", "1", 500, R, "1", 600, R),
+            # longer than max_size
+            get_adjacency("a6", "1", 1000, F, "1", 5000, R),
+            # spans an a2 (inter-chromosomal) breakend
+            get_adjacency("a7", "2", 300, F, "2", 10, R),
+        ]
+
+    def test_groups(self):
+        expected = {
+            (False, False, False): ["a3"],
+            (False, False, True): ["a3", "a5"],
+            (False, True, False): ["a1", "a7"],
+            (False, True, True): ["a1", "a5", "a7"],
+            (True, False, False): ["a1"],
+            (True, False, True): ["a1", "a5"],
+            (True, True, False): ["a1", "a7"],
+            (True, True, True): ["a1", "a5", "a7"],
+        }
+        for (same, tra, inv), aids in expected.items():
+            groups = infer_short_nas_labeling_groups(adjacencies=self.adjacencies, gid_suffix="x", allow_intermediate_same=same, allow_intermediate_tra=tra,
+                                                     allow_inv_signatures=inv)
+            # with intermediate breakends checks a3 is marked as processed, when a1, that spans its breakends, is processed
+            self.assertEqual(get_groups_summary(groups), [("{}_x".format(cnt), [aid, aid], {"agl": [0, 1]}) for cnt, aid in enumerate(aids)])
+
+    def test_duplicate_adjacency(self):
+        duplicate = get_adjacency("a4", "1", 100, F, "1", 400, R)
+        adjacencies = self.adjacencies[:3] + [duplicate] + self.adjacencies[3:]
+        groups = infer_short_nas_labeling_groups(adjacencies=adjacencies, allow_intermediate_same=True)
+        self.assertEqual([group.adjacencies_ids[0] for group in groups], ["a1", "a3", "a5"])
+        groups = infer_short_nas_labeling_groups(adjacencies=adjacencies)
+        self.assertEqual([group.adjacencies_ids[0] for group in groups], ["a3", "a5"])
+
+    def test_random(self):
+        for trial in range(100):
+            rnd = random.Random(trial)
+            coordinates = [rnd.randrange(0, 2000) for _ in range(rnd.randint(2, 40))]
+            adjacencies = []
+            for index in range(rnd.randint(1, 40)):
+                chr1 = rnd.choice(["1", "2"])
+                chr2 = chr1 if rnd.random() < 0.7 else rnd.choice(["1", "2", "3"])
+                adjacencies.append(get_adjacency(str(index), chr1, rnd.choice(coordinates), rnd.choice([F, R]), chr2, rnd.choice(coordinates), rnd.choice([F, R])))
+                if rnd.random() < 0.1:
+                    adj = adjacencies[-1]
+                    adjacencies.append(get_adjacency(str(index) + "d", adj.position1.chromosome, adj.position1.coordinate, adj.position1.strand,
+                                                     adj.position2.chromosome, adj.position2.coordinate, adj.position2.strand))
+            for same, tra, inv, max_size in itertools.product([False, True], [False, True], [False, True], [500, 5000]):
+                groups = infer_short_nas_labeling_groups(adjacencies=adjacencies, max_size=max_size, allow_intermediate_same=same, allow_intermediate_tra=tra,
+                                                         allow_inv_signatures=inv)
+                expected = reference_short_nas_labeling_groups(adjacencies=adjacencies, max_size=max_size, allow_intermediate_same=same, allow_intermediate_tra=tra,
+                                                               allow_inv_signatures=inv)
+                self.assertEqual([(group.gid, list(group.adjacencies_ids)) for group in groups], [(str(cnt), [aid, aid]) for cnt, aid in enumerate(expected)])
+
+
+class BreakendIndexTestCase(unittest.TestCase):
+    def test_breakends_in_range(self):
+        positions = [Position(chromosome="1", coordinate=100, strand=F), Position(chromosome="1", coordinate=100, strand=R), Position(chromosome="1", coordinate=50, strand=R),
+                     Position(chromosome="1", coordinate=100, strand=F), Position(chromosome="2", coordinate=10, strand=F)]
+        breakend_index = get_breakend_index(positions=positions)
+        self.assertEqual(sorted(breakend_index.keys()), ["1", "2"])
+        self.assertEqual(breakend_index["1"][1].tolist(), [50, 100, 100])
+        self.assertEqual(get_breakends_in_range(breakend_index=breakend_index, chromosome="1", start=50, end=100), positions[2:3] + positions[1:2] + positions[0:1])
+        self.assertEqual(get_breakends_in_range(breakend_index=breakend_index, chromosome="1", start=51, end=100), positions[1:2] + positions[0:1])
+        self.assertEqual(get_breakends_in_range(breakend_index=breakend_index, chromosome="1", start=0, end=99), positions[2:3])
+        self.assertEqual(get_breakends_in_range(breakend_index=breakend_index, chromosome="1", start=101, end=1000), [])
+        self.assertEqual(get_breakends_in_range(breakend_index=breakend_index, chromosome="3", start=0, end=1000), [])
+
+    def test_random(self):
+        rnd = random.Random(1)
+        for _ in range(100):
+            positions = [Position(chromosome=rnd.choice(["1", "2"]), coordinate=rnd.randrange(0, 1000), strand=rnd.choice([F, R])) for _ in range(rnd.randint(0, 50))]
+            breakend_index = get_breakend_index(positions=positions)
+            for _ in range(20):
+                chromosome, start = rnd.choice(["1", "2", "3"]), rnd.randrange(-100, 1000)
+                end = start + rnd.randrange(0, 500)
+                expected = sorted({p for p in positions if p.chromosome == chromosome and start <= p.coordinate <= end}, key=lambda p: (p.coordinate, p.strand))
+                self.assertEqual(get_breakends_in_range(breakend_index=breakend_index, chromosome=chromosome, start=start, end=end), expected)
+
+    def test_labeling_groups(self):
+        adjacencies = [get_adjacency("b1", "1", 1000, F, "1", 5000, R), get_adjacency("b2", "1", 6000, F, "2", 100, R), get_adjacency("b3", "2", 900, F, "3", 2000, R),
+                       get_adjacency("b4", "1", 5500, F, "1", 7000, R)]
+        alignments = [ReadAlignment("q1", "1", 0, 1000, 0, 1000, False), ReadAlignment("q1", "1", 5000, 6000, 1000, 2000, False),
+                      ReadAlignment("q1", "2", 100, 900, 2000, 2800, False), ReadAlignment("q1", "3", 2000, 2500, 2800, 3300, False)]
+        expected = {
+            "first": [(0, ["b1", "b4"], {"alignment": "q1", "agl": [1, 0]}), (1, ["b2", "b1"], {"alignment": "q1", "agl": [0, 1]}),
+                      (2, ["b2", "b3"], {"alignment": "q1", "agl": [1, 0]})],
+            "last": [(0, ["b1", "b2"], {"alignment": "q1", "agl": [1, 0]}), (1, ["b2", "b3"], {"alignment": "q1", "agl": [1, 0]}),
+                     (2, ["b4", "b1"], {"alignment": "q1", "agl": [0, 1]})],
+        }
+        for neighbour_selection, groups in expected.items():
+            for delta in [0, 1000]:
+                self.assertEqual(get_groups_summary(get_labeling_groups(read_alignments=alignments, read_adjacencies=adjacencies, delta=delta,
+                                                                        neighbour_selection=neighbour_selection)), groups)
+
+    def test_labeling_groups_unmapped_alignments(self):
+        adjacencies = [get_adjacency("b1", "1", 1000, F, "1", 5000, R), get_adjacency("b2", "1", 6000, F, "2", 100, R)]
+        unmapped = get_aligned_segment(query_name="q1", flag=4)
+        self.assertEqual(get_labeling_groups(read_alignments=[unmapped], read_adjacencies=adjacencies[:1]), [])
+        alignments = [ReadAlignment("q1", "1", 0, 1000, 0, 1000, False), ReadAlignment("q1", "1", 5000, 6000, 1000, 2000, False),
+                      ReadAlignment("q1", "2", 100, 900, 2000, 2800, False)]
+        self.assertEqual(get_groups_summary(get_labeling_groups(read_alignments=alignments + [unmapped], read_adjacencies=adjacencies)),
+                         get_groups_summary(get_labeling_groups(read_alignments=alignments, read_adjacencies=adjacencies)))
+
+
+class FetchReadAlignmentsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.alignment_file_name = os.path.join(self.workdir, "alignments.bam")
+        header = {"HD": {"VN": "1.0", "SO": "coordinate"}, "SQ": [{"SN": "1", "LN": 10000}]}
+        with pysam.AlignmentFile(self.alignment_file_name, "wb", header=header) as destination:
+            # q1 is a mapped read with an unmapped mate, that is placed at the read position; q2 is not a supporting read
+            destination.write(get_aligned_segment(query_name="q1", flag=1 + 8 + 64, reference_id=0, reference_start=1000, cigar_length=100))
+            destination.write(get_aligned_segment(query_name="q1", flag=1 + 4 + 128, reference_id=0, reference_start=1000))
+            destination.write(get_aligned_segment(query_name="q2", flag=0, reference_id=0, reference_start=1050, cigar_length=100))
+        pysam.index(self.alignment_file_name)
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir)
+
+    def test_unmapped_alignments(self):
+        alignments = fetch_read_alignments(alignment_file_name=self.alignment_file_name, regions=[["1", 900, 1200, {"q1"}], ["2", 0, 100, {"q1"}]])
+        self.assertEqual(alignments, [ReadAlignment("q1", "1", 1000, 1100, 0, 100, False)])
+
+
+if __name__ == '__main__':
+    unittest.main()
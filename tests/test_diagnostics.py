@@ -0,0 +1,150 @@
+import itertools
+import random
+import unittest
+
+from rck.core.diagnostics import get_monotone_boundary, get_minimal_relaxation, localize_infeasibility, get_infeasibility_report_lines, \
+    WINDOW, RELAXED_SCNB, EXTRA_TELOMERES, DROPPED_GROUPS, NAS_FP
+from rck.core.structures import Position, Strand, Segment, Adjacency, AdjacencyType
+
+
+class FakeChecker(object):
+    """
+    Stand-in for `FeasibilityChecker` with a known infeasible core: any window that contains all `core` segments is infeasible,
+        unless copy number boundaries of segments that cover any of the `sufficient_scnb` sets are relaxed.
+    """
+
+    def __init__(self, segments, core, sufficient_scnb, workers=1):
+        self.segments = segments
+        self.adjacencies = []
+        for s1, s2 in zip(segments[:-1], segments[1:]):
+            if s1.chromosome == s2.chromosome:
+                self.adjacencies.append(Adjacency(position1=s1.end_position, position2=s2.start_position, adjacency_type=AdjacencyType.REFERENCE))
+        self.telomeres = []
+        self.adjacency_groups = []
+        self.positions_to_sids = {position.stable_id_non_hap: segment.stable_id_non_hap for segment in segments
+                                  for position in [segment.start_position, segment.end_position]}
+        self.core = set(core)
+        self.sufficient_scnb = [set(sids) for sids in sufficient_scnb]
+        self.workers = workers
+        self.checks_cnt = 0
+        self.exhausted = False
+
+    def __call__(self, spec):
+        window = spec.get(WINDOW)
+        if window is not None and not self.core.issubset(window):
+            return True
+        relaxed = set(spec.get(RELAXED_SCNB, []))
+        return any(sids.issubset(relaxed) for sids in self.sufficient_scnb)
+
+    def check_many(self, specs):
+        self.checks_cnt += len(specs)
+        return [self(spec) for spec in specs]
+
+
+def get_segments(chromosome, cnt):
+    return [Segment(start_position=Position(chromosome=chromosome, coordinate=index * 100 + 1, strand=Strand.REVERSE),
+                    end_position=Position(chromosome=chromosome, coordinate=(index + 1) * 100, strand=Strand.FORWARD)) for index in range(cnt)]
+
+
+class MonotoneBoundaryTestCase(unittest.TestCase):
+    def test_boundary(self):
+        for width in [1, 2, 3, 7]:
+            for lo, hi in [(0, 0), (0, 1), (0, 10), (3, 50)]:
+                for boundary in range(lo, hi + 1):
+                    evaluated = []
+
+                    def predicate_many(points):
+                        evaluated.extend(points)
+                        return [point <= boundary for point in points]
+
+                    self.assertEqual(get_monotone_boundary(lo=lo, hi=hi, predicate_many=predicate_many, width=width), boundary)
+                    self.assertTrue(all(lo < point <= hi for point in evaluated))
+
+
+class MinimalRelaxationTestCase(unittest.TestCase):
+    def assertIrreducible(self, result, is_sufficient):
+        self.assertTrue(is_sufficient(result))
+        for index in range(len(result)):
+            self.assertFalse(is_sufficient(result[:index] + result[index + 1:]))
+
+    def test_known_cores(self):
+        items = list(range(10))
+        for cores in [[{4}], [{0, 9}], [{2, 3, 7}], [{1, 2}, {5}], [{8, 9}, {0, 1, 2}]]:
+            def is_sufficient(subset):
+                return any(core.issubset(subset) for core in cores)
+
+            result = get_minimal_relaxation(items=items, is_sufficient=is_sufficient)
+            self.assertIrreducible(result=result, is_sufficient=is_sufficient)
+            self.assertIn(set(result), cores)
+
+    def test_empty(self):
+        self.assertEqual(get_minimal_relaxation(items=[], is_sufficient=lambda subset: True), [])
+        self.assertEqual(get_minimal_relaxation(items=[1, 2, 3], is_sufficient=lambda subset: True), [])
+
+    def test_random_cores(self):
+        rnd = random.Random(1)
+        for _ in range(200):
+            items = list(range(rnd.randint(1, 20)))
+            cores = [set(rnd.sample(items, rnd.randint(1, min(4, len(items))))) for _ in range(rnd.randint(1, 3))]
+            cores.append(set(items))
+
+            def is_sufficient(subset):
+                return any(core.issubset(subset) for core in cores)
+
+            result = get_minimal_relaxation(items=items, is_sufficient=is_sufficient)
+            self.assertIrreducible(result=result, is_sufficient=is_sufficient)
+            self.assertEqual(len(result), len(set(result)))
+
+
+class LocalizeInfeasibilityTestCase(unittest.TestCase):
+    def setUp(self):
+        self.chr1 = get_segments(chromosome="1", cnt=12)
+        self.chr2 = get_segments(chromosome="2", cnt=4)
+        self.sids = [segment.stable_id_non_hap for segment in self.chr1]
+
+    def test_minimal_window_and_culprits(self):
+        for workers in [1, 2, 4]:
+            for start, end in itertools.combinations(range(13), 2):
+                core = self.sids[start:end]
+                sufficient_scnb = [[core[len(core) // 2]], [core[0], core[-1]]]
+                checker = FakeChecker(segments=self.chr1 + self.chr2, core={core[0], core[-1]}, sufficient_scnb=sufficient_scnb, workers=workers)
+                report = localize_infeasibility(checker=checker)
+                self.assertFalse(report["feasible"])
+                self.assertTrue(report["families"][RELAXED_SCNB])
+                self.assertFalse(report["families"][EXTRA_TELOMERES])
+                self.assertNotIn(DROPPED_GROUPS, report["families"])
+                self.assertFalse(report["families"][NAS_FP])
+                self.assertEqual(report["chromosomes"], {"1": False, "2": True})
+                self.assertEqual(len(report["regions"]), 1)
+                region = report["regions"][0]
+                self.assertEqual(region["segments"], core)
+                self.assertEqual((region["start"], region["end"]), (self.chr1[start].start_coordinate, self.chr1[end - 1].end_coordinate))
+                culprits = region["culprits"][RELAXED_SCNB]
+                self.assertIn(set(culprits), [set(sids) for sids in sufficient_scnb])
+                self.assertTrue(checker({WINDOW: set(core), RELAXED_SCNB: culprits}))
+                for index in range(len(culprits)):
+                    self.assertFalse(checker({WINDOW: set(core), RELAXED_SCNB: culprits[:index] + culprits[index + 1:]}))
+                self.assertNotIn(EXTRA_TELOMERES, region["culprits"])
+                self.assertEqual(report["checks"], checker.checks_cnt)
+                self.assertGreater(len(get_infeasibility_report_lines(report=report)), 0)
+
+    def test_no_infeasible_chromosome(self):
+        # infeasibility spans two chromosomes, so neither of them is infeasible on its own
+        core = {self.chr1[3].stable_id_non_hap, self.chr2[1].stable_id_non_hap}
+        checker = FakeChecker(segments=self.chr1 + self.chr2, core=core, sufficient_scnb=[[self.chr2[1].stable_id_non_hap]])
+        report = localize_infeasibility(checker=checker)
+        self.assertEqual(report["chromosomes"], {"1": True, "2": True})
+        self.assertEqual(len(report["regions"]), 1)
+        region = report["regions"][0]
+        self.assertIsNone(region["chromosome"])
+        self.assertEqual(region["culprits"][RELAXED_SCNB], [self.chr2[1].stable_id_non_hap])
+
+    def test_feasible(self):
+        checker = FakeChecker(segments=self.chr1, core=set(), sufficient_scnb=[[]])
+        report = localize_infeasibility(checker=checker)
+        self.assertTrue(report["feasible"])
+        self.assertEqual(report["regions"], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,8 @@
 import unittest
 
-from rck.core.graph import IntervalAdjacencyGraph
-from rck.core.structures import Position, Strand, Segment, Adjacency, AdjacencyType
+from rck.core.graph import IntervalAdjacencyGraph, CopyNumberIncidence, construct_hiag_inflate_from_haploid_data, COPY_NUMBER
+from rck.core.structures import Position, Strand, Segment, Adjacency, AdjacencyType, Haplotype, Phasing, SegmentCopyNumberProfile, \
+    AdjacencyCopyNumberProfile, HAPLOTYPE
 
 
 class TestIntervalAdjacencyGraph(unittest.TestCase):
@@ -104,3 +105,77 @@ class TestIntervalAdjacencyGraph(unittest.TestCase):
             IntervalAdjacencyGraph.check_consistency(segments=segments, adjacencies=adjacencies)
         with self.assertRaises(ValueError):
             IntervalAdjacencyGraph(segments=segments, adjacencies=adjacencies)
+
+    def test_duplicate_adjacency_edges_are_not_added(self):
+        segments = [self.s1, self.s2, self.s3]
+        ra1 = Adjacency(position1=self.s1.end_position, position2=self.s2.start_position, adjacency_type=AdjacencyType.REFERENCE)
+        na1 = Adjacency(position1=self.s1.end_position, position2=self.s2.start_position, adjacency_type=AdjacencyType.NOVEL)
+        na2 = Adjacency(position1=self.s2.start_position, position2=self.s1.end_position, adjacency_type=AdjacencyType.NOVEL)
+        iag = IntervalAdjacencyGraph(segments=segments, adjacencies=[ra1, na1, na2, ra1])
+        iag.build_graph()
+        self.assertEqual(len(list(iag.ref_adjacency_edges(data=True))), 1)
+        self.assertEqual(len(list(iag.nov_adjacency_edges(data=True))), 1)
+        self.assertEqual(len(iag.adjacency_edges_keys), 2)
+        u, v = iag.get_edge_vertices_pair_from_adjacency(adjacency=na1)
+        iag.remove_adjacency_edge(u=u, v=v, adj_type=AdjacencyType.NOVEL)
+        self.assertEqual(len(list(iag.nov_adjacency_edges(data=True))), 0)
+        self.assertEqual(len(iag.adjacency_edges_keys), 1)
+        iag.add_adjacency_edge(adjacency=na2)
+        self.assertEqual(len(list(iag.nov_adjacency_edges(data=True))), 1)
+
+
+class TestCopyNumberIncidence(unittest.TestCase):
+    def setUp(self):
+        self.s1 = Segment(start_position=Position(chromosome="1", coordinate=1, strand=Strand.REVERSE),
+                          end_position=Position(chromosome="1", coordinate=100, strand=Strand.FORWARD))
+        self.s2 = Segment(start_position=Position(chromosome="1", coordinate=101, strand=Strand.REVERSE),
+                          end_position=Position(chromosome="1", coordinate=200, strand=Strand.FORWARD))
+        self.r = Adjacency(position1=self.s1.end_position, position2=self.s2.start_position, adjacency_type=AdjacencyType.REFERENCE)
+        # fold-back inversion, i.e., a self-loop at the s1 end vertex
+        self.n1 = Adjacency(position1=Position(chromosome="1", coordinate=100, strand=Strand.FORWARD),
+                            position2=Position(chromosome="1", coordinate=100, strand=Strand.FORWARD), adjacency_type=AdjacencyType.NOVEL)
+        self.n2 = Adjacency(position1=self.s1.start_position, position2=self.s2.end_position, adjacency_type=AdjacencyType.NOVEL)
+        self.scnp = SegmentCopyNumberProfile()
+        # s2 is lost on haplotype A
+        for segment, haplotype, cn in [(self.s1, Haplotype.A, 3), (self.s1, Haplotype.B, 1), (self.s2, Haplotype.A, 0), (self.s2, Haplotype.B, 2)]:
+            self.scnp.set_cn_record_for_segment(segment=segment, cn=cn, haplotype=haplotype)
+        self.acnp = AdjacencyCopyNumberProfile()
+        for adjacency, phasing, cn in [(self.r, Phasing.AA, 1), (self.r, Phasing.BB, 1), (self.n1, Phasing.AA, 1), (self.n1, Phasing.BB, 1),
+                                       (self.n2, Phasing.BA, 1), (self.n2, Phasing.BB, 1)]:
+            self.acnp.set_cn_record_for_adjacency(adjacency=adjacency, cn=cn, phasing=phasing)
+
+    def test_hiag_imbalances(self):
+        hiag = construct_hiag_inflate_from_haploid_data(hapl_segments=[self.s1, self.s2], hapl_adjacencies=[self.r, self.n1, self.n2])
+        incidence = CopyNumberIncidence(iag=hiag)
+        self.assertTrue(incidence.haplotype_specific)
+        copy_numbers = incidence.get_copy_numbers(scnt={"1": self.scnp, "2": SegmentCopyNumberProfile()},
+                                                  acnt={"1": self.acnp, "2": AdjacencyCopyNumberProfile()}, clone_ids=["1", "2"])
+        cns_by_objects = {id(edge_object): cn for edge_object, cn in zip(incidence.segments + incidence.adjacencies, copy_numbers[0].tolist())}
+        for u, v, data in hiag.edges(data=True):
+            data[COPY_NUMBER] = cns_by_objects[id(data["object"])]
+        imbalances = incidence.get_imbalances(copy_numbers=copy_numbers)
+        self.assertEqual(imbalances.shape, (2, len(incidence.nodes)))
+        self.assertEqual(imbalances[1].tolist(), [0] * len(incidence.nodes))
+        for node_index, node in enumerate(incidence.nodes):
+            self.assertEqual(imbalances[0, node_index], hiag.node_imbalance(node=node))
+        imbalances_by_nodes = {(node.coordinate, node.extra[HAPLOTYPE]): imbalance for node, imbalance in zip(incidence.nodes, imbalances[0].tolist())}
+        # segment copy number, minus the reference adjacency, minus twice the self-loop
+        self.assertEqual(imbalances_by_nodes[(100, Haplotype.A)], 3 - 1 - 2 * 1)
+        self.assertEqual(imbalances_by_nodes[(100, Haplotype.B)], 1 - 1 - 2 * 1)
+        # zero copy number segment with a present reference adjacency
+        self.assertEqual(imbalances_by_nodes[(101, Haplotype.A)], 0 - 1)
+        # zero copy number segment with a present BA realization of n2
+        self.assertEqual(imbalances_by_nodes[(200, Haplotype.A)], 0 - 1)
+        self.assertEqual(incidence.get_lengths(copy_numbers=copy_numbers).tolist(), [(3 + 1 + 0 + 2) * 100, 0])
+
+    def test_iag_imbalances(self):
+        iag = IntervalAdjacencyGraph(segments=[self.s1, self.s2], adjacencies=[self.r, self.n1, self.n2])
+        iag.build_graph()
+        incidence = CopyNumberIncidence(iag=iag)
+        self.assertFalse(incidence.haplotype_specific)
+        iag.assign_copy_numbers_from_scn_profile(scn_profile=self.scnp)
+        iag.assign_copy_numbers_from_acn_profile(acn_profile=self.acnp)
+        imbalances = incidence.get_imbalances(copy_numbers=incidence.get_copy_numbers(scnt={"1": self.scnp}, acnt={"1": self.acnp}, clone_ids=["1"]))
+        for node_index, node in enumerate(incidence.nodes):
+            self.assertEqual(imbalances[0, node_index], iag.node_imbalance(node=node))
+        self.assertEqual(dict(zip([node.coordinate for node in incidence.nodes], imbalances[0].tolist()))[100], 4 - 2 - 2 * 2)
@@ -0,0 +1,128 @@
+import unittest
+
+from rck.core.heuristic import get_min_cost_flow_cn_profiles, get_opposite_locations_nas_ids
+from rck.core.graph import IntervalAdjacencyGraph
+from rck.core.structures import Position, Strand, Segment, Adjacency, AdjacencyType, Haplotype, Phasing, CNBoundaries
+from rck.core.structures import SegmentCopyNumberProfile, SegmentCopyNumberBoundaries
+
+
+class MinCostFlowHeuristicTestCase(unittest.TestCase):
+    def setUp(self):
+        self.s1 = Segment(start_position=Position(chromosome="1", coordinate=1, strand=Strand.REVERSE),
+                          end_position=Position(chromosome="1", coordinate=100, strand=Strand.FORWARD))
+        self.s2 = Segment(start_position=Position(chromosome="1", coordinate=101, strand=Strand.REVERSE),
+                          end_position=Position(chromosome="1", coordinate=200, strand=Strand.FORWARD))
+        self.s3 = Segment(start_position=Position(chromosome="1", coordinate=201, strand=Strand.REVERSE),
+                          end_position=Position(chromosome="1", coordinate=300, strand=Strand.FORWARD))
+        self.t1 = Segment(start_position=Position(chromosome="2", coordinate=1, strand=Strand.REVERSE),
+                          end_position=Position(chromosome="2", coordinate=100, strand=Strand.FORWARD))
+        self.segments = [self.s1, self.s2, self.s3, self.t1]
+        self.r1 = Adjacency(position1=self.s1.end_position, position2=self.s2.start_position, adjacency_type=AdjacencyType.REFERENCE)
+        self.r2 = Adjacency(position1=self.s2.end_position, position2=self.s3.start_position, adjacency_type=AdjacencyType.REFERENCE)
+        # deletion of s2
+        self.na1 = Adjacency(position1=self.s1.end_position, position2=self.s3.start_position, adjacency_type=AdjacencyType.NOVEL)
+        # translocation on the other side of the r1 reference adjacency
+        self.na2 = Adjacency(position1=self.t1.end_position, position2=self.s2.start_position, adjacency_type=AdjacencyType.NOVEL)
+        self.adjacencies = [self.r1, self.r2, self.na1, self.na2]
+
+    def get_scnt_and_scnb(self, cns, lower=None, upper=None):
+        scnp = SegmentCopyNumberProfile()
+        scnbp = SegmentCopyNumberBoundaries()
+        for (segment, haplotype), cn in cns.items():
+            sid = segment.stable_id_non_hap
+            scnp.set_cn_record_for_segment(segment=segment, cn=cn, haplotype=haplotype)
+            scnbp.set_cnb_record(sid=sid, hap=haplotype, boundary_type=CNBoundaries.LOWER, value=(lower or {}).get((segment, haplotype), cn))
+            scnbp.set_cnb_record(sid=sid, hap=haplotype, boundary_type=CNBoundaries.UPPER, value=(upper or {}).get((segment, haplotype), cn))
+        return {"1": scnp}, {"1": scnbp}
+
+    def assertBalancedWithinBoundaries(self, segments, adjacencies, scnt, acnt, scnb, telomeres):
+        telomeres_ids = {p.stable_id_non_hap for p in telomeres}
+        for clone_id in scnt:
+            for haplotype, phasing in [(Haplotype.A, Phasing.AA), (Haplotype.B, Phasing.BB)]:
+                for segment in segments:
+                    sid = segment.stable_id_non_hap
+                    cn = scnt[clone_id].get_cn(sid=sid, haplotype=haplotype)
+                    self.assertGreaterEqual(cn, scnb[clone_id].get_cnb(sid=sid, hap=haplotype, boundary_type=CNBoundaries.LOWER))
+                    self.assertLessEqual(cn, scnb[clone_id].get_cnb(sid=sid, hap=haplotype, boundary_type=CNBoundaries.UPPER))
+                    for position in [segment.start_position, segment.end_position]:
+                        pid = position.stable_id_non_hap
+                        adjacencies_cn = sum(acnt[clone_id].get_cn(aid=adjacency.stable_id_non_phased, phasing=phasing)
+                                             for adjacency in adjacencies
+                                             if pid in (adjacency.position1.stable_id_non_hap, adjacency.position2.stable_id_non_hap))
+                        if pid in telomeres_ids:
+                            self.assertLessEqual(adjacencies_cn, cn)
+                        else:
+                            self.assertEqual(adjacencies_cn, cn)
+
+    def test_opposite_locations_nas_ids(self):
+        iag = IntervalAdjacencyGraph(segments=self.segments, adjacencies=self.adjacencies)
+        iag.build_graph()
+        opposite = get_opposite_locations_nas_ids(iag=iag)
+        self.assertEqual(opposite[self.na1.stable_id_non_phased], {self.na2.stable_id_non_phased})
+        self.assertEqual(opposite[self.na2.stable_id_non_phased], {self.na1.stable_id_non_phased})
+
+    def test_balanced_within_boundaries(self):
+        cns = {(self.s1, Haplotype.A): 2, (self.s2, Haplotype.A): 1, (self.s3, Haplotype.A): 2, (self.t1, Haplotype.A): 1,
+               (self.s1, Haplotype.B): 1, (self.s2, Haplotype.B): 1, (self.s3, Haplotype.B): 1, (self.t1, Haplotype.B): 1}
+        scnt, scnb = self.get_scnt_and_scnb(cns=cns)
+        telomeres = [self.s1.start_position, self.s3.end_position, self.t1.start_position, self.t1.end_position]
+        result_scnt, result_acnt = get_min_cost_flow_cn_profiles(segments=self.segments, adjacencies=self.adjacencies, scnt=scnt, scnb=scnb, telomeres=telomeres)
+        for (segment, haplotype), cn in cns.items():
+            self.assertEqual(result_scnt["1"].get_cn(sid=segment.stable_id_non_hap, haplotype=haplotype), cn)
+        self.assertEqual(result_acnt["1"].get_cn(aid=self.na1.stable_id_non_phased, phasing=Phasing.AA), 1)
+        self.assertEqual(result_acnt["1"].get_cn(aid=self.r1.stable_id_non_phased, phasing=Phasing.AA), 1)
+        self.assertEqual(result_acnt["1"].get_cn(aid=self.r1.stable_id_non_phased, phasing=Phasing.BB), 1)
+        self.assertBalancedWithinBoundaries(segments=self.segments, adjacencies=self.adjacencies, scnt=result_scnt, acnt=result_acnt, scnb=scnb, telomeres=telomeres)
+
+    def test_lower_boundaries_demands(self):
+        cns = {(self.s1, Haplotype.A): 1, (self.s2, Haplotype.A): 0, (self.s3, Haplotype.A): 1, (self.t1, Haplotype.A): 0,
+               (self.s1, Haplotype.B): 0, (self.s2, Haplotype.B): 0, (self.s3, Haplotype.B): 0, (self.t1, Haplotype.B): 0}
+        lower = {(self.s2, Haplotype.A): 1}
+        upper = {(self.s2, Haplotype.A): 3}
+        scnt, scnb = self.get_scnt_and_scnb(cns=cns, lower=lower, upper=upper)
+        telomeres = [self.s1.start_position, self.s3.end_position]
+        result_scnt, result_acnt = get_min_cost_flow_cn_profiles(segments=self.segments, adjacencies=[self.r1, self.r2], scnt=scnt, scnb=scnb, telomeres=telomeres)
+        self.assertEqual(result_scnt["1"].get_cn(sid=self.s2.stable_id_non_hap, haplotype=Haplotype.A), 1)
+        self.assertEqual(result_acnt["1"].get_cn(aid=self.r1.stable_id_non_phased, phasing=Phasing.AA), 1)
+        self.assertEqual(result_acnt["1"].get_cn(aid=self.r2.stable_id_non_phased, phasing=Phasing.AA), 1)
+        self.assertBalancedWithinBoundaries(segments=self.segments, adjacencies=[self.r1, self.r2], scnt=result_scnt, acnt=result_acnt, scnb=scnb, telomeres=telomeres)
+
+    def test_na_on_haplotype_forbids_it_and_opposite_nas_on_other_haplotype(self):
+        a_cns = {(self.s1, Haplotype.A): 2, (self.s2, Haplotype.A): 1, (self.s3, Haplotype.A): 2, (self.t1, Haplotype.A): 0}
+        telomeres = [self.s1.start_position, self.s3.end_position, self.t1.start_position]
+        # haplotype B can only be balanced with na1 (first case), or with na2 (second case)
+        b_na1_cns = {(self.s1, Haplotype.B): 1, (self.s2, Haplotype.B): 0, (self.s3, Haplotype.B): 1, (self.t1, Haplotype.B): 0}
+        b_na2_cns = {(self.s1, Haplotype.B): 0, (self.s2, Haplotype.B): 1, (self.s3, Haplotype.B): 1, (self.t1, Haplotype.B): 1}
+        for b_cns, na in [(b_na1_cns, self.na1), (b_na2_cns, self.na2)]:
+            # without haplotype A using na1 (i.e., s2 is not deleted on haplotype A), haplotype B uses the respective novel adjacency
+            cns = dict(a_cns)
+            cns.update(b_cns)
+            cns[(self.s1, Haplotype.A)] = cns[(self.s3, Haplotype.A)] = 1
+            scnt, scnb = self.get_scnt_and_scnb(cns=cns)
+            result_scnt, result_acnt = get_min_cost_flow_cn_profiles(segments=self.segments, adjacencies=self.adjacencies, scnt=scnt, scnb=scnb, telomeres=telomeres)
+            self.assertEqual(result_acnt["1"].get_cn(aid=self.na1.stable_id_non_phased, phasing=Phasing.AA), 0)
+            self.assertEqual(result_acnt["1"].get_cn(aid=na.stable_id_non_phased, phasing=Phasing.BB), 1)
+            self.assertBalancedWithinBoundaries(segments=self.segments, adjacencies=self.adjacencies, scnt=result_scnt, acnt=result_acnt, scnb=scnb, telomeres=telomeres)
+            # with na1 used on haplotype A, neither na1, nor its opposite location na2, can be used on haplotype B
+            cns = dict(a_cns)
+            cns.update(b_cns)
+            scnt, scnb = self.get_scnt_and_scnb(cns=cns)
+            with self.assertRaises(ValueError):
+                get_min_cost_flow_cn_profiles(segments=self.segments, adjacencies=self.adjacencies, scnt=scnt, scnb=scnb, telomeres=telomeres)
+
+    def test_no_flow(self):
+        # s2 copy number can not be supported by the reference adjacency alone, and its start is not a telomere
+        cns = {(self.s1, Haplotype.A): 1, (self.s2, Haplotype.A): 2, (self.s3, Haplotype.A): 2, (self.t1, Haplotype.A): 0,
+               (self.s1, Haplotype.B): 0, (self.s2, Haplotype.B): 0, (self.s3, Haplotype.B): 0, (self.t1, Haplotype.B): 0}
+        scnt, scnb = self.get_scnt_and_scnb(cns=cns)
+        telomeres = [self.s1.start_position, self.s3.end_position]
+        with self.assertRaises(ValueError):
+            get_min_cost_flow_cn_profiles(segments=self.segments, adjacencies=[self.r1, self.r2], scnt=scnt, scnb=scnb, telomeres=telomeres)
+        # relaxing the s2 and s3 lower boundaries makes the balanced assignment possible
+        scnt, scnb = self.get_scnt_and_scnb(cns=cns, lower={(self.s2, Haplotype.A): 1, (self.s3, Haplotype.A): 1})
+        result_scnt, result_acnt = get_min_cost_flow_cn_profiles(segments=self.segments, adjacencies=[self.r1, self.r2], scnt=scnt, scnb=scnb, telomeres=telomeres)
+        self.assertEqual(result_scnt["1"].get_cn(sid=self.s2.stable_id_non_hap, haplotype=Haplotype.A), 1)
+        self.assertBalancedWithinBoundaries(segments=self.segments, adjacencies=[self.r1, self.r2], scnt=result_scnt, acnt=result_acnt, scnb=scnb, telomeres=telomeres)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+import unittest
+
+import numpy as np
+
+from rck.core.io import FALSE_POSITIVE, AG_LABELING
+from rck.core.structures import Position, Strand, Segment, Adjacency, AdjacencyType, AdjacencyGroup, AdjacencyGroupType, Haplotype, Phasing, \
+    SegmentCopyNumberProfile, SegmentCopyNumberBoundaries, AdjacencyCopyNumberProfile, CNBoundaries
+from rck.utils.karyotype.analysis import scnb_violations, adjacency_groups_molecule_inferred_fps, adjacency_groups_general_inferred_fps, \
+    adjacency_groups_molecule_violations, adjacency_groups_general_violations, adjacency_groups_labeling_violations
+
+
+def get_adjacency(aid, coordinate1, coordinate2):
+    return Adjacency(position1=Position(chromosome="1", coordinate=coordinate1, strand=Strand.FORWARD),
+                     position2=Position(chromosome="2", coordinate=coordinate2, strand=Strand.REVERSE),
+                     adjacency_type=AdjacencyType.NOVEL, idx=aid)
+
+
+def get_group(gid, adjacencies, group_type, fp=None, labeling=None):
+    extra = {}
+    if fp is not None:
+        extra[FALSE_POSITIVE] = fp
+    if labeling is not None:
+        extra[AG_LABELING] = labeling
+    return AdjacencyGroup(gid=gid, aids=[adjacency.idx for adjacency in adjacencies], group_type=group_type, adjacencies=adjacencies, extra=extra)
+
+
+def get_gids(groups):
+    return [group.gid for group in groups]
+
+
+class ScnbViolationsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.segments = [Segment.from_chromosome_coordinates(chromosome="1", start=start, end=start + 99) for start in [1, 101, 201]]
+        self.s1, self.s2, self.s3 = [segment.stable_id_non_hap for segment in self.segments]
+        # boundaries of s2 are given for the other allele
+        self.segments_syncs = {self.s1: 1, self.s2: -1, self.s3: 1}
+        self.scnt = {"1": SegmentCopyNumberProfile(), "2": SegmentCopyNumberProfile()}
+        self.scnb = {"1": SegmentCopyNumberBoundaries(), "2": SegmentCopyNumberBoundaries()}
+        for clone_id, sid, cna, cnb, (lower_a, lower_b, upper_a, upper_b) in [
+            ("1", self.s1, 1, 2, (1, 2, 1, 2)),
+            ("1", self.s2, 2, 0, (0, 2, 0, 2)),
+            ("1", self.s3, 1, 1, (0, 0, 0, 0)),
+            ("2", self.s1, 0, 0, (1, 0, 1, 0)),
+            ("2", self.s2, 0, 0, (0, 0, 0, 0)),
+            ("2", self.s3, 0, 0, (0, 0, 2, 2)),
+        ]:
+            self.scnt[clone_id].set_cn_record(sid=sid, hap=Haplotype.A, cn=cna)
+            self.scnt[clone_id].set_cn_record(sid=sid, hap=Haplotype.B, cn=cnb)
+            for hap, boundary_type, value in [(Haplotype.A, CNBoundaries.LOWER, lower_a), (Haplotype.B, CNBoundaries.LOWER, lower_b),
+                                              (Haplotype.A, CNBoundaries.UPPER, upper_a), (Haplotype.B, CNBoundaries.UPPER, upper_b)]:
+                self.scnb[clone_id].set_cnb_record(sid=sid, hap=hap, boundary_type=boundary_type, value=value)
+
+    def test_violations(self):
+        result = scnb_violations(scnt=self.scnt, scnb=self.scnb, segments_syncs=self.segments_syncs, clone_ids=["1", "2"])
+        self.assertEqual(dict(result), {"1": [self.s3], "2": [self.s1]})
+        result = scnb_violations(scnt=self.scnt, scnb=self.scnb, segments_syncs=self.segments_syncs, segments=self.segments[:2], clone_ids=["1", "2"])
+        self.assertEqual(dict(result), {"2": [self.s1]})
+        # boundaries of segments, that are in allele sync, are not swapped
+        self.segments_syncs[self.s2] = 1
+        result = scnb_violations(scnt=self.scnt, scnb=self.scnb, segments_syncs=self.segments_syncs, clone_ids=["1", "2"])
+        self.assertEqual(dict(result), {"1": [self.s2, self.s3], "2": [self.s1]})
+
+    def test_short_circuit(self):
+        result = scnb_violations(scnt=self.scnt, scnb=self.scnb, segments_syncs=self.segments_syncs, clone_ids=["1", "2"], short_circuit=True)
+        self.assertEqual(dict(result), {"1": [self.s3]})
+        result = scnb_violations(scnt=self.scnt, scnb=self.scnb, segments_syncs=self.segments_syncs, segments=self.segments[:2], clone_ids=["1", "2"],
+                                 short_circuit=True)
+        self.assertEqual(dict(result), {"2": [self.s1]})
+
+    def test_no_violations(self):
+        result = scnb_violations(scnt=self.scnt, scnb=self.scnb, segments_syncs=self.segments_syncs, segments=[self.segments[1]], clone_ids=["1", "2"])
+        self.assertEqual(dict(result), {})
+        self.assertEqual(dict(scnb_violations(scnt=self.scnt, scnb=self.scnb, segments_syncs=self.segments_syncs, clone_ids=[])), {})
+
+
+class AdjacencyGroupsViolationsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.a1, self.a2, self.a3, self.a4 = [get_adjacency(aid="a{index}".format(index=index), coordinate1=index * 100, coordinate2=index * 100 + 1)
+                                              for index in range(1, 5)]
+        self.acnt = {"1": AdjacencyCopyNumberProfile(), "2": AdjacencyCopyNumberProfile()}
+        # a4 is absent in all clones
+        for clone_id, adjacency, phasing, cn in [("1", self.a1, Phasing.AA, 1), ("1", self.a2, Phasing.AB, 1), ("2", self.a3, Phasing.BB, 2)]:
+            self.acnt[clone_id].set_cn_record_for_adjacency(adjacency=adjacency, cn=cn, phasing=phasing)
+        m = AdjacencyGroupType.MOLECULE
+        self.molecule_groups = [
+            get_group(gid="m1", adjacencies=[self.a1, self.a2], group_type=m, fp=0.0),
+            get_group(gid="m4", adjacencies=[self.a4], group_type=m),
+            get_group(gid="m2", adjacencies=[self.a1, self.a3], group_type=m, fp=0.4),
+            get_group(gid="m3", adjacencies=[self.a1, self.a2, self.a3, self.a4], group_type=m, fp=0.5),
+            get_group(gid="m5", adjacencies=[], group_type=m, fp=0.0),
+            get_group(gid="m6", adjacencies=[self.a3, self.a4], group_type=m, fp=0.1),
+        ]
+        n = AdjacencyGroupType.GENERAL
+        self.general_groups = [
+            get_group(gid="n3", adjacencies=[self.a4], group_type=n),
+            get_group(gid="n2", adjacencies=[self.a2, self.a3], group_type=n, fp=0.0),
+            get_group(gid="n1", adjacencies=[self.a1, self.a3, self.a4], group_type=n, fp=0.3),
+            get_group(gid="n4", adjacencies=[], group_type=n, fp=0.0),
+            get_group(gid="n5", adjacencies=[self.a1, self.a4], group_type=n, fp=0.5),
+        ]
+        l = AdjacencyGroupType.LABELING
+        self.labeling_groups = [
+            get_group(gid="l1", adjacencies=[self.a1, self.a2], group_type=l, labeling=[0, 0]),
+            get_group(gid="l2", adjacencies=[self.a1, self.a2], group_type=l, labeling=[0, 1]),
+            get_group(gid="l3", adjacencies=[self.a3, self.a4], group_type=l, labeling=[0, 1]),
+            get_group(gid="l4", adjacencies=[], group_type=l, labeling=[]),
+            get_group(gid="l5", adjacencies=[self.a3, self.a1], group_type=l, labeling=[1, 0]),
+        ]
+        self.groups = self.molecule_groups + self.general_groups + self.labeling_groups
+
+    def test_molecule_inferred_fps(self):
+        inferred_fps = adjacency_groups_molecule_inferred_fps(groups=self.molecule_groups, acnt=self.acnt)
+        self.assertEqual(inferred_fps.tolist(), [[0.0, 1.0], [1.0, 1.0], [0.5, 0.5], [0.5, 0.75], [0.0, 0.0], [1.0, 0.5]])
+        inferred_fps = adjacency_groups_molecule_inferred_fps(groups=self.molecule_groups, acnt=self.acnt, clone_ids=["2"])
+        self.assertEqual(inferred_fps.tolist(), [[1.0], [1.0], [0.5], [0.75], [0.0], [0.5]])
+        self.assertEqual(adjacency_groups_molecule_inferred_fps(groups=[], acnt=self.acnt).shape, (0, 2))
+
+    def test_general_inferred_fps(self):
+        inferred_fps = adjacency_groups_general_inferred_fps(groups=self.general_groups, acnt=self.acnt)
+        np.testing.assert_allclose(inferred_fps, [1.0, 0.0, 1.0 / 3, 0.0, 0.5])
+        inferred_fps = adjacency_groups_general_inferred_fps(groups=self.general_groups, acnt=self.acnt, clone_ids=["1"])
+        np.testing.assert_allclose(inferred_fps, [1.0, 0.5, 2.0 / 3, 0.0, 0.5])
+        self.assertEqual(adjacency_groups_general_inferred_fps(groups=[], acnt=self.acnt).shape, (0,))
+
+    def test_molecule_violations(self):
+        self.assertEqual(get_gids(adjacency_groups_molecule_violations(groups=self.groups, acnt=self.acnt)), ["m2", "m6"])
+        self.assertEqual(get_gids(adjacency_groups_molecule_violations(groups=self.groups, acnt=self.acnt, skip_missing_fp=False)), ["m4", "m2", "m6"])
+        self.assertEqual(get_gids(adjacency_groups_molecule_violations(groups=self.groups, acnt=self.acnt, clone_ids=["2"])), ["m1", "m2", "m3", "m6"])
+        self.assertEqual(get_gids(adjacency_groups_molecule_violations(groups=self.groups, acnt=self.acnt, short_circuit=True)), ["m2"])
+        self.assertEqual(get_gids(adjacency_groups_molecule_violations(groups=self.groups, acnt=self.acnt, skip_missing_fp=False, short_circuit=True)), ["m4"])
+        self.assertEqual(adjacency_groups_molecule_violations(groups=self.general_groups, acnt=self.acnt, skip_missing_fp=False), [])
+        self.assertEqual(adjacency_groups_molecule_violations(groups=[], acnt=self.acnt, skip_missing_fp=False), [])
+
+    def test_general_violations(self):
+        self.assertEqual(get_gids(adjacency_groups_general_violations(groups=self.groups, acnt=self.acnt)), ["n1"])
+        self.assertEqual(get_gids(adjacency_groups_general_violations(groups=self.groups, acnt=self.acnt, skip_missing_fp=False)), ["n3", "n1"])
+        self.assertEqual(get_gids(adjacency_groups_general_violations(groups=self.groups, acnt=self.acnt, clone_ids=["1"])), ["n2", "n1"])
+        self.assertEqual(get_gids(adjacency_groups_general_violations(groups=self.groups, acnt=self.acnt, short_circuit=True)), ["n1"])
+        self.assertEqual(get_gids(adjacency_groups_general_violations(groups=self.groups, acnt=self.acnt, skip_missing_fp=False, short_circuit=True)), ["n3"])
+        self.assertEqual(adjacency_groups_general_violations(groups=self.molecule_groups, acnt=self.acnt, skip_missing_fp=False), [])
+        self.assertEqual(adjacency_groups_general_violations(groups=[], acnt=self.acnt, skip_missing_fp=False), [])
+
+    def test_labeling_violations(self):
+        self.assertEqual(get_gids(adjacency_groups_labeling_violations(groups=self.groups, acnt=self.acnt)), ["l2", "l5"])
+        self.assertEqual(get_gids(adjacency_groups_labeling_violations(groups=self.groups, acnt=self.acnt, clone_ids=["1"])), ["l2"])
+        self.assertEqual(get_gids(adjacency_groups_labeling_violations(groups=self.groups, acnt=self.acnt, short_circuit=True)), ["l2"])
+        self.assertEqual(adjacency_groups_labeling_violations(groups=[], acnt=self.acnt), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
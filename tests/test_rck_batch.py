@@ -0,0 +1,186 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from rck.rck_batch import get_batch_manifest, read_batch_manifest, BatchScheduler, PENDING, ESTIMATING, ESTIMATED, SOLVING, DONE, FAILED, \
+    ESTIMATE_PHASE, SOLVE_PHASE
+
+
+class StubPopen(object):
+    """
+    Stand-in for `subprocess.Popen` of `rck` runs: finishes immediately with the return code for the sample (see `return_codes`),
+        and, for the estimate phase (i.e., `rck --dry-run`), writes the model size estimate to the supplied stdout.
+    """
+    commands = []
+    return_codes = {}
+    memory_mb = {}
+
+    def __init__(self, command, stdout=None, stderr=None):
+        self.command = command
+        self.commands.append(command)
+        workdir = command[command.index("--workdir") + 1]
+        self.sample = os.path.basename(workdir)
+        self.returncode = self.return_codes.get(self.sample, 0)
+        if "--dry-run" in command and self.returncode == 0:
+            json.dump({"memory_mb": self.memory_mb.get(self.sample, 100)}, stdout)
+
+    def poll(self):
+        return self.returncode
+
+    def terminate(self):
+        pass
+
+    def wait(self):
+        return self.returncode
+
+
+def get_samples(names):
+    return [{"sample": name, "scnt": "/data/{name}.scnt.tsv".format(name=name), "adjacencies": "/data/{name}.adj.tsv".format(name=name), "args": []}
+            for name in names]
+
+
+class BatchManifestTestCase(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir)
+
+    def test_new_samples(self):
+        manifest = get_batch_manifest(samples=get_samples(["s1", "s2"]), workdir=self.workdir, rck_args=["--clone-ids", "c1"], previous_manifest={})
+        self.assertEqual(sorted(manifest.keys()), ["s1", "s2"])
+        record = manifest["s1"]
+        self.assertEqual(record["status"], PENDING)
+        self.assertEqual(record["workdir"], os.path.join(self.workdir, "samples", "s1"))
+        self.assertEqual(record["rck_args"], ["--scnt", "/data/s1.scnt.tsv", "--adjacencies", "/data/s1.adj.tsv", "--clone-ids", "c1"])
+        self.assertEqual(record["attempts"], {ESTIMATE_PHASE: 0, SOLVE_PHASE: 0})
+
+    def test_status_transitions(self):
+        samples = get_samples(["s1", "s2", "s3", "s4", "s5", "s6"])
+        previous_manifest = get_batch_manifest(samples=samples, workdir=self.workdir, rck_args=[], previous_manifest={})
+        statuses = {"s1": (ESTIMATING, None), "s2": (SOLVING, None), "s3": (FAILED, ESTIMATE_PHASE), "s4": (FAILED, SOLVE_PHASE), "s5": (DONE, None), "s6": (ESTIMATED, None)}
+        for sample_id, (status, failed_phase) in statuses.items():
+            previous_manifest[sample_id]["status"] = status
+            previous_manifest[sample_id]["failed_phase"] = failed_phase
+        previous_manifest = json.loads(json.dumps(previous_manifest))
+        manifest = get_batch_manifest(samples=samples, workdir=self.workdir, rck_args=[], previous_manifest=json.loads(json.dumps(previous_manifest)))
+        self.assertEqual({sample_id: record["status"] for sample_id, record in manifest.items()},
+                         {"s1": PENDING, "s2": ESTIMATED, "s3": FAILED, "s4": FAILED, "s5": DONE, "s6": ESTIMATED})
+        manifest = get_batch_manifest(samples=samples, workdir=self.workdir, rck_args=[], previous_manifest=json.loads(json.dumps(previous_manifest)),
+                                      retry_failed=True)
+        self.assertEqual({sample_id: record["status"] for sample_id, record in manifest.items()},
+                         {"s1": PENDING, "s2": ESTIMATED, "s3": PENDING, "s4": ESTIMATED, "s5": DONE, "s6": ESTIMATED})
+
+    def test_changed_args_reset_record_and_workdir(self):
+        samples = get_samples(["s1", "s2"])
+        previous_manifest = get_batch_manifest(samples=samples, workdir=self.workdir, rck_args=[], previous_manifest={})
+        for record in previous_manifest.values():
+            record["status"] = DONE
+            record["attempts"][SOLVE_PHASE] = 1
+            checkpoint_dir = os.path.join(record["workdir"], "checkpoint")
+            os.makedirs(checkpoint_dir)
+            with open(os.path.join(checkpoint_dir, "incumbent.json"), "wt") as destination:
+                destination.write("{}")
+        samples[1]["args"] = ["--run-nas-fp", "0.2"]
+        manifest = get_batch_manifest(samples=samples, workdir=self.workdir, rck_args=[], previous_manifest=previous_manifest)
+        self.assertEqual(manifest["s1"]["status"], DONE)
+        self.assertTrue(os.path.exists(os.path.join(manifest["s1"]["workdir"], "checkpoint")))
+        self.assertEqual(manifest["s2"]["status"], PENDING)
+        self.assertEqual(manifest["s2"]["attempts"][SOLVE_PHASE], 0)
+        self.assertEqual(manifest["s2"]["rck_args"][-2:], ["--run-nas-fp", "0.2"])
+        self.assertFalse(os.path.exists(manifest["s2"]["workdir"]))
+
+
+class BatchSchedulerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        StubPopen.commands = []
+        StubPopen.return_codes = {}
+        StubPopen.memory_mb = {}
+        self.popen_patcher = mock.patch("rck.rck_batch.subprocess.Popen", StubPopen)
+        self.popen_patcher.start()
+
+    def tearDown(self):
+        self.popen_patcher.stop()
+        shutil.rmtree(self.workdir)
+
+    def get_scheduler(self, manifest, cores=8, memory_mb=5000, solver_seats=1, solve_threads=2, max_solve_threads=16, estimate_memory_mb=1000):
+        return BatchScheduler(manifest=manifest, workdir=self.workdir, cores=cores, memory_mb=memory_mb, solver_seats=solver_seats, solve_threads=solve_threads,
+                              max_solve_threads=max_solve_threads, estimate_memory_mb=estimate_memory_mb, poll_interval=0)
+
+    def get_job(self, cores, memory_mb, seats):
+        return {"process": None, "phase": SOLVE_PHASE, "cores": cores, "memory_mb": memory_mb, "seats": seats, "files": []}
+
+    def test_fits(self):
+        scheduler = self.get_scheduler(manifest={}, cores=8, memory_mb=5000, solver_seats=2)
+        # a process, that does not fit into the resources at all, is started alone
+        self.assertTrue(scheduler.fits(cores=100, memory_mb=100000, seats=10))
+        scheduler.running["s1"] = self.get_job(cores=4, memory_mb=3000, seats=1)
+        self.assertTrue(scheduler.fits(cores=4, memory_mb=2000, seats=1))
+        self.assertFalse(scheduler.fits(cores=5, memory_mb=1000, seats=0))
+        self.assertFalse(scheduler.fits(cores=1, memory_mb=2001, seats=0))
+        scheduler.running["s2"] = self.get_job(cores=1, memory_mb=0, seats=1)
+        self.assertFalse(scheduler.fits(cores=1, memory_mb=0, seats=1))
+        self.assertTrue(scheduler.fits(cores=1, memory_mb=0, seats=0))
+        scheduler.memory_mb = None
+        self.assertTrue(scheduler.fits(cores=3, memory_mb=100000, seats=0))
+
+    def test_solve_threads(self):
+        scheduler = self.get_scheduler(manifest={}, cores=16, solver_seats=2, solve_threads=2, max_solve_threads=6)
+        self.assertEqual(scheduler.get_solve_threads(ready_cnt=3, pending_cnt=1), 2)
+        # with nothing left to estimate, free cores are spread across (at most `solver_seats`) solves, up to `max_solve_threads` each
+        self.assertEqual(scheduler.get_solve_threads(ready_cnt=3, pending_cnt=0), 6)
+        scheduler.running["s1"] = self.get_job(cores=10, memory_mb=0, seats=1)
+        self.assertEqual(scheduler.get_solve_threads(ready_cnt=1, pending_cnt=0), 6)
+        self.assertEqual(scheduler.get_solve_threads(ready_cnt=2, pending_cnt=0), 3)
+        scheduler.running["s2"] = self.get_job(cores=6, memory_mb=0, seats=1)
+        self.assertEqual(scheduler.get_solve_threads(ready_cnt=1, pending_cnt=0), 2)
+        scheduler = self.get_scheduler(manifest={}, cores=1, solve_threads=4)
+        self.assertEqual(scheduler.get_solve_threads(ready_cnt=1, pending_cnt=1), 1)
+
+    def test_schedule(self):
+        manifest = get_batch_manifest(samples=get_samples(["s1", "s2", "s3", "s4", "s5"]), workdir=self.workdir, rck_args=[], previous_manifest={})
+        for sample_id, memory_mb in [("s1", 1000), ("s2", 3000)]:
+            manifest[sample_id]["status"] = ESTIMATED
+            manifest[sample_id]["memory_mb"] = memory_mb
+        scheduler = self.get_scheduler(manifest=manifest, cores=8, memory_mb=5000, solver_seats=1, solve_threads=2, estimate_memory_mb=1000)
+        self.assertTrue(scheduler.schedule())
+        # the larger solve is started first, the other one waits for the solver seat; estimates are started while memory allows
+        self.assertEqual(sorted((sample_id, job["phase"]) for sample_id, job in scheduler.running.items()),
+                         [("s2", SOLVE_PHASE), ("s3", ESTIMATE_PHASE), ("s4", ESTIMATE_PHASE)])
+        self.assertEqual([manifest[sample_id]["status"] for sample_id in ["s1", "s2", "s3", "s4", "s5"]], [ESTIMATED, SOLVING, ESTIMATING, ESTIMATING, PENDING])
+        self.assertEqual(manifest["s2"]["threads"], 2)
+        self.assertEqual(manifest["s2"]["attempts"], {ESTIMATE_PHASE: 0, SOLVE_PHASE: 1})
+        commands = {os.path.basename(command[command.index("--workdir") + 1]): command for command in StubPopen.commands}
+        self.assertEqual(commands["s2"][-3:], ["--resume", "--run-g-threads", "2"])
+        self.assertEqual(commands["s3"][-1], "--dry-run")
+        self.assertEqual(read_batch_manifest(workdir=self.workdir)["s2"]["status"], SOLVING)
+
+    def test_run(self):
+        manifest = get_batch_manifest(samples=get_samples(["s1", "s2", "s3", "s4"]), workdir=self.workdir, rck_args=[], previous_manifest={})
+        StubPopen.memory_mb = {"s1": 100, "s2": 200, "s3": 300}
+        StubPopen.return_codes = {"s3": 1}
+        scheduler = self.get_scheduler(manifest=manifest, cores=2, solver_seats=1)
+        manifest = scheduler.run()
+        self.assertEqual({sample_id: record["status"] for sample_id, record in manifest.items()}, {"s1": DONE, "s2": DONE, "s3": FAILED, "s4": DONE})
+        self.assertEqual(manifest["s2"]["memory_mb"], 200)
+        self.assertEqual(manifest["s3"]["failed_phase"], ESTIMATE_PHASE)
+        self.assertEqual(manifest["s3"]["attempts"], {ESTIMATE_PHASE: 1, SOLVE_PHASE: 0})
+        self.assertEqual(manifest["s1"]["outputs"], os.path.join(manifest["s1"]["workdir"], "output"))
+        self.assertEqual(read_batch_manifest(workdir=self.workdir), manifest)
+        # failed sample is retried from the failed phase
+        StubPopen.return_codes = {}
+        manifest = get_batch_manifest(samples=get_samples(["s1", "s2", "s3", "s4"]), workdir=self.workdir, rck_args=[], previous_manifest=read_batch_manifest(self.workdir),
+                                      retry_failed=True)
+        StubPopen.commands = []
+        manifest = self.get_scheduler(manifest=manifest, cores=2, solver_seats=1).run()
+        self.assertTrue(all(record["status"] == DONE for record in manifest.values()))
+        self.assertEqual(manifest["s3"]["attempts"], {ESTIMATE_PHASE: 2, SOLVE_PHASE: 1})
+        self.assertEqual(len(StubPopen.commands), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+
+import numpy as np
+
+from rck.core.structures import Segment, SegmentCopyNumberProfile, Haplotype
+from rck.utils.scn.process import scnt_pair_distance, scnt_distance_matrix
+
+
+def get_scnt(segments, cns_by_clone_ids):
+    result = {}
+    for clone_id, cns in cns_by_clone_ids.items():
+        scnp = SegmentCopyNumberProfile()
+        for segment, (cna, cnb) in zip(segments, cns):
+            scnp.set_cn_record(sid=segment.stable_id_non_hap, hap=Haplotype.A, cn=cna)
+            scnp.set_cn_record(sid=segment.stable_id_non_hap, hap=Haplotype.B, cn=cnb)
+        result[clone_id] = scnp
+    return result
+
+
+class ScntDistanceTestCase(unittest.TestCase):
+    def setUp(self):
+        self.segments = [Segment.from_chromosome_coordinates(chromosome="1", start=1, end=100),
+                         Segment.from_chromosome_coordinates(chromosome="1", start=101, end=110)]
+        self.scnt_x = get_scnt(segments=self.segments, cns_by_clone_ids={"c1": [(1, 1), (1, 1)], "c2": [(2, 2), (0, 0)]})
+        # clones of y are (almost) the clones of x in the reversed order
+        self.scnt_y = get_scnt(segments=self.segments, cns_by_clone_ids={"d1": [(2, 2), (0, 0)], "d2": [(1, 1), (2, 1)]})
+        self.scnt_z = get_scnt(segments=self.segments, cns_by_clone_ids={"e1": [(1, 1), (1, 1)]})
+        self.scnt_w = get_scnt(segments=self.segments, cns_by_clone_ids={"f1": [(1, 1), (1, 1)], "f2": [(2, 2), (0, 1)]})
+
+    def test_sorted_clone_mapping(self):
+        total, distances, mapping = scnt_pair_distance(scnt1=self.scnt_x, scnt2=self.scnt_y, segments=self.segments)
+        self.assertEqual(mapping, {"c1": "d1", "c2": "d2"})
+        self.assertEqual(distances, {"c1": 2 * 100 + 2 * 10, "c2": 2 * 100 + 3 * 10})
+        self.assertEqual(total, 450)
+
+    def test_best_clone_mapping(self):
+        total, distances, mapping = scnt_pair_distance(scnt1=self.scnt_x, scnt2=self.scnt_y, segments=self.segments, best_clone_mapping=True)
+        self.assertEqual(mapping, {"c1": "d2", "c2": "d1"})
+        self.assertEqual(distances, {"c1": 10, "c2": 0})
+        self.assertEqual(total, 10)
+        # sorted mapping is already the best one
+        self.assertEqual(scnt_pair_distance(scnt1=self.scnt_x, scnt2=self.scnt_w, segments=self.segments, best_clone_mapping=True),
+                         scnt_pair_distance(scnt1=self.scnt_x, scnt2=self.scnt_w, segments=self.segments))
+
+    def test_different_clones_cnt(self):
+        with self.assertRaises(ValueError):
+            scnt_pair_distance(scnt1=self.scnt_x, scnt2=self.scnt_z, segments=self.segments)
+
+    def get_distance_matrix(self, best_clone_mapping, workers):
+        scnts_by_sample_names = {"y": self.scnt_y, "x": self.scnt_x, "z": self.scnt_z, "w": self.scnt_w}
+        segments_by_sample_names = {sample_name: self.segments for sample_name in scnts_by_sample_names}
+        return scnt_distance_matrix(segments_by_sample_names=segments_by_sample_names, scnts_by_sample_names=scnts_by_sample_names,
+                                    best_clone_mapping=best_clone_mapping, workers=workers)
+
+    def test_distance_matrix(self):
+        nan = np.nan
+        for best_clone_mapping, x_y_distance, y_w_distance in [(False, 450, 440), (True, 10, 20)]:
+            sample_names, matrix, pairs = self.get_distance_matrix(best_clone_mapping=best_clone_mapping, workers=1)
+            self.assertEqual(sample_names, ["w", "x", "y", "z"])
+            np.testing.assert_array_equal(matrix, [[0, 10, y_w_distance, nan],
+                                                   [10, 0, x_y_distance, nan],
+                                                   [y_w_distance, x_y_distance, 0, nan],
+                                                   [nan, nan, nan, 0]])
+            self.assertEqual(sorted(pairs.keys()), [("w", "x"), ("w", "y"), ("w", "z"), ("x", "y"), ("x", "z"), ("y", "z")])
+            self.assertEqual([pair for pair, pair_result in sorted(pairs.items()) if pair_result is None], [("w", "z"), ("x", "z"), ("y", "z")])
+            self.assertEqual(pairs[("x", "y")][0], x_y_distance)
+
+    def test_distance_matrix_workers(self):
+        for best_clone_mapping in [False, True]:
+            sample_names, matrix, pairs = self.get_distance_matrix(best_clone_mapping=best_clone_mapping, workers=1)
+            workers_sample_names, workers_matrix, workers_pairs = self.get_distance_matrix(best_clone_mapping=best_clone_mapping, workers=2)
+            self.assertEqual(sample_names, workers_sample_names)
+            np.testing.assert_array_equal(matrix, workers_matrix)
+            self.assertEqual(pairs, workers_pairs)
+
+
+if __name__ == '__main__':
+    unittest.main()
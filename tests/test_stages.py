@@ -0,0 +1,110 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from rck.core.stages import get_content_key, stage_is_fresh, record_stage, StageProfiler, STAGES_MANIFEST_FILE, PROFILE_FILE
+
+
+class StagesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.input_file = os.path.join(self.workdir, "input.tsv")
+        with open(self.input_file, "wt") as destination:
+            destination.write("a\t1\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir)
+
+    def test_content_key(self):
+        key = get_content_key(input_files=[self.input_file], options={"fp": 0.1, "regions": ["1"]}, salt="preprocess")
+        self.assertEqual(key, get_content_key(input_files=[self.input_file], options={"regions": ["1"], "fp": 0.1}, salt="preprocess"))
+        self.assertNotEqual(key, get_content_key(input_files=[self.input_file], options={"fp": 0.2, "regions": ["1"]}, salt="preprocess"))
+        self.assertNotEqual(key, get_content_key(input_files=[self.input_file], options={"fp": 0.1, "regions": ["1"]}, salt="presolve"))
+        self.assertNotEqual(key, get_content_key(input_files=[self.input_file], options={"fp": 0.1, "regions": ["1"]}, salt="preprocess", upstream_keys=["x"]))
+        # modification time alone does not change the key
+        os.utime(self.input_file, (0, 0))
+        self.assertEqual(key, get_content_key(input_files=[self.input_file], options={"fp": 0.1, "regions": ["1"]}, salt="preprocess"))
+        with open(self.input_file, "wt") as destination:
+            destination.write("a\t2\n")
+        self.assertNotEqual(key, get_content_key(input_files=[self.input_file], options={"fp": 0.1, "regions": ["1"]}, salt="preprocess"))
+
+    def test_content_key_missing_file(self):
+        missing_file = os.path.join(self.workdir, "missing.tsv")
+        key = get_content_key(input_files=[missing_file], options={})
+        self.assertEqual(key, get_content_key(input_files=[missing_file], options={}))
+        self.assertNotEqual(key, get_content_key(input_files=[], options={}))
+        with open(missing_file, "wt") as destination:
+            destination.write("a")
+        self.assertNotEqual(key, get_content_key(input_files=[missing_file], options={}))
+
+    def test_stage_freshness(self):
+        output_file = os.path.join(self.workdir, "output", "rck.scnt.tsv")
+        os.makedirs(os.path.dirname(output_file))
+        with open(output_file, "wt") as destination:
+            destination.write("")
+        self.assertFalse(stage_is_fresh(workdir=self.workdir, stage="preprocess", key="key1"))
+        record_stage(workdir=self.workdir, stage="preprocess", key="key1", outputs=[output_file])
+        with open(os.path.join(self.workdir, STAGES_MANIFEST_FILE), "rt") as source:
+            self.assertEqual(json.load(source)["preprocess"]["outputs"], [os.path.join("output", "rck.scnt.tsv")])
+        self.assertTrue(stage_is_fresh(workdir=self.workdir, stage="preprocess", key="key1"))
+        self.assertFalse(stage_is_fresh(workdir=self.workdir, stage="preprocess", key="key2"))
+        self.assertFalse(stage_is_fresh(workdir=self.workdir, stage="presolve", key="key1"))
+        record_stage(workdir=self.workdir, stage="presolve", key="key3", outputs=[])
+        self.assertTrue(stage_is_fresh(workdir=self.workdir, stage="preprocess", key="key1"))
+        self.assertTrue(stage_is_fresh(workdir=self.workdir, stage="presolve", key="key3"))
+        os.remove(output_file)
+        self.assertFalse(stage_is_fresh(workdir=self.workdir, stage="preprocess", key="key1"))
+        self.assertTrue(stage_is_fresh(workdir=self.workdir, stage="presolve", key="key3"))
+
+    def test_corrupted_manifest(self):
+        with open(os.path.join(self.workdir, STAGES_MANIFEST_FILE), "wt") as destination:
+            destination.write("{")
+        self.assertFalse(stage_is_fresh(workdir=self.workdir, stage="preprocess", key="key1"))
+        record_stage(workdir=self.workdir, stage="preprocess", key="key1", outputs=[])
+        self.assertTrue(stage_is_fresh(workdir=self.workdir, stage="preprocess", key="key1"))
+
+
+class StageProfilerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir)
+
+    def read_profile(self):
+        with open(os.path.join(self.workdir, PROFILE_FILE), "rt") as source:
+            return json.load(source)
+
+    def test_stages(self):
+        profiler = StageProfiler(workdir=self.workdir)
+        with profiler.stage("preprocess") as record:
+            record["skipped"] = True
+        with profiler.stage("sweep", points=3):
+            pass
+        profile = self.read_profile()
+        self.assertEqual([record["name"] for record in profile["stages"]], ["preprocess", "sweep"])
+        self.assertEqual([record["status"] for record in profile["stages"]], ["finished", "finished"])
+        self.assertTrue(profile["stages"][0]["skipped"])
+        self.assertEqual(profile["stages"][1]["points"], 3)
+        for field in ["wall_time", "cpu_time", "max_rss_mb"]:
+            self.assertIn(field, profile["stages"][0])
+        self.assertEqual(len(profiler.get_summary_lines()), 4)
+
+    def test_written_on_exit_and_failure(self):
+        for exception, status in [(SystemExit(1), "exited"), (SystemExit(0), "finished"), (ValueError(), "failed")]:
+            profiler = StageProfiler(workdir=self.workdir)
+            with self.assertRaises(type(exception)):
+                with profiler.stage("solve"):
+                    raise exception
+            profile = self.read_profile()
+            self.assertEqual(len(profile["stages"]), 1)
+            self.assertEqual(profile["stages"][0]["name"], "solve")
+            self.assertEqual(profile["stages"][0]["status"], status)
+            self.assertIn("wall_time", profile["stages"][0])
+            os.remove(os.path.join(self.workdir, PROFILE_FILE))
+
+
+if __name__ == '__main__':
+    unittest.main()
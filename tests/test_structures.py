@@ -1,7 +1,8 @@
+import pickle
 import unittest
 
-from rck.core.structures import PositionCluster
-from rck.core.structures import Strand, Position, Segment, Adjacency
+from rck.core.structures import PositionCluster, SegmentCopyNumberBoundaries, CNBoundaries, Haplotype
+from rck.core.structures import Strand, Position, Segment, Adjacency, AdjacencyGroup, AdjacencyGroupType
 
 
 class StrandTestCase(unittest.TestCase):
@@ -112,5 +113,28 @@ class PositionClusterTestCase(unittest.TestCase):
         self.assertListEqual(pc.positions, [self.position2, self.position1, self.position3])
 
 
+class SegmentCopyNumberBoundariesTestCase(unittest.TestCase):
+    def test_pickling(self):
+        scnb = SegmentCopyNumberBoundaries()
+        scnb.set_cnb_record(sid="1:1-100", hap=Haplotype.A, boundary_type=CNBoundaries.LOWER, value=1)
+        scnb.set_cnb_record(sid="1:1-100", hap=Haplotype.A, boundary_type=CNBoundaries.UPPER, value=3)
+        restored = pickle.loads(pickle.dumps(scnb))
+        self.assertEqual(restored.get_cnb(sid="1:1-100", hap=Haplotype.A, boundary_type=CNBoundaries.LOWER), 1)
+        self.assertEqual(restored.get_cnb(sid="1:1-100", hap=Haplotype.A, boundary_type=CNBoundaries.UPPER), 3)
+        self.assertFalse(restored.has_record(sid="1:1-100", hap=Haplotype.B, boundary_type=CNBoundaries.UPPER))
+        restored.set_cnb_record(sid="1:101-200", hap=Haplotype.B, boundary_type=CNBoundaries.UPPER, value=2)
+        self.assertEqual(restored.get_cnb(sid="1:101-200", hap=Haplotype.B, boundary_type=CNBoundaries.UPPER), 2)
+
+
+class AdjacencyGroupTestCase(unittest.TestCase):
+    def test_immutable_ids_and_set_view(self):
+        group = AdjacencyGroup(gid="1", aids=["a1", "a2", "a1"], group_type=AdjacencyGroupType.LABELING)
+        self.assertEqual(group.adjacencies_ids, ("a1", "a2", "a1"))
+        self.assertEqual(group.adjacencies_ids_set, frozenset(["a1", "a2"]))
+        group.adjacencies_ids = ["a3"]
+        self.assertEqual(group.adjacencies_ids, ("a3",))
+        self.assertEqual(group.adjacencies_ids_set, frozenset(["a3"]))
+
+
 if __name__ == '__main__':
     unittest.main()